@@ -1,4 +1,5 @@
 from __future__ import annotations
+import asyncio
 import contextlib
 from dataclasses import dataclass, field
 import errno
@@ -7,7 +8,16 @@ import os.path
 from pathlib import Path
 import shutil
 import threading
-from typing import Callable, ContextManager, Iterator, List, Tuple
+from typing import (
+    AsyncContextManager,
+    Callable,
+    ContextManager,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+)
+import pyspawner
 from cjwkernel.util import tempdir_context, tempfile_context
 from cjwkernel.errors import ModuleExitedError
 
@@ -101,6 +111,16 @@ class Chroot:
     learn what the upper layer is.
     """
 
+    network_config: pyspawner.NetworkConfig = field(
+        default_factory=pyspawner.NetworkConfig
+    )
+    """
+    Network interfaces and addresses for a module that fetches in this chroot.
+
+    Each editable chroot has its own veth pair and IP addresses (see
+    setup-sandboxes.sh), so modules in different chroots may fetch at once.
+    """
+
     lock: threading.Lock = field(default_factory=threading.Lock)
     """
     Sanity check.
@@ -157,6 +177,15 @@ class ChrootContext:
 
     def __init__(self, chroot: Chroot):
         self.chroot = chroot
+        self.module_lock = threading.Lock()
+        """
+        Lock held while a module runs in this chroot.
+
+        Callers may share one ChrootContext between threads (e.g., renderer
+        executes several tabs concurrently). Only one module may run at a
+        time, though: `clear_unowned_edits()` after one module exits would
+        delete the files another module is still writing.
+        """
 
     def _clear_all_edits(self) -> None:
         """
@@ -294,11 +323,116 @@ class ChrootContext:
         os.chown(path, old_stat.st_uid, old_stat.st_gid)
 
 
-_chroots = Path("/var/lib/cjwkernel/chroot")
-_base = Path("/var/lib/cjwkernel/chroot-layers/base")
+class ChrootPool:
+    """
+    A fixed set of editable chroots, each leased to one caller at a time.
+
+    A ChrootContext only runs one module at a time (see
+    `ChrootContext.module_lock`). With a pool, a single process can run
+    several renders and fetches at once: each leases its own chroot, and the
+    lease is returned (wiped clean by `ChrootContext.__exit__()`) on exit.
+
+    The chroots must be provisioned beforehand by `setup-sandboxes.sh`.
+    """
+
+    def __init__(self, chroots: List[Chroot]):
+        assert chroots, "a ChrootPool needs at least one Chroot"
+        self.chroots = chroots
+        self._available = list(reversed(chroots))  # pop() leases chroots[0] first
+        self._condition: Optional[asyncio.Condition] = None
+        self._condition_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def keep_partition(self, index: int, n_partitions: int) -> None:
+        """
+        Forget all chroots but every `n_partitions`-th, starting at `index`.
+
+        Call this in each of `n_partitions` processes on the same node, before
+        leasing: then no two processes lease the same chroot.
+
+        Raise ValueError if partition `index` would have no chroots. Raise
+        RuntimeError if a chroot is leased.
+        """
+        chroots = self.chroots[index::n_partitions]
+        if not chroots:
+            raise ValueError(
+                "Partition %d of %d is empty: there are only %d chroots"
+                % (index, n_partitions, len(self.chroots))
+            )
+        if len(self._available) != len(self.chroots):
+            raise RuntimeError("Cannot partition while a chroot is leased")
+        self.chroots = chroots
+        self._available = list(reversed(chroots))
+
+    def _get_condition(self) -> asyncio.Condition:
+        """
+        Return the Condition waiters use, on the running event loop.
+
+        An asyncio.Condition belongs to one event loop. Production code runs a
+        single loop; unit tests call `asyncio.run()` many times. Leases never
+        outlive their loop, so a new loop can safely start a new Condition.
+        """
+        loop = asyncio.get_running_loop()
+        if self._condition_loop is not loop:
+            self._condition = asyncio.Condition()
+            self._condition_loop = loop
+        return self._condition
+
+    @contextlib.asynccontextmanager
+    async def acquire_context(self) -> AsyncContextManager[ChrootContext]:
+        """
+        Lease a chroot; yield its (clean) ChrootContext; return it on exit.
 
+        If all chroots are leased, wait -- without blocking the event loop --
+        until one is returned.
+        """
+        condition = self._get_condition()
+        async with condition:
+            await condition.wait_for(lambda: self._available)
+            chroot = self._available.pop()
+
+        try:
+            with chroot.acquire_context() as chroot_context:
+                yield chroot_context
+        finally:
+            async with condition:
+                self._available.append(chroot)
+                condition.notify()
 
-EDITABLE_CHROOT = Chroot(
-    _chroots / "editable" / "root", _base, _chroots / "editable" / "upperfs" / "upper"
+
+_chroots = Path("/var/lib/cjwkernel/chroot")
+_base = Path("/var/lib/cjwkernel/chroot-layers/base")
+_n_editable_chroots = int(os.environ.get("CJW_KERNEL_N_EDITABLE_CHROOTS", "1"))
+"""
+Number of editable chroots `setup-sandboxes.sh` created.
+
+setup-sandboxes.sh reads the same environment variable.
+"""
+
+
+def _editable_chroot(index: int) -> Chroot:
+    path = _chroots / "editable" / str(index)
+    # setup-sandboxes.sh writes iptables rules for these names and addresses
+    return Chroot(
+        path / "root",
+        _base,
+        path / "upperfs" / "upper",
+        network_config=pyspawner.NetworkConfig(
+            kernel_veth_name="cjw-veth-%d" % index,
+            child_veth_name="cjw-veth-%d-c" % index,
+            kernel_ipv4_address="192.168.%d.1" % (123 + index),
+            child_ipv4_address="192.168.%d.2" % (123 + index),
+        ),
+    )
+
+
+EDITABLE_CHROOT_POOL = ChrootPool(
+    [_editable_chroot(i) for i in range(_n_editable_chroots)]
 )
+EDITABLE_CHROOT = EDITABLE_CHROOT_POOL.chroots[0]
+"""
+The first chroot in EDITABLE_CHROOT_POOL.
+
+Use it in unit tests, which run one module at a time. Production code should
+lease from EDITABLE_CHROOT_POOL instead.
+"""
 READONLY_CHROOT_DIR = _chroots / "readonly" / "root"
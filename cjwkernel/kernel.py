@@ -8,7 +8,7 @@ from pathlib import Path
 import pyspawner
 import selectors
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 import thrift.protocol.TBinaryProtocol
 import thrift.transport.TTransport
 from cjwkernel.chroot import ChrootContext, READONLY_CHROOT_DIR
@@ -133,7 +133,17 @@ class Kernel:
         migrate_params_timeout: float = TIMEOUT,
         fetch_timeout: float = TIMEOUT,
         render_timeout: float = TIMEOUT,
+        warm_imports: Tuple[str, ...] = (),
     ):
+        """
+        Start a spawner process.
+
+        `warm_imports` are extra Python modules for the spawner to import
+        before it forks any children. A child running a `CompiledModule` whose
+        `warm_module_name` is among them uses the imported module as-is: the
+        import and evaluation cost is paid once, not on every call. Each call
+        still gets a freshly-forked process. SECURITY: only list trusted code.
+        """
         self.validate_timeout = validate_timeout
         self.migrate_params_timeout = migrate_params_timeout
         self.fetch_timeout = fetch_timeout
@@ -228,6 +238,7 @@ class Kernel:
                 "cjwkernel.pandas.parse",
                 "cjwkernel.parquet",
                 *ENCODING_IMPORTS,
+                *warm_imports,
             ],
         )
 
@@ -285,6 +296,33 @@ class Kernel:
         )
         return RawParams.from_thrift(response).params
 
+    def migrate_params_batch(
+        self, compiled_module: CompiledModule, params_list: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Call a module's migrate_params() on each of `params_list`.
+
+        One child process handles the whole batch. If migrate_params() fails on
+        any item, the whole call fails.
+        """
+        request = RawParams({"batch": params_list}).to_thrift()
+        response = self._run_in_child(
+            chroot_dir=READONLY_CHROOT_DIR,
+            network_config=None,
+            compiled_module=compiled_module,
+            timeout=self.migrate_params_timeout,
+            result=ttypes.RawParams(),
+            function="migrate_params_batch_thrift",
+            args=[request],
+        )
+        try:
+            result = RawParams.from_thrift(response).params["batch"]
+        except (ValueError, KeyError, TypeError):
+            raise ModuleExitedError(0, "Module returned an invalid batch") from None
+        if not isinstance(result, list) or len(result) != len(params_list):
+            raise ModuleExitedError(0, "Module returned the wrong number of params")
+        return result
+
     def render(
         self,
         compiled_module: CompiledModule,
@@ -311,19 +349,20 @@ class Kernel:
             None if fetch_result is None else fetch_result.to_thrift(),
             output_filename,
         )
-        try:
-            with chroot_context.writable_file(basedir / output_filename):
-                result = self._run_in_child(
-                    chroot_dir=chroot_dir,
-                    network_config=pyspawner.NetworkConfig(),  # TODO disallow networking
-                    compiled_module=compiled_module,
-                    timeout=self.render_timeout,
-                    result=ttypes.RenderResult(),
-                    function="render_thrift",
-                    args=[request],
-                )
-        finally:
-            chroot_context.clear_unowned_edits()
+        with chroot_context.module_lock:
+            try:
+                with chroot_context.writable_file(basedir / output_filename):
+                    result = self._run_in_child(
+                        chroot_dir=chroot_dir,
+                        network_config=None,
+                        compiled_module=compiled_module,
+                        timeout=self.render_timeout,
+                        result=ttypes.RenderResult(),
+                        function="render_thrift",
+                        args=[request],
+                    )
+            finally:
+                chroot_context.clear_unowned_edits()
 
         if result.table.filename and result.table.filename != output_filename:
             raise ModuleExitedError(0, "Module wrote to wrong output file")
@@ -364,19 +403,20 @@ class Kernel:
             input_parquet_filename,
             output_filename,
         )
-        try:
-            with chroot_context.writable_file(basedir / output_filename):
-                result = self._run_in_child(
-                    chroot_dir=chroot_dir,
-                    network_config=pyspawner.NetworkConfig(),
-                    compiled_module=compiled_module,
-                    timeout=self.fetch_timeout,
-                    result=ttypes.FetchResult(),
-                    function="fetch_thrift",
-                    args=[request],
-                )
-        finally:
-            chroot_context.clear_unowned_edits()
+        with chroot_context.module_lock:
+            try:
+                with chroot_context.writable_file(basedir / output_filename):
+                    result = self._run_in_child(
+                        chroot_dir=chroot_dir,
+                        network_config=chroot_context.chroot.network_config,
+                        compiled_module=compiled_module,
+                        timeout=self.fetch_timeout,
+                        result=ttypes.FetchResult(),
+                        function="fetch_thrift",
+                        args=[request],
+                    )
+            finally:
+                chroot_context.clear_unowned_edits()
 
         if result.filename and result.filename != output_filename:
             raise ModuleExitedError(0, "Module wrote to wrong output file")
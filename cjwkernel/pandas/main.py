@@ -15,6 +15,7 @@ def main(compiled_module: CompiledModule, function: str, args: List[Any]) -> Non
     assert function in (
         "render_thrift",
         "migrate_params_thrift",
+        "migrate_params_batch_thrift",
         "fetch_thrift",
         "validate_thrift",
     )
@@ -34,13 +35,20 @@ def run_in_sandbox(
     """
     # TODO sandbox -- will need an OS `clone()` with namespace, cgroups, ....
 
-    # Run the user's code in a new (programmatic) module.
-    #
-    # This gives the user code a blank namespace -- exactly what we want.
     module_name = f"rawmodule.{compiled_module.module_slug}"
-    user_code_module = types.ModuleType(module_name)
-    sys.modules[module_name] = user_code_module  # simulate "import"
-    exec(compiled_module.code_object, user_code_module.__dict__)
+    warm_module = sys.modules.get(compiled_module.warm_module_name or "")
+    if warm_module is not None:
+        # Our spawner evaluated this (trusted) module before forking us. We're
+        # a fresh fork, so its globals are pristine. Skip unmarshal+exec.
+        user_code_module = warm_module
+        sys.modules[module_name] = user_code_module
+    else:
+        # Run the user's code in a new (programmatic) module.
+        #
+        # This gives the user code a blank namespace -- exactly what we want.
+        user_code_module = types.ModuleType(module_name)
+        sys.modules[module_name] = user_code_module  # simulate "import"
+        exec(compiled_module.code_object, user_code_module.__dict__)
 
     # And now ... now we're unsafe! Because `code_object` may be malicious, any
     # line of code from here on out gives undefined behavior. Luckily, a parent
@@ -71,6 +79,8 @@ def run_in_sandbox(
         result = module.render_thrift(*args)
     elif function == "migrate_params_thrift":
         result = module.migrate_params_thrift(*args)
+    elif function == "migrate_params_batch_thrift":
+        result = module.migrate_params_batch_thrift(*args)
     elif function == "validate_thrift":
         result = module.validate_thrift(*args)
     elif function == "fetch_thrift":
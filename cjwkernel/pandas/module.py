@@ -289,6 +289,9 @@ def fetch_pandas(
 
         kwargs["get_stored_dataframe"] = get_stored_dataframe
 
+    if varkw or "last_fetch_result" in kwonlyargs:
+        kwargs["last_fetch_result"] = last_fetch_result
+
     if varkw or "output_path" in kwonlyargs:
         kwargs["output_path"] = output_path
 
@@ -419,6 +422,24 @@ def migrate_params_thrift(params: ttypes.RawParams):
     return types.RawParams(result_dict).to_thrift()
 
 
+def migrate_params_batch_thrift(params: ttypes.RawParams):
+    """
+    Call `migrate_params_thrift()` on each of a list of params.
+
+    `params` and the return value are both `{"batch": [...]}`: one process
+    migrates many steps' params. We call `migrate_params_thrift()` (not
+    `migrate_params()`) so a module that overrides it still gets called.
+    """
+    batch = types.RawParams.from_thrift(params).params["batch"]
+    result = [
+        types.RawParams.from_thrift(
+            migrate_params_thrift(types.RawParams(item).to_thrift())
+        ).params
+        for item in batch
+    ]
+    return types.RawParams({"batch": result}).to_thrift()
+
+
 def validate_thrift() -> ttypes.ValidateModuleResult:
     """
     Crash with an error to stdout if something about this module seems amiss.
@@ -454,7 +475,13 @@ def validate_thrift() -> ttypes.ValidateModuleResult:
     assert len(fetch_spec.args) == 1, "fetch must take one positional argument"
     assert not (
         set(fetch_spec.kwonlyargs)
-        - {"secrets", "get_input_dataframe", "get_stored_dataframe", "output_path"}
+        - {
+            "secrets",
+            "get_input_dataframe",
+            "get_stored_dataframe",
+            "last_fetch_result",
+            "output_path",
+        }
     ), "a fetch() keyword argument is misspelled"
 
     return ttypes.ValidateModuleResult()
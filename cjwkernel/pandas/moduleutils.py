@@ -1,16 +1,19 @@
 from contextlib import asynccontextmanager
 import io
 import json
+from pathlib import Path
 import re
 import ssl
-from typing import Dict, Callable, Iterator, Optional
+from typing import Dict, Callable, Iterator, List, Optional, Tuple
 import aiohttp
 import numpy as np
 import pandas as pd
 from pandas.api.types import is_numeric_dtype, is_datetime64_dtype
+import pyarrow
 import yarl  # aiohttp innards -- yuck!
 from cjwkernel.util import tempfile_context
 from cjwkernel.pandas.types import ProcessResult
+from cjwkernel.types import ArrowTable, Column, RenderResult, TableMetadata
 
 
 _TextEncoding = Optional[str]
@@ -186,3 +189,121 @@ def autocast_dtypes_in_place(table: pd.DataFrame) -> None:
     for colname in table:
         column = table[colname]
         table[colname] = autocast_series_dtype(column)
+
+
+def render_arrow_columns(
+    table: ArrowTable, columns: List[Tuple[str, Column]], output_path: Path
+) -> RenderResult:
+    """
+    Write a subset of `table`'s columns to `output_path`, without Pandas.
+
+    `columns` is a list of `(input_column_name, output_column)` pairs, in
+    output order. Each output column reuses the input column's Arrow data
+    as-is (it may be renamed, duplicated or given a new `ColumnType`), so
+    pass-through columns are never converted or copied in RAM: we only write
+    the mmapped input buffers to the output file.
+
+    Use this in `render_arrow()` of modules that only shuffle columns around.
+    """
+    return render_arrow_table(
+        [table.table.column(name) for name, _ in columns],
+        [column for _, column in columns],
+        table.metadata.n_rows,
+        output_path,
+    )
+
+
+def render_arrow_table(
+    arrays: List[pyarrow.ChunkedArray],
+    columns: List[Column],
+    n_rows: int,
+    output_path: Path,
+) -> RenderResult:
+    """
+    Write `arrays` to `output_path`, without Pandas.
+
+    `columns` describes `arrays`, in the same order. Each array must have
+    `n_rows` rows of valid Workbench data: dictionaries must not hold unused
+    or null values, and floats must be finite.
+
+    Use this in `render_arrow()` of modules that build their own Arrow data.
+    """
+    metadata = TableMetadata(n_rows, columns)
+    if not columns:
+        return RenderResult(ArrowTable(None, None, metadata))
+
+    arrow_table = pyarrow.Table.from_arrays(arrays, names=[c.name for c in columns])
+    with pyarrow.RecordBatchFileWriter(str(output_path), arrow_table.schema) as writer:
+        writer.write_table(arrow_table)
+    return RenderResult(ArrowTable(output_path, arrow_table, metadata))
+
+
+def arrow_column_to_array(column: pyarrow.ChunkedArray) -> pyarrow.Array:
+    """
+    Return `column`'s data as a single Array.
+
+    Workbench tables have one record batch, so this is usually free.
+    """
+    if column.num_chunks == 1:
+        return column.chunk(0)
+    elif column.num_chunks == 0:
+        return pyarrow.array([], type=column.type)
+    else:
+        return pyarrow.concat_arrays(column.chunks)
+
+
+def arrow_null_mask(array: pyarrow.Array) -> np.ndarray:
+    """
+    Read `array`'s validity bitmap as a numpy bool array: True means null.
+    """
+    if array.null_count == 0:
+        return np.zeros(len(array), dtype=bool)
+    bitmap = np.frombuffer(array.buffers()[0], dtype=np.uint8)
+    bits = np.unpackbits(bitmap, bitorder="little")
+    return bits[array.offset : array.offset + len(array)] == 0
+
+
+def arrow_values_to_numpy(array: pyarrow.Array, null_value) -> np.ndarray:
+    """
+    Copy a number or timestamp `array` to numpy, replacing nulls.
+
+    Integers and timestamps become int64; floats become float64. (pyarrow's
+    own `to_numpy()` refuses arrays with nulls, and `to_pandas()` converts
+    integers with nulls to float.)
+    """
+    if pyarrow.types.is_floating(array.type):
+        dtype = np.float64
+    else:
+        dtype = np.int64
+    if len(array) == 0:
+        return np.array([], dtype=dtype)
+    if pyarrow.types.is_timestamp(array.type):
+        buffer_dtype = np.int64
+    else:
+        buffer_dtype = array.type.to_pandas_dtype()
+    values = np.frombuffer(array.buffers()[1], dtype=buffer_dtype)
+    values = values[array.offset : array.offset + len(array)].astype(dtype)
+    if array.null_count:
+        values[arrow_null_mask(array)] = null_value
+    return values
+
+
+def remove_unused_dictionary_values(
+    array: pyarrow.DictionaryArray
+) -> pyarrow.DictionaryArray:
+    """
+    Drop dictionary values that no row uses, as Workbench requires.
+
+    Call this after selecting a subset of a dictionary array's rows.
+    """
+    n_values = len(array.dictionary)
+    codes = arrow_values_to_numpy(array.indices, n_values)
+    used = np.bincount(codes, minlength=n_values + 1)[:n_values] > 0
+    if used.all():
+        return array
+    new_codes = np.cumsum(used) - 1
+    indices = new_codes[np.minimum(codes, n_values - 1)].astype(np.int32)
+    return pyarrow.DictionaryArray.from_arrays(
+        pyarrow.array(indices, mask=codes == n_values),
+        array.dictionary.take(pyarrow.array(np.flatnonzero(used))),
+    )
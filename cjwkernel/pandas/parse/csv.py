@@ -5,14 +5,15 @@ import os
 from pathlib import Path
 import re
 import subprocess
-from typing import List, Optional, Tuple
+from typing import Iterator, List, Optional, Tuple
+import numpy as np
 import pandas as pd
 import pyarrow
 from cjwkernel import settings
 from cjwkernel.types import ArrowTable, I18nMessage, RenderError, RenderResult
 from cjwkernel.util import tempfile_context
 from cjwmodule.util.colnames import gen_unique_clean_colnames
-from .postprocess import dictionary_encode_columns, infer_table_metadata
+from .postprocess import infer_table_metadata, pylist_n_bytes
 from .text import transcode_to_utf8_and_warn
 
 
@@ -211,13 +212,13 @@ def _parse_csv_to_arrow_warnings(text: str) -> List[ParseCsvWarning]:
 
 
 def _postprocess_name_columns(
-    table: pyarrow.Table, has_header: bool
-) -> Tuple[pyarrow.Table, List[ParseCsvWarning]]:
+    header: Optional[List[str]], n_columns: int
+) -> Tuple[List[str], List[ParseCsvWarning]]:
     """
-    Return `table`, with final column names but still String values.
+    Return final column names, given the header row (or `None`).
     """
     warnings = []
-    if has_header and table.num_rows > 0:
+    if header is not None:
         n_ascii_cleaned = 0
         first_ascii_cleaned = None
         n_truncated = 0
@@ -226,10 +227,7 @@ def _postprocess_name_columns(
         first_numbered = None
 
         names = []
-        for colname in gen_unique_clean_colnames(
-            list(("" if c[0] is pyarrow.NULL else c[0].as_py()) for c in table.columns),
-            settings=settings,
-        ):
+        for colname in gen_unique_clean_colnames(header, settings=settings):
             names.append(colname.name)
             if colname.is_ascii_cleaned:
                 if n_ascii_cleaned == 0:
@@ -262,94 +260,326 @@ def _postprocess_name_columns(
             warnings.append(
                 ParseCsvWarning.NumberedColumnNames(n_numbered, first_numbered)
             )
-
-        # Remove header (zero-copy: builds new pa.Table with same backing data)
-        table = table.slice(1)
     else:
-        names = [f"Column {i + 1}" for i in range(len(table.columns))]
+        names = [f"Column {i + 1}" for i in range(n_columns)]
 
-    return (
-        pyarrow.table({name: table.column(i) for i, name in enumerate(names)}),
-        warnings,
-    )
+    return names, warnings
 
 
-def _autocast_column(data: pyarrow.ChunkedArray) -> pyarrow.ChunkedArray:
+def _read_header(reader: pyarrow.ipc.RecordBatchFileReader) -> Optional[List[str]]:
+    """
+    Return the first row of csv-to-arrow output, or `None` if there are no rows.
     """
-    Convert `data` to float64 or int(64|32|16|8); as fallback, return `data`.
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        if batch.num_rows > 0:
+            return ["" if c[0] is pyarrow.NULL else c[0].as_py() for c in batch.columns]
+    return None
 
-    Assume `data` is of type `utf8` or a dictionary of utf8.
 
-    *Implementation wart*: this may choose float64 when integers would seem a
-    better choice, because we use Pandas and Pandas does not support nulls
-    in integer columns.
+def _iter_raw_batches(
+    reader: pyarrow.ipc.RecordBatchFileReader, skip_first_row: bool
+) -> Iterator[pyarrow.RecordBatch]:
     """
-    series: pd.Series = data.to_pandas()
-    null = series.isnull()
-    empty = series == ""
-    if empty.any() and (null | empty).all():
-        # All-empty (and all-null) columns stay text
-        return data
-    try:
-        # Try to cast to numbers
-        number_values = pd.to_numeric(series).values
-    except (ValueError, TypeError):
-        return data
-
-    # pd.to_numeric("") gives np.nan. We want None. Use from_pandas=True.
-    number_array = pyarrow.array(number_values, from_pandas=True)
-    numbers = pyarrow.chunked_array([number_array])
-
-    # Downcast integers, when possible.
-    #
-    # We even downcast float to int. Workbench semantics say a Number is a
-    # Number; so we might as well store it efficiently.
-    try:
-        # Shrink as far as we can, until pyarrow complains.
-        #
-        # pyarrow will error "Floating point value truncated" if a conversion
-        # from float to int would be lossy.
-        #
-        # We'll return the last _successful_ `numbers` result.
-        numbers = numbers.cast(pyarrow.int32())
-        numbers = numbers.cast(pyarrow.int16())
-        numbers = numbers.cast(pyarrow.int8())
-    except pyarrow.ArrowInvalid:
-        pass
-
-    return numbers
-
-
-def _postprocess_autocast_columns(table: pyarrow.Table) -> pyarrow.Table:
-    return pyarrow.table(
-        {
-            name: _autocast_column(column)
-            for name, column in zip(table.column_names, table.columns)
-        }
-    )
+    Yield csv-to-arrow's non-empty record batches, minus the header row.
+
+    The output is mmapped, so this costs (almost) no RAM.
+    """
+    n_to_skip = 1 if skip_first_row else 0
+    for i in range(reader.num_record_batches):
+        batch = reader.get_batch(i)
+        start = min(n_to_skip, batch.num_rows)
+        n_to_skip -= start
+        if start < batch.num_rows:
+            yield batch.slice(start)
+
+
+def _iter_raw_chunks(
+    reader: pyarrow.ipc.RecordBatchFileReader, skip_first_row: bool
+) -> Iterator[pyarrow.RecordBatch]:
+    """
+    Yield zero-copy slices of csv-to-arrow output, `CSV_CHUNK_N_ROWS` at most.
+
+    The output is mmapped, so this costs (almost) no RAM.
+    """
+    chunk_n_rows = settings.CSV_CHUNK_N_ROWS
+    for batch in _iter_raw_batches(reader, skip_first_row):
+        for offset in range(0, batch.num_rows, chunk_n_rows):
+            yield batch.slice(offset, chunk_n_rows)
+
+
+def _utf8_array_n_text_bytes(array: pyarrow.Array) -> int:
+    """
+    Count the bytes of text in `array` (which may be a slice).
+    """
+    if len(array) == 0:
+        return 0
+    offsets = np.frombuffer(array.buffers()[1], dtype=np.int32)
+    return int(offsets[array.offset + len(array)] - offsets[array.offset])
+
+
+class _ColumnStats:
+    """
+    Facts about a csv-to-arrow (utf8) column, gathered one chunk at a time.
+
+    After the first pass, `output_type()` chooses one type for the whole
+    column. The second pass converts every chunk to that type, so chunks agree.
+    """
+
+    def __init__(self):
+        self.n_values = 0
+        self.n_nulls = 0
+        self.n_text_bytes = 0
+        self.has_empty = False
+        self.has_non_empty = False  # a value that is neither null nor ""
+        self.is_numeric = True
+        self.numeric_dtype = None  # np.dtype, once we've seen a number
+        self.is_integral = True
+        self.min_number = None
+        self.max_number = None
+        # dict (not set) because we want first-appearance order, like
+        # dictionary_encode(). `None` once the dictionary is too big.
+        self.dictionary = {}
+        self.dictionary_n_text_bytes = 0
+
+    def add_chunk(self, array: pyarrow.Array, autoconvert_text_to_numbers: bool):
+        if len(array) == 0:
+            return
+        self.n_values += len(array)
+        self.n_nulls += array.null_count
+        self.n_text_bytes += _utf8_array_n_text_bytes(array)
+
+        series = pd.Series(array.to_pandas(), dtype=object)
+        null = series.isnull()
+        empty = series == ""
+        self.has_empty = self.has_empty or empty.any()
+        self.has_non_empty = self.has_non_empty or not (null | empty).all()
+
+        if autoconvert_text_to_numbers and self.is_numeric:
+            try:
+                numbers = pd.to_numeric(series).values
+            except (ValueError, TypeError):
+                self.is_numeric = False
+            else:
+                self._add_numbers(numbers)
+
+        if self.dictionary is not None:
+            self._add_dictionary_values(series[~null])
+
+    def _add_numbers(self, numbers: np.ndarray) -> None:
+        if self.numeric_dtype is None:
+            self.numeric_dtype = numbers.dtype
+        else:
+            self.numeric_dtype = np.result_type(self.numeric_dtype, numbers.dtype)
+
+        if numbers.dtype.kind == "f":
+            numbers = numbers[~np.isnan(numbers)]  # NaN will become null
+            with np.errstate(invalid="ignore"):  # inf % 1 is NaN: not integral
+                if not (np.mod(numbers, 1) == 0).all():
+                    self.is_integral = False
+        if len(numbers):
+            min_number = numbers.min()
+            max_number = numbers.max()
+            if self.min_number is None:
+                self.min_number, self.max_number = min_number, max_number
+            else:
+                self.min_number = min(self.min_number, min_number)
+                self.max_number = max(self.max_number, max_number)
+
+    def _add_dictionary_values(self, values: pd.Series) -> None:
+        for value in values.unique():  # in order of appearance
+            if value not in self.dictionary:
+                self.dictionary[value] = None
+                self.dictionary_n_text_bytes += len(value.encode("utf-8"))
+        if self._dictionary_cost() > settings.MAX_DICTIONARY_PYLIST_N_BYTES:
+            self.dictionary = None  # abort! abort! dictionary is too large
+
+    def _dictionary_cost(self) -> int:
+        return pylist_n_bytes(len(self.dictionary), 0, self.dictionary_n_text_bytes)
+
+    def _should_autocast(self) -> bool:
+        return (
+            self.n_values > 0
+            and self.is_numeric
+            # All-empty (and all-null) columns stay text
+            and not (self.has_empty and not self.has_non_empty)
+        )
+
+    def _should_dictionary_encode(self) -> bool:
+        if self.dictionary is None or self.n_nulls == self.n_values:
+            return False
+        old_cost = pylist_n_bytes(self.n_values, self.n_nulls, self.n_text_bytes)
+        new_cost = self._dictionary_cost()
+        return (
+            old_cost / new_cost
+            >= settings.MIN_DICTIONARY_COMPRESSION_RATIO_PYLIST_N_BYTES
+        )
+
+    def _number_type(self) -> pyarrow.DataType:
+        """
+        Choose int(8|16|32) if every number fits; otherwise int64/float64.
+
+        We even downcast float to int. Workbench semantics say a Number is a
+        Number; so we might as well store it efficiently.
+        """
+        if self.is_integral:
+            for arrow_type, np_type in (
+                (pyarrow.int8(), np.int8),
+                (pyarrow.int16(), np.int16),
+                (pyarrow.int32(), np.int32),
+            ):
+                info = np.iinfo(np_type)
+                if self.min_number is None or (
+                    info.min <= self.min_number and self.max_number <= info.max
+                ):
+                    return arrow_type
+        return pyarrow.from_numpy_dtype(self.numeric_dtype)
+
+    def output_type(self, autoconvert_text_to_numbers: bool) -> pyarrow.DataType:
+        if autoconvert_text_to_numbers and self._should_autocast():
+            return self._number_type()
+        elif self._should_dictionary_encode():
+            return pyarrow.dictionary(pyarrow.int32(), pyarrow.utf8())
+        else:
+            return pyarrow.utf8()
+
+    def dictionary_array(self) -> pyarrow.Array:
+        return pyarrow.array(list(self.dictionary.keys()), pyarrow.utf8())
+
+
+def _convert_chunk(
+    array: pyarrow.Array,
+    output_type: pyarrow.DataType,
+    dictionary: Optional[pyarrow.Array],
+) -> pyarrow.Array:
+    """
+    Convert a chunk of csv-to-arrow output to `output_type`.
+
+    `dictionary` is the whole column's dictionary, if `output_type` is a
+    dictionary type. Every chunk shares it.
+    """
+    if output_type == pyarrow.utf8():
+        return array  # zero-copy
+
+    series = pd.Series(array.to_pandas(), dtype=object)
+    if pyarrow.types.is_dictionary(output_type):
+        codes = pd.Categorical(series, categories=dictionary.to_pylist()).codes
+        codes = codes.astype(np.int32)
+        return pyarrow.DictionaryArray.from_arrays(codes, dictionary, mask=codes == -1)
+    else:
+        # pd.to_numeric("") gives np.nan. We want None. Use from_pandas=True.
+        numbers = pyarrow.array(pd.to_numeric(series).values, from_pandas=True)
+        return numbers.cast(output_type)
+
+
+def _convert_column(
+    reader: pyarrow.ipc.RecordBatchFileReader,
+    skip_first_row: bool,
+    index: int,
+    output_type: pyarrow.DataType,
+    dictionary: Optional[pyarrow.Array],
+) -> pyarrow.Array:
+    """
+    Convert column `index` of csv-to-arrow output to one `output_type` array.
+
+    Our Arrow files hold a single record batch (`cjwkernel.types.ArrowTable`
+    insists), so we concatenate converted chunks. Text that needs no
+    conversion is sliced straight from the mmapped input: when csv-to-arrow
+    wrote one record batch, that's zero-copy.
+    """
+    if output_type == pyarrow.utf8():
+        chunks = [
+            batch.column(index) for batch in _iter_raw_batches(reader, skip_first_row)
+        ]
+    else:
+        chunks = [
+            _convert_chunk(chunk.column(index), output_type, dictionary)
+            for chunk in _iter_raw_chunks(reader, skip_first_row)
+        ]
+
+    if not chunks:
+        if pyarrow.types.is_dictionary(output_type):
+            return pyarrow.DictionaryArray.from_arrays(
+                pyarrow.array([], pyarrow.int32()), dictionary
+            )
+        else:
+            return pyarrow.array([], output_type)
+    elif len(chunks) == 1:
+        return chunks[0]
+    else:
+        # Dictionary chunks share `dictionary`, so this concatenates indices
+        return pyarrow.concat_arrays(chunks)
 
 
-def _postprocess_table(
-    table: pyarrow.Table, has_header: bool, autoconvert_text_to_numbers: bool
+def _postprocess_to_file(
+    reader: pyarrow.ipc.RecordBatchFileReader,
+    has_header: bool,
+    autoconvert_text_to_numbers: bool,
+    output_path: Path,
 ) -> Tuple[pyarrow.Table, List[ParseCsvWarning]]:
     """
-    Transform `raw_table` to meet our standards:
+    Transform csv-to-arrow output to meet our standards; write `output_path`.
 
-    * If `has_headers` is True, remove the first row (zero-copy) and use it to
-      build column names -- which we guarantee are unique. Otherwise, generate
+    * If `has_headers` is True, use the first row to build column names --
+      which we guarantee are unique -- and skip it. Otherwise, generate
       unique column names.
-    * Convert each column dictionary if it agrees with
-      `settings.MAX_DICTIONARY_PYLIST_N_BYTES` and
-      `settings.MIN_DICTIONARY_COMPRESSION_RATIO`.
     * Auto-convert each column to numeric if every value is represented
       correctly. (`""` becomes `null`. This conversion is lossy for the myriad
       numbers CSV can represent accurately that int/double cannot.
       TODO auto-conversion optional.)
+    * Dictionary-encode each remaining column if it agrees with
+      `settings.MAX_DICTIONARY_PYLIST_N_BYTES` and
+      `settings.MIN_DICTIONARY_COMPRESSION_RATIO_PYLIST_N_BYTES`.
+
+    We work in chunks of `settings.CSV_CHUNK_N_ROWS` rows, so the pandas
+    Series of Python strings we build stay small. The first pass gathers
+    per-column stats to choose each column's type; the second pass parses each
+    chunk again and converts it to that type. The output is a single record
+    batch, so peak RAM is every converted column (numbers and dictionary codes
+    for all rows) plus one column's chunks while we concatenate them. Text
+    columns are zero-copy slices of the mmapped input if csv-to-arrow wrote
+    one record batch; otherwise concatenating copies them into RAM, too.
+
+    Return the output table, mmapped from `output_path`.
     """
-    table, warnings = _postprocess_name_columns(table, has_header)
-    table = dictionary_encode_columns(table)
-    if autoconvert_text_to_numbers:
-        table = _postprocess_autocast_columns(table)
+    n_columns = len(reader.schema.names)
+    header = _read_header(reader) if has_header else None
+    names, warnings = _postprocess_name_columns(header, n_columns)
+    skip_first_row = header is not None
+
+    all_stats = [_ColumnStats() for _ in range(n_columns)]
+    for chunk in _iter_raw_chunks(reader, skip_first_row):
+        for stats, array in zip(all_stats, chunk.columns):
+            stats.add_chunk(array, autoconvert_text_to_numbers)
+
+    output_types = [
+        stats.output_type(autoconvert_text_to_numbers) for stats in all_stats
+    ]
+    dictionaries = [
+        stats.dictionary_array() if pyarrow.types.is_dictionary(output_type) else None
+        for stats, output_type in zip(all_stats, output_types)
+    ]
+    del all_stats  # free dictionaries' Python strings
+
+    if n_columns:
+        arrays = [
+            _convert_column(reader, skip_first_row, i, output_type, dictionary)
+            for i, (output_type, dictionary) in enumerate(
+                zip(output_types, dictionaries)
+            )
+        ]
+        batch = pyarrow.RecordBatch.from_arrays(arrays, names)
+        # Write with batch.schema, not an equal one we build: pyarrow 0.15
+        # only finds the batch's dictionaries through its own schema.
+        schema = batch.schema
+    else:
+        batch = None
+        schema = pyarrow.schema([])
+    with pyarrow.ipc.RecordBatchFileWriter(output_path.as_posix(), schema) as writer:
+        if batch is not None:
+            writer.write_batch(batch)
+
+    table = pyarrow.ipc.open_file(output_path.as_posix()).read_all()  # mmapped
     return table, warnings
 
 
@@ -377,6 +607,7 @@ class ParseCsvResult:
 def _parse_csv(
     path: Path,
     *,
+    output_path: Path,
     encoding: Optional[str],
     delimiter: Optional[str],
     has_header: bool,
@@ -397,11 +628,11 @@ def _parse_csv(
     2. Convert the file to UTF-8.
     3. Sniff delimiter, if the passed argument is `None`.
     4. Run `csv-to-arrow` to parse the CSV into unnamed columns.
-    5. Postprocess each column: remove its header if needed and
-       dictionary-encode if it's helpful. (This doesn't cost much RAM per
-       column: either dictionary encoding makes it small, or it's a zero-copy
-       slice of the csv-to-arrow output file.)
-    6. Write the final Arrow file.
+    5. Postprocess each column, chunk by chunk: remove its header if needed,
+       autocast and dictionary-encode if it's helpful. (Text columns are
+       zero-copy slices of the mmapped csv-to-arrow output file, if it wrote
+       one record batch.)
+    6. Write the final Arrow file to `output_path`, as one record batch.
     """
     warnings = []
 
@@ -461,12 +692,11 @@ def _parse_csv(
                     _parse_csv_to_arrow_warnings(child.stdout.decode("utf-8"))
                 )
 
-            reader = pyarrow.ipc.open_file(arrow_path.as_posix())
-            raw_table = reader.read_all()  # efficient -- RAM is mmapped
+            reader = pyarrow.ipc.open_file(arrow_path.as_posix())  # mmapped
+            table, more_warnings = _postprocess_to_file(
+                reader, has_header, autoconvert_text_to_numbers, output_path
+            )
 
-    table, more_warnings = _postprocess_table(
-        raw_table, has_header, autoconvert_text_to_numbers
-    )
     return ParseCsvResult(table, warnings + more_warnings)
 
 
@@ -481,16 +711,12 @@ def parse_csv(
 ) -> RenderResult:
     result = _parse_csv(
         path,
+        output_path=output_path,
         encoding=encoding,
         delimiter=delimiter,
         has_header=has_header,
         autoconvert_text_to_numbers=autoconvert_text_to_numbers,
     )
-    with pyarrow.ipc.RecordBatchFileWriter(
-        output_path.as_posix(), schema=result.table.schema
-    ) as writer:
-        writer.write_table(result.table)
-
     metadata = infer_table_metadata(result.table)
 
     if len(metadata.columns) == 0:
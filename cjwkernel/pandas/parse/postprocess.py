@@ -3,6 +3,21 @@ from cjwkernel import settings
 from cjwkernel.types import Column, ColumnType, TableMetadata
 
 
+def pylist_n_bytes(n_values: int, n_nulls: int, n_text_bytes: int) -> int:
+    """
+    Estimate the RAM a list of Python strings would consume.
+    """
+    return (
+        # 8 bytes per value (each value is a 64-bit pointer)
+        (8 * n_values)
+        # 50 bytes of overhead per string (heuristic) -- experiment with
+        # sys.getsizeof() if you disbelieve.
+        + (50 * (n_values - n_nulls))
+        # ... and then count the actual bytes of data
+        + n_text_bytes
+    )
+
+
 def _string_array_pylist_n_bytes(data: pyarrow.ChunkedArray) -> int:
     text_buf = data.buffers()[-1]
     if text_buf is None:
@@ -11,15 +26,7 @@ def _string_array_pylist_n_bytes(data: pyarrow.ChunkedArray) -> int:
     else:
         n_text_bytes = text_buf.size
 
-    return (
-        # 8 bytes per value (each value is a 64-bit pointer)
-        (8 * len(data))
-        # 50 bytes of overhead per string (heuristic) -- experiment with
-        # sys.getsizeof() if you disbelieve.
-        + (50 * (len(data) - data.null_count))
-        # ... and then count the actual bytes of data
-        + n_text_bytes
-    )
+    return pylist_n_bytes(len(data), data.null_count, n_text_bytes)
 
 
 def _maybe_dictionary_encode_column(data: pyarrow.ChunkedArray) -> pyarrow.ChunkedArray:
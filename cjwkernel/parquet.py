@@ -1,10 +1,17 @@
+import base64
 import contextlib
+from dataclasses import dataclass
+import datetime
 import io
+import json
 import logging
+import math
 from pathlib import Path
 import subprocess
-from typing import Any, ContextManager, Dict, List
+from typing import Any, ContextManager, Dict, List, Optional, Sequence
+import numpy as np
 import pyarrow
+import pyarrow.ipc
 import pyarrow.parquet
 from cjwkernel.util import tempfile_context
 
@@ -51,7 +58,215 @@ def file_has_parquet_magic_number(path: Path) -> bool:
     return True
 
 
-def convert_parquet_file_to_arrow_file(parquet_path: Path, arrow_path: Path) -> None:
+def convert_parquet_file_to_arrow_file(
+    parquet_path: Path, arrow_path: Path, *, only_columns: Optional[List[int]] = None
+) -> None:
+    """
+    Write an Arrow file at `arrow_path` holding (part of) `parquet_path`.
+
+    Raise `pyarrow.ArrowIOError` on invalid input file.
+
+    By default, convert the entire file. Pass `only_columns` (column indices)
+    to read less of it: we skip the pages we don't need, so loading one column
+    of a wide table costs one column's worth of decoding. Out-of-range indices
+    raise `ValueError`.
+
+    We decode in-process, one row group at a time. If pyarrow can't handle the
+    file (it raises `ArrowNotImplementedError`) and the caller asked for the
+    whole file, we fall back to the `/usr/bin/parquet-to-arrow` subprocess.
+
+    The output file always holds exactly one record batch: that's what
+    `cjwkernel.validate` expects.
+    """
+    try:
+        _convert_parquet_file_to_arrow_file_in_process(
+            parquet_path, arrow_path, only_columns
+        )
+    except pyarrow.ArrowNotImplementedError:
+        if only_columns is not None:
+            raise
+        logger.info("Falling back to parquet-to-arrow for %s", parquet_path)
+        _convert_parquet_file_to_arrow_file_in_subprocess(parquet_path, arrow_path)
+
+
+def _read_dictionary_column_names(metadata: pyarrow.parquet.FileMetaData) -> List[str]:
+    """
+    List the columns `parquet.write()` wrote from dictionary-encoded arrays.
+
+    `pyarrow.parquet.write_table()` stores the Arrow schema in the file's
+    key-value metadata. Files without it (e.g., ones written by fastparquet)
+    have no dictionary columns.
+    """
+    serialized = (metadata.metadata or {}).get(b"ARROW:schema")
+    if not serialized:
+        return []
+    try:
+        schema = pyarrow.ipc.read_schema(
+            pyarrow.py_buffer(base64.b64decode(serialized))
+        )
+    except (ValueError, pyarrow.ArrowException):
+        return []
+    return [field.name for field in schema if pyarrow.types.is_dictionary(field.type)]
+
+
+def _empty_array(data_type: pyarrow.DataType) -> pyarrow.Array:
+    if pyarrow.types.is_dictionary(data_type):
+        return pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array([], type=data_type.index_type),
+            pyarrow.array([], type=data_type.value_type),
+        )
+    else:
+        return pyarrow.array([], type=data_type)
+
+
+def _concat_dictionary_arrays(
+    arrays: List[pyarrow.DictionaryArray]
+) -> pyarrow.DictionaryArray:
+    """
+    Concatenate dictionary arrays that may each have a different dictionary.
+
+    Each Parquet row group has its own dictionary; an Arrow record batch only
+    has room for one. The result's dictionary holds each distinct value once,
+    in order of appearance.
+    """
+    all_values = pyarrow.concat_arrays([array.dictionary for array in arrays])
+    encoded = all_values.dictionary_encode()
+    # remap[offset + i] is the new index of arrays[n].dictionary[i]
+    remap = np.asarray(encoded.indices.to_pandas(), dtype=np.int32)
+
+    all_indices = []
+    all_nulls = []
+    offset = 0
+    for array in arrays:
+        # to_pandas() gives float64 with NaN for nulls
+        indices = np.asarray(array.indices.to_pandas(), dtype=np.float64)
+        nulls = np.isnan(indices)
+        indices = np.where(nulls, 0, indices).astype(np.int32)
+        if len(array.dictionary):
+            indices = remap[offset + indices]
+        all_indices.append(indices)
+        all_nulls.append(nulls)
+        offset += len(array.dictionary)
+
+    return pyarrow.DictionaryArray.from_arrays(
+        pyarrow.array(
+            np.concatenate(all_indices),
+            mask=np.concatenate(all_nulls),
+            type=pyarrow.int32(),
+        ),
+        encoded.dictionary,
+    )
+
+
+def _concat_arrays(
+    arrays: List[pyarrow.Array], data_type: pyarrow.DataType
+) -> pyarrow.Array:
+    if not arrays:
+        return _empty_array(data_type)
+    elif len(arrays) == 1:
+        return arrays[0]
+    elif pyarrow.types.is_dictionary(data_type):
+        return _concat_dictionary_arrays(arrays)
+    else:
+        return pyarrow.concat_arrays(arrays)
+
+
+def _open_parquet_file(parquet_path: Path) -> pyarrow.parquet.ParquetFile:
+    """
+    Open `parquet_path`, reading its footer (but no data).
+
+    Raise `pyarrow.ArrowIOError` on invalid input file.
+    """
+    try:
+        metadata = pyarrow.parquet.read_metadata(str(parquet_path))
+        return pyarrow.parquet.ParquetFile(
+            str(parquet_path),
+            metadata=metadata,
+            read_dictionary=_read_dictionary_column_names(metadata),
+        )
+    except pyarrow.ArrowInvalid as err:
+        raise pyarrow.ArrowIOError(str(err)) from err
+
+
+def _read_column(
+    parquet_file: pyarrow.parquet.ParquetFile, name: str, row_groups: Sequence[int]
+) -> pyarrow.Array:
+    """
+    Decode column `name` of `row_groups` into a single array.
+    """
+    if not row_groups:
+        # No row groups means no dictionary pages: text is text
+        tables = [parquet_file.read(columns=[name], use_threads=False)]
+    else:
+        # Decode one row group at a time, single-threaded: we share the CPU
+        # with whoever else is using this process.
+        tables = [
+            parquet_file.read_row_group(i, columns=[name], use_threads=False)
+            for i in row_groups
+        ]
+    return _concat_arrays(
+        [chunk for table in tables for chunk in table.column(0).chunks],
+        tables[0].schema.field(0).type,
+    )
+
+
+def _read_record_batch(
+    parquet_file: pyarrow.parquet.ParquetFile,
+    names: List[str],
+    row_groups: Sequence[int],
+) -> pyarrow.RecordBatch:
+    """
+    Decode columns `names` of `row_groups` into a single record batch.
+
+    We decode and concatenate one column at a time, so the row groups'
+    decoded chunks are freed as we go: peak RAM is the record batch plus one
+    column's chunks, not twice the record batch.
+
+    Raise `pyarrow.ArrowIOError` on invalid input file.
+    """
+    try:
+        return pyarrow.RecordBatch.from_arrays(
+            [_read_column(parquet_file, name, row_groups) for name in names], names
+        )
+    except pyarrow.ArrowInvalid as err:
+        raise pyarrow.ArrowIOError(str(err)) from err
+
+
+def _convert_parquet_file_to_arrow_file_in_process(
+    parquet_path: Path, arrow_path: Path, only_columns: Optional[List[int]]
+) -> None:
+    parquet_file = _open_parquet_file(parquet_path)  # raise ArrowIOError
+    metadata = parquet_file.metadata
+    all_names = metadata.schema.to_arrow_schema().names
+
+    if only_columns is None:
+        names = all_names
+    else:
+        for i in only_columns:
+            if i < 0 or i >= len(all_names):
+                raise ValueError("Column %d is out of range" % i)
+        names = [all_names[i] for i in only_columns]
+    row_groups = range(metadata.num_row_groups)
+
+    if not names:
+        # Zero-column file. Our ArrowTable doesn't store its row count.
+        schema = pyarrow.schema([])
+        batch = None
+    else:
+        batch = _read_record_batch(parquet_file, names, row_groups)
+        schema = batch.schema
+
+    writer = pyarrow.RecordBatchFileWriter(str(arrow_path), schema)
+    try:
+        if batch is not None:
+            writer.write_batch(batch)
+    finally:
+        writer.close()
+
+
+def _convert_parquet_file_to_arrow_file_in_subprocess(
+    parquet_path: Path, arrow_path: Path
+) -> None:
     result = subprocess.run(
         ["/usr/bin/parquet-to-arrow", str(parquet_path), str(arrow_path)],
         capture_output=True,
@@ -93,7 +308,52 @@ def are_files_equal(path1: Path, path2: Path) -> bool:
         raise pyarrow.ArrowIOError(result.stdout)
 
 
-def write(parquet_path: Path, table: pyarrow.Table) -> None:
+@dataclass(frozen=True)
+class WriteProfile:
+    """
+    How `write()` lays out a Parquet file.
+
+    Profiles are versioned: `write()` stores `version` in the file's key-value
+    metadata (as `cjw:write-profile`). Never change an existing profile's
+    settings: add a new profile with a new version. `read()` supports files
+    written with every profile (and files written before profiles existed).
+    """
+
+    version: int
+
+    row_group_size: Optional[int] = None
+    """
+    Maximum number of rows per row group, or `None` for a single row group.
+
+    Smaller row groups let readers skip more data when they only need a few
+    rows; larger ones compress better.
+    """
+
+    compression: str = "SNAPPY"
+    """
+    Codec for all columns: "SNAPPY", "ZSTD" or "LZ4".
+    """
+
+    write_statistics: bool = True
+    """
+    Store per-column, per-row-group min/max/null-count statistics.
+    """
+
+
+PROFILE_V1 = WriteProfile(version=1)
+"""
+One Snappy-compressed row group. What `write()` wrote before profiles.
+"""
+
+PROFILE_V2 = WriteProfile(version=2, row_group_size=10000)
+"""
+Row groups of at most 10,000 rows, so paged reads decode only a few of them.
+"""
+
+
+def write(
+    parquet_path: Path, table: pyarrow.Table, profile: WriteProfile = PROFILE_V1
+) -> None:
     """
     Write an Arrow table to a Parquet file, overwriting if needed.
 
@@ -105,53 +365,146 @@ def write(parquet_path: Path, table: pyarrow.Table) -> None:
     `parquet.write(path, table); table = parquet.read(path)` does not change
     `table`.
     """
+    assert profile.compression in {"SNAPPY", "ZSTD", "LZ4"}
+
     if table.num_rows == 0:
         # Workaround for https://issues.apache.org/jira/browse/ARROW-6568
         # If table is zero-length, guarantee it has a RecordBatch so Arrow
         # won't crash when writing a DictionaryArray.
-
-        def empty_array_for_field(field):
-            if pyarrow.types.is_dictionary(field.type):
-                return pyarrow.DictionaryArray.from_arrays(
-                    pyarrow.array([], type=field.type.index_type),
-                    pyarrow.array([], type=field.type.value_type),
-                )
-            else:
-                return pyarrow.array([], type=field.type)
-
         table = pyarrow.table(
-            {field.name: empty_array_for_field(field) for field in table.schema}
+            {field.name: _empty_array(field.type) for field in table.schema}
         )
 
+    table = table.replace_schema_metadata(_profile_metadata(profile))
+
     pyarrow.parquet.write_table(
         table,
         str(parquet_path),
+        row_group_size=profile.row_group_size,
+        **_write_options(table.schema, profile),
+    )
+
+
+def _profile_metadata(profile: WriteProfile) -> Dict[bytes, bytes]:
+    return {b"cjw:write-profile": str(profile.version).encode("ascii")}
+
+
+def _write_options(schema: pyarrow.Schema, profile: WriteProfile) -> Dict[str, Any]:
+    return dict(
         version="2.0",
-        compression="SNAPPY",
+        compression=profile.compression,
+        write_statistics=profile.write_statistics,
         # Preserve whatever dictionaries we have in Pandas. Write+read
         # should return an exact copy.
         use_dictionary=[
-            name.encode("utf-8")
-            for name, column in zip(table.column_names, table.columns)
-            if pyarrow.types.is_dictionary(column.type)
+            field.name.encode("utf-8")
+            for field in schema
+            if pyarrow.types.is_dictionary(field.type)
         ],
     )
 
 
+def write_prepended(
+    parquet_path: Path,
+    table: pyarrow.Table,
+    old_parquet_path: Path,
+    *,
+    max_n_rows: int,
+    profile: WriteProfile = PROFILE_V2,
+) -> None:
+    """
+    Write `table`'s rows, then `old_parquet_path`'s, to `parquet_path`.
+
+    This is for fetchers that accumulate rows: each fetch adds a few rows to
+    the previous result. We never hold the whole old table in RAM: we copy it
+    one row group at a time, regrouping rows into `profile.row_group_size`
+    chunks (so row groups don't multiply as fetches accumulate). We stop after
+    `max_n_rows` rows.
+
+    Raise `pyarrow.ArrowIOError` on invalid `old_parquet_path`. Raise
+    `ValueError` if its schema differs from `table`'s. Either way,
+    `parquet_path` will be garbage.
+    """
+    assert profile.compression in {"SNAPPY", "ZSTD", "LZ4"}
+    metadata = _profile_metadata(profile)
+    schema = table.schema.remove_metadata()
+    old_file = _open_parquet_file(old_parquet_path)  # raise ArrowIOError
+
+    pending: List[pyarrow.Table] = []
+    n_pending = 0
+    n_remaining = max_n_rows
+
+    writer = pyarrow.parquet.ParquetWriter(
+        str(parquet_path),
+        schema.with_metadata(metadata),
+        **_write_options(schema, profile),
+    )
+    try:
+
+        def flush(force: bool) -> None:
+            nonlocal pending, n_pending
+            if not pending:
+                return
+            size = profile.row_group_size
+            if not force and (size is None or n_pending < size):
+                return
+            buffer = pyarrow.concat_tables(pending)
+            if force or size is None:
+                n_to_write = n_pending
+            else:
+                n_to_write = n_pending - n_pending % size
+            writer.write_table(buffer.slice(0, n_to_write), row_group_size=size)
+            if n_to_write == n_pending:
+                pending, n_pending = [], 0
+            else:
+                pending = [buffer.slice(n_to_write)]
+                n_pending -= n_to_write
+
+        def add(part: pyarrow.Table) -> None:
+            nonlocal n_pending, n_remaining
+            part = part.slice(0, n_remaining).replace_schema_metadata(metadata)
+            if part.num_rows:
+                pending.append(part)
+                n_pending += part.num_rows
+                n_remaining -= part.num_rows
+                flush(False)
+
+        add(table)
+        for i in range(old_file.num_row_groups):
+            if n_remaining <= 0:
+                break
+            try:
+                old_part = old_file.read_row_group(i, use_threads=False)
+            except pyarrow.ArrowInvalid as err:
+                raise pyarrow.ArrowIOError(str(err)) from err
+            if not old_part.schema.remove_metadata().equals(schema):
+                raise ValueError("Old Parquet file has a different schema")
+            add(old_part)
+        flush(True)
+    finally:
+        writer.close()
+
+
 @contextlib.contextmanager
-def open_as_mmapped_arrow(parquet_path: Path) -> ContextManager[pyarrow.Table]:
+def open_as_mmapped_arrow(
+    parquet_path: Path, *, only_columns: Optional[List[int]] = None
+) -> ContextManager[pyarrow.Table]:
     """
     Load `parquet_path` as a low-RAM (mmapped) pyarrow.Table.
 
     Raise `pyarrow.ArrowIOError` on invalid input file.
 
+    Pass `only_columns` (column indices) to skip decoding other columns.
+
     Dictionary-encoded columns will stay dictionary-encoded. Practically,
     `parquet.write(path, table); table = parquet.read(path)` does not change
     `table`.
     """
     with tempfile_context() as arrow_path:
         # raise ArrowIOError
-        convert_parquet_file_to_arrow_file(parquet_path, arrow_path)
+        convert_parquet_file_to_arrow_file(
+            parquet_path, arrow_path, only_columns=only_columns
+        )
         reader = pyarrow.ipc.open_file(str(arrow_path))
         arrow_table = reader.read_all()
         yield arrow_table
@@ -168,6 +521,80 @@ def read(parquet_path: Path) -> pyarrow.Table:
         return table
 
 
+_TIMESTAMP_UNIT_NS = {"s": 1000000000, "ms": 1000000, "us": 1000, "ns": 1}
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _format_timestamp(ns: int) -> str:
+    seconds, nanoseconds = divmod(ns, 1000000000)
+    dt = _EPOCH + datetime.timedelta(seconds=seconds)
+    if nanoseconds == 0 and dt.time() == datetime.time():
+        return dt.date().isoformat()
+    text = dt.isoformat()
+    if nanoseconds:
+        text += (".%09d" % nanoseconds).rstrip("0")
+    return text + "Z"
+
+
+def _array_to_json_values(array: pyarrow.Array) -> List[Any]:
+    """
+    Convert `array` to a list of JSON-serializable values.
+    """
+    if pyarrow.types.is_timestamp(array.type):
+        factor = _TIMESTAMP_UNIT_NS[array.type.unit]
+        return [
+            None if v is None else _format_timestamp(v * factor)
+            for v in array.cast(pyarrow.int64()).to_pylist()
+        ]
+    elif pyarrow.types.is_floating(array.type):
+        return [
+            None if v is None or not math.isfinite(v) else v for v in array.to_pylist()
+        ]
+    else:
+        return array.to_pylist()
+
+
+def _read_slice_as_json(
+    parquet_path: Path, only_columns: range, only_rows: range
+) -> str:
+    parquet_file = _open_parquet_file(parquet_path)  # raise ArrowIOError
+    metadata = parquet_file.metadata
+    names = metadata.schema.to_arrow_schema().names[
+        only_columns.start : only_columns.stop
+    ]
+    rows = range(
+        min(only_rows.start, metadata.num_rows), min(only_rows.stop, metadata.num_rows)
+    )
+    if not rows:
+        return "[]"
+
+    # Skip row groups outside of `rows`. Paging deep into a table costs the
+    # same as reading its first page.
+    row_groups = []
+    offset = 0  # index of first row of row group `i`
+    first_row = 0  # index of first row of row_groups[0]
+    for i in range(metadata.num_row_groups):
+        n_rows = metadata.row_group(i).num_rows
+        if offset < rows.stop and offset + n_rows > rows.start:
+            if not row_groups:
+                first_row = offset
+            row_groups.append(i)
+        offset += n_rows
+
+    if names:
+        batch = _read_record_batch(parquet_file, names, row_groups).slice(
+            rows.start - first_row, len(rows)
+        )
+        columns = [_array_to_json_values(column) for column in batch.columns]
+        records = [dict(zip(names, values)) for values in zip(*columns)]
+    else:
+        records = [{} for _ in rows]
+
+    return json.dumps(
+        records, ensure_ascii=False, separators=(",", ":"), allow_nan=False
+    )
+
+
 def read_slice_as_text(
     parquet_path: Path, format: str, only_columns: range, only_rows: range
 ) -> str:
@@ -181,10 +608,12 @@ def read_slice_as_text(
     To limit the amount of text stored in RAM, use relatively small ranges for
     `only_columns` and `only_rows`.
 
-    This uses `parquet-to-text-stream` with `--row-range` and `--column-range`.
-    Read `parquet-to-text-stream` documentation to see how nulls and floats are
-    handled in your chosen format (`csv` or `json`). (In a nutshell: it's
-    mostly non-lossy, though CSV can't represent `null`.)
+    JSON is formatted in-process: we decode only the requested columns of the
+    row groups that hold the requested rows. CSV uses `parquet-to-text-stream`
+    with `--row-range` and `--column-range`. Both formats share
+    `parquet-to-text-stream`'s conventions: timestamps are ISO8601 UTC (just
+    the date at midnight), and NaN and infinity are null. (CSV can't
+    represent `null`.)
     """
     assert format in {"csv", "json"}
     assert only_columns.step == 1
@@ -194,6 +623,9 @@ def read_slice_as_text(
     assert only_rows.start >= 0
     assert only_rows.stop >= only_rows.start
 
+    if format == "json":
+        return _read_slice_as_json(parquet_path, only_columns, only_rows)
+
     with tempfile_context(prefix="read_pydict-", suffix=".arrow") as arrow_path:
         try:
             result = subprocess.run(
@@ -35,6 +35,17 @@ consumed while parsing a CSV. (RAM fragmentation leads us to consume more
 than this in the worst case.)
 """
 
+CSV_CHUNK_N_ROWS = 20_000
+"""
+Number of rows we postprocess at a time when parsing CSV.
+
+This bounds the temporary pandas Series of Python strings we build to choose
+and convert each column's type. It does not bound the output: we write one
+record batch, so we hold every converted column (numbers and dictionary codes
+for all rows) until we write it. See `_postprocess_to_file()` in
+`cjwkernel.pandas.parse.csv`.
+"""
+
 MAX_BYTES_TEXT_DATA = 1 * 1024 * 1024 * 1024  # 1GB
 """
 Maximum number of bytes of UTF-8 text data to hold in memory.
@@ -103,6 +114,24 @@ SCRAPER_TIMEOUT = 30
 Maximum number of seconds an HTTP request may take.
 """
 
+SCRAPER_NUM_CONNECTIONS_PER_HOST = 2
+"""
+Number of simultaneous requests from urlscraper to any one host.
+
+Requests to a busy host wait their turn without blocking requests to other
+hosts.
+"""
+
+SCRAPER_DNS_CACHE_SECONDS = 300
+"""
+Number of seconds urlscraper remembers a hostname's IP addresses.
+"""
+
+SCRAPER_MAX_RESPONSE_BYTES = 5 * 1024 * 1024
+"""
+Maximum number of bytes urlscraper reads from a response; it drops the rest.
+"""
+
 CHARDET_CHUNK_SIZE = 1024 * 1024
 """
 Chunk size for chardet file encoding detection.
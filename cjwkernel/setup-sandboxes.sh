@@ -11,8 +11,9 @@
 # is a source of frustration: integration-test runs privileged but staging
 # and production don't. If you're messing with sandboxes, test on staging.
 #
-# This is _one_ chroot environment, suitable for _one_ command. Assume
-# pyspawner never runs two commands at once.
+# Each editable chroot is suitable for _one_ command at a time. We create
+# $CJW_KERNEL_N_EDITABLE_CHROOTS of them (default 1), so one process can run
+# several commands at once. `cjwkernel/chroot.py` reads the same variable.
 #
 # We use overlay mounts:
 #
@@ -35,12 +36,13 @@
 #       * var/tmp/ (empty folder)
 #       * ...
 #   * chroot/ (on a separate filesystem)
-#     * editable/ (a singleton)
-#       * upperfs.ext4 (a 20GB sparse file with ext4 filesystem)
-#       * upperfs/ (upperfs.ext4, loopback-mounted)
-#         * upper/ (empty: where mounts and edits from caller+module go)
-#         * work/ (for overlayfs -- do not read/modify)
-#       * root/ (overlay dev volumes + layers/base + upper)
+#     * editable/
+#       * 0/ (and 1/, 2/, ... -- one per editable chroot)
+#         * upperfs.ext4 (a 20GB sparse file with ext4 filesystem)
+#         * upperfs/ (upperfs.ext4, loopback-mounted)
+#           * upper/ (empty: where mounts and edits from caller+module go)
+#           * work/ (for overlayfs -- do not read/modify)
+#         * root/ (overlay dev volumes + layers/base + upper)
 #     * readonly/
 #       * upper/ (do not modify -- contains mountpoints)
 #       * work/ (for overlayfs -- do not read/modify)
@@ -72,12 +74,22 @@ fi
 
 CHROOT=/var/lib/cjwkernel/chroot
 LAYERS=/var/lib/cjwkernel/chroot-layers
-EDITABLE_CHROOT_SIZE=20G  # max size of user edits in EDITABLE_CHROOT
+EDITABLE_CHROOT_SIZE=20G  # max size of user edits in each editable chroot
+N_EDITABLE_CHROOTS=${CJW_KERNEL_N_EDITABLE_CHROOTS:-1}
 VENV_PATH="/root/.local/share/virtualenvs" # only exits in dev
 
-# NetworkConfig mimics pyspawner/pyspawner/sandbox.py
-KERNEL_VETH=veth-pyspawn
-CHILD_VETH_IP4="192.168.123.2"
+# Each editable chroot gets its own pyspawner.NetworkConfig, so modules in
+# different chroots can fetch at once. cjwkernel/chroot.py mimics this: chroot
+# $i uses kernel veth "cjw-veth-$i" and child IP 192.168.$((123 + i)).2.
+# (pyspawner gives each veth pair a /24, so each needs its own block.)
+KERNEL_VETHS=cjw-veth-+  # iptables wildcard: all chroots' kernel veths
+if [ "$N_EDITABLE_CHROOTS" -gt 132 ]; then
+  echo "CJW_KERNEL_N_EDITABLE_CHROOTS must be at most 132" >&2
+  exit 1
+fi
+child_veth_ip4() {
+  echo "192.168.$((123 + $1)).2"
+}
 
 
 # /app/cjwkernel (base layer)
@@ -112,7 +124,7 @@ if [ "$MODE" = "only-readonly" ]; then
 fi
 
 
-# EDITABLE_CHROOT
+# EDITABLE_CHROOT_POOL
 # Build upperfs.ext4 and mount it
 # What's upperfs.ext4? It's a space-limited filesystem. If users write data
 # larger than $EDITABLE_CHROOT_SIZE to the chroot filesystem, they'll get
@@ -120,20 +132,23 @@ fi
 # script super-fast on producion. (We don't care much about FS speed. The
 # intended use case is large tempfiles and no fsync. When files grow beyond
 # the Linux I/O cache size, users should expect slowdowns.)
-mkdir -p $CHROOT/editable/upperfs
-truncate --size=$EDITABLE_CHROOT_SIZE $CHROOT/editable/upperfs.ext4  # create sparse file
-mkfs.ext4 -q -O ^has_journal $CHROOT/editable/upperfs.ext4
-if ! mount -o loop $CHROOT/editable/upperfs.ext4 $CHROOT/editable/upperfs; then
-  # Docker without --privileged doesn't provide a loopback device. This affects
-  # dev mode (which we don't care about). But it should never happen on production.
-  echo "******* WARNING: failed to mount loopback filesystem $CHROOT/editable/upperfs *****" >&2
-  echo "Workbench will not constrain modules' disk usage. If a module writes" >&2
-  echo "too much to disk, Workbench will experience undefined behavior." >&2
-fi
-# Build overlay filesystem, with upper layer on upperfs
-mkdir -p $CHROOT/editable/upperfs/{upper,work}
-mkdir -p $CHROOT/editable/root
-mount -t overlay overlay -o dirsync,lowerdir=$LAYERS/base,upperdir=$CHROOT/editable/upperfs/upper,workdir=$CHROOT/editable/upperfs/work $CHROOT/editable/root
+for i in $(seq 0 $(($N_EDITABLE_CHROOTS - 1))); do
+  EDITABLE=$CHROOT/editable/$i
+  mkdir -p $EDITABLE/upperfs
+  truncate --size=$EDITABLE_CHROOT_SIZE $EDITABLE/upperfs.ext4  # create sparse file
+  mkfs.ext4 -q -O ^has_journal $EDITABLE/upperfs.ext4
+  if ! mount -o loop $EDITABLE/upperfs.ext4 $EDITABLE/upperfs; then
+    # Docker without --privileged doesn't provide a loopback device. This affects
+    # dev mode (which we don't care about). But it should never happen on production.
+    echo "******* WARNING: failed to mount loopback filesystem $EDITABLE/upperfs *****" >&2
+    echo "Workbench will not constrain modules' disk usage. If a module writes" >&2
+    echo "too much to disk, Workbench will experience undefined behavior." >&2
+  fi
+  # Build overlay filesystem, with upper layer on upperfs
+  mkdir -p $EDITABLE/upperfs/{upper,work}
+  mkdir -p $EDITABLE/root
+  mount -t overlay overlay -o dirsync,lowerdir=$LAYERS/base,upperdir=$EDITABLE/upperfs/upper,workdir=$EDITABLE/upperfs/work $EDITABLE/root
+done
 
 
 # iptables
@@ -146,37 +161,41 @@ cat << EOF | iptables-legacy-restore --noflush
 :INPUT ACCEPT
 :FORWARD DROP
 # Block access to the host itself from a module.
--A INPUT -i $KERNEL_VETH -j REJECT
+-A INPUT -i $KERNEL_VETHS -j REJECT
 # Allow forwarding response packets back to our module (even
 # though our module's IP is in UNSAFE_IPV4_ADDRESS_BLOCKS).
--A FORWARD -o $KERNEL_VETH -j ACCEPT
+-A FORWARD -o $KERNEL_VETHS -j ACCEPT
 # Block unsafe destination addresses. Modules should not be
 # able to access internal services. (Not even our DNS server.)
--A FORWARD -d 0.0.0.0/8          -i $KERNEL_VETH -j REJECT
--A FORWARD -d 10.0.0.0/8         -i $KERNEL_VETH -j REJECT
--A FORWARD -d 100.64.0.0/10      -i $KERNEL_VETH -j REJECT
--A FORWARD -d 127.0.0.0/8        -i $KERNEL_VETH -j REJECT
--A FORWARD -d 169.254.0.0/16     -i $KERNEL_VETH -j REJECT
--A FORWARD -d 172.16.0.0/12      -i $KERNEL_VETH -j REJECT
--A FORWARD -d 192.0.0.0/24       -i $KERNEL_VETH -j REJECT
--A FORWARD -d 192.0.2.0/24       -i $KERNEL_VETH -j REJECT
--A FORWARD -d 192.88.99.0/24     -i $KERNEL_VETH -j REJECT
--A FORWARD -d 192.168.0.0/16     -i $KERNEL_VETH -j REJECT
--A FORWARD -d 198.18.0.0/15      -i $KERNEL_VETH -j REJECT
--A FORWARD -d 198.51.100.0/24    -i $KERNEL_VETH -j REJECT
--A FORWARD -d 203.0.113.0/24     -i $KERNEL_VETH -j REJECT
--A FORWARD -d 224.0.0.0/4        -i $KERNEL_VETH -j REJECT
--A FORWARD -d 240.0.0.0/4        -i $KERNEL_VETH -j REJECT
--A FORWARD -d 255.255.255.255/32 -i $KERNEL_VETH -j REJECT
-# Allow forwarding exactly the source address of the module.
-# Don't forward just any address (i.e. don't set policy
-# ACCEPT): if a module somehow gains CAP_NET_ADMIN (which
-# shouldn't happen) it should not be able to spoof source
-# addresses.
--A FORWARD -i $KERNEL_VETH -s $CHILD_VETH_IP4 -j ACCEPT
+-A FORWARD -d 0.0.0.0/8          -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 10.0.0.0/8         -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 100.64.0.0/10      -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 127.0.0.0/8        -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 169.254.0.0/16     -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 172.16.0.0/12      -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 192.0.0.0/24       -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 192.0.2.0/24       -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 192.88.99.0/24     -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 192.168.0.0/16     -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 198.18.0.0/15      -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 198.51.100.0/24    -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 203.0.113.0/24     -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 224.0.0.0/4        -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 240.0.0.0/4        -i $KERNEL_VETHS -j REJECT
+-A FORWARD -d 255.255.255.255/32 -i $KERNEL_VETHS -j REJECT
+# Allow forwarding exactly the source address of each chroot's
+# module, from that chroot's veth. Don't forward just any
+# address (i.e. don't set policy ACCEPT): if a module somehow
+# gains CAP_NET_ADMIN (which shouldn't happen) it should not
+# be able to spoof source addresses.
+$(for i in $(seq 0 $(($N_EDITABLE_CHROOTS - 1))); do
+  echo "-A FORWARD -i cjw-veth-$i -s $(child_veth_ip4 $i) -j ACCEPT"
+done)
 COMMIT
 *nat
 :POSTROUTING ACCEPT
--A POSTROUTING -s $CHILD_VETH_IP4 -j SNAT --to-source $ipv4_snat_source
+$(for i in $(seq 0 $(($N_EDITABLE_CHROOTS - 1))); do
+  echo "-A POSTROUTING -s $(child_veth_ip4 $i) -j SNAT --to-source $ipv4_snat_source"
+done)
 COMMIT
 EOF
@@ -4,7 +4,12 @@ import unittest
 import numpy as np
 import pyarrow as pa
 from typing import ContextManager, Optional, Union
-from cjwkernel.pandas.parse.csv import _parse_csv, ParseCsvResult, ParseCsvWarning
+from cjwkernel.pandas.parse.csv import (
+    _parse_csv,
+    parse_csv,
+    ParseCsvResult,
+    ParseCsvWarning,
+)
 from cjwkernel.tests.util import override_settings, assert_arrow_table_equals
 from cjwkernel.util import tempfile_context
 
@@ -22,13 +27,16 @@ def _internal_parse_csv(
     has_header: bool = False,
     autoconvert_text_to_numbers: bool = False,
 ):
-    return _parse_csv(
-        path,
-        encoding=encoding,
-        delimiter=delimiter,
-        has_header=has_header,
-        autoconvert_text_to_numbers=autoconvert_text_to_numbers,
-    )
+    with tempfile_context(suffix=".arrow") as output_path:
+        # The table is mmapped: it stays readable after we delete the file
+        return _parse_csv(
+            path,
+            output_path=output_path,
+            encoding=encoding,
+            delimiter=delimiter,
+            has_header=has_header,
+            autoconvert_text_to_numbers=autoconvert_text_to_numbers,
+        )
 
 
 @contextlib.contextmanager
@@ -117,6 +125,43 @@ class ParseCsvInternalTests(unittest.TestCase):
                 ),
             )
 
+    @override_settings(CSV_CHUNK_N_ROWS=2)
+    def test_autoconvert_consistent_across_chunks(self):
+        # A: int in chunk 1, float in chunk 2
+        # B: int8 in chunk 1, int16 in chunk 2
+        # C: number in chunk 1, text in chunk 2
+        with _temp_csv("A,B,C\n1,1,1\n2,2,2\n3.5,300,x") as path:
+            result = _internal_parse_csv(
+                path, has_header=True, autoconvert_text_to_numbers=True
+            )
+        assert_csv_result_equals(
+            result,
+            ParseCsvResult(
+                pa.table(
+                    {
+                        "A": pa.array([1, 2, 3.5], pa.float64()),
+                        "B": pa.array([1, 2, 300], pa.int16()),
+                        "C": ["1", "2", "x"],
+                    }
+                ),
+                [],
+            ),
+        )
+
+    @override_settings(CSV_CHUNK_N_ROWS=2)
+    def test_encode_dictionary_across_chunks(self):
+        with _temp_csv("A\na\na\nb\nb\na\nb") as path:
+            result = _internal_parse_csv(path, has_header=True)
+        assert_csv_result_equals(
+            result,
+            ParseCsvResult(
+                pa.table(
+                    {"A": pa.array(["a", "a", "b", "b", "a", "b"]).dictionary_encode()}
+                ),
+                [],
+            ),
+        )
+
     def test_autoconvert_all_null_is_number(self):
         with _temp_csv("A,B\na\nb\nc") as path:
             assert_csv_result_equals(
@@ -501,3 +546,30 @@ class ParseCsvInternalTests(unittest.TestCase):
                     ],
                 ),
             )
+
+
+class ParseCsvTests(unittest.TestCase):
+    @override_settings(CSV_CHUNK_N_ROWS=2)
+    def test_many_chunks_make_one_record_batch(self):
+        # ArrowTable() raises if the file holds more than one record batch
+        with _temp_csv("A,B,C\n1,a,x\n2,a,y\n3,b,z\n4,b,w\n5,a,v") as path:
+            with tempfile_context(suffix=".arrow") as output_path:
+                result = parse_csv(
+                    path,
+                    output_path=output_path,
+                    encoding="utf-8",
+                    delimiter=",",
+                    has_header=True,
+                    autoconvert_text_to_numbers=True,
+                )
+        self.assertEqual(result.errors, [])
+        assert_arrow_table_equals(
+            result.table,
+            pa.table(
+                {
+                    "A": pa.array([1, 2, 3, 4, 5], pa.int8()),
+                    "B": pa.array(["a", "a", "b", "b", "a"]).dictionary_encode(),
+                    "C": ["x", "y", "z", "w", "v"],
+                }
+            ),
+        )
@@ -372,6 +372,13 @@ class FetchTests(unittest.TestCase):
 
         self._test_fetch(fetch, last_fetch_result=None)
 
+    def test_fetch_last_fetch_result(self):
+        async def fetch(params, *, last_fetch_result):
+            self.assertEqual(last_fetch_result.path, parquet_path)
+
+        with parquet_file({"A": [1]}, dir=self.basedir) as parquet_path:
+            self._test_fetch(fetch, last_fetch_result=FetchResult(parquet_path, []))
+
     def test_fetch_get_input_dataframe_happy_path(self):
         async def fetch(params, *, get_input_dataframe):
             df = await get_input_dataframe()
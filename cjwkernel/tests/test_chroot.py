@@ -0,0 +1,90 @@
+import asyncio
+import contextlib
+import unittest
+from cjwkernel.chroot import Chroot, ChrootPool
+from cjwkernel.util import tempdir_context
+
+
+class ChrootPoolTests(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.ctx = contextlib.ExitStack()
+        self.chroots = []
+        for _ in range(2):
+            # Plain directories, not overlayfs: enough to test leasing
+            root = self.ctx.enter_context(tempdir_context())
+            base = self.ctx.enter_context(tempdir_context())
+            upper = self.ctx.enter_context(tempdir_context())
+            self.chroots.append(Chroot(root, base, upper))
+
+    def tearDown(self):
+        self.ctx.close()
+        super().tearDown()
+
+    def test_lease_distinct_chroots(self):
+        pool = ChrootPool(self.chroots)
+
+        async def inner():
+            async with pool.acquire_context() as ctx1:
+                async with pool.acquire_context() as ctx2:
+                    return ctx1.chroot, ctx2.chroot
+
+        chroot1, chroot2 = asyncio.run(inner())
+        self.assertIs(chroot1, self.chroots[0])
+        self.assertIs(chroot2, self.chroots[1])
+
+    def test_wait_for_release(self):
+        pool = ChrootPool(self.chroots[:1])
+        events = []
+
+        async def lease(name):
+            async with pool.acquire_context() as ctx:
+                events.append(("enter", name, ctx.chroot))
+                await asyncio.sleep(0.01)
+                events.append(("exit", name, ctx.chroot))
+
+        async def inner():
+            await asyncio.gather(lease("a"), lease("b"))
+
+        asyncio.run(inner())
+        chroot = self.chroots[0]
+        self.assertEqual(
+            events,
+            [
+                ("enter", "a", chroot),
+                ("exit", "a", chroot),
+                ("enter", "b", chroot),
+                ("exit", "b", chroot),
+            ],
+        )
+
+    def test_release_on_error(self):
+        pool = ChrootPool(self.chroots[:1])
+
+        async def fail():
+            async with pool.acquire_context():
+                raise ValueError("boom")
+
+        async def succeed():
+            async with pool.acquire_context() as ctx:
+                return ctx.chroot
+
+        with self.assertRaises(ValueError):
+            asyncio.run(fail())
+        self.assertIs(asyncio.run(succeed()), self.chroots[0])
+
+    def test_keep_partition(self):
+        pool = ChrootPool(self.chroots)
+        pool.keep_partition(1, 2)
+
+        async def inner():
+            async with pool.acquire_context() as ctx:
+                return ctx.chroot
+
+        self.assertEqual(pool.chroots, [self.chroots[1]])
+        self.assertIs(asyncio.run(inner()), self.chroots[1])
+
+    def test_keep_partition_too_few_chroots(self):
+        pool = ChrootPool(self.chroots)
+        with self.assertRaises(ValueError):
+            pool.keep_partition(2, 3)
@@ -1,4 +1,5 @@
 import contextlib
+import dataclasses
 import textwrap
 import unittest
 from unittest.mock import patch
@@ -136,6 +137,43 @@ class KernelTests(unittest.TestCase):
         result = self.kernel.migrate_params(module, {"foo": 123})
         self.assertEquals(result, {"nested": {"foo": 123}})
 
+    def test_migrate_params_warm_module(self):
+        module = self.kernel.compile(
+            MockPath(
+                ["foo.py"], b"def migrate_params(params): return {'nested': params}"
+            ),
+            "foo",
+        )
+        # The spawner preloads cjwkernel.pandas.parse, which has no
+        # migrate_params(). Using it instead of our code means the default
+        # migrate_params() runs.
+        warm_module = dataclasses.replace(
+            module, warm_module_name="cjwkernel.pandas.parse"
+        )
+        result = self.kernel.migrate_params(warm_module, {"foo": 123})
+        self.assertEquals(result, {"foo": 123})
+
+    def test_migrate_params_warm_module_not_preloaded(self):
+        module = self.kernel.compile(
+            MockPath(
+                ["foo.py"], b"def migrate_params(params): return {'nested': params}"
+            ),
+            "foo",
+        )
+        cold_module = dataclasses.replace(module, warm_module_name="foo.not.loaded")
+        result = self.kernel.migrate_params(cold_module, {"foo": 123})
+        self.assertEquals(result, {"nested": {"foo": 123}})
+
+    def test_migrate_params_batch(self):
+        module = self.kernel.compile(
+            MockPath(
+                ["foo.py"], b"def migrate_params(params): return {'nested': params}"
+            ),
+            "foo",
+        )
+        result = self.kernel.migrate_params_batch(module, [{"foo": 1}, {"foo": 2}])
+        self.assertEquals(result, [{"nested": {"foo": 1}}, {"nested": {"foo": 2}}])
+
     def test_migrate_params_retval_not_thrift_ready(self):
         module = self.kernel.compile(
             MockPath(["foo.py"], b"def migrate_params(params): return range(2)"), "foo"
@@ -4,6 +4,7 @@ import math
 import unittest
 import numpy as np
 import pyarrow as pa
+import pyarrow.parquet
 from cjwkernel import parquet
 from cjwkernel.tests.util import arrow_table, assert_arrow_table_equals, parquet_file
 from cjwkernel.util import create_tempfile, tempfile_context
@@ -137,6 +138,130 @@ class ParquetTest(unittest.TestCase):
         self._test_read_write_table(table)
 
 
+class WriteProfileTest(unittest.TestCase):
+    def test_profile_v2_bounds_row_groups(self):
+        table = pa.table({"A": list(range(25000))})
+        with tempfile_context() as path:
+            parquet.write(path, table, parquet.PROFILE_V2)
+            metadata = pa.parquet.read_metadata(str(path))
+            self.assertEqual(metadata.num_row_groups, 3)
+            self.assertTrue(metadata.row_group(0).column(0).is_stats_set)
+            assert_arrow_table_equals(parquet.read(path), table)
+
+    def test_store_profile_version(self):
+        with tempfile_context() as path:
+            parquet.write(path, pa.table({"A": [1]}), parquet.PROFILE_V2)
+            metadata = pa.parquet.read_metadata(str(path))
+            self.assertEqual(metadata.metadata[b"cjw:write-profile"], b"2")
+
+    def test_zstd_dictionary_round_trip(self):
+        table = pa.table({"A": pa.array(["x", "y", None] * 10000).dictionary_encode()})
+        with tempfile_context() as path:
+            parquet.write(
+                path,
+                table,
+                parquet.WriteProfile(
+                    version=3, row_group_size=7000, compression="ZSTD"
+                ),
+            )
+            assert_arrow_table_equals(parquet.read(path), table)
+
+
+class WritePrependedTest(unittest.TestCase):
+    def test_regroup_rows(self):
+        profile = parquet.WriteProfile(version=3, row_group_size=4)
+        with tempfile_context() as old_path, tempfile_context() as path:
+            parquet.write(old_path, pa.table({"A": list(range(3, 10))}), profile)
+            parquet.write_prepended(
+                path,
+                pa.table({"A": [0, 1, 2]}),
+                old_path,
+                max_n_rows=9,
+                profile=profile,
+            )
+            metadata = pa.parquet.read_metadata(str(path))
+            self.assertEqual(
+                [
+                    metadata.row_group(i).num_rows
+                    for i in range(metadata.num_row_groups)
+                ],
+                [4, 4, 1],
+            )
+            assert_arrow_table_equals(
+                parquet.read(path), pa.table({"A": list(range(9))})
+            )
+
+    def test_dictionary(self):
+        with tempfile_context() as old_path, tempfile_context() as path:
+            parquet.write(
+                old_path, pa.table({"A": pa.array(["y", "z"]).dictionary_encode()})
+            )
+            parquet.write_prepended(
+                path,
+                pa.table({"A": pa.array(["x", "y"]).dictionary_encode()}),
+                old_path,
+                max_n_rows=10,
+            )
+            assert_arrow_table_equals(
+                parquet.read(path),
+                pa.table({"A": pa.array(["x", "y", "y", "z"]).dictionary_encode()}),
+            )
+
+    def test_schema_mismatch(self):
+        with tempfile_context() as old_path, tempfile_context() as path:
+            parquet.write(old_path, pa.table({"A": ["x"]}))
+            with self.assertRaises(ValueError):
+                parquet.write_prepended(
+                    path, pa.table({"A": [1]}), old_path, max_n_rows=10
+                )
+
+
+class ConvertParquetFileToArrowFileTest(unittest.TestCase):
+    def _convert(self, parquet_path, **kwargs):
+        with tempfile_context(suffix=".arrow") as arrow_path:
+            parquet.convert_parquet_file_to_arrow_file(
+                parquet_path, arrow_path, **kwargs
+            )
+            return pa.ipc.open_file(str(arrow_path)).read_all()
+
+    def test_only_columns(self):
+        with parquet_file({"A": [1, 2], "B": ["x", "y"], "C": [3.0, 4.0]}) as path:
+            assert_arrow_table_equals(
+                self._convert(path, only_columns=[2, 0]), {"C": [3.0, 4.0], "A": [1, 2]}
+            )
+
+    def test_only_columns_out_of_range(self):
+        with parquet_file({"A": [1, 2]}) as path:
+            with self.assertRaises(ValueError):
+                self._convert(path, only_columns=[1])
+
+    def test_many_row_groups_become_one_record_batch(self):
+        table = pa.table({"A": [1, 2, 3, 4, 5]})
+        with tempfile_context() as path:
+            pa.parquet.write_table(table, str(path), row_group_size=2)
+            result = self._convert(path)
+        self.assertEqual(result.column(0).num_chunks, 1)
+        assert_arrow_table_equals(result, {"A": [1, 2, 3, 4, 5]})
+
+    def test_unify_dictionaries_across_row_groups(self):
+        table = pa.table(
+            {"A": pa.array(["x", "y", None, "z", "x", "y"]).dictionary_encode()}
+        )
+        with tempfile_context() as path:
+            pa.parquet.write_table(
+                table, str(path), row_group_size=2, use_dictionary=[b"A"]
+            )
+            result = self._convert(path)
+        self.assertEqual(result.column(0).num_chunks, 1)
+        assert_arrow_table_equals(result, table)
+
+    def test_invalid_file(self):
+        with tempfile_context() as path:
+            path.write_bytes(b"PAR1 this is not Parquet PAR1")
+            with self.assertRaises(pa.ArrowIOError):
+                self._convert(path)
+
+
 class ReadSliceAsText(unittest.TestCase):
     def test_slice_zero_row_groups(self):
         table = pa.Table.from_batches([], schema=pa.schema([("A", pa.string())]))
@@ -236,3 +361,27 @@ class ReadSliceAsText(unittest.TestCase):
                 parquet.read_slice_as_text(path, "csv", range(1), range(2, 5)),
                 "A\n2\n3",
             )
+
+    def test_slice_json_skips_row_groups(self):
+        table = pa.table({"A": list(range(10)), "B": [str(i) for i in range(10)]})
+        with tempfile_context() as path:
+            pa.parquet.write_table(table, str(path), row_group_size=3)
+            self.assertEqual(
+                parquet.read_slice_as_text(path, "json", range(1, 2), range(5, 7)),
+                '[{"B":"5"},{"B":"6"}]',
+            )
+
+    def test_slice_json_nan_and_infinity_are_null(self):
+        with parquet_file({"A": [math.nan, math.inf, -math.inf, 1.5]}) as path:
+            self.assertEqual(
+                parquet.read_slice_as_text(path, "json", range(1), range(4)),
+                '[{"A":null},{"A":null},{"A":null},{"A":1.5}]',
+            )
+
+    def test_slice_json_timestamp_before_epoch(self):
+        dt = datetime(1969, 12, 31, 23, 59, 59, 500000)
+        with parquet_file({"A": pa.array([dt], pa.timestamp("ns"))}) as path:
+            self.assertEqual(
+                parquet.read_slice_as_text(path, "json", range(1), range(1)),
+                '[{"A":"1969-12-31T23:59:59.5Z"}]',
+            )
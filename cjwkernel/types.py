@@ -61,6 +61,15 @@ class CompiledModule:
     that's the way we use it.)
     """
 
+    warm_module_name: Optional[str] = None
+    """
+    Name of a trusted Python module with the same code, or `None`.
+
+    If the kernel's spawner preloaded this module (see `Kernel(warm_imports)`),
+    children run it directly instead of unmarshalling and evaluating
+    `marshalled_code_object`. Only set this for code we ship ourselves.
+    """
+
     @property
     def code_object(self) -> Any:
         return marshal.loads(self.marshalled_code_object)
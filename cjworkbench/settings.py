@@ -95,12 +95,63 @@ increase this number so they don't block other requests.
 #
 # (PgLocker connections do not count against SYNC_DATABASE_CONNECTIONS.)
 
+RENDER_MAX_CONCURRENT_TABS = int(os.environ.get("CJW_RENDER_MAX_CONCURRENT_TABS", "4"))
+"""
+Number of a workflow's tabs renderer may execute simultaneously.
+
+A tab starts executing as soon as all the tabs it depends on are rendered.
+Independent tabs overlap their database queries, cache reads and writes.
+"""
+
+KERNEL_WARM_STATIC_MODULES = (
+    os.environ.get("CJW_KERNEL_WARM_STATIC_MODULES", "true") != "false"
+)
+"""
+Evaluate built-in modules once, in the kernel's spawner process.
+
+Each render, fetch and migrate_params call still forks a fresh process; but
+the child skips unmarshalling and evaluating the module's code. Set
+CJW_KERNEL_WARM_STATIC_MODULES=false to evaluate them on every call.
+"""
+
 # RabbitMQ
 try:
     RABBITMQ_HOST = os.environ["CJW_RABBITMQ_HOST"]
 except KeyError:
     sys.exit("Must set CJW_RABBITMQ_HOST")
 
+RENDERER_CONCURRENCY = int(os.environ.get("CJW_RENDERER_CONCURRENCY", "1"))
+"""
+Number of render messages one renderer process (or worker) handles at once.
+
+Each render leases a chroot from the kernel's pool, so values above
+CJW_KERNEL_N_EDITABLE_CHROOTS only add renders waiting for a chroot.
+"""
+
+RENDERER_N_WORKERS = int(os.environ.get("CJW_RENDERER_N_WORKERS", "1"))
+"""
+Number of renderer worker processes to fork.
+
+With more than one, `manage.py renderer` loads its Python dependencies once
+and forks this many workers, restarting any that die. Each consumes render
+messages on its own and leases its own share of CJW_KERNEL_N_EDITABLE_CHROOTS
+(which must be at least this number).
+"""
+
+FETCHER_CONCURRENCY = int(os.environ.get("CJW_FETCHER_CONCURRENCY", "1"))
+"""
+Number of fetch messages one fetcher process handles at once.
+
+Each fetch leases a chroot from the kernel's pool, and each chroot has its own
+network interface, so values up to CJW_KERNEL_N_EDITABLE_CHROOTS run that many
+modules at once.
+"""
+
+RABBITMQ_STATS_INTERVAL = float(os.environ.get("CJW_RABBITMQ_STATS_INTERVAL", "60"))
+"""
+Seconds between log messages describing renderer/fetcher queue workloads.
+"""
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_rabbitmq.core.RabbitmqChannelLayer",
@@ -469,6 +520,38 @@ if "MINIO_STATIC_URL_PATTERN" in os.environ:
 if STATIC_URL != "http://localhost:8000/static/":
     print(f"Serving static files from {STATIC_URL}")
 
+RENDER_CACHE_LOCAL_DIR = os.environ.get(
+    "CJW_RENDER_CACHE_LOCAL_DIR", "/var/tmp/cjw-render-cache"
+)
+"""
+Directory where we keep copies of cached render results we read from minio.
+
+Point web, renderer and fetcher processes on the same node at the same
+(disk-backed) directory so they share one cache.
+"""
+
+RENDER_CACHE_LOCAL_MAX_BYTES = int(
+    os.environ.get("CJW_RENDER_CACHE_LOCAL_MAX_BYTES", "0")
+)
+"""
+Maximum size of RENDER_CACHE_LOCAL_DIR. 0 (the default) disables the cache.
+
+The local cache is opt-in: set this to, say, 2147483648 (2GB) to enable it.
+
+When a new file makes the cache exceed this size, we delete the
+least-recently-read files.
+"""
+
+RENDER_CACHE_PARQUET_COMPRESSION = os.environ.get(
+    "CJW_RENDER_CACHE_PARQUET_COMPRESSION", "SNAPPY"
+)
+"""
+Codec for Parquet files in the render cache: "SNAPPY", "ZSTD" or "LZ4".
+
+ZSTD files are smaller but slower to write. Existing files stay readable
+when this changes.
+"""
+
 LESSON_FILES_URL = "https://storage.googleapis.com/production-static.workbenchdata.com"
 """
 URL where we publish data for users to fetch in lessons.
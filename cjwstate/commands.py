@@ -3,6 +3,7 @@ from cjworkbench.sync import database_sync_to_async
 from cjwstate import clientside, rabbitmq
 from cjwstate.models import Delta, WfModule, Workflow
 from cjwstate.models.commands import ChangeDataVersionCommand
+from cjwstate.models.workflow import DEPENDENCY_GRAPHS
 
 
 async def websockets_notify(workflow_id: int, update: clientside.Update) -> None:
@@ -23,6 +24,18 @@ async def queue_render(workflow_id: int, delta_id: int) -> None:
     await rabbitmq.queue_render(workflow_id, delta_id)
 
 
+def _carry_forward_dependency_graph(
+    delta: Delta, from_delta_id: Optional[int], to_delta_id: Optional[int]
+) -> None:
+    """
+    Keep the cached DependencyGraph valid across `delta`, if we can.
+
+    Call this within a cooperative lock, after forward() or backward().
+    """
+    if not delta.get_modifies_dependency_graph():
+        DEPENDENCY_GRAPHS.carry_forward(delta.workflow_id, from_delta_id, to_delta_id)
+
+
 @database_sync_to_async
 def _workflow_has_notifications(workflow_id: int) -> bool:
     """Detect whether a workflow sends email on changes."""
@@ -115,6 +128,7 @@ def _first_forward_and_save_returning_clientside_update(
             prev_delta_id=workflow.last_delta_id, **create_kwargs
         )
         delta.forward()
+        _carry_forward_dependency_graph(delta, workflow.last_delta_id, delta.id)
 
         if orphan_delta:
             # We just deleted deltas; now we can garbage-collect Tabs and
@@ -139,6 +153,7 @@ def _call_forward_and_load_clientside_update(
 ) -> Tuple[clientside.Update, bool]:
     with Workflow.lookup_and_cooperative_lock(id=delta.workflow_id):
         delta.forward()
+        _carry_forward_dependency_graph(delta, delta.prev_delta_id, delta.id)
         delta.workflow.last_delta = delta
         delta.workflow.save(update_fields=["last_delta_id"])
 
@@ -151,6 +166,7 @@ def _call_backward_and_load_clientside_update(
 ) -> Tuple[clientside.Update, bool]:
     with Workflow.lookup_and_cooperative_lock(id=delta.workflow_id):
         delta.backward()
+        _carry_forward_dependency_graph(delta, delta.id, delta.prev_delta_id)
 
         # Point workflow to previous delta
         # Only update prev_delta_id: other columns may have been edited in
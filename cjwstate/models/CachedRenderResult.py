@@ -1,8 +1,50 @@
-from dataclasses import dataclass
-from typing import Any, Dict, List
+from __future__ import annotations
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, List, Optional
 from cjwkernel.types import RenderError, TableMetadata
 
 
+@dataclass(frozen=True)
+class ColumnStats:
+    """
+    Facts about one column of a cached render result.
+
+    We compute these when we cache the result, so readers needn't download
+    the table to learn them.
+    """
+
+    n_nulls: int
+    n_distinct: Optional[int]
+    """
+    Number of distinct non-null values, or `None` if we didn't count.
+
+    We only count text columns' values, and we stop counting after
+    `cjwstate.rendercache.io.MAX_N_STORED_VALUE_COUNTS`.
+    """
+    min: Optional[Any] = None
+    """
+    Least non-null value, or `None` if there is none.
+
+    Numbers are JSON numbers; text is a string; timestamps are ISO-8601
+    strings.
+    """
+    max: Optional[Any] = None
+    """Greatest non-null value, or `None` if there is none."""
+    value_counts: Optional[Dict[str, int]] = None
+    """
+    Count of each distinct value, for text columns with few distinct values.
+
+    `None` means, "not stored" -- read the table to count.
+    """
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, d: Dict[str, Any]) -> ColumnStats:
+        return cls(**d)
+
+
 @dataclass
 class CachedRenderResult:
     """
@@ -27,3 +69,7 @@ class CachedRenderResult:
     errors: List[RenderError]
     json: Dict[str, Any]
     table_metadata: TableMetadata
+    fingerprint: Optional[str] = None
+    """SHA-1 of the table's Arrow data, or `None` if we did not compute it."""
+    input_fingerprint: Optional[str] = None
+    """SHA-1 of everything passed to render(), or `None` if unknown."""
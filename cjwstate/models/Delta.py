@@ -64,6 +64,18 @@ class Delta(PolymorphicModel):
         """
         return False
 
+    def get_modifies_dependency_graph(self) -> bool:
+        """
+        Return whether this Delta might change the workflow's DependencyGraph.
+
+        That is: whether it might add, remove or reorder tabs or steps, or
+        change a step's "tab" params. If it can't, the cached graph from
+        before this Delta stays valid after it.
+
+        This must be called in a `workflow.cooperative_lock()`.
+        """
+        return True
+
     @classmethod
     def amend_create_kwargs(cls, **kwargs):
         """
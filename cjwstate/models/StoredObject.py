@@ -1,10 +1,43 @@
-from django.db import models
-from django.db.models.signals import pre_delete
+from django.db import connection, models
+from django.db.models.signals import post_delete, pre_delete
 from django.dispatch import receiver
 from django.utils import timezone
 from cjwstate import minio
 
 
+SharedKeyPrefix = "sha256/"
+"""
+Prefix of content-addressed keys: "sha256/{hash}.dat".
+
+Many StoredObjects may point to the same content-addressed key. The file is
+deleted when the last one is deleted.
+"""
+
+SharedKeyLockKey = 3
+"""
+Postgres advisory-lock "key1" for content-addressed keys.
+
+(cjworkbench.pg_render_locker uses keys 1 and 2.)
+"""
+
+
+def is_shared_key(key: str) -> bool:
+    return key.startswith(SharedKeyPrefix)
+
+
+def lock_shared_key(key: str) -> None:
+    """
+    Block until no other transaction is adding or removing references to `key`.
+
+    The lock is held until the current transaction ends. Call this before
+    creating or deleting a StoredObject that points to a shared key: otherwise,
+    one transaction could delete a file another is about to reference.
+    """
+    key2 = int(key[len(SharedKeyPrefix) :][:8], 16) - 2 ** 31  # int4
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)", [SharedKeyLockKey, key2])
+
+
 # StoredObject is our persistence layer.
 # Allows WfModules to store keyed, versioned binary objects
 class StoredObject(models.Model):
@@ -14,7 +47,9 @@ class StoredObject(models.Model):
     Ideally, a module's fetch() would store whatever it wants. Currently, we
     only allow storing data frames.
 
-    StoredObject links to an S3 bucket+key. The key must adhere to the format:
+    StoredObject links to an S3 bucket+key. New keys are content-addressed,
+    "sha256/{hash}.dat", and shared by all StoredObjects with the same contents.
+    Legacy keys (one file per StoredObject) adhere to the format:
     "{workflow_id}/{wf_module_id}/{uuidv1()}"
     """
 
@@ -32,8 +67,8 @@ class StoredObject(models.Model):
     key = models.CharField(max_length=255, null=False, blank=True, default="")
     stored_at = models.DateTimeField(default=timezone.now)
 
-    # used only for stored tables
-    hash = models.CharField(max_length=32)
+    # hex SHA-256 of file contents ("unhashed" on legacy objects)
+    hash = models.CharField(max_length=64)
     size = models.IntegerField(default=0)  # file size
 
     # keeping track of whether this version of the data has ever been loaded
@@ -42,9 +77,14 @@ class StoredObject(models.Model):
 
     # make a deep copy for another WfModule
     def duplicate(self, to_wf_module):
-        basename = self.key.split("/")[-1]
-        key = f"{to_wf_module.workflow_id}/{to_wf_module.id}/{basename}"
-        minio.copy(self.bucket, key, f"{self.bucket}/{self.key}")
+        if is_shared_key(self.key):
+            # Add a reference to the same file
+            lock_shared_key(self.key)
+            key = self.key
+        else:
+            basename = self.key.split("/")[-1]
+            key = f"{to_wf_module.workflow_id}/{to_wf_module.id}/{basename}"
+            minio.copy(self.bucket, key, f"{self.bucket}/{self.key}")
 
         return to_wf_module.stored_objects.create(
             stored_at=self.stored_at,
@@ -65,5 +105,23 @@ def _delete_from_s3_pre_delete(sender, instance, **kwargs):
     deletion fails, we need the link to remain in our database -- that's how
     the user will know it isn't deleted.
     """
-    if instance.bucket and instance.key:
+    if instance.bucket and instance.key and not is_shared_key(instance.key):
         minio.remove(instance.bucket, instance.key)
+
+
+@receiver(post_delete, sender=StoredObject)
+def _delete_shared_from_s3_post_delete(sender, instance, **kwargs):
+    """
+    Delete a content-addressed file from S3 once nothing references it.
+
+    This is post-delete because Django may delete several references at once
+    (e.g., when deleting a Workflow): each pre-delete handler would see the
+    others. We're still within the deleting transaction: if deletion fails,
+    the database rolls back and the user will know it isn't deleted.
+    """
+    if instance.bucket and is_shared_key(instance.key):
+        lock_shared_key(instance.key)
+        if not StoredObject.objects.filter(
+            bucket=instance.bucket, key=instance.key
+        ).exists():
+            minio.remove(instance.bucket, instance.key)
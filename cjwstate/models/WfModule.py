@@ -7,7 +7,7 @@ from django.db import models
 from django.db.models import Q
 from cjwkernel.types import I18nMessage, RenderError, TableMetadata
 from cjwstate import minio
-from .fields import ColumnsField, RenderErrorsField
+from .fields import ColumnsField, ColumnStatsField, RenderErrorsField
 from .CachedRenderResult import CachedRenderResult
 from .module_version import ModuleVersion
 from .Tab import Tab
@@ -18,6 +18,13 @@ from cjwstate import clientside
 logger = logging.getLogger(__name__)
 
 
+class WfModuleManager(models.Manager):
+    def get_queryset(self):
+        # Column stats can be large, and only the value-counts endpoint reads
+        # them. Load them on access.
+        return super().get_queryset().defer("cached_render_result_column_stats")
+
+
 class WfModule(models.Model):
     """An instance of a Module in a Workflow."""
 
@@ -67,6 +74,8 @@ class WfModule(models.Model):
             )
         ]
 
+    objects = WfModuleManager()
+
     slug = models.SlugField(db_index=True)
     """
     Unique ID, generated by the client.
@@ -149,6 +158,33 @@ class WfModule(models.Model):
     cached_render_result_json = models.BinaryField(blank=True)
     cached_render_result_columns = ColumnsField(null=True, blank=True)
     cached_render_result_nrows = models.IntegerField(null=True, blank=True)
+    cached_render_result_fingerprint = models.CharField(
+        null=True, blank=True, max_length=40
+    )
+    """
+    SHA-1 of the cached table's Arrow data.
+
+    Equal fingerprints mean equal tables -- so steps downstream need not
+    re-render.
+    """
+    cached_render_result_input_fingerprint = models.CharField(
+        null=True, blank=True, max_length=40
+    )
+    """
+    SHA-1 of the inputs that produced the cached result.
+
+    This hashes the previous step's `cached_render_result_fingerprint`, this
+    step's params, module version and fetched data. If a stale cached result's
+    input fingerprint matches the current one, render() would reproduce it.
+    `None` if we couldn't compute it (for instance, if params refer to tabs).
+    """
+    cached_render_result_column_stats = ColumnStatsField(null=True, blank=True)
+    """
+    One ColumnStats per column of the cached table.
+
+    `None` for results cached before we computed stats. Deferred: only
+    `cjwstate.rendercache.read_cached_render_result_value_counts()` reads it.
+    """
 
     # TODO once we auto-compute stale module outputs, nix is_busy -- it will
     # be implied by the fact that the cached output revision is wrong.
@@ -359,7 +395,16 @@ class WfModule(models.Model):
         if cached_result is not None and self.tab.name == to_tab.name:
             # assuming file-copy succeeds, copy cached results.
             new_step.cached_render_result_delta_id = new_step.last_relevant_delta_id
-            for attr in ("status", "errors", "json", "columns", "nrows"):
+            for attr in (
+                "status",
+                "errors",
+                "json",
+                "columns",
+                "nrows",
+                "fingerprint",
+                "input_fingerprint",
+                "column_stats",
+            ):
                 full_attr = f"cached_render_result_{attr}"
                 setattr(new_step, full_attr, getattr(self, full_attr))
 
@@ -500,6 +545,8 @@ class WfModule(models.Model):
         columns = self.cached_render_result_columns
         errors = self.cached_render_result_errors
         nrows = self.cached_render_result_nrows
+        fingerprint = self.cached_render_result_fingerprint
+        input_fingerprint = self.cached_render_result_input_fingerprint
 
         # cached_render_result_json is sometimes a memoryview
         json_bytes = bytes(self.cached_render_result_json)
@@ -516,6 +563,8 @@ class WfModule(models.Model):
             errors=errors,
             json=json_dict,
             table_metadata=TableMetadata(nrows, columns),
+            fingerprint=fingerprint,
+            input_fingerprint=input_fingerprint,
         )
 
     def delete(self, *args, **kwargs):
@@ -31,6 +31,10 @@ class ChangeDataVersionCommand(ChangesWfModuleOutputs, Delta):
         """
         return True
 
+    # override
+    def get_modifies_dependency_graph(self) -> bool:
+        return False
+
     @classmethod
     def amend_create_kwargs(cls, *, wf_module, **kwargs):
         return {
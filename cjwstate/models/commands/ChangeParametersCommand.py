@@ -2,6 +2,7 @@ import logging
 from django.contrib.postgres.fields import JSONField
 from django.db import models
 from .. import Delta, WfModule
+from ..workflow import DependencyGraph
 from cjwstate.modules import loaded_module
 from .util import ChangesWfModuleOutputs
 
@@ -45,6 +46,14 @@ class ChangeParametersCommand(ChangesWfModuleOutputs, Delta):
         )
         self.backward_affected_delta_ids()
 
+    # override
+    def get_modifies_dependency_graph(self) -> bool:
+        # Only "tab" params are edges in the graph
+        module_version = self.wf_module.module_version
+        return module_version is not None and DependencyGraph.schema_has_tab_params(
+            module_version.param_schema
+        )
+
     @classmethod
     def wf_module_is_deleted(self, wf_module):
         """Return True iff we cannot add commands to `wf_module`."""
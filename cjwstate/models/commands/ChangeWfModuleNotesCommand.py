@@ -27,6 +27,10 @@ class ChangeWfModuleNotesCommand(Delta):
             .update_step(self.wf_module.id, notes=self.wf_module.notes)
         )
 
+    # override
+    def get_modifies_dependency_graph(self) -> bool:
+        return False
+
     @classmethod
     def amend_create_kwargs(cls, *, wf_module, new_value, **kwargs):
         wf_module.refresh_from_db()  # now that we're atomic
@@ -22,6 +22,10 @@ class ChangeWorkflowTitleCommand(Delta):
     def load_clientside_update(self):
         return super().load_clientside_update().update_workflow(name=self.workflow.name)
 
+    # override
+    def get_modifies_dependency_graph(self) -> bool:
+        return False
+
     @classmethod
     def amend_create_kwargs(cls, *, workflow, new_value, **kwargs):
         return {
@@ -91,7 +91,7 @@ class ReorderTabsCommand(ChangesWfModuleOutputs, Delta):
         moved_slugs = set(old_slugs[first_change_index : last_change_index + 1])
 
         # Figure out which params depend on those.
-        graph = DependencyGraph.load_from_workflow(workflow)
+        graph = DependencyGraph.load_cached(workflow)
         wf_module_ids = graph.get_step_ids_depending_on_tab_slugs(moved_slugs)
         q = models.Q(id__in=wf_module_ids)
         return cls.q_to_wf_module_delta_ids(q)
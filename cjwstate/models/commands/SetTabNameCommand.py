@@ -38,6 +38,10 @@ class SetTabNameCommand(ChangesWfModuleOutputs, Delta):
         self.tab.name = self.old_name
         self.tab.save(update_fields=["name"])
 
+    # override
+    def get_modifies_dependency_graph(self) -> bool:
+        return False
+
     @classmethod
     def amend_create_kwargs(cls, *, workflow, tab, new_name):
         if tab.name == new_name:
@@ -59,9 +59,9 @@ class ChangesWfModuleOutputs:
         In other words: all WfModules that use `tab` in a 'tab' parameter, plus
         all WfModules that depend on them.
 
-        This uses the tab's workflow's `DependencyGraph`.
+        This uses the tab's workflow's (cached) `DependencyGraph`.
         """
-        graph = DependencyGraph.load_from_workflow(tab.workflow)
+        graph = DependencyGraph.load_cached(tab.workflow)
         tab_slug = tab.slug
         wf_module_ids = graph.get_step_ids_depending_on_tab_slug(tab_slug)
 
@@ -1,6 +1,7 @@
 from django.contrib.postgres.fields import JSONField
 from django.core.exceptions import ValidationError
 from cjwkernel.types import Column, RenderError
+from .CachedRenderResult import ColumnStats
 
 
 class ColumnsField(JSONField):
@@ -75,3 +76,41 @@ class RenderErrorsField(JSONField):
 
         arr = [c.to_dict() for c in value]
         return super().get_prep_value(arr)  # JSONField: arr->bytes
+
+
+class ColumnStatsField(JSONField):
+    """
+    Maps a List[ColumnStats] to a database JSON column.
+    """
+
+    description = "List of ColumnStats, stored as JSON"
+
+    def from_db_value(self, value, *args, **kwargs):
+        if value is None:
+            return None
+
+        return [ColumnStats.from_dict(c) for c in value]
+
+    def validate(self, value, model_instance):
+        super().validate(value, model_instance)
+
+        if value is None:
+            return
+
+        if not isinstance(value, list):
+            raise ValidationError("not a list", code="invalid", params={"value": value})
+
+        for item in value:
+            if not isinstance(item, ColumnStats):
+                raise ValidationError(
+                    "list item is not a ColumnStats",
+                    code="invalid",
+                    params={"value": value},
+                )
+
+    def get_prep_value(self, value):
+        if value is None:
+            return None
+
+        arr = [c.to_dict() for c in value]
+        return super().get_prep_value(arr)  # JSONField: arr->bytes
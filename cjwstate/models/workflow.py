@@ -1,7 +1,9 @@
 from __future__ import annotations
+from collections import OrderedDict
 from contextlib import contextmanager
 from dataclasses import dataclass
-from typing import Callable, Dict, List, Optional, Set, Tuple, FrozenSet
+import threading
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, FrozenSet
 import warnings
 from django.db import models, transaction
 from django.db.models import Q
@@ -519,6 +521,12 @@ class Workflow(models.Model):
         else:
             self.last_delta_id = first_delta.id
             self.save(update_fields=["last_delta_id"])
+            # first_delta.id used to mean the initial state; now it doesn't.
+            # Other processes' DEPENDENCY_GRAPHS see the new datetime.
+            type(first_delta).objects.filter(id=first_delta.id).update(
+                datetime=timezone.now()
+            )
+            DEPENDENCY_GRAPHS.discard(self.id)
 
         try:
             # Select the _second_ delta.
@@ -634,9 +642,29 @@ class DependencyGraph:
     tabs: List[DependencyGraph.Tab]
     steps: Dict[int, Step]  # keyed by wf_module_id
 
+    @staticmethod
+    def schema_has_tab_params(schema) -> bool:
+        """
+        Return whether `schema` (a `ParamDType.Dict`) has Tab or Multitab params.
+
+        Only Steps with tab params can depend on other tabs.
+        """
+        from cjwstate.models.param_spec import ParamDType
+
+        return any(
+            isinstance(dtype, (ParamDType.Tab, ParamDType.Multitab))
+            for dtype in schema.iter_dfs_dtypes()
+        )
+
     @classmethod
     def load_from_workflow(cls, workflow: Workflow) -> "DependencyGraph":
+        """
+        Build a DependencyGraph by reading every live Step in `workflow`.
+
+        This may call modules' migrate_params(). Prefer `load_cached()`.
+        """
         from cjwstate.models.param_spec import ParamDType
+        from cjwstate.params import get_migrated_params
 
         tabs = []
         steps = {}
@@ -652,21 +680,11 @@ class DependencyGraph:
                     continue
 
                 schema = module_version.param_schema
-                if all(
-                    (
-                        (
-                            not isinstance(dtype, ParamDType.Tab)
-                            and not isinstance(dtype, ParamDType.Multitab)
-                        )
-                        for dtype in schema.iter_dfs_dtypes()
-                    )
-                ):
+                if not cls.schema_has_tab_params(schema):
                     # There are no tab params.
                     steps[wf_module.id] = cls.Step(set())
                     continue
 
-                from cjwstate.params import get_migrated_params
-
                 params = get_migrated_params(wf_module)
 
                 # raises ValueError (and we don't handle that right now)
@@ -682,6 +700,16 @@ class DependencyGraph:
 
         return cls(tabs, steps)
 
+    @classmethod
+    def load_cached(cls, workflow: Workflow) -> "DependencyGraph":
+        """
+        Return `workflow`'s DependencyGraph, from `DEPENDENCY_GRAPHS` if we can.
+
+        Call this within a `Workflow.cooperative_lock()`. Do not mutate the
+        result: it is shared.
+        """
+        return DEPENDENCY_GRAPHS.get(workflow)
+
     def _get_dependent_ids_step(self, tab_slugs: Set[str]) -> Tuple[Set[int], Set[str]]:
         """
         Find `(set(new_wf_module_ids), set(tab_slugs_of_new_wf_module_ids))`.
@@ -725,3 +753,134 @@ class DependencyGraph:
                 if wf_module_id in wf_module_ids:
                     ret.append(wf_module_id)
         return ret
+
+
+DEPENDENCY_GRAPHS_MAX_ENTRIES = 500
+
+
+class _DependencyGraphCache:
+    """
+    Remember recent workflows' DependencyGraphs, in this process.
+
+    A workflow's graph is a function of its tabs and steps, their params and
+    the modules' param schemas. Every edit to tabs, steps and params is a
+    Delta; so we key each graph by `workflow.last_delta_id` and that Delta's
+    datetime. Undo and redo reuse Delta IDs, and they restore the exact state
+    each ID had. `Workflow.clear_deltas()` re-points `last_delta_id` at the
+    first Delta, so it bumps that Delta's datetime.
+
+    Internal modules never change while the program runs. External modules
+    can be re-imported at any time, by any process: we check the ones each
+    graph uses.
+
+    When a Delta cannot change the graph (e.g., a note edit), commands call
+    `carry_forward()` to re-key the cached graph instead of dropping it.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        # workflow_id => (key, external_module_id_names, modules_stamp, graph)
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(workflow_id: int) -> Tuple[Optional[int], Any]:
+        # Query, don't read `workflow.last_delta_id`: callers may pass a stale
+        # Workflow (e.g., `tab.workflow`).
+        row = (
+            Workflow.objects.filter(id=workflow_id)
+            .values_list("last_delta_id", "last_delta__datetime")
+            .first()
+        )
+        return row or (None, None)
+
+    @staticmethod
+    def _delta_key(delta_id: Optional[int]) -> Tuple[Optional[int], Any]:
+        from cjwstate.models import Delta
+
+        return (
+            delta_id,
+            Delta.objects.filter(id=delta_id)
+            .values_list("datetime", flat=True)
+            .first(),
+        )
+
+    @staticmethod
+    def _external_module_id_names(workflow_id: int) -> FrozenSet[str]:
+        from cjwstate.models import WfModule
+        from cjwstate.modules import staticregistry
+
+        id_names = WfModule.live_in_workflow(workflow_id).values_list(
+            "module_id_name", flat=True
+        )
+        # Internal modules take precedence over external ones of the same name
+        return frozenset(id_names) - frozenset(staticregistry.Specs)
+
+    @staticmethod
+    def _modules_stamp(id_names: FrozenSet[str]) -> Any:
+        """
+        Find a value that changes when any module in `id_names` is imported.
+
+        Most workflows only use internal modules: that costs no query.
+        """
+        from cjwstate.models.module_version import ModuleVersion
+
+        if not id_names:
+            return None
+        return ModuleVersion.objects.filter(id_name__in=id_names).aggregate(
+            models.Max("last_update_time")
+        )["last_update_time__max"]
+
+    def get(self, workflow: Workflow) -> DependencyGraph:
+        key = self._key(workflow.id)
+        with self._lock:
+            entry = self._entries.get(workflow.id)
+        if (
+            entry is not None
+            and entry[0] == key
+            and entry[2] == self._modules_stamp(entry[1])
+        ):
+            with self._lock:
+                if workflow.id in self._entries:
+                    self._entries.move_to_end(workflow.id)
+            return entry[3]
+
+        # Read module stamps before the graph: if a module changes while we
+        # build, the next get() will see a newer stamp.
+        id_names = self._external_module_id_names(workflow.id)
+        modules_stamp = self._modules_stamp(id_names)
+        graph = DependencyGraph.load_from_workflow(workflow)
+
+        with self._lock:
+            self._entries[workflow.id] = (key, id_names, modules_stamp, graph)
+            self._entries.move_to_end(workflow.id)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return graph
+
+    def carry_forward(
+        self, workflow_id: int, from_delta_id: Optional[int], to_delta_id: int
+    ) -> None:
+        """
+        Declare that the graph at `to_delta_id` is the graph at `from_delta_id`.
+        """
+        with self._lock:
+            entry = self._entries.get(workflow_id)
+        if entry is None or entry[0][0] != from_delta_id:
+            return
+
+        to_key = self._delta_key(to_delta_id)
+        with self._lock:
+            if self._entries.get(workflow_id) is entry:
+                self._entries[workflow_id] = (to_key,) + entry[1:]
+
+    def discard(self, workflow_id: int) -> None:
+        with self._lock:
+            self._entries.pop(workflow_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+DEPENDENCY_GRAPHS = _DependencyGraphCache(DEPENDENCY_GRAPHS_MAX_ENTRIES)
@@ -1,3 +1,4 @@
+from django.conf import settings
 import cjwkernel.chroot
 import cjwkernel.kernel
 import cjwstate.modules.staticregistry
@@ -19,5 +20,10 @@ def init_module_system():
     # Ignore spurious init() calls. They happen in unit-testing: each unit test
     # that relies on the module system needs to ensure it's initialized.
     if kernel is None:
-        kernel = cjwkernel.kernel.Kernel()
-        cjwstate.modules.staticregistry._setup(kernel)
+        warm = settings.KERNEL_WARM_STATIC_MODULES
+        kernel = cjwkernel.kernel.Kernel(
+            warm_imports=(
+                tuple(cjwstate.modules.staticregistry.warm_imports()) if warm else ()
+            )
+        )
+        cjwstate.modules.staticregistry._setup(kernel, warm=warm)
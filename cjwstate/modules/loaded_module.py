@@ -5,7 +5,7 @@ import logging
 from pathlib import Path
 import threading
 import time
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional
 from cjwkernel.errors import ModuleError
 from cjwkernel.types import (
     ArrowTable,
@@ -189,6 +189,45 @@ class LoadedModule:
                 int((time2 - time1) * 1000),
             )
 
+    def migrate_params_batch(
+        self, raw_params_list: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Call module `migrate_params()` on each of `raw_params_list`.
+
+        This costs one kernel call, no matter how long the list is.
+
+        Raise ModuleError if module code did not execute on _any_ item.
+
+        Log any ModuleError. Also log success.
+        """
+        time1 = time.time()
+        logger.info(
+            "%s.migrate_params_batch(%d) begin", self.name, len(raw_params_list)
+        )
+        status = "???"
+        try:
+            result = cjwstate.modules.kernel.migrate_params_batch(
+                self.compiled_module, raw_params_list
+            )  # raise ModuleError
+            status = "ok"
+            return result
+        except ModuleError as err:
+            logger.exception(
+                "Exception in %s.migrate_params_batch", self.module_id_name
+            )
+            status = type(err).__name__
+            raise
+        finally:
+            time2 = time.time()
+            logger.info(
+                "%s.migrate_params_batch(%d) => %s in %dms",
+                self.module_id_name,
+                len(raw_params_list),
+                status,
+                int((time2 - time1) * 1000),
+            )
+
     @classmethod
     def for_module_version(
         cls, module_version: Optional["ModuleVersion"]
@@ -44,23 +44,54 @@ their ``.json`` spec files.
 >>> cjwstate.modules.init_module_system()
 >>> staticregistry.Lookup['pythoncode']  # dynamic lookup by id_name
 """
+import dataclasses
+import hashlib
 from pathlib import Path
+from typing import List
 import staticmodules
 from .module_loader import ModuleSpec
 
 
 Lookup = {}
 Specs = {}
+SourceHashes = {}
+"""
+SHA1 of each module's spec and Python code, by id_name.
+
+Internal modules' ModuleVersions all have `source_version_hash="internal"`;
+this is how callers notice that a deploy changed a module's code.
+"""
+
+
+def _spec_paths() -> List[Path]:
+    return list(Path(staticmodules.__file__).parent.glob("*.yaml"))
+
+
+def warm_imports() -> List[str]:
+    """
+    List Python module names for `Kernel(warm_imports=...)`.
+
+    The kernel's spawner imports these once, so each call skips evaluating the
+    module's code.
+    """
+    return ["staticmodules." + spec_path.stem for spec_path in _spec_paths()]
 
 
-def _setup(kernel):
-    spec_paths = list(Path(staticmodules.__file__).parent.glob("*.yaml"))
-    for spec_path in spec_paths:
+def _setup(kernel, *, warm: bool = False):
+    for spec_path in _spec_paths():
         spec = ModuleSpec.load_from_path(spec_path)
         assert (
             "parameters_version" in spec.data
         ), "Internal modules require a 'parameters_version'"
         id_name = spec_path.stem
-        compiled_module = kernel.compile(spec_path.with_suffix(".py"), id_name)
+        code_path = spec_path.with_suffix(".py")
+        compiled_module = kernel.compile(code_path, id_name)
+        if warm:
+            compiled_module = dataclasses.replace(
+                compiled_module, warm_module_name="staticmodules." + id_name
+            )
         Lookup[id_name] = compiled_module
         Specs[id_name] = spec
+        SourceHashes[id_name] = hashlib.sha1(
+            spec_path.read_bytes() + code_path.read_bytes()
+        ).hexdigest()
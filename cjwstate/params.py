@@ -1,8 +1,105 @@
-from typing import Any, Dict
-from cjwstate.models import WfModule
+from collections import OrderedDict
+import copy
+import hashlib
+import json
+import logging
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+from cjwkernel.errors import ModuleError
+from cjwstate.models import ModuleVersion, WfModule
 from cjwstate.modules.loaded_module import LoadedModule
 
 
+logger = logging.getLogger(__name__)
+
+
+MEMO_MAX_ENTRIES = 2000
+
+
+class _MigratedParamsMemo:
+    """
+    Remember recent migrate_params() results, in this process.
+
+    Keys are `(module id_name, source_version_hash, param_schema_version,
+    sha1(params))`. We never remember results for "develop" modules: their
+    code changes without their version changing.
+    """
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(
+        module_version: ModuleVersion, params: Dict[str, Any]
+    ) -> Optional[Tuple[str, str, str, str]]:
+        if module_version.source_version_hash == "develop":
+            return None
+        params_json = json.dumps(params, sort_keys=True, ensure_ascii=False)
+        return (
+            module_version.id_name,
+            module_version.source_version_hash,
+            module_version.param_schema_version,
+            hashlib.sha1(params_json.encode("utf-8")).hexdigest(),
+        )
+
+    def get(self, key) -> Optional[Dict[str, Any]]:
+        if key is None:
+            return None
+        with self._lock:
+            try:
+                self._entries.move_to_end(key)
+                value = self._entries[key]
+            except KeyError:
+                return None
+        return copy.deepcopy(value)  # callers may mutate the result
+
+    def set(self, key, value: Dict[str, Any]) -> None:
+        if key is None:
+            return
+        with self._lock:
+            self._entries[key] = copy.deepcopy(value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+MEMO = _MigratedParamsMemo(MEMO_MAX_ENTRIES)
+
+
+def _is_stale(wf_module: WfModule, module_version: ModuleVersion) -> bool:
+    if module_version.source_version_hash == "develop":
+        return True
+    else:
+        # works if cached version (and thus cached _result_) is None
+        return (
+            module_version.param_schema_version
+            != wf_module.cached_migrated_params_module_version
+        )
+
+
+def _save_migrated_params(
+    wf_module: WfModule, module_version: ModuleVersion, params: Dict[str, Any]
+) -> None:
+    wf_module.cached_migrated_params = params
+    wf_module.cached_migrated_params_module_version = (
+        module_version.param_schema_version
+    )
+    # Write to DB, like wf_module.save(fields=[...]), even if the
+    # WfModule was deleted in a race
+    WfModule.objects.filter(id=wf_module.id).update(
+        cached_migrated_params=wf_module.cached_migrated_params,
+        cached_migrated_params_module_version=(
+            wf_module.cached_migrated_params_module_version
+        ),
+    )
+
+
 def get_migrated_params(wf_module: WfModule) -> Dict[str, Any]:
     """
     Read `wf_module.params`, calling migrate_params() or using cache fields.
@@ -13,6 +110,9 @@ def get_migrated_params(wf_module: WfModule) -> Dict[str, Any]:
     return the cached value. See `wf_module.cached_migrated_params`,
     `wf_module.cached_migrated_params_module_version`.
 
+    Otherwise, if this process migrated identical params for this version of
+    the module, return the result from `MEMO` without calling the kernel.
+
     Raise `ModuleError` if migration fails.
 
     Return `{}` if the module was deleted.
@@ -24,36 +124,69 @@ def get_migrated_params(wf_module: WfModule) -> Dict[str, Any]:
     if module_version is None:
         return {}
 
-    if module_version.source_version_hash == "develop":
-        stale = True
-    elif (
-        # works if cached version (and thus cached _result_) is None
-        module_version.param_schema_version
-        != wf_module.cached_migrated_params_module_version
-    ):
-        stale = True
-    else:
-        stale = False
-
-    if not stale:
+    if not _is_stale(wf_module, module_version):
         return wf_module.cached_migrated_params
     else:
-        loaded_module = LoadedModule.for_module_version(module_version)
-        if loaded_module:
+        memo_key = MEMO.key(module_version, wf_module.params)
+        params = MEMO.get(memo_key)
+        if params is None:
+            loaded_module = LoadedModule.for_module_version(module_version)
+            if not loaded_module:
+                return {}
             params = wf_module.params  # the user-supplied params
             params = loaded_module.migrate_params(params)  # raises ModuleError
-            wf_module.cached_migrated_params = params
-            wf_module.cached_migrated_params_module_version = (
-                module_version.param_schema_version
-            )
-            # Write to DB, like wf_module.save(fields=[...]), even if the
-            # WfModule was deleted in a race
-            WfModule.objects.filter(id=wf_module.id).update(
-                cached_migrated_params=wf_module.cached_migrated_params,
-                cached_migrated_params_module_version=(
-                    wf_module.cached_migrated_params_module_version
-                ),
-            )
-            return params
+            MEMO.set(memo_key, params)
+        _save_migrated_params(wf_module, module_version, params)
+        return params
+
+
+def prefetch_migrated_params(wf_modules: Iterable[WfModule]) -> None:
+    """
+    Migrate many WfModules' params, with one kernel call per module.
+
+    Call this within a `Workflow.cooperative_lock()`, before calling
+    `get_migrated_params()` on each of `wf_modules`. Stale params are migrated
+    in batches (one batch per module version) and cached -- in the database,
+    like `get_migrated_params()` does, and in `MEMO`. Then
+    `get_migrated_params()` won't need the kernel.
+
+    Never raise: on error, log and cache nothing. `get_migrated_params()` will
+    retry each WfModule individually, and raise its own errors.
+
+    "develop" modules are skipped: `get_migrated_params()` always migrates them.
+    """
+    # (id_name, source_version_hash) => (module_version, [(wf_module, key)]).
+    # Not pk: internal modules' ModuleVersions are never saved, so pk is None.
+    batches = {}
+    for wf_module in wf_modules:
+        module_version = wf_module.module_version
+        if (
+            module_version is None
+            or module_version.source_version_hash == "develop"
+            or not _is_stale(wf_module, module_version)
+        ):
+            continue
+        memo_key = MEMO.key(module_version, wf_module.params)
+        params = MEMO.get(memo_key)
+        if params is not None:
+            _save_migrated_params(wf_module, module_version, params)
         else:
-            return {}
+            batch_key = (module_version.id_name, module_version.source_version_hash)
+            batches.setdefault(batch_key, (module_version, []))[1].append(
+                (wf_module, memo_key)
+            )
+
+    for module_version, items in batches.values():
+        try:
+            loaded_module = LoadedModule.for_module_version(module_version)
+            if not loaded_module:
+                continue
+            results = loaded_module.migrate_params_batch(
+                [wf_module.params for wf_module, _ in items]
+            )  # raise ModuleError
+        except (ModuleError, FileNotFoundError):
+            # LoadedModule logged the error. get_migrated_params() will retry.
+            continue
+        for (wf_module, memo_key), params in zip(items, results):
+            MEMO.set(memo_key, params)
+            _save_migrated_params(wf_module, module_version, params)
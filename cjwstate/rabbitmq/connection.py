@@ -1,12 +1,13 @@
 import asyncio
+from collections import Counter
 from dataclasses import dataclass
 import functools
 import logging
 import pickle
-from typing import Any, Callable, Dict, Optional
+from typing import Any, Callable, Dict, List, Optional
 import types
 import aioamqp
-from aioamqp.exceptions import AmqpClosedConnection, PublishFailed
+from aioamqp.exceptions import AmqpClosedConnection, ChannelClosed, PublishFailed
 from django.conf import settings
 import msgpack
 from .. import clientside
@@ -36,6 +37,33 @@ class DeclaredQueueConsume:
     If `None`, just _declare_ the queue but never consume from it.
     """
 
+    concurrency: int = 1
+    """
+    Maximum number of messages to handle at once.
+
+    This is the consumer's RabbitMQ prefetch count: RabbitMQ delivers at most
+    this many un-acked messages. We enforce it in-process, too, so a callback
+    that acks early can't make us run more than this many callbacks at once.
+    """
+
+
+@dataclass(frozen=True)
+class QueueStats:
+    """
+    Snapshot of a consumed queue's workload.
+    """
+
+    name: str
+    concurrency: int
+    n_in_flight: int
+    """Number of callbacks running right now."""
+
+    n_waiting: int
+    """Number of delivered messages waiting for a callback to finish."""
+
+    n_queued: Optional[int]
+    """Number of messages RabbitMQ has not delivered, or None if unknown."""
+
 
 class RetryingConnection:
     """
@@ -44,8 +72,8 @@ class RetryingConnection:
     Usage:
 
         connection = RetryingConnection(url, 10, 1.5)
-        connection.declare_consume('render', 2, handle_render)
-        connection.declare_consume('fetch', 2, handle_fetch)
+        connection.declare_queue_consume('render', handle_render, concurrency=2)
+        connection.declare_queue_consume('fetch', handle_fetch, concurrency=2)
 
         await connection.connect_forever()
     """
@@ -57,11 +85,16 @@ class RetryingConnection:
         self.is_closed = False
         self._declared_queues = []
         self._closed_event = asyncio.Event()
+        self._channel = None
 
         # processing_messages: a set of running tasks, _outside_ of aioamqp.
         #
         # See _make_callback_not_block().
         self._processing_messages = set()
+        self._queue_slots: Dict[str, asyncio.Semaphore] = {}
+        self._n_in_flight = Counter()
+        self._n_waiting = Counter()
+        self._consumer_tags: List[str] = []
 
     async def connect(self) -> None:
         """
@@ -140,9 +173,9 @@ class RetryingConnection:
                 logger.exception("Unhandled exception from _attempt_connect()")
                 raise
 
-    def _make_callback_not_block(self, callback) -> Callable:
+    def _make_callback_not_block(self, queue: DeclaredQueueConsume) -> Callable:
         """
-        Make `callback` return right away and manage it in the event loop.
+        Make `queue.callback` return right away and manage it in the event loop.
 
         This is complex, so hold on.
 
@@ -157,12 +190,34 @@ class RetryingConnection:
         That's self._processing_messages: tasks running in the background. Each
         such task finishes by acking its message and deleting itself from the
         list.
+
+        At most `queue.concurrency` callbacks run at once. Other tasks wait
+        for a slot. (They're counted in `get_queue_stats()`.)
         """
         loop = asyncio.get_event_loop()
+        name = queue.name
+        callback = queue.callback
+        # Keep slots across reconnects: callbacks from before the reconnect
+        # may still be running.
+        slots = self._queue_slots.setdefault(name, asyncio.Semaphore(queue.concurrency))
+
+        async def run_in_slot(*args):
+            self._n_waiting[name] += 1
+            try:
+                await slots.acquire()
+            finally:
+                self._n_waiting[name] -= 1
+
+            self._n_in_flight[name] += 1
+            try:
+                await callback(*args)
+            finally:
+                self._n_in_flight[name] -= 1
+                slots.release()
 
         @functools.wraps(callback)
         async def inner(*args):
-            task = loop.create_task(callback(*args))
+            task = loop.create_task(run_in_slot(*args))
             self._processing_messages.add(task)
             task.add_done_callback(self._processing_messages.remove)
 
@@ -192,6 +247,7 @@ class RetryingConnection:
             await self._channel.queue_declare(queue.name, durable=True)
 
         logger.info("Starting RabbitMQ consumers")
+        self._consumer_tags = []
 
         # Start consuming `self._declared_queues`
         for queue in self._declared_queues:
@@ -203,12 +259,13 @@ class RetryingConnection:
             # actual channel. https://www.rabbitmq.com/consumer-prefetch.html
             #
             # leave prefetch_size at its default, 0: "no octet-size limit"
-            await self._channel.basic_qos(prefetch_count=1)
+            await self._channel.basic_qos(prefetch_count=queue.concurrency)
 
             # call (and await) `callback` for every message.
-            await self._channel.basic_consume(
-                self._make_callback_not_block(queue.callback), queue_name=queue.name
+            consume_result = await self._channel.basic_consume(
+                self._make_callback_not_block(queue), queue_name=queue.name
             )
+            self._consumer_tags.append(consume_result["consumer_tag"])
 
         # _declared_exchanges: exchanges we have declared since our most recent
         # successful connect.
@@ -221,7 +278,11 @@ class RetryingConnection:
 
     async def close(self) -> None:
         """
-        Close the connection.
+        Drain and close the connection.
+
+        Draining means: stop consuming, so RabbitMQ delivers no more messages;
+        then wait for every delivered message's callback to finish -- and ack
+        -- while the channel is still open.
 
         Currently, closing a connection means waiting for it to open first.
         """
@@ -233,24 +294,81 @@ class RetryingConnection:
         self.is_closed = True  # speed up self.connect() if it's waiting
 
         await self._connected
+        try:
+            for consumer_tag in self._consumer_tags:
+                await self._channel.basic_cancel(consumer_tag)
+        except (AmqpClosedConnection, ChannelClosed):
+            pass  # we can't ack any more; RabbitMQ will requeue
+        if self._processing_messages:
+            await asyncio.wait(self._processing_messages)
         try:
             await self._protocol.close()
         except aioamqp.exceptions.AmqpClosedConnection:
             pass
         await self._protocol.worker  # wait for connection to close entirely
-        if self._processing_messages:
-            await asyncio.wait(self._processing_messages)
         self._closed_event.set()  # we're finished closing.
 
-    def declare_queue_consume(self, queue: str, callback: Callable) -> None:
+    async def get_queue_stats(self) -> List[QueueStats]:
+        """
+        Describe the workload of each queue we consume.
+
+        `n_queued` comes from RabbitMQ. It is `None` if we aren't connected.
+        """
+        ret = []
+        for queue in self._declared_queues:
+            if queue.callback is None:
+                continue
+
+            n_queued = None
+            if self._channel is not None and self._channel.is_open:
+                try:
+                    declared = await self._channel.queue_declare(
+                        queue.name, durable=True, passive=True
+                    )
+                    n_queued = declared["message_count"]
+                except (AmqpClosedConnection, ChannelClosed):
+                    pass
+
+            ret.append(
+                QueueStats(
+                    queue.name,
+                    queue.concurrency,
+                    self._n_in_flight[queue.name],
+                    self._n_waiting[queue.name],
+                    n_queued,
+                )
+            )
+        return ret
+
+    async def log_queue_stats_forever(self, interval_s: float) -> None:
+        """
+        Log `get_queue_stats()` every `interval_s` seconds, until `close()`.
+        """
+        while not self.is_closed:
+            await asyncio.sleep(interval_s)
+            for stats in await self.get_queue_stats():
+                logger.info(
+                    "Queue %s: %d in flight, %d waiting, %s queued (concurrency %d)",
+                    stats.name,
+                    stats.n_in_flight,
+                    stats.n_waiting,
+                    "?" if stats.n_queued is None else str(stats.n_queued),
+                    stats.concurrency,
+                )
+
+    def declare_queue_consume(
+        self, queue: str, callback: Callable, *, concurrency: int = 1
+    ) -> None:
         """
         Declare a queue to be consumed after connect.
 
+        At most `concurrency` callbacks will run at once.
+
         Call this only during initialization. Do not call it after connect.
 
         (This is used on fetcher/renderer.)
         """
-        self._declared_queues.append(DeclaredQueueConsume(queue, callback))
+        self._declared_queues.append(DeclaredQueueConsume(queue, callback, concurrency))
 
     def declare_queue(self, queue: str) -> None:
         """
@@ -357,11 +475,11 @@ def get_connection(loop=None):
 
         def start():
             connection = RetryingConnection(url, 10, 1.5)
-            connection.declare_consume('render', 2, handle_render)
-            connection.declare_consume('fetch', 2, handle_fetch)
+            connection.declare_queue_consume('render', handle_render)
+            connection.declare_queue_consume('fetch', handle_fetch)
 
     ... `connection.connect_forever()` will be scheduled to run on the event
-    loop. Do not call `connection.declare_consume()` after connect.
+    loop. Do not call `connection.declare_queue_consume()` after connect.
 
     This function returns a different connection per event loop. This is used
     during unit tests, as each test starts up and destroys an event loop.
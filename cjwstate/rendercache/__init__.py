@@ -1,10 +1,14 @@
 from cjwstate.models.CachedRenderResult import CachedRenderResult
 from .io import (
     cache_render_result,
+    compute_column_stats,
     downloaded_parquet_file,
+    fingerprint_table,
     load_cached_render_result,
     open_cached_render_result,
     read_cached_render_result_slice_as_text,
+    read_cached_render_result_value_counts,
+    reuse_stale_cached_render_result,
     CorruptCacheError,
 )
 
@@ -12,8 +16,12 @@ __all__ = (
     "CachedRenderResult",
     "CorruptCacheError",
     "cache_render_result",
+    "compute_column_stats",
     "downloaded_parquet_file",
+    "fingerprint_table",
     "load_cached_render_result",
     "open_cached_render_result",
     "read_cached_render_result_slice_as_text",
+    "read_cached_render_result_value_counts",
+    "reuse_stale_cached_render_result",
 )
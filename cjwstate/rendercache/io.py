@@ -1,18 +1,59 @@
 import contextlib
+import dataclasses
+from functools import partial
+import hashlib
+import json
+import logging
 import math
 from pathlib import Path
-from typing import Any, ContextManager, Dict, List
+from typing import Any, ContextManager, Dict, List, Optional
+from django.conf import settings
+import numpy as np
 import pyarrow
 from cjwkernel import parquet
 from cjwkernel.types import ArrowTable, ColumnType, RenderResult, TableMetadata
 from cjwkernel.util import json_encode, tempfile_context
 from cjwstate import minio
 from cjwstate.models import WfModule, Workflow, CachedRenderResult
+from cjwstate.models.CachedRenderResult import ColumnStats
+from .localcache import LocalFileCache
+
+
+logger = logging.getLogger(__name__)
 
 
 BUCKET = minio.CachedRenderResultsBucket
 
 
+LOCAL_CACHE = LocalFileCache(
+    Path(settings.RENDER_CACHE_LOCAL_DIR), settings.RENDER_CACHE_LOCAL_MAX_BYTES
+)
+"""
+Copies of recently-read Parquet files, shared by all processes on this node.
+
+minio rewrites `delta-N.dat` when a delta is rendered again (e.g., after undo
+or a cache clear), perhaps on another node. So we key local copies by the
+cached result's fingerprint, too: see `_local_cache_key()`.
+"""
+
+
+PARQUET_PROFILE = dataclasses.replace(
+    parquet.PROFILE_V2, compression=settings.RENDER_CACHE_PARQUET_COMPRESSION
+)
+"""
+How we write cached render results: bounded row groups, so table-grid
+requests decode only the rows they show.
+"""
+
+
+MAX_N_STORED_VALUE_COUNTS = 1000
+"""
+Most distinct values a text column may have for us to store its value counts
+in the database. (Bigger counts go to a file; see
+`read_cached_render_result_value_counts()`.)
+"""
+
+
 WF_MODULE_FIELDS = [
     "cached_render_result_delta_id",
     "cached_render_result_errors",
@@ -20,6 +61,9 @@ WF_MODULE_FIELDS = [
     "cached_render_result_columns",
     "cached_render_result_status",
     "cached_render_result_nrows",
+    "cached_render_result_fingerprint",
+    "cached_render_result_input_fingerprint",
+    "cached_render_result_column_stats",
 ]
 
 
@@ -50,12 +94,90 @@ def crr_parquet_key(crr: CachedRenderResult) -> str:
     return parquet_key(crr.workflow_id, crr.wf_module_id, crr.delta_id)
 
 
+def value_counts_prefix(workflow_id: int, wf_module_id: int, delta_id: int) -> str:
+    """
+    "Directory" of JSON files with precomputed value counts, one per column.
+
+    It's beside the Parquet file, so `delete_parquet_files_for_wf_module()`
+    deletes it too.
+    """
+    return "%sdelta-%d-value-counts/" % (
+        parquet_prefix(workflow_id, wf_module_id),
+        delta_id,
+    )
+
+
+def crr_value_counts_key(crr: CachedRenderResult, column_index: int) -> str:
+    """
+    Path to a JSON file with precomputed value counts for one column.
+
+    The name includes the table's fingerprint: if we re-render the same delta
+    and get a different table, we must not read the old table's counts.
+    (Results cached before we stored fingerprints don't have one.)
+    """
+    prefix = value_counts_prefix(crr.workflow_id, crr.wf_module_id, crr.delta_id)
+    if crr.fingerprint is None:
+        return "%s%d.json" % (prefix, column_index)
+    return "%s%d-%s.json" % (prefix, column_index, crr.fingerprint)
+
+
+def _local_cache_key(crr: CachedRenderResult, key: str) -> Optional[str]:
+    """
+    Find the `LOCAL_CACHE` key for minio `key`, or None if we can't cache it.
+
+    The fingerprint changes whenever the data behind `key` changes. Results
+    cached before we stored fingerprints aren't cached locally.
+    """
+    if crr.fingerprint is None:
+        return None
+    return "%s@%s" % (key, crr.fingerprint)
+
+
+def fingerprint_table(table: ArrowTable) -> str:
+    """
+    Hash `table`'s columns (names, types and formats) and Arrow data.
+
+    Two tables with the same fingerprint are equal. (Two equal tables may have
+    different fingerprints, if they're chunked differently. That's rare: given
+    the same input, a module writes the same bytes.)
+
+    Zero-column tables all have the same fingerprint: steps after them never
+    read them.
+    """
+    sha1 = hashlib.sha1()
+    if table.metadata.columns:
+        # Column formats aren't in the Arrow file; they're metadata. A step
+        # that only changes formats (e.g., formatnumbers) changes the result.
+        columns = [column.to_dict() for column in table.metadata.columns]
+        sha1.update(json_encode(columns).encode("utf-8"))
+    if table.path is not None and table.metadata.columns:
+        with table.path.open("rb") as f:
+            for block in iter(lambda: f.read(1024 * 1024), b""):
+                sha1.update(block)
+    return sha1.hexdigest()
+
+
 def cache_render_result(
-    workflow: Workflow, wf_module: WfModule, delta_id: int, result: RenderResult
+    workflow: Workflow,
+    wf_module: WfModule,
+    delta_id: int,
+    result: RenderResult,
+    *,
+    input_fingerprint: Optional[str] = None,
+    fingerprint: Optional[str] = None,
+    column_stats: Optional[List[ColumnStats]] = None,
 ) -> None:
     """
     Save `result` for later viewing.
 
+    Store `fingerprint_table(result.table)` and `compute_column_stats()`
+    alongside, and `input_fingerprint` (the hash of what was passed to
+    render(), if the caller knows it).
+
+    Both `fingerprint_table()` and `compute_column_stats()` read the whole
+    table. Callers that hold a lock should compute them beforehand and pass
+    them as `fingerprint` and `column_stats`.
+
     Raise AssertionError if `delta_id` is not what we expect.
 
     Since this alters data, be sure to call it within a lock:
@@ -66,6 +188,10 @@ def cache_render_result(
     """
     assert delta_id == wf_module.last_relevant_delta_id
     assert result is not None
+    if fingerprint is None:
+        fingerprint = fingerprint_table(result.table)
+    if column_stats is None:
+        column_stats = compute_column_stats(result.table)
 
     json_bytes = json_encode(result.json).encode("utf-8")
     if not result.table.metadata.columns:
@@ -82,6 +208,9 @@ def cache_render_result(
     wf_module.cached_render_result_json = json_bytes
     wf_module.cached_render_result_columns = result.table.metadata.columns
     wf_module.cached_render_result_nrows = result.table.metadata.n_rows
+    wf_module.cached_render_result_fingerprint = fingerprint
+    wf_module.cached_render_result_input_fingerprint = input_fingerprint
+    wf_module.cached_render_result_column_stats = column_stats
 
     # Now we get to the part where things can end up inconsistent. Try to
     # err on the side of not-caching when that happens.
@@ -91,12 +220,63 @@ def cache_render_result(
     wf_module.save(update_fields=WF_MODULE_FIELDS)  # makes new cache inconsistent
     if result.table.metadata.columns:  # only write non-zero-column tables
         with tempfile_context() as parquet_path:
-            parquet.write(parquet_path, result.table.table)
+            parquet.write(parquet_path, result.table.table, PARQUET_PROFILE)
             minio.fput_file(
                 BUCKET, parquet_key(workflow.id, wf_module.id, delta_id), parquet_path
             )  # makes new cache consistent
 
 
+def reuse_stale_cached_render_result(
+    workflow: Workflow, wf_module: WfModule, delta_id: int
+) -> None:
+    """
+    Declare `wf_module`'s stale cached result to be its result for `delta_id`.
+
+    Call this when render() would reproduce the stale result -- that is, when
+    the result's `input_fingerprint` matches the input we'd render. It's far
+    cheaper than `cache_render_result()`: minio copies the Parquet file (and
+    any value-counts files) to their new keys without us downloading them.
+
+    Raise AssertionError if `delta_id` is not what we expect or there is no
+    stale result. Raise CorruptCacheError if the Parquet file is missing.
+
+    Since this alters data, be sure to call it within a lock, like
+    `cache_render_result()`.
+    """
+    assert delta_id == wf_module.last_relevant_delta_id
+    crr = wf_module.get_stale_cached_render_result()
+    assert crr is not None
+
+    if crr.table_metadata.columns:  # only non-zero-column tables are written
+        old_key = crr_parquet_key(crr)
+        try:
+            minio.copy(
+                BUCKET,
+                parquet_key(workflow.id, wf_module.id, delta_id),
+                "%(Bucket)s/%(Key)s" % {"Bucket": BUCKET, "Key": old_key},
+            )
+        except minio.error.NoSuchKey:
+            raise CorruptCacheError
+    else:
+        old_key = None
+
+    old_counts_prefix = value_counts_prefix(workflow.id, wf_module.id, crr.delta_id)
+    new_counts_prefix = value_counts_prefix(workflow.id, wf_module.id, delta_id)
+    for key in minio.list_file_keys(BUCKET, old_counts_prefix):
+        minio.copy(
+            BUCKET,
+            new_counts_prefix + key[len(old_counts_prefix) :],
+            "%(Bucket)s/%(Key)s" % {"Bucket": BUCKET, "Key": key},
+        )
+
+    wf_module.cached_render_result_delta_id = delta_id
+    wf_module.save(update_fields=["cached_render_result_delta_id"])
+
+    if old_key is not None:
+        minio.remove(BUCKET, old_key)
+    minio.remove_recursive(BUCKET, old_counts_prefix)
+
+
 @contextlib.contextmanager
 def downloaded_parquet_file(crr: CachedRenderResult, dir=None) -> ContextManager[Path]:
     """
@@ -105,6 +285,9 @@ def downloaded_parquet_file(crr: CachedRenderResult, dir=None) -> ContextManager
     This is cheaper than open_cached_render_result() because it does not parse
     the file. Use this function when you suspect you won't need the table data.
 
+    We only download from minio on `LOCAL_CACHE` miss. `path` is a private
+    copy either way: the caller may read it as long as it likes.
+
     Raise CorruptCacheError if the cached data is missing.
 
     Usage:
@@ -116,9 +299,14 @@ def downloaded_parquet_file(crr: CachedRenderResult, dir=None) -> ContextManager
             # file does not exist....
     """
     with contextlib.ExitStack() as ctx:
+        key = crr_parquet_key(crr)
         try:
             path = ctx.enter_context(
-                minio.temporarily_download(BUCKET, crr_parquet_key(crr), dir=dir)
+                LOCAL_CACHE.open(
+                    _local_cache_key(crr, key),
+                    partial(minio.download, BUCKET, key),
+                    dir=dir,
+                )
             )
         except FileNotFoundError:
             raise CorruptCacheError
@@ -126,10 +314,15 @@ def downloaded_parquet_file(crr: CachedRenderResult, dir=None) -> ContextManager
         yield path
 
 
-def load_cached_render_result(crr: CachedRenderResult, path: Path) -> RenderResult:
+def load_cached_render_result(
+    crr: CachedRenderResult, path: Path, *, only_columns: Optional[List[int]] = None
+) -> RenderResult:
     """
     Return a RenderResult equivalent to the one passed to `cache_render_result()`.
 
+    Pass `only_columns` (column indices) to load a table with just those
+    columns. We won't decode the rest of the Parquet file.
+
     Raise CorruptCacheError if the cached data does not match `crr`. That can
     mean:
 
@@ -143,7 +336,15 @@ def load_cached_render_result(crr: CachedRenderResult, path: Path) -> RenderResu
     supplied as `path`. It doesn't require much physical RAM: the Linux kernel
     may page out data we aren't using.
     """
-    if not crr.table_metadata.columns:
+    if only_columns is None:
+        table_metadata = crr.table_metadata
+    else:
+        table_metadata = TableMetadata(
+            crr.table_metadata.n_rows,
+            [crr.table_metadata.columns[i] for i in only_columns],
+        )
+
+    if not table_metadata.columns:
         # Zero-column tables aren't written to cache
         return RenderResult(
             ArrowTable.from_zero_column_metadata(
@@ -157,19 +358,27 @@ def load_cached_render_result(crr: CachedRenderResult, path: Path) -> RenderResu
     with downloaded_parquet_file(crr) as parquet_path:
         try:
             # raises ArrowIOError
-            parquet.convert_parquet_file_to_arrow_file(parquet_path, path)
-        except pyarrow.ArrowIOError as err:
+            parquet.convert_parquet_file_to_arrow_file(
+                parquet_path, path, only_columns=only_columns
+            )
+        except (pyarrow.ArrowIOError, ValueError) as err:
+            # ValueError: column out of range
             raise CorruptCacheError from err
     # TODO handle validation errors => CorruptCacheError
-    arrow_table = ArrowTable.from_trusted_file(path, crr.table_metadata)
+    arrow_table = ArrowTable.from_trusted_file(path, table_metadata)
     return RenderResult(arrow_table, crr.errors, crr.json)
 
 
 @contextlib.contextmanager
-def open_cached_render_result(crr: CachedRenderResult) -> ContextManager[RenderResult]:
+def open_cached_render_result(
+    crr: CachedRenderResult, *, only_columns: Optional[List[int]] = None
+) -> ContextManager[RenderResult]:
     """
     Yield a RenderResult equivalent to the one passed to `cache_render_result()`.
 
+    Pass `only_columns` (column indices) to load a table with just those
+    columns.
+
     Raise CorruptCacheError if the cached data does not match `crr`. That can
     mean:
 
@@ -195,7 +404,7 @@ def open_cached_render_result(crr: CachedRenderResult) -> ContextManager[RenderR
 
     with tempfile_context(prefix="cached-render-result") as arrow_path:
         # raise CorruptCacheError (deleting `arrow_path` in the process)
-        result = load_cached_render_result(crr, arrow_path)
+        result = load_cached_render_result(crr, arrow_path, only_columns=only_columns)
 
         yield result
 
@@ -204,7 +413,7 @@ def read_cached_render_result_slice_as_text(
     crr: CachedRenderResult, format: str, only_columns: range, only_rows: range
 ) -> str:
     """
-    Call `parquet-to-text-stream` and return its output.
+    Return a slice of the cached table as CSV or JSON text.
 
     Ignore out-of-range rows and columns.
 
@@ -220,10 +429,7 @@ def read_cached_render_result_slice_as_text(
     To limit the amount of text stored in RAM, use relatively small ranges for
     `only_columns` and `only_rows`.
 
-    This uses `parquet-to-text-stream` with `--row-range` and `--column-range`.
-    Read `parquet-to-text-stream` documentation to see how nulls and floats are
-    handled in your chosen format (`csv` or `json`). (In a nutshell: it's
-    mostly non-lossy, though CSV can't represent `null`.)
+    See `cjwkernel.parquet.read_slice_as_text()` for formatting details.
     """
     if not crr.table_metadata.columns:
         # Zero-column tables aren't written to cache
@@ -238,6 +444,176 @@ def read_cached_render_result_slice_as_text(
         raise CorruptCacheError
 
 
+def count_values(
+    chunked_array: pyarrow.ChunkedArray, max_n_values: Optional[int] = None
+) -> Optional[Dict[str, int]]:
+    """
+    Count each distinct non-null value in a text column.
+
+    Handle plain and dictionary-encoded text and any number of chunks. The
+    counting happens in NumPy: we only visit Python objects once per distinct
+    value per chunk.
+
+    Return `None` as soon as we find more than `max_n_values` distinct values
+    (if it is set): then we needn't build Python strings for all of them.
+    """
+    counts = {}
+    for chunk in chunked_array.chunks:
+        if not pyarrow.types.is_dictionary(chunk.type):
+            chunk = chunk.dictionary_encode()
+        if not len(chunk.dictionary):
+            continue  # all null
+        # to_pandas() gives float64 (with NaN) if there are nulls
+        indices = np.asarray(chunk.indices.to_pandas())
+        if chunk.null_count:
+            indices = indices[~np.isnan(indices)]
+        chunk_counts = np.bincount(
+            indices.astype(np.intp), minlength=len(chunk.dictionary)
+        )
+        if max_n_values is not None and np.count_nonzero(chunk_counts) > max_n_values:
+            return None
+        for value, count in zip(chunk.dictionary.to_pylist(), chunk_counts):
+            if count:
+                counts[value] = counts.get(value, 0) + int(count)
+        if max_n_values is not None and len(counts) > max_n_values:
+            return None
+    return counts
+
+
+def _finite_or_none(value: float) -> Optional[float]:
+    # JSON has no NaN or Infinity
+    return value if math.isfinite(value) else None
+
+
+def _compute_non_text_column_stats(chunked_array: pyarrow.ChunkedArray) -> ColumnStats:
+    """
+    Compute null count, min and max of a number or timestamp column, in NumPy.
+
+    We don't count distinct values: that means sorting or hashing, and nobody
+    needs the count badly enough to pay for it.
+    """
+    lo = hi = None
+    for chunk in chunked_array.chunks:
+        # to_pandas() gives float64 (with NaN) or datetime64 (with NaT) if
+        # there are nulls
+        values = np.asarray(chunk.to_pandas())
+        if values.dtype.kind == "M":
+            values = values[~np.isnat(values)]
+        elif values.dtype.kind == "f":
+            values = values[~np.isnan(values)]
+        if not len(values):
+            continue
+        chunk_lo, chunk_hi = values.min(), values.max()
+        lo = chunk_lo if lo is None else min(lo, chunk_lo)
+        hi = chunk_hi if hi is None else max(hi, chunk_hi)
+
+    if lo is None:
+        pass
+    elif pyarrow.types.is_timestamp(chunked_array.type):
+        lo, hi = (np.datetime_as_string(v) + "Z" for v in (lo, hi))
+    elif pyarrow.types.is_integer(chunked_array.type):
+        lo, hi = int(lo), int(hi)
+    else:
+        lo, hi = _finite_or_none(float(lo)), _finite_or_none(float(hi))
+    return ColumnStats(
+        n_nulls=chunked_array.null_count, n_distinct=None, min=lo, max=hi
+    )
+
+
+def compute_column_stats(table: ArrowTable) -> List[ColumnStats]:
+    """
+    Describe each column of `table`: null count, min and max.
+
+    For text columns with at most `MAX_N_STORED_VALUE_COUNTS` distinct values,
+    include value counts and the distinct count, too. We stop counting once a
+    column has more: then its `n_distinct`, `min` and `max` are `None`.
+
+    Each column is scanned once, in NumPy. This reads the whole table, so
+    don't call it while holding a lock.
+    """
+    if not table.metadata.columns:
+        return []
+
+    ret = []
+    for column, chunked_array in zip(table.metadata.columns, table.table.columns):
+        if isinstance(column.type, ColumnType.Text):
+            counts = count_values(chunked_array, MAX_N_STORED_VALUE_COUNTS)
+            if counts is None:
+                ret.append(
+                    ColumnStats(n_nulls=chunked_array.null_count, n_distinct=None)
+                )
+            else:
+                ret.append(
+                    ColumnStats(
+                        n_nulls=chunked_array.null_count,
+                        n_distinct=len(counts),
+                        min=min(counts, default=None),
+                        max=max(counts, default=None),
+                        value_counts=counts,
+                    )
+                )
+        else:
+            ret.append(_compute_non_text_column_stats(chunked_array))
+    return ret
+
+
+def _read_column_stats(crr: CachedRenderResult) -> Optional[List[ColumnStats]]:
+    """
+    Query `crr`'s column stats, which `WfModule.objects` does not load.
+
+    Return `None` if `crr` predates column stats or is no longer cached.
+    """
+    return (
+        WfModule.objects.filter(
+            id=crr.wf_module_id,
+            cached_render_result_delta_id=crr.delta_id,
+            cached_render_result_fingerprint=crr.fingerprint,
+        )
+        .values_list("cached_render_result_column_stats", flat=True)
+        .first()
+    )
+
+
+def read_cached_render_result_value_counts(
+    crr: CachedRenderResult, column_index: int
+) -> Dict[str, int]:
+    """
+    Count each distinct non-null value in a text column of the cached table.
+
+    The first call for a given column counts and stores the counts beside the
+    cached Parquet file. Subsequent calls read the stored counts. (A cached
+    render result never changes, so the counts never go stale.)
+
+    If `cache_render_result()` stored the counts in the WfModule's column
+    stats, return those without touching minio.
+
+    Raise CorruptCacheError if the cached data does not match `crr`.
+    """
+    column_stats = _read_column_stats(crr)
+    if column_stats is not None:
+        value_counts = column_stats[column_index].value_counts
+        if value_counts is not None:
+            return value_counts
+
+    key = crr_value_counts_key(crr, column_index)
+    try:
+        with LOCAL_CACHE.open(
+            _local_cache_key(crr, key), partial(minio.download, BUCKET, key)
+        ) as path:
+            return json.loads(path.read_bytes())
+    except FileNotFoundError:
+        pass  # we haven't counted yet
+    except ValueError:
+        logger.exception("Ignoring invalid value counts in %s", key)
+
+    # raise CorruptCacheError
+    with open_cached_render_result(crr, only_columns=[column_index]) as result:
+        counts = count_values(result.table.table.column(0))
+
+    minio.put_bytes(BUCKET, key, json_encode(counts).encode("utf-8"))
+    return counts
+
+
 def delete_parquet_files_for_wf_module(workflow_id: int, wf_module_id: int) -> None:
     """
     Delete all Parquet files cached for `wf_module`.
@@ -247,8 +623,14 @@ def delete_parquet_files_for_wf_module(workflow_id: int, wf_module_id: int) -> N
 
     This deletes from minio but not from the database. Beware -- this can leave
     the database in an inconsistent state.
+
+    This also deletes this node's `LOCAL_CACHE` copies, to free space. (Other
+    nodes' copies are keyed by fingerprint, so they can't be mistaken for a
+    new render of the same delta.)
     """
-    minio.remove_recursive(BUCKET, parquet_prefix(workflow_id, wf_module_id))
+    prefix = parquet_prefix(workflow_id, wf_module_id)
+    minio.remove_recursive(BUCKET, prefix)
+    LOCAL_CACHE.remove_prefix(prefix)
 
 
 def clear_cached_render_result_for_wf_module(wf_module: WfModule) -> None:
@@ -266,5 +648,8 @@ def clear_cached_render_result_for_wf_module(wf_module: WfModule) -> None:
     wf_module.cached_render_result_status = None
     wf_module.cached_render_result_columns = None
     wf_module.cached_render_result_nrows = None
+    wf_module.cached_render_result_fingerprint = None
+    wf_module.cached_render_result_input_fingerprint = None
+    wf_module.cached_render_result_column_stats = None
 
     wf_module.save(update_fields=WF_MODULE_FIELDS)
@@ -0,0 +1,234 @@
+import contextlib
+import errno
+import logging
+import os
+from pathlib import Path
+import shutil
+import threading
+from typing import Callable, ContextManager, List, Optional, Tuple
+from cjwkernel.util import create_tempfile, tempfile_context
+
+
+logger = logging.getLogger(__name__)
+
+
+class LocalFileCache:
+    """
+    Size-bounded, least-recently-used cache of immutable files on local disk.
+
+    Keys must be immutable: we assume the same key always points to the same
+    bytes. minio keys are _not_ immutable (e.g., "wf-1/wfm-2/delta-3.dat" is
+    rewritten after undo), so callers add a version (e.g., a fingerprint) to
+    the key. Pass `key=None` to bypass the cache.
+
+    Several processes may share `root` (e.g., web server, renderer and fetcher
+    on the same node). There is no lock file: we rely on POSIX semantics.
+
+    * Fills are atomic. We write to a tempfile in `root/tmp` and `rename()` it
+      into place, so readers never see a half-written entry. (Two processes
+      that miss the same key will both download; the last one wins. The
+      contents are identical anyway.)
+    * Readers never read an entry directly. They hard-link (or copy) it to a
+      private tempfile first, so eviction by another process can't delete a
+      file out from under them.
+    * Recency is the entry's mtime. Each hit bumps it.
+    * Each process tracks the cache's total size in memory, so it needn't scan
+      the whole tree on every store. It only scans when its estimate exceeds
+      `max_bytes` -- and then it evicts and re-syncs its estimate. Entries
+      other processes add are counted at that rescan.
+
+    `max_bytes=0` disables the cache: every call invokes `fill()`.
+    """
+
+    def __init__(self, root: Path, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.n_hits = 0
+        self.n_misses = 0
+        self.n_evictions = 0
+        self._total_bytes: Optional[int] = None  # None means, "scan to find out"
+
+    @property
+    def _entries_dir(self) -> Path:
+        return self.root / "entries"
+
+    @property
+    def _tmp_dir(self) -> Path:
+        return self.root / "tmp"
+
+    def _entry_path(self, key: str) -> Path:
+        if key.startswith("/") or ".." in key.split("/"):
+            raise ValueError("Invalid cache key %r" % key)
+        return self._entries_dir / key
+
+    @contextlib.contextmanager
+    def open(
+        self,
+        key: Optional[str],
+        fill: Callable[[Path], None],
+        dir: Optional[Path] = None,
+    ) -> ContextManager[Path]:
+        """
+        Yield a tempfile in `dir` holding `key`'s data; delete it on exit.
+
+        On cache miss, call `fill(path)` to write the data, then store a copy.
+        Exceptions from `fill()` propagate (and nothing is stored).
+
+        The yielded file belongs to the caller: eviction won't delete it.
+        """
+        with tempfile_context(prefix="local-cache-", dir=dir) as path:
+            if self.max_bytes <= 0 or key is None:
+                fill(path)
+            elif self._load(key, path, allow_link=(dir is None)):
+                self._count("n_hits")
+            else:
+                self._count("n_misses")
+                fill(path)
+                self._store(key, path)
+            yield path
+
+    def _count(self, attr: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, attr, getattr(self, attr) + n)
+
+    def _load(self, key: str, path: Path, *, allow_link: bool) -> bool:
+        """
+        Make `path` hold the contents of `key`; return False on cache miss.
+        """
+        entry = self._entry_path(key)
+        try:
+            _link_or_copy(entry, path, allow_link=allow_link)
+        except FileNotFoundError:
+            return False
+        with contextlib.suppress(FileNotFoundError):
+            os.utime(entry)  # mark as most-recently used
+        return True
+
+    def _store(self, key: str, path: Path) -> None:
+        """
+        Atomically add `path`'s contents as `key`; then evict old entries.
+
+        Errors are logged, not raised: a failure to cache isn't a failure to
+        read.
+        """
+        entry = self._entry_path(key)
+        try:
+            self._tmp_dir.mkdir(parents=True, exist_ok=True)
+            entry.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = create_tempfile(prefix="fill-", dir=self._tmp_dir)
+            try:
+                # `path` is private to our caller, so it can't be modified
+                # behind our back. But our caller may chmod it (e.g., to share
+                # it with a module). Never link: the entry must own its inode.
+                _link_or_copy(path, tmp_path, allow_link=False)
+                tmp_path.chmod(0o644)
+                size = tmp_path.stat().st_size
+                os.rename(tmp_path, entry)  # atomic
+            finally:
+                with contextlib.suppress(FileNotFoundError):
+                    tmp_path.unlink()
+        except OSError:
+            logger.exception("Failed to store %s in local cache", key)
+            return
+
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes += size
+        self._evict_if_needed()
+
+    def _list_entries(
+        self, dirpath: Optional[Path] = None
+    ) -> List[Tuple[float, int, Path]]:
+        """
+        List `(mtime, size, path)` for all entries (in `dirpath`, if set).
+
+        Entries may disappear as we scan (other processes evict them).
+        """
+        ret = []
+        stack = [dirpath or self._entries_dir]
+        while stack:
+            dirpath = stack.pop()
+            try:
+                with os.scandir(dirpath) as it:
+                    for dir_entry in it:
+                        try:
+                            if dir_entry.is_dir(follow_symlinks=False):
+                                stack.append(Path(dir_entry.path))
+                            else:
+                                stat = dir_entry.stat(follow_symlinks=False)
+                                ret.append(
+                                    (stat.st_mtime, stat.st_size, Path(dir_entry.path))
+                                )
+                        except FileNotFoundError:
+                            pass
+            except FileNotFoundError:
+                pass
+        return ret
+
+    def _evict_if_needed(self) -> None:
+        with self._lock:
+            if self._total_bytes is not None and self._total_bytes <= self.max_bytes:
+                return  # no need to scan
+
+        entries = self._list_entries()
+        total = sum(size for _, size, _ in entries)
+        n_evicted = 0
+        if total > self.max_bytes:
+            for _, size, path in sorted(entries):  # oldest first
+                with contextlib.suppress(FileNotFoundError):
+                    path.unlink()
+                    n_evicted += 1
+                total -= size
+                if total <= self.max_bytes:
+                    break
+        with self._lock:
+            self._total_bytes = total
+        self._count("n_evictions", n_evicted)
+
+    def remove_prefix(self, prefix: str) -> None:
+        """
+        Delete all entries whose keys start with `prefix`, which ends with "/".
+
+        Call this when the keys may be reused with different data.
+        """
+        if not prefix.endswith("/"):
+            raise ValueError("`prefix` must end with `/`")
+        dirpath = self._entry_path(prefix[:-1])
+        n_bytes = sum(size for _, size, _ in self._list_entries(dirpath))
+        with contextlib.suppress(FileNotFoundError):
+            shutil.rmtree(dirpath)
+        with self._lock:
+            if self._total_bytes is not None:
+                self._total_bytes = max(0, self._total_bytes - n_bytes)
+
+    def clear(self) -> None:
+        """
+        Delete all entries and reset counters.
+        """
+        with contextlib.suppress(FileNotFoundError):
+            shutil.rmtree(self._entries_dir)
+        with self._lock:
+            self.n_hits = 0
+            self.n_misses = 0
+            self.n_evictions = 0
+            self._total_bytes = 0
+
+
+def _link_or_copy(src: Path, dest: Path, *, allow_link: bool) -> None:
+    """
+    Overwrite `dest` with the contents of `src`.
+
+    Raise FileNotFoundError if `src` does not exist.
+    """
+    if allow_link:
+        try:
+            tmp_dest = dest.with_name(dest.name + ".link")
+            os.link(src, tmp_dest)
+            os.rename(tmp_dest, dest)
+            return
+        except OSError as err:
+            if err.errno not in (errno.EXDEV, errno.EPERM, errno.EMLINK):
+                raise
+            # fall through: different filesystems. Copy.
+    shutil.copyfile(src, dest)
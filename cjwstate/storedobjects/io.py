@@ -1,14 +1,16 @@
+import hashlib
 from pathlib import Path
 from typing import ContextManager, Optional
-import uuid
 from django.conf import settings
 from django.utils import timezone
 from cjwkernel.util import tempfile_context
 from cjwstate import minio
 from cjwstate.models import StoredObject, WfModule
+from cjwstate.models.StoredObject import SharedKeyPrefix, lock_shared_key
 
 
 BUCKET = minio.StoredObjectsBucket
+_BUFFER_SIZE = 1024 * 1024
 
 
 def downloaded_file(stored_object: StoredObject, dir=None) -> ContextManager[Path]:
@@ -36,9 +38,26 @@ def downloaded_file(stored_object: StoredObject, dir=None) -> ContextManager[Pat
         )
 
 
-def _build_key(workflow_id: int, wf_module_id: int) -> str:
-    """Build a helpful S3 key."""
-    return f"{workflow_id}/{wf_module_id}/{uuid.uuid1()}.dat"
+def hash_file(path: Path) -> str:
+    """
+    Return the hex SHA-256 of `path`'s contents.
+
+    Raise OSError if file read fails.
+    """
+    sha256 = hashlib.sha256()
+    buffer = bytearray(_BUFFER_SIZE)
+    view = memoryview(buffer)
+    with path.open("rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                return sha256.hexdigest()
+            sha256.update(view[:n])
+
+
+def _build_key(hash: str) -> str:
+    """Build a content-addressed S3 key."""
+    return f"{SharedKeyPrefix}{hash}.dat"
 
 
 def create_stored_object(
@@ -46,10 +65,16 @@ def create_stored_object(
     wf_module_id: int,
     path: Path,
     stored_at: Optional[timezone.datetime] = None,
+    *,
+    hash: Optional[str] = None,
 ) -> StoredObject:
     """
     Write and return a new StoredObject.
 
+    The file is stored by content: if another StoredObject (from any workflow)
+    has the same contents, the new StoredObject points to the same file and we
+    upload nothing. Pass `hash=hash_file(path)` if you already computed it.
+
     The caller should call enforce_storage_limits() after calling this.
 
     Raise IntegrityError if a database race prevents saving this. Raise a minio
@@ -58,17 +83,21 @@ def create_stored_object(
     """
     if stored_at is None:
         stored_at = timezone.now()
-    key = _build_key(workflow_id, wf_module_id)
+    if hash is None:
+        hash = hash_file(path)
+    key = _build_key(hash)
     size = path.stat().st_size
+    lock_shared_key(key)  # so nobody deletes the file before we reference it
     stored_object = StoredObject.objects.create(
         stored_at=stored_at,
         wf_module_id=wf_module_id,
         bucket=BUCKET,
         key=key,
         size=size,
-        hash="unhashed",
+        hash=hash,
     )
-    minio.fput_file(BUCKET, key, path)
+    if not minio.exists(BUCKET, key):
+        minio.fput_file(BUCKET, key, path)
     return stored_object
 
 
@@ -32,6 +32,39 @@ class StoredObjectTests(DbTestCase):
             minio.get_object_with_data(so2.bucket, so2.key)["Body"], b"12345"
         )
 
+    def test_duplicate_shared_key(self):
+        key = "sha256/" + "a" * 64 + ".dat"
+        minio.put_bytes(minio.StoredObjectsBucket, key, b"12345")
+        self.step2 = self.step1.tab.wf_modules.create(order=1, slug="step-2")
+        so1 = self.step1.stored_objects.create(
+            bucket=minio.StoredObjectsBucket, key=key, size=5, hash="a" * 64
+        )
+        so2 = so1.duplicate(self.step2)
+
+        # new StoredObject should reference the same file
+        self.assertEqual(so1.key, so2.key)
+        self.assertEqual(so1.hash, so2.hash)
+        so1.delete()
+        self.assertTrue(minio.exists(minio.StoredObjectsBucket, key))
+        so2.delete()
+        self.assertFalse(minio.exists(minio.StoredObjectsBucket, key))
+
+    def test_delete_workflow_deletes_shared_key_from_s3(self):
+        # Django deletes both StoredObjects at once. Only after that is the
+        # file unreferenced.
+        key = "sha256/" + "b" * 64 + ".dat"
+        minio.put_bytes(minio.StoredObjectsBucket, key, b"abcd")
+        workflow = Workflow.create_and_init()
+        tab = workflow.tabs.first()
+        wf_module1 = tab.wf_modules.create(order=0, slug="step-1")
+        wf_module2 = tab.wf_modules.create(order=1, slug="step-2")
+        for wf_module in (wf_module1, wf_module2):
+            wf_module.stored_objects.create(
+                size=4, bucket=minio.StoredObjectsBucket, key=key, hash="b" * 64
+            )
+        workflow.delete()
+        self.assertFalse(minio.exists(minio.StoredObjectsBucket, key))
+
     def test_delete_workflow_deletes_from_s3(self):
         minio.put_bytes(minio.StoredObjectsBucket, "test.dat", b"abcd")
         workflow = Workflow.create_and_init()
@@ -4,10 +4,11 @@ import uuid
 from django.contrib.auth.models import User
 from cjwstate import commands, minio
 from cjwstate.models import ModuleVersion
-from cjwstate.models.workflow import Workflow, DependencyGraph
+from cjwstate.models.workflow import DEPENDENCY_GRAPHS, Workflow, DependencyGraph
 from cjwstate.models.commands import (
     InitWorkflowCommand,
     AddModuleCommand,
+    AddTabCommand,
     ChangeWorkflowTitleCommand,
 )
 from cjwstate.modules.loaded_module import LoadedModule
@@ -304,3 +305,73 @@ class DependencyGraphTests(DbTestCase):
                 step3.id: DependencyGraph.Step(set()),
             },
         )
+
+    @patch.object(commands, "queue_render", async_noop)
+    @patch.object(commands, "websockets_notify", async_noop)
+    def test_load_cached_until_graph_changes(self):
+        workflow = Workflow.create_and_init()
+        graph1 = DependencyGraph.load_cached(workflow)
+        self.assertIs(DependencyGraph.load_cached(workflow), graph1)
+
+        # A Delta that changes the graph invalidates the cache
+        cmd = self.run_with_async_db(
+            commands.do(
+                AddTabCommand, workflow_id=workflow.id, slug="tab-2", name="Tab 2"
+            )
+        )
+        graph2 = DependencyGraph.load_cached(workflow)
+        self.assertEqual([tab.slug for tab in graph2.tabs], ["tab-1", "tab-2"])
+
+        # A Delta that can't change the graph keeps it
+        title_cmd = self.run_with_async_db(
+            commands.do(
+                ChangeWorkflowTitleCommand, workflow_id=workflow.id, new_value="X"
+            )
+        )
+        self.assertIs(DependencyGraph.load_cached(workflow), graph2)
+
+        # Undo restores the old state
+        self.run_with_async_db(commands.undo(title_cmd))
+        self.assertIs(DependencyGraph.load_cached(workflow), graph2)
+        self.run_with_async_db(commands.undo(cmd))
+        graph3 = DependencyGraph.load_cached(workflow)
+        self.assertEqual([tab.slug for tab in graph3.tabs], ["tab-1"])
+
+    @patch.object(commands, "queue_render", async_noop)
+    @patch.object(commands, "websockets_notify", async_noop)
+    def test_load_cached_after_clear_deltas_in_another_process(self):
+        workflow = Workflow.create_and_init()
+        DependencyGraph.load_cached(workflow)
+        # Another process cached the initial graph, keyed by the first Delta
+        other_process_entry = DEPENDENCY_GRAPHS._entries[workflow.id]
+
+        self.run_with_async_db(
+            commands.do(
+                AddTabCommand, workflow_id=workflow.id, slug="tab-2", name="Tab 2"
+            )
+        )
+        workflow.refresh_from_db()
+        workflow.clear_deltas()  # last_delta_id is the first Delta's again
+
+        DEPENDENCY_GRAPHS._entries[workflow.id] = other_process_entry
+        graph = DependencyGraph.load_cached(workflow)
+        self.assertEqual([tab.slug for tab in graph.tabs], ["tab-1", "tab-2"])
+
+    @patch.object(LoadedModule, "for_module_version", MockLoadedModule)
+    def test_load_cached_until_external_module_changes(self):
+        workflow = Workflow.create_and_init()
+        workflow.tabs.first().wf_modules.create(
+            order=0, slug="step-1", module_id_name="simple", params={"str": "A"}
+        )
+        spec = {
+            "id_name": "simple",
+            "name": "Simple",
+            "category": "Add data",
+            "parameters": [{"id_name": "str", "type": "string"}],
+        }
+        ModuleVersion.create_or_replace_from_spec(spec, source_version_hash="a")
+        graph1 = DependencyGraph.load_cached(workflow)
+        self.assertIs(DependencyGraph.load_cached(workflow), graph1)
+
+        ModuleVersion.create_or_replace_from_spec(spec, source_version_hash="b")
+        self.assertIsNot(DependencyGraph.load_cached(workflow), graph1)
@@ -1,4 +1,6 @@
+import dataclasses
 import datetime
+from unittest.mock import patch
 import numpy as np
 import pyarrow as pa
 from cjwkernel.tests.util import arrow_table, assert_render_result_equals
@@ -15,17 +17,24 @@ from cjwkernel.types import (
 from cjwkernel.tests.util import tempfile_context
 from cjwstate import minio
 from cjwstate.models import Workflow, WfModule
+from cjwstate.models.CachedRenderResult import ColumnStats
 from cjwstate.models.commands import InitWorkflowCommand
 from cjwstate.tests.utils import DbTestCase
 from cjwstate.rendercache.io import (
     BUCKET,
+    LOCAL_CACHE,
     CorruptCacheError,
     cache_render_result,
+    compute_column_stats,
+    count_values,
     load_cached_render_result,
     open_cached_render_result,
     clear_cached_render_result_for_wf_module,
     crr_parquet_key,
+    crr_value_counts_key,
     read_cached_render_result_slice_as_text,
+    read_cached_render_result_value_counts,
+    reuse_stale_cached_render_result,
 )
 
 
@@ -134,3 +143,192 @@ class RendercacheIoTests(DbTestCase):
             read_cached_render_result_slice_as_text(crr, "csv", range(2), range(3)),
             "A\n2037-08-18T13:03:32.341232967Z\n",
         )
+
+    def test_count_values_multiple_chunks(self):
+        self.assertEqual(
+            count_values(
+                pa.chunked_array(
+                    [
+                        pa.array(["a", None, "b", "a"]),
+                        pa.array(["b", "c", None]).dictionary_encode(),
+                        pa.array([None], pa.string()),
+                    ]
+                )
+            ),
+            {"a": 2, "b": 2, "c": 1},
+        )
+
+    def test_count_values_omit_unused_dictionary_values(self):
+        chunk = pa.DictionaryArray.from_arrays(
+            pa.array([0, 0, None], pa.int32()), pa.array(["a", "b"])
+        )
+        self.assertEqual(count_values(pa.chunked_array([chunk])), {"a": 2})
+
+    def test_count_values_max_n_values(self):
+        chunked_array = pa.chunked_array([pa.array(["a", "b"]), pa.array(["c"])])
+        self.assertEqual(count_values(chunked_array, 3), {"a": 1, "b": 1, "c": 1})
+        self.assertIsNone(count_values(chunked_array, 2))
+
+    def test_local_cache_ignores_rewrite_of_same_delta(self):
+        with patch.object(LOCAL_CACHE, "max_bytes", 10 * 1024 * 1024):
+            cache_render_result(
+                self.workflow,
+                self.wf_module,
+                self.delta.id,
+                RenderResult(arrow_table({"A": [1]})),
+            )
+            with open_cached_render_result(self.wf_module.cached_render_result):
+                pass  # fill LOCAL_CACHE
+
+            # Another node renders the same delta again. It can't evict our
+            # local copy.
+            with patch.object(LOCAL_CACHE, "remove_prefix"):
+                cache_render_result(
+                    self.workflow,
+                    self.wf_module,
+                    self.delta.id,
+                    RenderResult(arrow_table({"A": [2]})),
+                )
+            crr = self.wf_module.cached_render_result
+            with open_cached_render_result(crr) as result:
+                self.assertEqual(result.table.table["A"].to_pylist(), [2])
+
+    @patch("cjwstate.rendercache.io.MAX_N_STORED_VALUE_COUNTS", 1)
+    def test_read_cached_render_result_value_counts_is_persisted(self):
+        result = RenderResult(arrow_table({"A": [1, 2, 3], "B": ["x", "y", "x"]}))
+        cache_render_result(self.workflow, self.wf_module, self.delta.id, result)
+        crr = self.wf_module.cached_render_result
+        # Too many distinct values to store in the database
+        self.assertIsNone(
+            self.wf_module.cached_render_result_column_stats[1].value_counts
+        )
+        self.assertEqual(
+            read_cached_render_result_value_counts(crr, 1), {"x": 2, "y": 1}
+        )
+        # Second read doesn't need the table
+        minio.remove(BUCKET, crr_parquet_key(crr))
+        LOCAL_CACHE.clear()
+        self.assertEqual(
+            read_cached_render_result_value_counts(crr, 1), {"x": 2, "y": 1}
+        )
+
+    def test_crr_value_counts_key_depends_on_fingerprint(self):
+        result = RenderResult(arrow_table({"A": ["x"]}))
+        cache_render_result(self.workflow, self.wf_module, self.delta.id, result)
+        crr = self.wf_module.cached_render_result
+        # Same delta, different table: a re-render after the cache was wiped
+        crr2 = dataclasses.replace(crr, fingerprint="other")
+        self.assertNotEqual(crr_value_counts_key(crr, 0), crr_value_counts_key(crr2, 0))
+
+    def test_read_cached_render_result_value_counts_missing_file(self):
+        result = RenderResult(arrow_table({"A": ["x"]}))
+        cache_render_result(self.workflow, self.wf_module, self.delta.id, result)
+        # A result cached before we computed stats must read the table
+        WfModule.objects.filter(id=self.wf_module.id).update(
+            cached_render_result_column_stats=None
+        )
+        crr = self.wf_module.cached_render_result
+        minio.remove(BUCKET, crr_parquet_key(crr))
+        LOCAL_CACHE.clear()
+        with self.assertRaises(CorruptCacheError):
+            read_cached_render_result_value_counts(crr, 0)
+
+    def test_read_cached_render_result_value_counts_from_column_stats(self):
+        result = RenderResult(arrow_table({"A": ["x", "y", "x"]}))
+        cache_render_result(self.workflow, self.wf_module, self.delta.id, result)
+        crr = WfModule.objects.get(id=self.wf_module.id).cached_render_result
+        # Prove we don't read the table
+        minio.remove(BUCKET, crr_parquet_key(crr))
+        LOCAL_CACHE.clear()
+        self.assertEqual(
+            read_cached_render_result_value_counts(crr, 0), {"x": 2, "y": 1}
+        )
+
+    def test_reuse_stale_cached_render_result_moves_value_counts(self):
+        result = RenderResult(arrow_table({"A": ["x"]}))
+        cache_render_result(self.workflow, self.wf_module, self.delta.id, result)
+        old_key = crr_value_counts_key(self.wf_module.cached_render_result, 0)
+        minio.put_bytes(BUCKET, old_key, b'{"x": 1}')
+
+        delta2 = InitWorkflowCommand.create(self.workflow)
+        self.wf_module.last_relevant_delta_id = delta2.id
+        self.wf_module.save(update_fields=["last_relevant_delta_id"])
+        reuse_stale_cached_render_result(self.workflow, self.wf_module, delta2.id)
+
+        crr = self.wf_module.cached_render_result
+        self.assertEqual(crr.delta_id, delta2.id)
+        self.assertEqual(
+            minio.get_object_with_data(BUCKET, crr_value_counts_key(crr, 0))["Body"],
+            b'{"x": 1}',
+        )
+        self.assertFalse(minio.exists(BUCKET, old_key))
+
+    def test_cache_render_result_column_stats(self):
+        result = RenderResult(
+            arrow_table(
+                {
+                    "A": [3, None, 1, 3],
+                    "B": pa.array(
+                        [None, 1564704000000000000, None, 1564617600000000000],
+                        pa.timestamp("ns"),
+                    ),
+                    "C": pa.array(["b", None, "a", "b"]).dictionary_encode(),
+                    "D": [1.5, float("inf"), None, None],
+                }
+            )
+        )
+        cache_render_result(self.workflow, self.wf_module, self.delta.id, result)
+        wf_module = WfModule.objects.get(id=self.wf_module.id)
+        # Only the value-counts endpoint needs them: don't load them by default
+        self.assertIn(
+            "cached_render_result_column_stats", wf_module.get_deferred_fields()
+        )
+        self.assertEqual(
+            wf_module.cached_render_result_column_stats,
+            [
+                ColumnStats(n_nulls=1, n_distinct=None, min=1, max=3),
+                ColumnStats(
+                    n_nulls=2,
+                    n_distinct=None,
+                    min="2019-08-01T00:00:00.000000000Z",
+                    max="2019-08-02T00:00:00.000000000Z",
+                ),
+                ColumnStats(
+                    n_nulls=1,
+                    n_distinct=2,
+                    min="a",
+                    max="b",
+                    value_counts={"a": 1, "b": 2},
+                ),
+                ColumnStats(n_nulls=2, n_distinct=None, min=1.5, max=None),
+            ],
+        )
+
+    def test_compute_column_stats_all_null(self):
+        table = arrow_table(
+            {"A": pa.array([None], pa.float64()), "B": pa.array([None], pa.string())}
+        )
+        self.assertEqual(
+            compute_column_stats(table),
+            [
+                ColumnStats(n_nulls=1, n_distinct=None),
+                ColumnStats(n_nulls=1, n_distinct=0, value_counts={}),
+            ],
+        )
+
+    @patch("cjwstate.rendercache.io.MAX_N_STORED_VALUE_COUNTS", 2)
+    def test_compute_column_stats_stop_counting_many_values(self):
+        table = arrow_table({"A": ["a", "b", "c", None], "B": ["a", "b", "a", None]})
+        self.assertEqual(
+            compute_column_stats(table),
+            [
+                ColumnStats(n_nulls=1, n_distinct=None),
+                ColumnStats(
+                    n_nulls=1,
+                    n_distinct=2,
+                    min="a",
+                    max="b",
+                    value_counts={"a": 2, "b": 1},
+                ),
+            ],
+        )
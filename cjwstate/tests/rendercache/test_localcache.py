@@ -0,0 +1,124 @@
+import os
+from pathlib import Path
+import unittest
+from unittest.mock import patch
+from cjwkernel.util import tempdir_context
+from cjwstate.rendercache.localcache import LocalFileCache
+
+
+class LocalFileCacheTests(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self._tempdir_context = tempdir_context(prefix="test-local-cache-")
+        self.root = self._tempdir_context.__enter__()
+
+    def tearDown(self):
+        self._tempdir_context.__exit__(None, None, None)
+        super().tearDown()
+
+    def _read(self, cache, key, data=b"data"):
+        calls = []
+
+        def fill(path: Path):
+            calls.append(path)
+            path.write_bytes(data)
+
+        with cache.open(key, fill) as path:
+            return path.read_bytes(), len(calls)
+
+    def test_miss_then_hit(self):
+        cache = LocalFileCache(self.root, 1000)
+        self.assertEqual(self._read(cache, "wf-1/wfm-2/delta-3.dat"), (b"data", 1))
+        self.assertEqual(self._read(cache, "wf-1/wfm-2/delta-3.dat"), (b"data", 0))
+        self.assertEqual((cache.n_hits, cache.n_misses), (1, 1))
+
+    def test_delete_private_copy_on_exit(self):
+        cache = LocalFileCache(self.root, 1000)
+        with cache.open("a/b", lambda path: path.write_bytes(b"x")) as path:
+            pass
+        self.assertFalse(path.exists())
+        # ... but the cached copy survives
+        self.assertEqual(self._read(cache, "a/b"), (b"x", 0))
+
+    def test_fill_error_stores_nothing(self):
+        cache = LocalFileCache(self.root, 1000)
+
+        def fill(path):
+            raise FileNotFoundError
+
+        with self.assertRaises(FileNotFoundError):
+            with cache.open("a/b", fill):
+                pass
+        self.assertEqual(self._read(cache, "a/b"), (b"data", 1))
+
+    def test_private_copy_survives_eviction(self):
+        cache = LocalFileCache(self.root, 1000)
+        self._read(cache, "a/b")
+        with cache.open("a/b", lambda path: None) as path:
+            cache.clear()
+            self.assertEqual(path.read_bytes(), b"data")
+
+    def test_copy_to_dir(self):
+        cache = LocalFileCache(self.root, 1000)
+        self._read(cache, "a/b")
+        with tempdir_context() as dir:
+            with cache.open("a/b", lambda path: None, dir=dir) as path:
+                self.assertEqual(path.parent, dir)
+                self.assertEqual(path.read_bytes(), b"data")
+                # a copy, not a hard link: callers may chmod it
+                self.assertEqual(path.stat().st_nlink, 1)
+
+    def test_evict_least_recently_used(self):
+        cache = LocalFileCache(self.root, 10)
+        self._read(cache, "a/1", b"1234")
+        self._read(cache, "a/2", b"1234")
+        os.utime(self.root / "entries" / "a" / "1", (1, 1))  # make "1" oldest
+        os.utime(self.root / "entries" / "a" / "2", (2, 2))
+        self._read(cache, "a/3", b"1234")  # 12 bytes > 10
+        self.assertEqual(cache.n_evictions, 1)
+        self.assertEqual(self._read(cache, "a/2", b"1234"), (b"1234", 0))
+        self.assertEqual(self._read(cache, "a/1", b"1234"), (b"1234", 1))
+
+    def test_track_size_without_rescanning(self):
+        cache = LocalFileCache(self.root, 1000)
+        self._read(cache, "a/1")  # first store scans
+        with patch.object(cache, "_list_entries", wraps=cache._list_entries) as scan:
+            self._read(cache, "a/2")
+            self._read(cache, "a/3")
+            scan.assert_not_called()
+
+    def test_rescan_when_estimate_exceeds_max_bytes(self):
+        cache = LocalFileCache(self.root, 10)
+        self._read(cache, "a/1", b"1234")
+        # Another process fills the cache behind our back
+        (self.root / "entries" / "a" / "2").write_bytes(b"12345678")
+        os.utime(self.root / "entries" / "a" / "1", (1, 1))
+        os.utime(self.root / "entries" / "a" / "2", (2, 2))
+        self._read(cache, "a/3", b"1234")  # we estimate 8; it's 16 > 10
+        self._read(cache, "a/4", b"1234")  # we estimate 12; scan, evict
+        self.assertEqual(cache.n_evictions, 2)
+        self.assertEqual(self._read(cache, "a/4", b"1234"), (b"1234", 0))
+
+    def test_key_none_bypasses_cache(self):
+        cache = LocalFileCache(self.root, 1000)
+        self.assertEqual(self._read(cache, None), (b"data", 1))
+        self.assertEqual(self._read(cache, None), (b"data", 1))
+        self.assertEqual(cache.n_misses, 0)
+
+    def test_remove_prefix(self):
+        cache = LocalFileCache(self.root, 1000)
+        self._read(cache, "wf-1/wfm-2/delta-3.dat")
+        self._read(cache, "wf-1/wfm-3/delta-3.dat")
+        cache.remove_prefix("wf-1/wfm-2/")
+        self.assertEqual(self._read(cache, "wf-1/wfm-2/delta-3.dat")[1], 1)
+        self.assertEqual(self._read(cache, "wf-1/wfm-3/delta-3.dat")[1], 0)
+
+    def test_max_bytes_zero_disables_cache(self):
+        cache = LocalFileCache(self.root, 0)
+        self.assertEqual(self._read(cache, "a/b"), (b"data", 1))
+        self.assertEqual(self._read(cache, "a/b"), (b"data", 1))
+
+    def test_invalid_key(self):
+        cache = LocalFileCache(self.root, 1000)
+        with self.assertRaises(ValueError):
+            self._read(cache, "../a")
@@ -1,10 +1,67 @@
+import hashlib
+import unittest
 from django.test.utils import override_settings
+from cjwstate import minio
 from cjwstate.models import Workflow
-from cjwstate.storedobjects.io import create_stored_object, enforce_storage_limits
+from cjwstate.storedobjects.io import (
+    create_stored_object,
+    enforce_storage_limits,
+    hash_file,
+)
 from cjwstate.tests.utils import DbTestCase
 from cjwkernel.tests.util import tempfile_context
 
 
+class HashFileTests(unittest.TestCase):
+    def test_sha256(self):
+        with tempfile_context() as path:
+            path.write_bytes(b"abc123")
+            self.assertEqual(hash_file(path), hashlib.sha256(b"abc123").hexdigest())
+
+
+class CreateStoredObjectTests(DbTestCase):
+    def test_key_is_content_hash(self):
+        workflow = Workflow.create_and_init()
+        wf_module = workflow.tabs.first().wf_modules.create(order=1, module_id_name="x")
+
+        with tempfile_context() as path:
+            path.write_bytes(b"abc123")
+            so = create_stored_object(workflow.id, wf_module.id, path)
+
+        hash = hashlib.sha256(b"abc123").hexdigest()
+        self.assertEqual(so.hash, hash)
+        self.assertEqual(so.key, f"sha256/{hash}.dat")
+        self.assertEqual(so.size, 6)
+        self.assertEqual(
+            minio.get_object_with_data(so.bucket, so.key)["Body"], b"abc123"
+        )
+
+    def test_share_file_with_same_contents(self):
+        workflow1 = Workflow.create_and_init()
+        wf_module1 = workflow1.tabs.first().wf_modules.create(
+            order=1, module_id_name="x"
+        )
+        workflow2 = Workflow.create_and_init()
+        wf_module2 = workflow2.tabs.first().wf_modules.create(
+            order=1, module_id_name="x"
+        )
+
+        with tempfile_context() as path:
+            path.write_bytes(b"abc123")
+            so1 = create_stored_object(workflow1.id, wf_module1.id, path)
+            so2 = create_stored_object(workflow2.id, wf_module2.id, path)
+
+        self.assertNotEqual(so1.id, so2.id)
+        self.assertEqual(so1.key, so2.key)
+        so1.delete()
+        # so2 still references the file
+        self.assertEqual(
+            minio.get_object_with_data(so2.bucket, so2.key)["Body"], b"abc123"
+        )
+        so2.delete()
+        self.assertFalse(minio.exists(so2.bucket, so2.key))
+
+
 class EnforceStorageLimitsTests(DbTestCase):
     @override_settings(MAX_STORAGE_PER_MODULE=99999999)
     def test_common_case_no_op(self):
@@ -1,8 +1,9 @@
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 from cjwkernel.errors import ModuleError
 from cjwstate.models import ModuleVersion, Workflow
 from cjwstate.modules.loaded_module import LoadedModule
-from cjwstate.params import get_migrated_params
+from cjwstate.modules.module_loader import ModuleSpec
+from cjwstate.params import get_migrated_params, prefetch_migrated_params
 from cjwstate.tests.utils import DbTestCase
 
 
@@ -238,3 +239,132 @@ class GetMigratedParamsTest(DbTestCase):
         self.assertEqual(wf_module.cached_migrated_params, {"foo": "bar"})
         self.assertEqual(wf_module.cached_migrated_params_module_version, "abc123")
         # ... even though the WfModule does not exist in the database
+
+    @patch.object(LoadedModule, "for_module_version")
+    def test_memo_skips_kernel_for_same_params(self, load_module):
+        workflow = Workflow.create_and_init()
+        tab = workflow.tabs.first()
+        wf_module1 = tab.wf_modules.create(
+            order=0, slug="step-1", module_id_name="yay", params={"foo": "bar"}
+        )
+        wf_module2 = tab.wf_modules.create(
+            order=1, slug="step-2", module_id_name="yay", params={"foo": "bar"}
+        )
+        ModuleVersion.create_or_replace_from_spec(
+            {
+                "id_name": "yay",
+                "name": "Yay",
+                "category": "Clean",
+                "parameters": [{"id_name": "foo", "type": "string"}],
+            },
+            source_version_hash="abc123",
+        )
+
+        load_module.return_value.migrate_params.return_value = {"foo": "baz"}
+        self.assertEqual(get_migrated_params(wf_module1), {"foo": "baz"})
+        self.assertEqual(get_migrated_params(wf_module2), {"foo": "baz"})
+        load_module.return_value.migrate_params.assert_called_once()
+        wf_module2.refresh_from_db()
+        self.assertEqual(wf_module2.cached_migrated_params, {"foo": "baz"})
+
+    @patch.object(LoadedModule, "for_module_version")
+    def test_prefetch_batches_per_module(self, load_module):
+        workflow = Workflow.create_and_init()
+        tab = workflow.tabs.first()
+        wf_module1 = tab.wf_modules.create(
+            order=0, slug="step-1", module_id_name="yay", params={"foo": "a"}
+        )
+        wf_module2 = tab.wf_modules.create(
+            order=1, slug="step-2", module_id_name="yay", params={"foo": "b"}
+        )
+        ModuleVersion.create_or_replace_from_spec(
+            {
+                "id_name": "yay",
+                "name": "Yay",
+                "category": "Clean",
+                "parameters": [{"id_name": "foo", "type": "string"}],
+            },
+            source_version_hash="abc123",
+        )
+
+        load_module.return_value.migrate_params_batch.return_value = [
+            {"foo": "A"},
+            {"foo": "B"},
+        ]
+        prefetch_migrated_params([wf_module1, wf_module2])
+        load_module.return_value.migrate_params_batch.assert_called_once_with(
+            [{"foo": "a"}, {"foo": "b"}]
+        )
+        self.assertEqual(get_migrated_params(wf_module1), {"foo": "A"})
+        self.assertEqual(get_migrated_params(wf_module2), {"foo": "B"})
+        load_module.return_value.migrate_params.assert_not_called()
+
+    @patch.object(LoadedModule, "for_module_version")
+    def test_prefetch_error_leaves_get_migrated_params_to_retry(self, load_module):
+        workflow = Workflow.create_and_init()
+        wf_module = workflow.tabs.first().wf_modules.create(
+            order=0, module_id_name="yay", params={"foo": "a"}
+        )
+        ModuleVersion.create_or_replace_from_spec(
+            {
+                "id_name": "yay",
+                "name": "Yay",
+                "category": "Clean",
+                "parameters": [{"id_name": "foo", "type": "string"}],
+            },
+            source_version_hash="abc123",
+        )
+
+        load_module.return_value.migrate_params_batch.side_effect = ModuleError
+        prefetch_migrated_params([wf_module])  # does not raise
+        self.assertIsNone(wf_module.cached_migrated_params)
+
+        load_module.return_value.migrate_params.side_effect = ModuleError
+        with self.assertRaises(ModuleError):
+            get_migrated_params(wf_module)
+
+    def test_prefetch_batches_internal_modules_separately(self):
+        # Internal ModuleVersions are never saved: their pks are all None
+        internal = {
+            id_name: ModuleVersion(
+                id_name=id_name,
+                source_version_hash="internal",
+                spec=ModuleSpec(
+                    id_name,
+                    id_name.title(),
+                    "Clean",
+                    [{"id_name": "foo", "type": "string"}],
+                    parameters_version=version,
+                ),
+            )
+            for id_name, version in (("yay", 2), ("nay", 3))
+        }
+        workflow = Workflow.create_and_init()
+        tab = workflow.tabs.first()
+        wf_module1 = tab.wf_modules.create(
+            order=0, slug="step-1", module_id_name="yay", params={"foo": "a"}
+        )
+        wf_module2 = tab.wf_modules.create(
+            order=1, slug="step-2", module_id_name="nay", params={"foo": "b"}
+        )
+
+        loaded_modules = {"yay": MagicMock(), "nay": MagicMock()}
+        loaded_modules["yay"].migrate_params_batch.return_value = [{"foo": "A"}]
+        loaded_modules["nay"].migrate_params_batch.return_value = [{"foo": "B"}]
+        with patch.object(ModuleVersion.objects, "internal", internal), patch.object(
+            LoadedModule,
+            "for_module_version",
+            lambda module_version: loaded_modules[module_version.id_name],
+        ):
+            prefetch_migrated_params([wf_module1, wf_module2])
+
+        loaded_modules["yay"].migrate_params_batch.assert_called_once_with(
+            [{"foo": "a"}]
+        )
+        loaded_modules["nay"].migrate_params_batch.assert_called_once_with(
+            [{"foo": "b"}]
+        )
+        self.assertEqual(wf_module1.cached_migrated_params, {"foo": "A"})
+        self.assertEqual(wf_module1.cached_migrated_params_module_version, "v2")
+        self.assertEqual(wf_module2.cached_migrated_params, {"foo": "B"})
+        self.assertEqual(wf_module2.cached_migrated_params_module_version, "v3")
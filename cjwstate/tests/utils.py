@@ -4,7 +4,8 @@ from django.db import connection, connections
 from django.contrib.auth.models import User
 from django.test import SimpleTestCase
 from cjworkbench.sync import WorkbenchDatabaseSyncToAsync
-from cjwstate import minio
+from cjwstate import minio, params, rendercache
+from cjwstate.models.workflow import DEPENDENCY_GRAPHS
 
 # Connect to the database, on the main thread, and remember that connection
 main_thread_connections = {name: connections[name] for name in connections}
@@ -33,6 +34,8 @@ class DbTestCase(SimpleTestCase):
     def setUp(self):
         clear_db()
         clear_minio()
+        params.MEMO.clear()
+        DEPENDENCY_GRAPHS.clear()  # clear_db() may reuse Delta IDs
 
         # Set WorkbenchDatabaseSyncToAsync's executor on _all_ tests. This
         # supports testing sync functions that call async_to_sync().
@@ -141,3 +144,7 @@ def clear_minio():
 
     for bucket in buckets:
         minio.remove_recursive(bucket, "/", force=True)
+
+    # The local cache mirrors minio; tests that delete from minio expect
+    # reads to fail.
+    rendercache.io.LOCAL_CACHE.clear()
@@ -9,7 +9,7 @@ from typing import Any, ContextManager, Dict, Optional, Tuple
 from django.conf import settings
 from django.db import DatabaseError, InterfaceError
 from django.utils import timezone
-from cjwkernel.chroot import EDITABLE_CHROOT, ChrootContext
+from cjwkernel.chroot import EDITABLE_CHROOT_POOL, ChrootContext
 from cjwkernel.errors import ModuleError, format_for_user_debugging
 from cjwkernel.types import FetchResult, I18nMessage, Params, RenderError, TableMetadata
 from cjworkbench.sync import database_sync_to_async
@@ -20,7 +20,7 @@ from cjwstate.models import (
     WfModule,
     Workflow,
 )
-from cjwkernel.chroot import EDITABLE_CHROOT
+from cjwstate.models.StoredObject import is_shared_key
 from cjwstate.modules.loaded_module import LoadedModule
 from cjwstate import rendercache, storedobjects
 import fetcher.secrets
@@ -349,8 +349,10 @@ async def fetch(
     if now is None:
         now = timezone.now()
 
-    with contextlib.ExitStack() as ctx:
-        chroot_context = ctx.enter_context(EDITABLE_CHROOT.acquire_context())
+    async with contextlib.AsyncExitStack() as ctx:
+        chroot_context = await ctx.enter_async_context(
+            EDITABLE_CHROOT_POOL.acquire_context()
+        )
         basedir = ctx.enter_context(chroot_context.tempdir_context(prefix="fetch-"))
         output_path = ctx.enter_context(
             chroot_context.tempfile_context(prefix="fetch-result-", dir=basedir)
@@ -374,13 +376,23 @@ async def fetch(
         )
 
         try:
+            # Hash once: to compare with the last result and to key the new one
+            new_hash = await asyncio.get_event_loop().run_in_executor(
+                None, storedobjects.hash_file, result.path
+            )
+            if stored_object is not None and is_shared_key(stored_object.key):
+                old_hash = stored_object.hash
+            else:
+                old_hash = None  # legacy StoredObject: hash the file
             with crash_on_database_error():
                 if last_fetch_result is not None and versions.are_fetch_results_equal(
-                    last_fetch_result, result
+                    result, last_fetch_result, new_hash=new_hash, old_hash=old_hash
                 ):
                     await save.mark_result_unchanged(workflow_id, wf_module, now)
                 else:
-                    await save.create_result(workflow_id, wf_module, result, now)
+                    await save.create_result(
+                        workflow_id, wf_module, result, now, hash=new_hash
+                    )
         except asyncio.CancelledError:
             raise
         except Exception:
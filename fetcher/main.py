@@ -1,3 +1,5 @@
+import asyncio
+from django.conf import settings
 from cjwstate import rabbitmq
 from .fetch import handle_fetch
 
@@ -8,7 +10,13 @@ async def main_loop():
     """
     connection = rabbitmq.get_connection()
     connection.declare_queue_consume(
-        rabbitmq.Fetch, rabbitmq.acking_callback(handle_fetch)
+        rabbitmq.Fetch,
+        rabbitmq.acking_callback(handle_fetch),
+        concurrency=settings.FETCHER_CONCURRENCY,
+    )
+    log_stats = asyncio.ensure_future(
+        connection.log_queue_stats_forever(settings.RABBITMQ_STATS_INTERVAL)
     )
     # Run forever
     await connection._closed_event.wait()
+    log_stats.cancel()
@@ -88,3 +88,28 @@ class DiffTest(unittest.TestCase):
                 FetchResult(self.old_path), FetchResult(self.new_path)
             )
         )
+
+    def test_hashes_same(self):
+        # Trust the caller's hashes: don't read the files
+        self.old_path.write_bytes(b"abc")
+        self.new_path.write_bytes(b"def")
+        self.assertTrue(
+            are_fetch_results_equal(
+                FetchResult(self.old_path),
+                FetchResult(self.new_path),
+                old_hash="a" * 64,
+                new_hash="a" * 64,
+            )
+        )
+
+    def test_hashes_different(self):
+        self.old_path.write_bytes(b"abc")
+        self.new_path.write_bytes(b"abc")
+        self.assertFalse(
+            are_fetch_results_equal(
+                FetchResult(self.old_path),
+                FetchResult(self.new_path),
+                old_hash="a" * 64,
+                new_hash="b" * 64,
+            )
+        )
@@ -1,38 +1,19 @@
-import errno
-import io
-from pathlib import Path
+from typing import Optional
 from cjwkernel import parquet
 from cjwkernel.types import FetchResult
-
-
-_BUFFER_SIZE = 1024 * 1024
+from cjwstate import storedobjects
 
 
 _is_parquet_path = parquet.file_has_parquet_magic_number
 
 
-def _are_file_contents_equal(path1: Path, path2: Path) -> bool:
-    """
-    Return whether both paths are byte-for-byte equal.
-
-    Raise OSError if file read fails
-    """
-    # Don't use `filecmp`: it has a _cache global variable; and the underlying
-    # loop is simple enough to transcribe.
-    buffer1 = bytearray(_BUFFER_SIZE)
-    buffer2 = bytearray(_BUFFER_SIZE)
-    with path1.open("rb", buffering=_BUFFER_SIZE) as f1:
-        with path2.open("rb", buffering=_BUFFER_SIZE) as f2:
-            while True:
-                n1 = f1.readinto(buffer1)
-                n2 = f2.readinto(buffer2)
-                if n1 != n2 or buffer1[:n1] != buffer2[:n2]:
-                    return False
-                if not n1:
-                    return True
-
-
-def are_fetch_results_equal(new_result: FetchResult, old_result: FetchResult) -> bool:
+def are_fetch_results_equal(
+    new_result: FetchResult,
+    old_result: FetchResult,
+    *,
+    new_hash: Optional[str] = None,
+    old_hash: Optional[str] = None,
+) -> bool:
     """
     Determine whether `new_result` is worth saving in the database.
 
@@ -64,16 +45,26 @@ def are_fetch_results_equal(new_result: FetchResult, old_result: FetchResult) ->
     Heuristics:
 
         1. If errors are different, the results are different.
-        2. If the render result is a Parquet file (legacy fetch retval),
+        2. If the files' SHA-256 hashes are equal, the results are equal.
+           (Pass `new_hash` and `old_hash` if you know them: the old hash is
+           in the database and the new hash is the new StoredObject's key.)
+        3. If the render result is a Parquet file (legacy fetch retval),
            compare schemas and values in the two Parquet files; return the
-           result.
-        3. Otherwise, compare file contents of the two files on disk; return
-           the result.
+           result. (Two Parquet files can hold the same table in different
+           bytes.)
+        4. Otherwise, the results are different.
     """
     if new_result.errors != old_result.errors:
         return False
 
+    if new_hash is None:
+        new_hash = storedobjects.hash_file(new_result.path)
+    if old_hash is None:
+        old_hash = storedobjects.hash_file(old_result.path)
+    if new_hash == old_hash:
+        return True
+
     if _is_parquet_path(old_result.path) and _is_parquet_path(new_result.path):
         return parquet.are_files_equal(old_result.path, new_result.path)
     else:
-        return _are_file_contents_equal(old_result.path, new_result.path)
+        return False
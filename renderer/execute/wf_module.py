@@ -3,12 +3,15 @@ from collections import namedtuple
 import contextlib
 import datetime
 from functools import partial
+import hashlib
+import json
 import logging
 from pathlib import Path
 from typing import Any, Dict, Optional, Tuple
 from cjworkbench.sync import database_sync_to_async
 from cjwkernel.chroot import ChrootContext
 from cjwkernel.errors import ModuleError, format_for_user_debugging
+from cjwkernel.param_dtype import ParamDType
 from cjwkernel.types import (
     ArrowTable,
     FetchResult,
@@ -19,7 +22,8 @@ from cjwkernel.types import (
 )
 from cjwkernel.util import tempfile_context
 from cjwstate import clientside, minio, rabbitmq, rendercache
-from cjwstate.models import StoredObject, WfModule, Workflow
+from cjwstate.models import CachedRenderResult, StoredObject, WfModule, Workflow
+from cjwstate.modules import staticregistry
 from cjwstate.modules.loaded_module import LoadedModule
 from renderer import notifications
 from .types import (
@@ -162,9 +166,9 @@ def _execute_wfmodule_pre(
     Raise PromptingError if the module parameters are invalid. (We'll skip
     render() and prompt the user with quickfixes in that case.)
 
-    All this runs synchronously within a database lock. (It's a separate
-    function so that when we're done awaiting it, we can continue executing in
-    a context that doesn't use a database thread.)
+    All this runs synchronously; the save runs within a database lock. (It's a
+    separate function so that when we're done awaiting it, we can continue
+    executing in a context that doesn't use a database thread.)
 
     `tab_results.keys()` must be ordered as the Workflow's tabs are.
     """
@@ -192,19 +196,162 @@ def _execute_wfmodule_pre(
         return (loaded_module, fetch_result, params)
 
 
+def _render_input_fingerprint(
+    safe_wf_module: WfModule, raw_params: Dict[str, Any], tab: Tab
+) -> Optional[str]:
+    """
+    Hash everything that determines the output of `safe_wf_module.render()`.
+
+    That's the previous step's output (data and column formats), the params,
+    the module version, the fetched data and the tab. Internal modules' version
+    is always "internal", so we hash their code, too: a deploy that changes a
+    module invalidates its cached results.
+
+    Return `None` if we can't vouch for the hash: when the module is deleted
+    or in development, when the params refer to other tabs (we don't
+    fingerprint tabs), or when the previous step's output is not cached.
+
+    Call this within a `workflow.cooperative_lock()`.
+    """
+    module_version = safe_wf_module.module_version
+    if module_version is None or module_version.source_version_hash == "develop":
+        return None
+
+    if module_version.param_schema.find_leaf_values_with_dtype(
+        ParamDType.Tab, raw_params
+    ):
+        return None
+
+    if safe_wf_module.order == 0:
+        input_table_fingerprint = ""
+        input_columns = []
+    else:
+        try:
+            prev_wf_module = safe_wf_module.tab.live_wf_modules.get(
+                order=safe_wf_module.order - 1
+            )
+        except WfModule.DoesNotExist:
+            return None
+        prev_crr = prev_wf_module.cached_render_result
+        if prev_crr is None or prev_crr.fingerprint is None:
+            return None
+        input_table_fingerprint = prev_crr.fingerprint
+        # Formats aren't in the table data. (Newer fingerprints include them;
+        # older ones don't.)
+        input_columns = [c.to_dict() for c in prev_crr.table_metadata.columns]
+
+    render_input = {
+        "input_table": input_table_fingerprint,
+        "input_columns": input_columns,
+        "module": [
+            module_version.id_name,
+            module_version.source_version_hash,
+            module_version.param_schema_version,
+            staticregistry.SourceHashes.get(module_version.id_name),
+        ],
+        "params": raw_params,
+        "stored_data_version": (
+            None
+            if safe_wf_module.stored_data_version is None
+            else safe_wf_module.stored_data_version.isoformat()
+        ),
+        "fetch_error": safe_wf_module.fetch_error,
+        "tab": [tab.slug, tab.name],
+    }
+    json_bytes = json.dumps(render_input, sort_keys=True).encode("utf-8")
+    return hashlib.sha1(json_bytes).hexdigest()
+
+
+@database_sync_to_async
+def _execute_wfmodule_reuse(
+    workflow: Workflow,
+    wf_module: WfModule,
+    raw_params: Dict[str, Any],
+    tab: Tab,
+    output_path: Path,
+) -> Tuple[Optional[str], Optional[Tuple[RenderResult, CachedRenderResult]]]:
+    """
+    Skip render() if it would reproduce `wf_module`'s stale cached result.
+
+    Return `(input_fingerprint, reused)`. `reused` is `None` if we must
+    render; otherwise it's `(result, cached_render_result)`, and the stale
+    result is now fresh and `result` is backed by `output_path`.
+
+    This is how we skip rendering steps after a step whose output did not
+    change: the unchanged output has the same fingerprint as before, so the
+    next step's input fingerprint matches its stale result's.
+
+    Raise UnneededExecution if the WfModule has changed in the interim.
+    """
+    # raises UnneededExecution
+    with locked_wf_module(workflow, wf_module) as safe_wf_module:
+        input_fingerprint = _render_input_fingerprint(safe_wf_module, raw_params, tab)
+        if input_fingerprint is None:
+            return (None, None)
+
+        stale_crr = safe_wf_module.get_stale_cached_render_result()
+        if stale_crr is None or stale_crr.input_fingerprint != input_fingerprint:
+            return (input_fingerprint, None)
+
+    # Read the whole table without locking: other writers may be waiting
+    try:
+        # raise CorruptCacheError
+        result = rendercache.load_cached_render_result(stale_crr, output_path)
+    except rendercache.CorruptCacheError:
+        logger.exception(
+            "Re-rendering to recover from corrupt cache in wf-%d/wfm-%d",
+            workflow.id,
+            wf_module.id,
+        )
+        return (input_fingerprint, None)
+
+    # raises UnneededExecution
+    with locked_wf_module(workflow, wf_module) as safe_wf_module:
+        # Another writer may have cached a result while we were reading
+        locked_crr = safe_wf_module.get_stale_cached_render_result()
+        if (
+            locked_crr is None
+            or locked_crr.delta_id != stale_crr.delta_id
+            or locked_crr.input_fingerprint != stale_crr.input_fingerprint
+        ):
+            return (input_fingerprint, None)
+
+        try:
+            # raise CorruptCacheError
+            rendercache.reuse_stale_cached_render_result(
+                workflow, safe_wf_module, safe_wf_module.last_relevant_delta_id
+            )
+        except rendercache.CorruptCacheError:
+            logger.exception(
+                "Re-rendering to recover from corrupt cache in wf-%d/wfm-%d",
+                workflow.id,
+                wf_module.id,
+            )
+            return (input_fingerprint, None)
+
+        return (input_fingerprint, (result, safe_wf_module.cached_render_result))
+
+
 @database_sync_to_async
 def _execute_wfmodule_save(
-    workflow: Workflow, wf_module: WfModule, result: RenderResult
+    workflow: Workflow,
+    wf_module: WfModule,
+    result: RenderResult,
+    input_fingerprint: Optional[str],
 ) -> SaveResult:
     """
     Call rendercache.cache_render_result() and build notifications.OutputDelta.
 
-    All this runs synchronously within a database lock. (It's a separate
-    function so that when we're done awaiting it, we can continue executing in
-    a context that doesn't use a database thread.)
+    All this runs synchronously; the save runs within a database lock. (It's a
+    separate function so that when we're done awaiting it, we can continue
+    executing in a context that doesn't use a database thread.)
 
     Raise UnneededExecution if the WfModule has changed in the interim.
     """
+    # Read the whole table before locking: other writers may be waiting
+    fingerprint = rendercache.fingerprint_table(result.table)
+    column_stats = rendercache.compute_column_stats(result.table)
+
     # raises UnneededExecution
     with locked_wf_module(workflow, wf_module) as safe_wf_module:
         if safe_wf_module.notifications:
@@ -231,7 +378,13 @@ def _execute_wfmodule_save(
             stale_result = None
 
         rendercache.cache_render_result(
-            workflow, safe_wf_module, wf_module.last_relevant_delta_id, result
+            workflow,
+            safe_wf_module,
+            wf_module.last_relevant_delta_id,
+            result,
+            input_fingerprint=input_fingerprint,
+            fingerprint=fingerprint,
+            column_stats=column_stats,
         )
 
         if (
@@ -357,10 +510,23 @@ async def execute_wfmodule(
     * When a user changes a workflow significantly, all prior renders will end
       relatively cheaply.
 
+    If render() would be given exactly the same input as it was given for the
+    stale cached result, we skip render() and mark the stale result fresh.
+    (This makes steps after an unchanged step cheap.)
+
     Raises `UnneededExecution` when the input WfModule should not be rendered.
     """
-    # delta_id won't change throughout this function
-    delta_id = wf_module.last_relevant_delta_id
+    # may raise UnneededExecution
+    input_fingerprint, reused = await _execute_wfmodule_reuse(
+        workflow, wf_module, params, tab, output_path
+    )
+    if reused is not None:
+        result, crr = reused
+        update = clientside.Update(
+            steps={wf_module.id: clientside.StepUpdate(render_result=crr)}
+        )
+        await rabbitmq.send_update_to_workflow_clients(workflow.id, update)
+        return result
 
     # may raise UnneededExecution
     result = await _render_wfmodule(
@@ -375,7 +541,9 @@ async def execute_wfmodule(
     )
 
     # may raise UnneededExecution
-    crr, output_delta = await _execute_wfmodule_save(workflow, wf_module, result)
+    crr, output_delta = await _execute_wfmodule_save(
+        workflow, wf_module, result, input_fingerprint
+    )
 
     update = clientside.Update(
         steps={wf_module.id: clientside.StepUpdate(render_result=crr)}
@@ -394,7 +562,4 @@ async def execute_wfmodule(
             datetime.datetime.now(),
         )
 
-    # TODO if there's no change, is it possible for us to skip the render
-    # of future modules, setting their cached_render_result_delta_id =
-    # last_relevant_delta_id?  Investigate whether this is worthwhile.
     return result
@@ -1,12 +1,14 @@
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional, Tuple
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+from django.conf import settings
 from cjworkbench.sync import database_sync_to_async
-from cjwkernel.chroot import EDITABLE_CHROOT
+from cjwkernel.chroot import EDITABLE_CHROOT_POOL
 from cjwkernel.errors import ModuleError
 from cjwkernel.param_dtype import ParamDType
 from cjwkernel.types import RenderResult, Tab
 from cjwstate.models import WfModule, Workflow
-from cjwstate.params import get_migrated_params
+from cjwstate.params import get_migrated_params, prefetch_migrated_params
 from .tab import ExecuteStep, TabFlow, execute_tab_flow
 from .types import UnneededExecution
 
@@ -69,7 +71,16 @@ def _load_tab_flows(workflow: Workflow, delta_id: int) -> List[TabFlow]:
         if workflow.last_delta_id != delta_id:
             raise UnneededExecution
 
-        for tab_model in workflow.live_tabs.all():
+        tab_models_and_steps = [
+            (tab_model, list(tab_model.live_wf_modules.all()))
+            for tab_model in workflow.live_tabs.all()
+        ]
+        # One kernel call per module, not per step
+        prefetch_migrated_params(
+            step for _, steps in tab_models_and_steps for step in steps
+        )
+
+        for tab_model, tab_steps in tab_models_and_steps:
             steps = [
                 ExecuteStep(
                     step,
@@ -84,7 +95,7 @@ def _load_tab_flows(workflow: Workflow, delta_id: int) -> List[TabFlow]:
                     # render()).
                     _get_migrated_params(step),
                 )
-                for step in tab_model.live_wf_modules.all()
+                for step in tab_steps
             ]
             ret.append(TabFlow(Tab(tab_model.slug, tab_model.name), steps))
     return ret
@@ -118,16 +129,81 @@ def partition_ready_and_dependent(
     return (ready, dependent)
 
 
-async def execute_workflow(workflow: Workflow, delta_id: int) -> None:
+async def execute_tab_flows_in_dependency_order(
+    flows: List[TabFlow],
+    execute: Callable[[TabFlow], Awaitable[Any]],
+    max_concurrency: int,
+) -> List[TabFlow]:
+    """
+    Await `execute(flow)` for each ready flow, up to `max_concurrency` at once.
+
+    A flow becomes ready the moment the last flow it depends on finishes. (We
+    don't wait for other flows that happen to be running at the same time.)
+    Flows start in the order given, so the user's tab order breaks ties.
+
+    Return the flows we never executed because they have cycles. The caller
+    should execute them last, so they can detect their cycles.
+
+    If any `execute()` raises, start no more flows; wait for already-running
+    flows to finish (so they don't outlive the caller's temporary files) and
+    then re-raise the first exception.
+    """
+    pending = list(flows)
+    running: Dict[asyncio.Future, TabFlow] = {}
+    error: Optional[BaseException] = None
+
+    while True:
+        if error is None and len(running) < max_concurrency:
+            # "Unfinished" flows are pending and running flows: a pending
+            # flow that depends on a running flow isn't ready.
+            ready, _ = partition_ready_and_dependent(pending + list(running.values()))
+            running_ids = frozenset(id(flow) for flow in running.values())
+            for flow in ready:
+                if len(running) >= max_concurrency:
+                    break
+                if id(flow) in running_ids:
+                    continue
+                pending = [f for f in pending if f is not flow]
+                running[asyncio.ensure_future(execute(flow))] = flow
+
+        if not running:
+            break
+
+        done, _ = await asyncio.wait(
+            running.keys(), return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in done:
+            del running[task]
+            try:
+                task.result()
+            except Exception as err:
+                if error is None:
+                    error = err
+
+    if error is not None:
+        raise error
+
+    return pending
+
+
+async def execute_workflow(
+    workflow: Workflow, delta_id: int, *, max_concurrent_tabs: Optional[int] = None
+) -> None:
     """
     Ensure all `workflow.tabs[*].live_wf_modules` cache fresh render results.
 
     Raise UnneededExecution if the inputs become stale (at which point we don't
     care about results any more).
 
-    WEBSOCKET NOTES: each wf_module is executed in turn. After each execution,
-    we notify clients of its new columns and status.
+    Up to `max_concurrent_tabs` tabs render at the same time (default
+    `settings.RENDER_MAX_CONCURRENT_TABS`).
+
+    WEBSOCKET NOTES: within a tab, each wf_module is executed in turn. After
+    each execution, we notify clients of its new columns and status.
     """
+    if max_concurrent_tabs is None:
+        max_concurrent_tabs = settings.RENDER_MAX_CONCURRENT_TABS
+
     # raises UnneededExecution
     pending_tab_flows = await _load_tab_flows(workflow, delta_id)
 
@@ -144,13 +220,19 @@ async def execute_workflow(workflow: Workflow, delta_id: int) -> None:
     }
     output_paths = []
 
-    # Execute one tab_flow at a time.
+    # Execute tab_flows concurrently, each as soon as its inputs are ready.
     #
     # We don't hold a DB lock throughout the loop: the loop can take a long
     # time; it might be run multiple times simultaneously (even on different
     # computers); and `await` doesn't work with locks.
+    #
+    # All tabs share one chroot, leased from the pool: other workflows'
+    # renders (and fetches) in this process use other chroots. Within this
+    # workflow, ChrootContext.module_lock ensures modules run one at a time;
+    # but other tabs' cache loads, cache writes and websocket updates happen
+    # while a module runs.
 
-    with EDITABLE_CHROOT.acquire_context() as chroot_context:
+    async with EDITABLE_CHROOT_POOL.acquire_context() as chroot_context:
         with chroot_context.tempdir_context("render-") as basedir:
 
             async def execute_tab_flow_into_new_file(tab_flow: TabFlow) -> RenderResult:
@@ -162,21 +244,15 @@ async def execute_workflow(workflow: Workflow, delta_id: int) -> None:
                     chroot_context, workflow, tab_flow, tab_results, output_path
                 )
 
-            while pending_tab_flows:
-                ready_flows, dependent_flows = partition_ready_and_dependent(
-                    pending_tab_flows
-                )
-
-                if not ready_flows:
-                    # All flows are dependent -- meaning they all have cycles. Execute
-                    # them last; they can detect their cycles through `tab_results`.
-                    break
-
-                for tab_flow in ready_flows:
-                    result = await execute_tab_flow_into_new_file(tab_flow)
-                    tab_results[tab_flow.tab] = result
+            async def execute_tab_flow_and_store_result(tab_flow: TabFlow) -> None:
+                result = await execute_tab_flow_into_new_file(tab_flow)
+                tab_results[tab_flow.tab] = result
 
-                pending_tab_flows = dependent_flows  # iterate
+            pending_tab_flows = await execute_tab_flows_in_dependency_order(
+                pending_tab_flows,
+                execute_tab_flow_and_store_result,
+                max_concurrency=max_concurrent_tabs,
+            )
 
             # Now, `pending_tab_flows` only contains flows with cycles. Execute
             # them. No need to update `tab_results`: If tab1 and tab 2 depend on
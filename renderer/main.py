@@ -1,19 +1,91 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+from django.conf import settings
 from cjwstate import rabbitmq
 from cjworkbench.pg_render_locker import PgRenderLocker
 from .render import handle_render
 
 
-async def main_loop():
+logger = logging.getLogger(__name__)
+
+
+class RenderStats:
+    """
+    Count how long this process spends rendering.
+    """
+
+    def __init__(self):
+        self.n_renders = 0
+        self.busy_seconds = 0.0
+
+    def add(self, seconds: float) -> None:
+        self.n_renders += 1
+        self.busy_seconds += seconds
+
+    def pop(self):
+        """
+        Return `(n_renders, busy_seconds)` since the last call.
+        """
+        ret = (self.n_renders, self.busy_seconds)
+        self.n_renders = 0
+        self.busy_seconds = 0.0
+        return ret
+
+
+async def log_render_stats_forever(
+    stats: RenderStats, interval_s: float, worker_index: Optional[int]
+) -> None:
+    """
+    Log this process's utilization every `interval_s` seconds.
+
+    Utilization is time spent rendering, as a share of the time
+    `settings.RENDERER_CONCURRENCY` render slots were available.
+    """
+    name = "Renderer" if worker_index is None else "Renderer worker %d" % worker_index
+    while True:
+        await asyncio.sleep(interval_s)
+        n_renders, busy_seconds = stats.pop()
+        logger.info(
+            "%s: %d renders, %.0f%% utilization",
+            name,
+            n_renders,
+            100 * busy_seconds / (interval_s * settings.RENDERER_CONCURRENCY),
+        )
+
+
+async def main_loop(worker_index: Optional[int] = None):
     """
     Run fetchers and renderers, forever.
+
+    `worker_index` identifies this process in logs, if a supervisor forked it.
     """
+    stats = RenderStats()
+
     async with PgRenderLocker() as pg_render_locker:
 
         @rabbitmq.manual_acking_callback
         async def render_callback(message, ack):
-            return await handle_render(message, ack, pg_render_locker)
+            start = time.monotonic()
+            try:
+                return await handle_render(message, ack, pg_render_locker)
+            finally:
+                stats.add(time.monotonic() - start)
 
         connection = rabbitmq.get_connection()
-        connection.declare_queue_consume(rabbitmq.Render, render_callback)
+        connection.declare_queue_consume(
+            rabbitmq.Render, render_callback, concurrency=settings.RENDERER_CONCURRENCY
+        )
+        log_stats = asyncio.ensure_future(
+            connection.log_queue_stats_forever(settings.RABBITMQ_STATS_INTERVAL)
+        )
+        log_render_stats = asyncio.ensure_future(
+            log_render_stats_forever(
+                stats, settings.RABBITMQ_STATS_INTERVAL, worker_index
+            )
+        )
         # Run forever
         await connection._closed_event.wait()
+        log_stats.cancel()
+        log_render_stats.cancel()
@@ -1,9 +1,14 @@
 import asyncio
 import logging
 import os
-from django.core.management.base import BaseCommand
+import signal
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from cjwkernel.chroot import EDITABLE_CHROOT_POOL
 import cjwstate.modules
 from ...main import main_loop
+from ...supervisor import Supervisor
 
 
 logger = logging.getLogger(__name__)
@@ -19,15 +24,43 @@ def exit_on_exception(loop, context):
     os._exit(1)
 
 
-async def main():
+async def main(worker_index=None):
     loop = asyncio.get_running_loop()
     loop.set_exception_handler(exit_on_exception)
-    await main_loop()
+    await main_loop(worker_index)
+
+
+def run_worker(index: int) -> None:
+    """
+    Render forever, in a process forked by `Supervisor`.
+    """
+    EDITABLE_CHROOT_POOL.keep_partition(index, settings.RENDERER_N_WORKERS)
+    # Each worker needs its own kernel: a pyspawner client can't be shared
+    # across processes.
+    cjwstate.modules.init_module_system()
+    asyncio.run(main(index))
 
 
 class Command(BaseCommand):
     help = "Continually render stale workflows"
 
     def handle(self, *args, **options):
-        cjwstate.modules.init_module_system()
-        asyncio.run(main())
+        if settings.RENDERER_N_WORKERS > 1:
+            # Each worker leases its own chroots: check before forking, so a
+            # misconfiguration doesn't become a restart loop.
+            n_chroots = len(EDITABLE_CHROOT_POOL.chroots)
+            if n_chroots < settings.RENDERER_N_WORKERS:
+                raise CommandError(
+                    "CJW_RENDERER_N_WORKERS=%d needs at least that many chroots; "
+                    "CJW_KERNEL_N_EDITABLE_CHROOTS=%d"
+                    % (settings.RENDERER_N_WORKERS, n_chroots)
+                )
+            # Workers must not share the supervisor's database connections
+            connections.close_all()
+            supervisor = Supervisor(settings.RENDERER_N_WORKERS, run_worker)
+            for signum in (signal.SIGTERM, signal.SIGINT):
+                signal.signal(signum, lambda *args: supervisor.stop())
+            supervisor.run()
+        else:
+            cjwstate.modules.init_module_system()
+            asyncio.run(main())
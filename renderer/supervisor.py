@@ -0,0 +1,110 @@
+import logging
+import os
+import signal
+import threading
+import time
+from typing import Callable, Dict, Tuple
+
+
+logger = logging.getLogger(__name__)
+
+
+class Supervisor:
+    """
+    Fork `n_workers` processes that each call `worker_main(index)`.
+
+    Import heavy dependencies before calling `run()`: workers share those
+    memory pages (copy-on-write) with the supervisor and each other, rather
+    than loading their own copies.
+
+    A worker that exits -- crash or not -- is restarted with the same index,
+    until `stop()` is called. If a worker dies within `restart_delay` seconds
+    of starting, wait `restart_delay` before restarting it, so a worker that
+    can't start doesn't spin the CPU.
+
+    Usage:
+
+        supervisor = Supervisor(4, worker_main)
+        signal.signal(signal.SIGTERM, lambda *args: supervisor.stop())
+        supervisor.run()  # returns once stop() is called and workers exit
+    """
+
+    def __init__(
+        self,
+        n_workers: int,
+        worker_main: Callable[[int], None],
+        *,
+        restart_delay: float = 1.0,
+    ):
+        self.n_workers = n_workers
+        self.worker_main = worker_main
+        self.restart_delay = restart_delay
+        self._workers: Dict[int, Tuple[int, float]] = {}  # pid => (index, start)
+        self._stopping = False
+        self._lock = threading.RLock()  # stop() may run in a signal handler
+
+    def _spawn(self, index: int) -> None:
+        pid = os.fork()
+        if pid == 0:
+            # Child process. Never return: the caller is the supervisor loop.
+            status = 1
+            try:
+                signal.signal(signal.SIGTERM, signal.SIG_DFL)
+                signal.signal(signal.SIGINT, signal.SIG_DFL)
+                self.worker_main(index)
+                status = 0
+            except BaseException:
+                logger.exception("Worker %d crashed", index)
+            finally:
+                os._exit(status)
+        logger.info("Started worker %d (pid %d)", index, pid)
+        self._workers[pid] = (index, time.time())
+
+    def _spawn_unless_stopping(self, index: int) -> None:
+        with self._lock:
+            if not self._stopping:
+                self._spawn(index)
+
+    def run(self) -> None:
+        """
+        Start workers; restart them when they exit; return after `stop()`.
+        """
+        for index in range(self.n_workers):
+            self._spawn_unless_stopping(index)
+
+        while True:
+            with self._lock:
+                if not self._workers:
+                    return
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                return  # no children left (and none will be spawned)
+
+            with self._lock:
+                index, start = self._workers.pop(pid, (None, None))
+                if index is None or self._stopping:
+                    continue
+
+            if os.WIFSIGNALED(status):
+                how = "was killed by signal %d" % os.WTERMSIG(status)
+            else:
+                how = "exited with code %d" % os.WEXITSTATUS(status)
+            logger.warning("Worker %d (pid %d) %s; restarting", index, pid, how)
+            if time.time() - start < self.restart_delay:
+                time.sleep(self.restart_delay)
+            self._spawn_unless_stopping(index)
+
+    def stop(self) -> None:
+        """
+        Send SIGTERM to all workers, and stop restarting them.
+
+        `run()` returns once they have all exited.
+        """
+        with self._lock:
+            self._stopping = True
+            for pid in self._workers:
+                try:
+                    os.kill(pid, signal.SIGTERM)
+                except ProcessLookupError:
+                    pass  # it exited; run() will reap it
@@ -3,8 +3,16 @@ from collections import namedtuple
 import logging
 import unittest
 from unittest.mock import Mock, patch
+from django.utils import timezone
 from cjwkernel.errors import ModuleExitedError
-from cjwkernel.types import I18nMessage, Params, RenderError, RenderResult
+from cjwkernel.types import (
+    Column,
+    ColumnType,
+    I18nMessage,
+    Params,
+    RenderError,
+    RenderResult,
+)
 from cjwkernel.tests.util import arrow_table, assert_render_result_equals
 from cjwstate import clientside, rabbitmq
 from cjwstate.models import ModuleVersion, Workflow
@@ -13,7 +21,11 @@ from cjwstate.modules.loaded_module import LoadedModule
 from cjwstate.rendercache import cache_render_result, open_cached_render_result
 from cjwstate.tests.utils import DbTestCase
 from renderer.execute.types import UnneededExecution
-from renderer.execute.workflow import execute_workflow, partition_ready_and_dependent
+from renderer.execute.workflow import (
+    execute_tab_flows_in_dependency_order,
+    execute_workflow,
+    partition_ready_and_dependent,
+)
 
 
 async def fake_send(*args, **kwargs):
@@ -437,6 +449,132 @@ class WorkflowTests(DbTestCase):
 
         email.assert_not_called()
 
+    @patch.object(LoadedModule, "for_module_version")
+    @patch.object(rabbitmq, "send_update_to_workflow_clients", fake_send)
+    def test_skip_render_after_unchanged_output(self, fake_load_module):
+        workflow = Workflow.create_and_init()
+        tab = workflow.tabs.first()
+        ModuleVersion.create_or_replace_from_spec(
+            {"id_name": "mod", "name": "Mod", "category": "Clean", "parameters": []}
+        )
+        wf_module1 = tab.wf_modules.create(
+            order=0,
+            slug="step-1",
+            last_relevant_delta_id=workflow.last_delta_id,
+            module_id_name="mod",
+        )
+        wf_module2 = tab.wf_modules.create(
+            order=1,
+            slug="step-2",
+            last_relevant_delta_id=workflow.last_delta_id,
+            module_id_name="mod",
+        )
+
+        fake_loaded_module = Mock(LoadedModule)
+        fake_loaded_module.migrate_params.return_value = {}
+        fake_load_module.return_value = fake_loaded_module
+        result = RenderResult(arrow_table({"A": [1]}))
+        fake_loaded_module.render.return_value = result
+
+        self._execute(workflow)
+        self.assertEqual(fake_loaded_module.render.call_count, 2)
+
+        # Change step 1's input, making both steps stale
+        delta2 = InitWorkflowCommand.create(workflow)
+        tab.wf_modules.update(last_relevant_delta_id=delta2.id)
+        tab.wf_modules.filter(id=wf_module1.id).update(
+            stored_data_version=timezone.now()
+        )
+
+        # step 1 gives the same output, so step 2 needn't render
+        self._execute(workflow)
+        self.assertEqual(fake_loaded_module.render.call_count, 3)
+
+        wf_module2.refresh_from_db()
+        self.assertEqual(wf_module2.cached_render_result.delta_id, delta2.id)
+        with open_cached_render_result(wf_module2.cached_render_result) as actual:
+            assert_render_result_equals(actual, result)
+
+    @patch.object(LoadedModule, "for_module_version")
+    @patch.object(rabbitmq, "send_update_to_workflow_clients", fake_send)
+    def test_render_after_changed_output(self, fake_load_module):
+        workflow = Workflow.create_and_init()
+        tab = workflow.tabs.first()
+        ModuleVersion.create_or_replace_from_spec(
+            {"id_name": "mod", "name": "Mod", "category": "Clean", "parameters": []}
+        )
+        wf_module1 = tab.wf_modules.create(
+            order=0,
+            slug="step-1",
+            last_relevant_delta_id=workflow.last_delta_id,
+            module_id_name="mod",
+        )
+        wf_module2 = tab.wf_modules.create(
+            order=1,
+            slug="step-2",
+            last_relevant_delta_id=workflow.last_delta_id,
+            module_id_name="mod",
+        )
+
+        fake_loaded_module = Mock(LoadedModule)
+        fake_loaded_module.migrate_params.return_value = {}
+        fake_load_module.return_value = fake_loaded_module
+        fake_loaded_module.render.return_value = RenderResult(arrow_table({"A": [1]}))
+        self._execute(workflow)
+
+        delta2 = InitWorkflowCommand.create(workflow)
+        tab.wf_modules.update(last_relevant_delta_id=delta2.id)
+        tab.wf_modules.filter(id=wf_module1.id).update(
+            stored_data_version=timezone.now()
+        )
+        result2 = RenderResult(arrow_table({"A": [2]}))
+        fake_loaded_module.render.return_value = result2
+        self._execute(workflow)
+        self.assertEqual(fake_loaded_module.render.call_count, 4)
+
+        wf_module2.refresh_from_db()
+        with open_cached_render_result(wf_module2.cached_render_result) as actual:
+            assert_render_result_equals(actual, result2)
+
+    @patch.object(LoadedModule, "for_module_version")
+    @patch.object(rabbitmq, "send_update_to_workflow_clients", fake_send)
+    def test_render_after_changed_output_format(self, fake_load_module):
+        workflow = Workflow.create_and_init()
+        tab = workflow.tabs.first()
+        ModuleVersion.create_or_replace_from_spec(
+            {"id_name": "mod", "name": "Mod", "category": "Clean", "parameters": []}
+        )
+        wf_module1 = tab.wf_modules.create(
+            order=0,
+            slug="step-1",
+            last_relevant_delta_id=workflow.last_delta_id,
+            module_id_name="mod",
+        )
+        tab.wf_modules.create(
+            order=1,
+            slug="step-2",
+            last_relevant_delta_id=workflow.last_delta_id,
+            module_id_name="mod",
+        )
+
+        fake_loaded_module = Mock(LoadedModule)
+        fake_loaded_module.migrate_params.return_value = {}
+        fake_load_module.return_value = fake_loaded_module
+        fake_loaded_module.render.return_value = RenderResult(arrow_table({"A": [1]}))
+        self._execute(workflow)
+
+        # Same bytes, different format: step 2 may format its output from it
+        delta2 = InitWorkflowCommand.create(workflow)
+        tab.wf_modules.update(last_relevant_delta_id=delta2.id)
+        tab.wf_modules.filter(id=wf_module1.id).update(
+            stored_data_version=timezone.now()
+        )
+        fake_loaded_module.render.return_value = RenderResult(
+            arrow_table({"A": [1]}, [Column("A", ColumnType.Number("{:,.2f}"))])
+        )
+        self._execute(workflow)
+        self.assertEqual(fake_loaded_module.render.call_count, 4)
+
 
 class PartitionReadyAndDependentTests(unittest.TestCase):
     MockTabFlow = namedtuple("MockTabFlow", ("tab_slug", "input_tab_slugs"))
@@ -479,3 +617,99 @@ class PartitionReadyAndDependentTests(unittest.TestCase):
     def test_tab_self_reference(self):
         flows = [self.MockTabFlow("t1", frozenset({"t1"}))]
         self.assertEqual(([], flows), partition_ready_and_dependent(flows))
+
+
+class ExecuteTabFlowsInDependencyOrderTests(unittest.TestCase):
+    MockTabFlow = namedtuple("MockTabFlow", ("tab_slug", "input_tab_slugs"))
+
+    def _run(self, flows, max_concurrency=4):
+        log = []
+        in_flight = set()
+        max_in_flight = 0
+
+        async def execute(flow):
+            nonlocal max_in_flight
+            log.append(("start", flow.tab_slug))
+            in_flight.add(flow.tab_slug)
+            max_in_flight = max(max_in_flight, len(in_flight))
+            # t-slow takes longer than anything else
+            await asyncio.sleep(0.05 if flow.tab_slug == "t-slow" else 0.001)
+            in_flight.remove(flow.tab_slug)
+            log.append(("end", flow.tab_slug))
+
+        async def inner():
+            return await execute_tab_flows_in_dependency_order(
+                flows, execute, max_concurrency
+            )
+
+        cycles = asyncio.run(inner())
+        return cycles, log, max_in_flight
+
+    def test_independent_flows_run_concurrently(self):
+        flows = [
+            self.MockTabFlow("t1", frozenset()),
+            self.MockTabFlow("t2", frozenset()),
+            self.MockTabFlow("t3", frozenset()),
+        ]
+        cycles, log, max_in_flight = self._run(flows)
+        self.assertEqual(cycles, [])
+        self.assertEqual(max_in_flight, 3)
+        self.assertEqual(
+            [slug for event, slug in log if event == "start"], ["t1", "t2", "t3"]
+        )
+
+    def test_max_concurrency(self):
+        flows = [self.MockTabFlow("t%d" % i, frozenset()) for i in range(5)]
+        cycles, log, max_in_flight = self._run(flows, max_concurrency=2)
+        self.assertEqual(cycles, [])
+        self.assertEqual(max_in_flight, 2)
+        self.assertEqual(len(log), 10)
+
+    def test_start_dependent_flow_when_its_inputs_finish(self):
+        flows = [
+            self.MockTabFlow("t-slow", frozenset()),
+            self.MockTabFlow("t-fast", frozenset()),
+            self.MockTabFlow("t-dependent", frozenset({"t-fast"})),
+        ]
+        cycles, log, _ = self._run(flows)
+        self.assertEqual(cycles, [])
+        # t-dependent need not wait for t-slow
+        self.assertLess(
+            log.index(("start", "t-dependent")), log.index(("end", "t-slow"))
+        )
+        self.assertLess(
+            log.index(("end", "t-fast")), log.index(("start", "t-dependent"))
+        )
+
+    def test_return_cycles_without_executing_them(self):
+        flows = [
+            self.MockTabFlow("t1", frozenset({"t2"})),
+            self.MockTabFlow("t2", frozenset({"t1"})),
+            self.MockTabFlow("t3", frozenset({"t1"})),
+            self.MockTabFlow("t4", frozenset()),
+        ]
+        cycles, log, _ = self._run(flows)
+        self.assertEqual(cycles, flows[:3])
+        self.assertEqual(log, [("start", "t4"), ("end", "t4")])
+
+    def test_error_waits_for_running_flows_and_starts_no_more(self):
+        flows = [
+            self.MockTabFlow("t-slow", frozenset()),
+            self.MockTabFlow("t1", frozenset()),
+            self.MockTabFlow("t2", frozenset({"t1"})),
+        ]
+        log = []
+
+        async def execute(flow):
+            log.append(flow.tab_slug)
+            await asyncio.sleep(0.05 if flow.tab_slug == "t-slow" else 0.001)
+            log.append(flow.tab_slug + "-done")
+            if flow.tab_slug == "t1":
+                raise UnneededExecution
+
+        async def inner():
+            with self.assertRaises(UnneededExecution):
+                await execute_tab_flows_in_dependency_order(flows, execute, 4)
+
+        asyncio.run(inner())
+        self.assertEqual(log, ["t-slow", "t1", "t1-done", "t-slow-done"])
@@ -0,0 +1,58 @@
+import os
+import threading
+import time
+import unittest
+from cjwkernel.util import tempfile_context
+from renderer.supervisor import Supervisor
+
+
+class SupervisorTests(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self._tempfile_context = tempfile_context(prefix="test-supervisor-")
+        self.log_path = self._tempfile_context.__enter__()
+
+    def tearDown(self):
+        self._tempfile_context.__exit__(None, None, None)
+        super().tearDown()
+
+    def _log(self, index: int) -> None:
+        # O_APPEND: concurrent workers don't overwrite each other's lines
+        fd = os.open(self.log_path, os.O_WRONLY | os.O_APPEND)
+        try:
+            os.write(fd, b"%d\n" % index)
+        finally:
+            os.close(fd)
+
+    def _logged(self):
+        return self.log_path.read_bytes().split()
+
+    def _run_until(self, supervisor, predicate, timeout=5):
+        def stop_when_ready():
+            deadline = time.time() + timeout
+            while time.time() < deadline and not predicate():
+                time.sleep(0.01)
+            supervisor.stop()
+
+        thread = threading.Thread(target=stop_when_ready)
+        thread.start()
+        supervisor.run()
+        thread.join()
+
+    def test_start_n_workers(self):
+        def worker_main(index):
+            self._log(index)
+            time.sleep(30)  # until stop() kills us
+
+        supervisor = Supervisor(2, worker_main)
+        self._run_until(supervisor, lambda: len(self._logged()) >= 2)
+        self.assertEqual(sorted(self._logged()), [b"0", b"1"])
+
+    def test_restart_exited_worker(self):
+        def worker_main(index):
+            self._log(index)
+            raise RuntimeError("crash")
+
+        supervisor = Supervisor(1, worker_main, restart_delay=0)
+        self._run_until(supervisor, lambda: len(self._logged()) >= 3)
+        self.assertEqual(self._logged()[:3], [b"0", b"0", b"0"])
@@ -0,0 +1,21 @@
+# Generated by Django 2.2.7 on 2019-12-02 15:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("server", "0038_auto_20190926_1255")]
+
+    operations = [
+        migrations.AddField(
+            model_name="wfmodule",
+            name="cached_render_result_fingerprint",
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+        migrations.AddField(
+            model_name="wfmodule",
+            name="cached_render_result_input_fingerprint",
+            field=models.CharField(blank=True, max_length=40, null=True),
+        ),
+    ]
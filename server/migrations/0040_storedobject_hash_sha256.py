@@ -0,0 +1,16 @@
+# Generated by Django 2.2.7 on 2019-12-10 14:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("server", "0039_wfmodule_cached_render_result_fingerprint")]
+
+    operations = [
+        migrations.AlterField(
+            model_name="storedobject",
+            name="hash",
+            field=models.CharField(max_length=64),
+        )
+    ]
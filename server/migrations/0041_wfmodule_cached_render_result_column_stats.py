@@ -0,0 +1,17 @@
+# Generated by Django 2.2.7 on 2019-12-12 10:04
+
+import cjwstate.models.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [("server", "0040_storedobject_hash_sha256")]
+
+    operations = [
+        migrations.AddField(
+            model_name="wfmodule",
+            name="cached_render_result_column_stats",
+            field=cjwstate.models.fields.ColumnStatsField(blank=True, null=True),
+        )
+    ]
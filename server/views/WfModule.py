@@ -20,8 +20,6 @@ from django.http import (
 from django.shortcuts import get_object_or_404
 from django.utils.cache import add_never_cache_headers
 from django.views.decorators.clickjacking import xframe_options_exempt
-import numpy as np
-import pyarrow as pa
 from rest_framework import status
 from rest_framework.decorators import api_view, renderer_classes
 from rest_framework.renderers import JSONRenderer
@@ -31,8 +29,8 @@ from cjwstate import rabbitmq
 from cjwstate.rendercache import (
     CorruptCacheError,
     downloaded_parquet_file,
-    open_cached_render_result,
     read_cached_render_result_slice_as_text,
+    read_cached_render_result_value_counts,
 )
 from cjwstate.models import Tab, WfModule, Workflow
 from cjwstate.modules.loaded_module import module_get_html_bytes
@@ -222,9 +220,9 @@ def wfmodule_value_counts(request: HttpRequest, wf_module: WfModule):
 
     try:
         # raise CorruptCacheError
-        with open_cached_render_result(cached_result) as result:
-            arrow_table = result.table.table
-            chunked_array = arrow_table.column(column_index)
+        value_counts = read_cached_render_result_value_counts(
+            cached_result, column_index
+        )
     except CorruptCacheError:
         # We _could_ return an empty result set; but our only goal here is
         # "don't crash" and this 404 seems to be the simplest implementation.
@@ -232,32 +230,6 @@ def wfmodule_value_counts(request: HttpRequest, wf_module: WfModule):
         # and this response is going to be ignored.)
         return JsonResponse({"error": f'column "{colname}" not found'}, status=404)
 
-    if chunked_array.num_chunks == 0:
-        value_counts = {}
-    else:
-        assert chunked_array.num_chunks == 1
-
-        # Assume type is text. (We checked column.type is ColumnType.Text above.)
-        chunk = chunked_array.chunks[0]
-        if not hasattr(chunk, "dictionary"):
-            chunk = chunk.dictionary_encode()
-
-        try:
-            max_index = max(v.as_py() for v in chunk.indices if v is not pa.NULL)
-        except ValueError:
-            # all nulls. Hack with "-1" makes the algorithm not-crash.
-            max_index = -1
-
-        counts = np.zeros(
-            max_index + 1, dtype=int
-        )  # if max_index = -1, counts is empty
-        for v in chunk.indices:
-            if v is not pa.NULL:
-                counts[v.as_py()] += 1
-        value_counts = {
-            value.as_py(): int(count) for value, count in zip(chunk.dictionary, counts)
-        }
-
     return JsonResponse({"values": value_counts})
 
 
@@ -304,17 +276,19 @@ def wfmodule_tile(
     rend = N_ROWS_PER_TILE * (tile_row + 1)
 
     try:
-        data = read_cached_render_result_pydict(
+        record_json = read_cached_render_result_slice_as_text(
             cached_result,
+            "json",
             only_columns=range(cbegin, cend),
             only_rows=range(rbegin, rend),
         )
-        columns = cached_result.table_metadata.columns[cbegin:cend]
-        records = _pydict_to_json_records(data, columns, rend - rbegin)
     except CorruptCacheError:
         raise  # TODO handle this case!
 
-    return JsonResponse(records)
+    data = '{"rows":%s}' % record_json
+    return HttpResponse(
+        data.encode("utf-8"), content_type="application/json", charset="utf-8"
+    )
 
 
 class SubprocessOutputFileLike(io.RawIOBase):
@@ -0,0 +1,129 @@
+"""
+Compare Join's Arrow implementation with the Pandas merge it replaced.
+
+Run from the repository root:
+
+    python -m staticmodules.benchmarks.jointab
+
+This is not a unit test: timings depend on the machine, so we only print
+the fastest of a few runs. We do check that both paths compute the same
+table.
+"""
+import time
+import numpy as np
+import pandas as pd
+import pyarrow
+from cjwkernel.tests.util import arrow_table
+from cjwkernel.types import Tab, TabOutput
+from cjwkernel.util import tempfile_context
+from staticmodules.jointab import render_arrow
+
+
+N_LEFT_ROWS = 1_000_000
+N_RIGHT_ROWS = 100_000
+N_REPEATS = 3
+
+
+def _pandas_merge(left, right, on, right_columns, how):
+    """
+    Join the way jointab did before it used Arrow: with `DataFrame.merge()`.
+    """
+    for colname in on:
+        # Coerce categories to be identical, so merge() keeps Categorical
+        left_series = left[colname]
+        right_series = right[colname]
+        if hasattr(left_series, "cat") and hasattr(right_series, "cat"):
+            categories = sorted(
+                frozenset(left_series.cat.categories)
+                | frozenset(right_series.cat.categories)
+            )
+            left_series.cat.set_categories(categories, inplace=True)
+            right_series.cat.set_categories(categories, inplace=True)
+
+    result = left.merge(right[on + right_columns], on=on, how=how)
+    for colname in result.columns:
+        series = result[colname]
+        if hasattr(series, "cat"):
+            series.cat.remove_unused_categories(inplace=True)
+    return result
+
+
+def _timed(fn):
+    """
+    Return `(seconds, result)` for the fastest of `N_REPEATS` calls to `fn`.
+    """
+    best = None
+    for _ in range(N_REPEATS):
+        start = time.perf_counter()
+        result = fn()
+        seconds = time.perf_counter() - start
+        if best is None or seconds < best:
+            best = seconds
+    return best, result
+
+
+def main():
+    rng = np.random.RandomState(0)
+    left = pyarrow.table(
+        {
+            "id": rng.randint(0, N_RIGHT_ROWS * 2, N_LEFT_ROWS),
+            "group": pyarrow.array(
+                ["g%d" % i for i in rng.randint(0, 50, N_LEFT_ROWS)]
+            ).dictionary_encode(),
+            "value": rng.rand(N_LEFT_ROWS),
+        }
+    )
+    right = pyarrow.table(
+        {
+            "id": np.arange(N_RIGHT_ROWS) * 2,
+            "group": pyarrow.array(
+                ["g%d" % (i % 50) for i in range(N_RIGHT_ROWS)]
+            ).dictionary_encode(),
+            "name": ["name %d" % i for i in range(N_RIGHT_ROWS)],
+            "score": rng.rand(N_RIGHT_ROWS),
+        }
+    )
+    left_table = arrow_table(left)
+    right_tab = TabOutput(Tab("tab-2", "Tab 2"), arrow_table(right))
+
+    print("%d left rows, %d right rows" % (N_LEFT_ROWS, N_RIGHT_ROWS))
+    for on in (["id"], ["id", "group"]):
+        for how in ("left", "inner", "right"):
+            params = {
+                "right_tab": right_tab,
+                "join_columns": {"on": on, "right": ["name", "score"]},
+                "type": how,
+            }
+            with tempfile_context(suffix=".arrow") as output_path:
+                new_seconds, result = _timed(
+                    lambda: render_arrow(left_table, params, "Tab 1", None, output_path)
+                )
+                new = result.table.table.to_pandas()
+            # The old module also paid to convert its input tables to Pandas
+            # and its output back to Arrow
+            old_seconds, old = _timed(
+                lambda: pyarrow.Table.from_pandas(
+                    _pandas_merge(
+                        left.to_pandas(), right.to_pandas(), on, ["name", "score"], how
+                    ),
+                    preserve_index=False,
+                )
+            )
+            old = old.to_pandas()
+            pd.testing.assert_frame_equal(
+                new, old, check_dtype=False, check_categorical=False
+            )
+            print(
+                "%-12s %-5s  Pandas %7.3fs  Arrow %7.3fs  (%.1fx)"
+                % (
+                    "+".join(on),
+                    how,
+                    old_seconds,
+                    new_seconds,
+                    old_seconds / new_seconds,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
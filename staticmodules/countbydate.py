@@ -1,5 +1,5 @@
 import enum
-from typing import Any, Dict, Optional
+from typing import Any, Dict, List, Optional, Union
 import numpy as np
 import pandas as pd
 from pandas.api.types import is_numeric_dtype
@@ -9,6 +9,9 @@ from cjwkernel import settings
 # group column by unique value, discard all other columns
 
 
+NS_PER_DAY = 86400 * 1000000000
+
+
 class Period(enum.Enum):
     SECOND = "second"
     MINUTE = "minute"
@@ -30,31 +33,59 @@ class Period(enum.Enum):
         )
 
     @property
-    def pandas_freq(self):
+    def numpy_unit(self):
+        """numpy datetime64 unit we floor to. (Quarters floor to months.)"""
         return {
-            Period.SECOND: "S",
-            Period.MINUTE: "T",
-            Period.HOUR: "H",
+            Period.SECOND: "s",
+            Period.MINUTE: "m",
+            Period.HOUR: "h",
             Period.DAY: "D",
             Period.MONTH: "M",
-            Period.QUARTER: "Q",
+            Period.QUARTER: "M",
             Period.YEAR: "Y",
-            Period.SECOND_OF_DAY: "S",
-            Period.MINUTE_OF_DAY: "T",
-            Period.HOUR_OF_DAY: "H",
+            Period.SECOND_OF_DAY: "s",
+            Period.MINUTE_OF_DAY: "m",
+            Period.HOUR_OF_DAY: "h",
         }[self]
 
-    @property
-    def strftime_format(self):
-        """If set, output must be cast to str using this format."""
-        return {
-            Period.QUARTER: "%Y Q%q",
-            Period.SECOND_OF_DAY: "%H:%M:%S",
-            Period.MINUTE_OF_DAY: "%H:%M",
-            Period.HOUR_OF_DAY: "%H:00",
-        }.get(
-            self
-        )  # usually `None`
+    def to_ordinals(self, timestamps: np.ndarray) -> np.ndarray:
+        """
+        Number each datetime64[ns] by its period, with integer math.
+
+        Ordinals are int64: periods since 1970 (or since midnight, for
+        time-of-day periods). Consecutive periods have consecutive ordinals.
+        """
+        if self.is_time_of_day:
+            # Drop the date (1970-01-01 is ordinal 0)
+            timestamps = (timestamps.view(np.int64) % NS_PER_DAY).view("datetime64[ns]")
+        # numpy floors (even before 1970) when casting to a coarser unit
+        ordinals = timestamps.astype(f"datetime64[{self.numpy_unit}]").view(np.int64)
+        if self == Period.QUARTER:
+            ordinals = ordinals // 3
+        return ordinals
+
+    def format_ordinals(self, ordinals: np.ndarray) -> Union[np.ndarray, List[str]]:
+        """
+        Convert ordinals to output values: period-start datetimes, or str.
+
+        Only quarters and time-of-day periods are str; formatting costs
+        O(n_periods), not O(n_rows).
+        """
+        if self == Period.QUARTER:
+            return ["%d Q%d" % (1970 + q // 4, q % 4 + 1) for q in ordinals.tolist()]
+        elif self == Period.SECOND_OF_DAY:
+            return [
+                "%02d:%02d:%02d" % (s // 3600, s // 60 % 60, s % 60)
+                for s in ordinals.tolist()
+            ]
+        elif self == Period.MINUTE_OF_DAY:
+            return ["%02d:%02d" % (m // 60, m % 60) for m in ordinals.tolist()]
+        elif self == Period.HOUR_OF_DAY:
+            return ["%02d:00" % h for h in ordinals.tolist()]
+        else:
+            return ordinals.astype(f"datetime64[{self.numpy_unit}]").astype(
+                "datetime64[ns]"
+            )
 
 
 class Operation(enum.Enum):
@@ -69,20 +100,57 @@ class Operation(enum.Enum):
     def only_numeric(self):
         return self == Operation.MEAN or self == Operation.SUM
 
-    @property
-    def agg_function_name(self):
-        """Pandas agg() function name."""
-        return self.value
+    def aggregate(
+        self, values: Optional[np.ndarray], starts: np.ndarray, counts: np.ndarray
+    ) -> np.ndarray:
+        """
+        Aggregate each group of `values`, which are sorted by group.
+
+        Group `i` is `values[starts[i]:starts[i] + counts[i]]`. It's never
+        empty. Like Pandas, sum/min/max keep int64; mean is float64.
+        """
+        if self == Operation.SIZE:
+            return counts
+        elif self == Operation.MEAN:
+            return np.add.reduceat(values.astype(np.float64), starts) / counts
+        elif self == Operation.SUM:
+            return np.add.reduceat(values, starts)
+        elif self == Operation.MIN:
+            return np.minimum.reduceat(values, starts)
+        else:
+            return np.maximum.reduceat(values, starts)
 
     @property
     def zero_value(self):
-        """Value to impute when there are no inputs to agg_function_name."""
+        """Value to impute when there are no inputs to aggregate()."""
         if self in (Operation.SIZE, Operation.SUM):
             return 0
         else:
             return np.nan
 
 
+def _stable_argsort(ordinals: np.ndarray) -> np.ndarray:
+    """
+    Argsort int64 ordinals, radix-sorting them 16 bits at a time if we can.
+
+    numpy radix-sorts 16-bit ints: much faster than sorting int64. Most
+    tables span < 2**16 days (or months, or years), and < 2**32 seconds.
+    """
+    if len(ordinals) == 0:
+        return np.array([], dtype=np.intp)
+    offsets = ordinals - ordinals.min()
+    span = int(offsets.max())
+    if span < 2 ** 16:
+        return np.argsort(offsets.astype(np.uint16), kind="stable")
+    elif span < 2 ** 32:
+        # Least-significant digit first: stable sorts preserve its order
+        order = np.argsort((offsets & 0xFFFF).astype(np.uint16), kind="stable")
+        high = (offsets[order] >> 16).astype(np.uint16)
+        return order[np.argsort(high, kind="stable")]
+    else:
+        return np.argsort(ordinals, kind="stable")
+
+
 class ValidatedForm:
     """User input, (almost) free of potential errors."""
 
@@ -105,63 +173,63 @@ class ValidatedForm:
         self.include_missing_dates = include_missing_dates
 
     def run(self):
-        # input_dataframe: drop all rows for which either date or value (if
-        # specified) is NA
-        input_data = {"date": self.date_series}
+        # Drop all rows for which either date or value (if specified) is NA.
+        # `.values` of a tz-aware Series is UTC datetime64[ns].
+        timestamps = self.date_series.values
+        is_valid = ~np.isnat(timestamps)
         if self.value_series is None:
-            input_data["value"] = 1
+            values = None
         else:
-            input_data["value"] = self.value_series
-        input_dataframe = pd.DataFrame(input_data)
-        input_dataframe.dropna(inplace=True)
-
-        # input_series: Series indexed by PeriodIndex
-        period_index = pd.PeriodIndex(
-            input_dataframe["date"].values, freq=self.period.pandas_freq
-        )
-        input_series = pd.Series(input_dataframe["value"].values, index=period_index)
-
-        # output_series: Grouped
-        grouped_series = input_series.groupby(input_series.index).agg(
-            self.operation.agg_function_name
-        )
-
-        # Sort by date
-        grouped_series.sort_index(inplace=True)
+            values = self.value_series.values
+            is_valid &= ~pd.isna(values)
+            values = values[is_valid]
+        ordinals = self.period.to_ordinals(timestamps[is_valid])
+
+        # Sort by date -- stable, so floats sum in input order, like Pandas
+        order = _stable_argsort(ordinals)
+        ordinals = ordinals[order]
+        if values is not None:
+            values = values[order]
+
+        # Find groups: each starts where the ordinal changes
+        is_start = np.ones(len(ordinals), dtype=bool)
+        is_start[1:] = ordinals[1:] != ordinals[:-1]
+        starts = np.flatnonzero(is_start)
+        counts = np.diff(starts, append=len(ordinals))
+        output_ordinals = ordinals[starts]
+        output_values = self.operation.aggregate(values, starts, counts)
 
         # Impute missing values
-        if self.include_missing_dates:
-            start = period_index.min()
-            if start is not pd.NaT:
-                end = period_index.max()
-                n_rows = (end - start).n + 1
-
-                if n_rows > settings.MAX_ROWS_PER_TABLE:
-                    raise ValueError(
-                        f"Including missing dates would create {n_rows} rows, "
-                        f"but the maximum allowed is "
-                        f"{settings.MAX_ROWS_PER_TABLE}"
-                    )
-                new_index = pd.period_range(
-                    start=start, end=end, freq=period_index.freq
-                )
-                grouped_series = grouped_series.reindex(
-                    new_index, fill_value=self.operation.zero_value
+        if self.include_missing_dates and len(output_ordinals):
+            start = output_ordinals[0]
+            n_rows = int(output_ordinals[-1] - start) + 1
+
+            if n_rows > settings.MAX_ROWS_PER_TABLE:
+                raise ValueError(
+                    f"Including missing dates would create {n_rows} rows, "
+                    f"but the maximum allowed is "
+                    f"{settings.MAX_ROWS_PER_TABLE}"
                 )
 
-        # Prepare output dataframe
-        output_periods = grouped_series.index
-        output_values = grouped_series.values
-
-        # strftime if needed
-        if self.period.strftime_format:
-            output_dates = output_periods.strftime(self.period.strftime_format)
-        else:
-            output_dates = output_periods.to_timestamp()
+            if n_rows > len(output_ordinals):
+                fill_value = self.operation.zero_value
+                dtype = output_values.dtype
+                if not np.isnan(fill_value):
+                    pass  # size/sum: 0
+                elif dtype.kind == "O":
+                    fill_value = None  # text
+                elif dtype.kind == "M":
+                    fill_value = np.datetime64("NaT")
+                elif dtype.kind in "iu":
+                    dtype = np.float64  # like Pandas: NaN makes int64 float64
+                all_values = np.full(n_rows, fill_value, dtype=dtype)
+                all_values[output_ordinals - start] = output_values
+                output_ordinals = np.arange(start, start + n_rows)
+                output_values = all_values
 
         return pd.DataFrame(
             {
-                self.output_date_column: output_dates,
+                self.output_date_column: self.period.format_ordinals(output_ordinals),
                 self.output_value_column: output_values,
             }
         )
@@ -230,14 +298,6 @@ class Form:
             else:
                 raise TextIsNotDatetime(self.date_column)
 
-        if self.period.is_time_of_day:
-            # Convert all dates to 1970-01-01
-            date_series = (
-                date_series
-                - date_series.dt.normalize()  # drop the actual date
-                + np.datetime64("1970-01-01")  # and put 1970-01-01 instead
-            )
-
         if self.operation != Operation.SIZE:
             output_value_column = self.value_column
             value_series = table[self.value_column]
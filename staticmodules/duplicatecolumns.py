@@ -1,8 +1,12 @@
-def render(table, params, *, input_columns):
-    # we'll modify `table` in-place and build up `column_formats`
-    column_formats = {}
+from cjwkernel.pandas.moduleutils import render_arrow_columns
+from cjwkernel.types import Column
 
-    colnames = set(table.columns)
+
+def render_arrow(table, params, tab_name, fetch_result, output_path):
+    # list of (input_colname, output_column); we'll insert copies as we go
+    columns = [(c.name, c) for c in table.metadata.columns]
+
+    colnames = set(c.name for c in table.metadata.columns)
 
     for c in params["colnames"]:
         new_column_name = f"Copy of {c}"
@@ -17,11 +21,11 @@ def render(table, params, *, input_columns):
         colnames.add(new_column_name)
 
         # Add new column next to reference column
-        column_idx = table.columns.tolist().index(c)
-        table.insert(column_idx + 1, new_column_name, table[c])
-        column_formats[new_column_name] = input_columns[c].format
+        column_idx = next(i for i, (_, col) in enumerate(columns) if col.name == c)
+        column = columns[column_idx][1]
+        columns.insert(column_idx + 1, (c, Column(new_column_name, column.type)))
 
-    return {"dataframe": table, "column_formats": column_formats}
+    return render_arrow_columns(table, columns, output_path)
 
 
 def _migrate_params_v0_to_v1(params):
@@ -5,7 +5,16 @@ import logging
 from typing import List
 import numpy as np
 import pandas as pd
-from pandas.api.types import is_numeric_dtype
+import pyarrow
+from cjwkernel.pandas.moduleutils import (
+    arrow_column_to_array,
+    arrow_null_mask,
+    arrow_values_to_numpy,
+    remove_unused_dictionary_values,
+    render_arrow_columns,
+    render_arrow_table,
+)
+from cjwkernel.types import Column, ColumnType
 
 logger = logging.getLogger(__name__)
 
@@ -17,48 +26,101 @@ class Edit:
     value: str
 
 
-def apply_edits(series: pd.Series, edits: List[Edit]) -> pd.Series:
+def apply_edits(array: pyarrow.Array, edits: List[Edit]) -> pyarrow.Array:
     """
-    Change a single cell value, with correct type handling.
+    Change cell values, with correct type handling.
 
-    If the (str) edit value can be converted to numeric and the cell is
+    If the (str) edit values can be converted to numeric and the column is
     numeric, edit without casting (or cast from int64 to float64 if necessary).
-    If the column is numeric and the edit value is str, convert the column to
-    str.
+    Otherwise, convert the column to str.
+
+    Only numbers and timestamps are converted row by row. Text edits copy
+    buffers (and dictionary edits copy indices) without creating a Python
+    object per row.
     """
-    keys = [edit.row for edit in edits]
-    str_values = pd.Series([edit.value for edit in edits], dtype=str)
+    rows = np.array([edit.row for edit in edits], dtype=np.int64)
+    str_values = [edit.value for edit in edits]
 
-    if is_numeric_dtype(series):
+    if pyarrow.types.is_integer(array.type) or pyarrow.types.is_floating(array.type):
         try:
-            num_values = pd.to_numeric(str_values)
-            # pandas will upcast int64 col to float64 if needed
-            series[keys] = num_values
-            return series
+            return _edit_numbers(array, rows, str_values)
         except ValueError:
-            # convert numbers to string, replacing NaN with ''
-            pass  # don't return: we'll handle this in the default case below
-
-    if hasattr(series, "cat"):
-        str_values_set = set(str_values)
-        old_values_set = set(series.cat.categories)
-        if str_values_set != old_values_set:
-            # Create new series. Otherwise for some reason the table's dtypes
-            # don't pick up on category changes.
-            series = series.cat.add_categories(str_values_set - old_values_set)
-            series[keys] = str_values
-            series.cat.remove_unused_categories(inplace=True)
-            return series
-        else:
-            series[keys] = str_values
-            return series
-
-    t = series
-    series = t.astype(str)
-    series[t.isna()] = np.nan
-    series[keys] = str_values
-
-    return series
+            pass  # convert to str, below
+
+    if pyarrow.types.is_dictionary(array.type):
+        return _edit_dictionary(array, rows, str_values)
+
+    if not pyarrow.types.is_string(array.type):
+        array = _format_as_text(array)
+    return _edit_text(array, rows, str_values)
+
+
+def _edit_numbers(
+    array: pyarrow.Array, rows: np.ndarray, str_values: List[str]
+) -> pyarrow.Array:
+    """
+    Set numbers at `rows`; raise ValueError if `str_values` are not numbers.
+    """
+    num_values = pd.to_numeric(pd.Series(str_values, dtype=str)).values
+    if np.isinf(num_values).any():
+        raise ValueError("Workbench does not allow infinity")
+    if num_values.dtype == np.int64 and pyarrow.types.is_integer(array.type):
+        values = arrow_values_to_numpy(array, 0)
+    else:
+        # Upcast int64 column to float64 if needed
+        values = arrow_values_to_numpy(array, np.nan).astype(np.float64)
+    values[rows] = num_values
+    # "" becomes NaN, which means null
+    is_null = arrow_null_mask(array)
+    is_null[rows] = pd.isna(num_values)
+    return pyarrow.array(values, mask=is_null)
+
+
+def _format_as_text(array: pyarrow.Array) -> pyarrow.StringArray:
+    if pyarrow.types.is_timestamp(array.type):
+        values = pd.Series(array.to_pandas()).astype(str).values
+    else:
+        values = arrow_values_to_numpy(array, 0).astype(str)
+    return pyarrow.array(values, mask=arrow_null_mask(array), type=pyarrow.utf8())
+
+
+def _edit_text(
+    array: pyarrow.StringArray, rows: np.ndarray, str_values: List[str]
+) -> pyarrow.StringArray:
+    """
+    Set strings at `rows`: append `str_values`, then take every row.
+    """
+    indices = np.arange(len(array))
+    indices[rows] = np.arange(len(array), len(array) + len(rows))
+    values = pyarrow.concat_arrays(
+        [array, pyarrow.array(str_values, type=pyarrow.utf8())]
+    )
+    return values.take(pyarrow.array(indices))
+
+
+def _edit_dictionary(
+    array: pyarrow.DictionaryArray, rows: np.ndarray, str_values: List[str]
+) -> pyarrow.DictionaryArray:
+    """
+    Set dictionary indices at `rows`, adding new values to the dictionary.
+    """
+    dictionary_values = array.dictionary.to_pylist()
+    codes = {value: code for code, value in enumerate(dictionary_values)}
+    for value in str_values:
+        if value not in codes:
+            codes[value] = len(codes)
+            dictionary_values.append(value)
+
+    indices = arrow_values_to_numpy(array.indices, 0).astype(np.int32)
+    indices[rows] = [codes[value] for value in str_values]
+    is_null = arrow_null_mask(array.indices)
+    is_null[rows] = False
+    return remove_unused_dictionary_values(
+        pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array(indices, mask=is_null),
+            pyarrow.array(dictionary_values, type=pyarrow.utf8()),
+        )
+    )
 
 
 def migrate_params_v0_to_v1(params):
@@ -92,22 +154,31 @@ def migrate_params(params):
 #    { 'row': 6, 'col': 'food', 'value':'sandwich' },
 #    ...
 #  ]
-def render(table, params, **kwargs):
+def render_arrow(table, params, tab_name, fetch_result, output_path):
     edits = [Edit(**item) for item in params["celledits"]]
 
     # Ignore missing columns and rows: delete them from the Array of edits
-    colnames = set(table.columns)
-    nrows = len(table)
+    column_indices = {column.name: i for i, column in enumerate(table.metadata.columns)}
+    nrows = table.metadata.n_rows
     edits = [
         edit
         for edit in edits
-        if edit.col in colnames and edit.row >= 0 and edit.row < nrows
+        if edit.col in column_indices and edit.row >= 0 and edit.row < nrows
     ]
+    if not edits:
+        return render_arrow_columns(
+            table, [(c.name, c) for c in table.metadata.columns], output_path
+        )
 
+    arrays = list(table.table.columns)
+    columns = list(table.metadata.columns)
     for column, column_edits in groupby(edits, lambda e: e.col):
-        series = table[column]
-        series2 = apply_edits(series, list(column_edits))
-        if series2 is not series:
-            table[column] = series2
-
-    return table
+        i = column_indices[column]
+        array = apply_edits(arrow_column_to_array(arrays[i]), list(column_edits))
+        arrays[i] = pyarrow.chunked_array([array])
+        if pyarrow.types.is_string(array.type) or pyarrow.types.is_dictionary(
+            array.type
+        ):
+            columns[i] = Column(column, ColumnType.Text())
+
+    return render_arrow_table(arrays, columns, nrows, output_path)
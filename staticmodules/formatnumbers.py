@@ -1,13 +1,25 @@
-def render(table, params):
-    colnames = params["colnames"]
-    if not colnames:
-        return table
+from cjwkernel.pandas.moduleutils import render_arrow_columns
+from cjwkernel.types import Column, ColumnType, RenderResult
 
-    # Don't edit `table` at all. Just set new column_formats.
-    return {
-        "dataframe": table,
-        "column_formats": {c: params["format"] for c in colnames},
-    }
+
+def render_arrow(table, params, tab_name, fetch_result, output_path):
+    colnames = frozenset(params["colnames"])
+    try:
+        number_type = ColumnType.Number(params["format"])
+    except ValueError as err:
+        return RenderResult.from_deprecated_error(str(err))
+
+    # Don't edit table data at all. Just set new column types.
+    columns = [
+        (
+            c.name,
+            Column(c.name, number_type)
+            if c.name in colnames and isinstance(c.type, ColumnType.Number)
+            else c,
+        )
+        for c in table.metadata.columns
+    ]
+    return render_arrow_columns(table, columns, output_path)
 
 
 def _migrate_params_v0_to_v1(params):
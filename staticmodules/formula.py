@@ -1,10 +1,15 @@
 import builtins
 import itertools
+import operator
 from formulas import Parser
-from typing import Any, Dict
+from formulas.builder import AstBuilder
+from formulas.tokens.function import Function
+from formulas.tokens.operand import Number, Range, String
+from formulas.tokens.operator import Operator, OperatorToken
+from typing import Any, Dict, List, Optional
 import numpy as np
 import pandas as pd
-from pandas.api.types import is_numeric_dtype, is_datetime64_dtype
+from pandas.api.types import infer_dtype, is_numeric_dtype, is_datetime64_dtype
 from schedula import DispatcherError
 from cjwkernel.pandas.moduleutils import autocast_series_dtype
 
@@ -184,7 +189,12 @@ def eval_excel_one_row(code, table):
     return eval_excel(code, formula_args)
 
 
-def eval_excel_all_rows(code, table):
+def _all_rows_column_indexes(code) -> List[List[int]]:
+    """
+    List the column indexes each of `code`'s inputs refers to.
+
+    Raise ValueError if an input refers to anything other than row 1.
+    """
     col_idx = []
     for token, obj in code.inputs.items():
         # If the formula is valid but no object comes back it means the
@@ -207,27 +217,446 @@ def eval_excel_all_rows(code, table):
             col_last = rng["n2"]
 
             col_idx.append(list(range(col_first - 1, col_last)))
+    return col_idx
+
+
+def _excel_row_args(col_idx: List[List[int]], row: np.ndarray) -> List[Any]:
+    return [flatten_single_element_lists([row[idx] for idx in col]) for col in col_idx]
+
+
+def eval_excel_all_rows(code, table):
+    col_idx = _all_rows_column_indexes(code)
 
     newcol = []
     for row in table.values:
-        args_to_excel = [
-            flatten_single_element_lists([row[idx] for idx in col]) for col in col_idx
-        ]
         # raises ValueError if function isn't implemented
-        newcol.append(eval_excel(code, args_to_excel))
+        newcol.append(eval_excel(code, _excel_row_args(col_idx, row)))
+
+    return pd.Series(newcol)
+
+
+class _ExpressionTreeBuilder(AstBuilder):
+    """
+    AstBuilder that remembers the argument tokens of each operator/function.
+
+    `formulas` compiles an expression into a single dispatcher that handles
+    one value per reference. We walk the tree ourselves to evaluate whole
+    columns at a time.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.arguments = {}  # id(token) => List[token]
+
+    def append(self, token):
+        if isinstance(token, (Operator, Function)):
+            n_args = token.get_n_args
+            if n_args <= len(self):  # else super() raises FormulaError
+                self.arguments[id(token)] = [
+                    self[i] for i in range(len(self) - n_args, len(self))
+                ]
+        super().append(token)
+
+
+class _ExcelParser(Parser):
+    ast_builder = _ExpressionTreeBuilder
+
+
+class _NotVectorizable(Exception):
+    """
+    The formula can't be evaluated column-wise: evaluate it row by row.
+    """
+
+
+def _unbox(values: np.ndarray) -> np.ndarray:
+    """
+    Convert an object array of numbers or bools to a numeric array.
+    """
+    if values.dtype != object:
+        return values
+    inferred = infer_dtype(values, skipna=False)
+    try:
+        if inferred == "integer":
+            return values.astype(np.int64)
+        elif inferred == "floating":
+            return values.astype(np.float64)
+        elif inferred == "boolean":
+            return values.astype(bool)
+    except OverflowError:
+        pass  # Python ints that don't fit in int64
+    return values
+
+
+def _is_number(values: np.ndarray) -> bool:
+    return values.ndim == 1 and values.dtype.kind in "iuf"
+
+
+def _is_number_or_bool(values: np.ndarray) -> bool:
+    return values.ndim == 1 and values.dtype.kind in "iufb"
 
+
+def _is_text(values: np.ndarray) -> bool:
+    return (
+        values.ndim == 1
+        and values.dtype == object
+        and infer_dtype(values, skipna=False) == "string"
+    )
+
+
+def _isnan(values: np.ndarray) -> np.ndarray:
+    if values.dtype.kind == "f":
+        return np.isnan(values)
+    else:
+        return np.zeros(len(values), bool)
+
+
+def _constant_int(values: np.ndarray) -> Optional[int]:
+    """
+    Return `int(values[0])` if all `values` are that same finite number.
+    """
+    if not _is_number_or_bool(values) or not len(values):
+        return None
+    first = values[0]
+    if (values != first).any() or not np.isfinite(first):
+        return None
+    return int(first)
+
+
+# Vectorized implementations of Excel operators and functions.
+#
+# Each takes the evaluated arguments -- numpy arrays, one value per row, or
+# 2-D arrays for multi-column ranges -- and returns `(result, row_by_row)`:
+# `row_by_row` marks rows whose result `formulas` must compute instead, because
+# they hold edge cases (nan, division by zero, ...) we don't reimplement. It
+# returns None if it doesn't handle these argument types at all.
+#
+# Results must be exactly what `formulas` computes on the same rows.
+
+
+def _vectorize_arithmetic(func):
+    def vectorized(*args):
+        if not all(_is_number_or_bool(arg) for arg in args):
+            return None
+        with np.errstate(all="ignore"):
+            result = func(*(arg.astype(np.float64) for arg in args))
+        # formulas returns #DIV/0!, #NUM! or #VALUE! where we'd return nan/inf
+        return result, ~np.isfinite(result)
+
+    return vectorized
+
+
+def _vectorize_comparison(func):
+    def vectorized(x, y):
+        if _is_number(x) and _is_number(y):
+            # formulas compares nan in its own way
+            return func(x, y), _isnan(x) | _isnan(y)
+        elif _is_text(x) and _is_text(y):
+            return func(x, y), np.zeros(len(x), bool)
+        else:
+            return None  # formulas orders number < text < bool
+
+    return vectorized
+
+
+def _as_text(values: np.ndarray) -> Optional[np.ndarray]:
+    """
+    Convert to text the way formulas does, or return None.
+
+    Bools are None: formulas writes "TRUE" or "True" depending on whether they
+    are Python or numpy bools.
+    """
+    if _is_text(values):
+        return values
+    elif _is_number(values):
+        return np.array([str(v) for v in values.tolist()], object)
+    else:
+        return None
+
+
+def _vectorized_concatenate(x, y):
+    x = _as_text(x)
+    y = _as_text(y)
+    if x is None or y is None:
+        return None
+    return x + y, np.zeros(len(x), bool)
+
+
+def _vectorized_if(*args):
+    if len(args) != 3:
+        return None
+    condition, if_true, if_false = args
+    if not _is_number_or_bool(condition) or not all(
+        _is_number_or_bool(v) or _is_text(v) for v in (if_true, if_false)
+    ):
+        return None
+    condition = condition != 0  # nan is true, as in Python
+    # formulas returns #NUM! instead of nan
+    row_by_row = np.where(condition, _isnan(if_true), _isnan(if_false))
+    if if_true.dtype != if_false.dtype:
+        # Don't let numpy cast between types: formulas returns them as-is
+        if_true = if_true.astype(object)
+        if_false = if_false.astype(object)
+    return np.where(condition, if_true, if_false), row_by_row
+
+
+def _vectorized_sum(*args):
+    # bools and text don't count in SUM(); leave them to formulas
+    if not args or not all(arg.dtype.kind in "iuf" for arg in args):
+        return None
+    # Add left to right, as Python's sum() does
+    result = np.zeros(len(args[0]), np.result_type(*args))
+    for arg in args:
+        for column in arg.T if arg.ndim == 2 else [arg]:
+            result += column
+    return result, np.zeros(len(result), bool)
+
+
+def _vectorized_round(*args):
+    if len(args) != 2:
+        return None
+    number, digits = args
+    digits = _constant_int(digits)
+    if not _is_number_or_bool(number) or digits is None or abs(digits) > 15:
+        return None
+    # Mimic formulas: round half to even, away from zero
+    factor = 10 ** digits
+    number = number.astype(np.float64)
+    with np.errstate(all="ignore"):  # NaN and inf become errors below
+        result = np.round(np.abs(number * factor)) / factor
+        result = np.where(number < 0, -result, result)
+    return result, ~np.isfinite(result)
+
+
+def _vectorize_text_function(func):
+    def vectorized(*args):
+        if len(args) != 1 or not _is_text(args[0]):
+            return None
+        result = func(pd.Series(args[0]).str).values
+        return result, np.zeros(len(result), bool)
+
+    return vectorized
+
+
+def _vectorize_text_slice(func):
+    def vectorized(*args):
+        if len(args) != 2:
+            return None
+        text, n_chars = args
+        n_chars = _constant_int(n_chars)
+        if not _is_text(text) or n_chars is None or n_chars < 0:
+            return None
+        return func(pd.Series(text).str, n_chars).values, np.zeros(len(text), bool)
+
+    return vectorized
+
+
+_VECTORIZED_OPERATORS = {
+    "+": _vectorize_arithmetic(operator.add),
+    "-": _vectorize_arithmetic(operator.sub),
+    "*": _vectorize_arithmetic(operator.mul),
+    "/": _vectorize_arithmetic(operator.truediv),
+    "^": _vectorize_arithmetic(operator.pow),
+    "u-": _vectorize_arithmetic(operator.neg),
+    "%": _vectorize_arithmetic(lambda x: x / 100.0),
+    "<": _vectorize_comparison(operator.lt),
+    "<=": _vectorize_comparison(operator.le),
+    ">": _vectorize_comparison(operator.gt),
+    ">=": _vectorize_comparison(operator.ge),
+    "=": _vectorize_comparison(operator.eq),
+    "<>": _vectorize_comparison(operator.ne),
+    "&": _vectorized_concatenate,
+}
+
+
+_VECTORIZED_FUNCTIONS = {
+    "IF": _vectorized_if,
+    "SUM": _vectorized_sum,
+    "ROUND": _vectorized_round,
+    "ABS": _vectorize_arithmetic(np.abs),
+    "UPPER": _vectorize_text_function(lambda s: s.upper()),
+    "LOWER": _vectorize_text_function(lambda s: s.lower()),
+    "LEN": _vectorize_text_function(lambda s: s.len()),
+    "LEFT": _vectorize_text_slice(lambda s, n: s.slice(stop=n)),
+    "RIGHT": _vectorize_text_slice(
+        lambda s, n: s.slice(start=-n) if n else s.slice(stop=0)
+    ),
+}
+
+
+def _column_letters(index: int) -> str:
+    """
+    Return "A" for 0, "Z" for 25, "AA" for 26, etc.
+    """
+    letters = ""
+    index += 1
+    while index:
+        index, remainder = divmod(index - 1, 26)
+        letters = chr(ord("A") + remainder) + letters
+    return letters
+
+
+class _ColumnwiseEvaluator:
+    """
+    Evaluate an expression tree over all rows of `values` at once.
+
+    Operators and functions in `_VECTORIZED_OPERATORS` and
+    `_VECTORIZED_FUNCTIONS` become numpy operations. Anything else is
+    evaluated by `formulas`, one row at a time, on its (column-wise) arguments.
+
+    After `evaluate()`, `row_by_row` marks rows the caller must re-evaluate
+    with the whole formula, one row at a time.
+    """
+
+    def __init__(self, arguments: Dict[int, List[Any]], values: np.ndarray):
+        self.arguments = arguments
+        self.values = values
+        self.row_by_row = np.zeros(values.shape[0], bool)
+
+    def evaluate(self, token) -> np.ndarray:
+        if type(token) is Range:
+            return self._evaluate_range(token)
+        elif type(token) in (Number, String):
+            return self._evaluate_literal(token)
+        elif type(token) is OperatorToken and token.name not in ":, ":
+            vectorized = _VECTORIZED_OPERATORS.get(token.name)
+        elif type(token) is Function:
+            vectorized = _VECTORIZED_FUNCTIONS.get(token.name.upper())
+        else:
+            raise _NotVectorizable  # array, error literal, range operator...
+
+        if id(token) not in self.arguments:
+            raise _NotVectorizable
+        args = [self.evaluate(arg) for arg in self.arguments[id(token)]]
+
+        result = vectorized(*args) if vectorized is not None else None
+        if result is None:
+            return self._evaluate_each_row(token, args)
+        values, row_by_row = result
+        self.row_by_row |= row_by_row
+        return values
+
+    def _evaluate_range(self, token) -> np.ndarray:
+        # _all_rows_column_indexes() validated rows
+        first, last = int(token.attr["n1"]), int(token.attr["n2"])
+        if token.attr.get("sheet") or last > self.values.shape[1]:
+            raise _NotVectorizable  # row-by-row evaluation raises the error
+        if self.values.dtype.kind not in "iufbO":
+            raise _NotVectorizable  # e.g., all-datetime table
+        if first == last:
+            return _unbox(self.values[:, first - 1])
+        columns = [_unbox(self.values[:, i]) for i in range(first - 1, last)]
+        if all(_is_number(column) for column in columns):
+            return np.column_stack(columns)
+        else:
+            return self.values[:, first - 1 : last]
+
+    def _evaluate_literal(self, token) -> np.ndarray:
+        value = token.compile()
+        n_rows = self.values.shape[0]
+        if isinstance(value, str):
+            return np.full(n_rows, value, object)
+        elif isinstance(value, bool):
+            return np.full(n_rows, value, bool)
+        elif isinstance(value, (int, float)):
+            try:
+                return np.full(n_rows, value)
+            except OverflowError:
+                raise _NotVectorizable from None
+        else:
+            raise _NotVectorizable
+
+    def _evaluate_each_row(self, token, args: List[np.ndarray]) -> np.ndarray:
+        # Build a formula of just this node, with literal arguments inline
+        # and a reference in place of each other argument. For instance,
+        # `DATE(2019, 6, A1+1)` becomes `=DATE(2019,6,A1)`.
+        arg_codes = []
+        inputs = {}  # reference => values
+        n_columns = 0
+        for arg_token, arg in zip(self.arguments[id(token)], args):
+            if type(arg_token) is Number:
+                arg_codes.append(arg_token.name)
+            elif type(arg_token) is String:
+                arg_codes.append('"' + arg_token.name + '"')  # name is escaped
+            else:
+                width = arg.shape[1] if arg.ndim == 2 else 1
+                reference = _column_letters(n_columns) + "1"
+                if width > 1:
+                    reference += ":" + _column_letters(n_columns + width - 1) + "1"
+                n_columns += width
+                arg_codes.append(reference)
+                inputs[reference] = arg
+
+        if type(token) is Function:
+            node_formula = "=%s(%s)" % (token.name.upper(), ",".join(arg_codes))
+        elif token.name == "u-" or token.name == "u+":
+            node_formula = "=" + token.name[1] + arg_codes[0]
+        elif token.name == "%":
+            node_formula = "=" + arg_codes[0] + "%"
+        else:
+            node_formula = "=" + token.name.join(arg_codes)
+
+        code = Parser().ast(node_formula)[1].compile()
+        # Python bools, not numpy bools: formulas formats those as "TRUE"
+        code_inputs = [
+            inputs[ref].astype(object) if inputs[ref].dtype.kind == "b" else inputs[ref]
+            for ref in code.inputs
+        ]
+
+        result = np.empty(self.values.shape[0], object)
+        # Skip rows the caller will re-evaluate anyway
+        for row in np.flatnonzero(~self.row_by_row):
+            row_args = [
+                list(values[row]) if values.ndim == 2 else values[row]
+                for values in code_inputs
+            ]
+            # raises ValueError if function isn't implemented
+            result[row] = eval_excel(code, row_args)
+        return _unbox(result)
+
+
+def eval_excel_all_rows_columnwise(builder, code, table) -> pd.Series:
+    """
+    Compute `eval_excel_all_rows(code, table)`, faster.
+
+    `builder` must come from `_ExcelParser`. Supported operators and functions
+    run once per column instead of once per row. Raise `_NotVectorizable` if
+    the caller must use `eval_excel_all_rows()` instead.
+    """
+    col_idx = _all_rows_column_indexes(code)  # raise ValueError
+
+    if table.empty:
+        raise _NotVectorizable  # let eval_excel_all_rows() pick the dtype
+
+    values = table.values
+    evaluator = _ColumnwiseEvaluator(builder.arguments, values)
+    result = evaluator.evaluate(builder[-1])
+    if result.ndim != 1:
+        raise _NotVectorizable  # result is a list per row
+
+    if result.dtype != object and not evaluator.row_by_row.any():
+        return pd.Series(result)
+
+    # Build a list, so pd.Series() infers dtype as in eval_excel_all_rows()
+    newcol = result.tolist()
+    for row in np.flatnonzero(evaluator.row_by_row):
+        # raises ValueError if function isn't implemented
+        newcol[row] = eval_excel(code, _excel_row_args(col_idx, values[row]))
     return pd.Series(newcol)
 
 
 def excel_formula(table, formula, all_rows):
     try:
         # 0 is a list of tokens, 1 is the function builder object
-        code = Parser().ast(formula)[1].compile()
+        builder = _ExcelParser().ast(formula)[1]
+        code = builder.compile()
     except Exception as e:
         raise ValueError(f"Couldn't parse formula: {str(e)}")
 
     if all_rows:
-        newcol = eval_excel_all_rows(code, table)
+        try:
+            newcol = eval_excel_all_rows_columnwise(builder, code, table)
+        except _NotVectorizable:
+            newcol = eval_excel_all_rows(code, table)
         newcol = autocast_series_dtype(sanitize_series(newcol))
     else:
         # the whole column is blank except first row
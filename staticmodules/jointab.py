@@ -1,105 +1,324 @@
-from typing import List, Set
+from typing import List, Optional, Set, Tuple
+import numpy as np
+import pyarrow
+from cjwkernel.pandas.moduleutils import (
+    arrow_column_to_array,
+    arrow_values_to_numpy,
+    remove_unused_dictionary_values,
+    render_arrow_columns,
+    render_arrow_table,
+)
+from cjwkernel.types import RenderResult
 
 
 def _parse_colnames(val: List[str], valid: Set[str]):
     return [c for c in val if c in valid]
 
 
-def render(table, params, *, input_columns):
+def _is_number(dtype: pyarrow.DataType) -> bool:
+    return pyarrow.types.is_integer(dtype) or pyarrow.types.is_floating(dtype)
+
+
+def _common_number_type(
+    dtype1: pyarrow.DataType, dtype2: pyarrow.DataType
+) -> pyarrow.DataType:
+    if pyarrow.types.is_integer(dtype1) and pyarrow.types.is_integer(dtype2):
+        return pyarrow.int64()
+    else:
+        return pyarrow.float64()
+
+
+def _dictionary_encode(array: pyarrow.Array) -> pyarrow.DictionaryArray:
+    if pyarrow.types.is_dictionary(array.type):
+        return array
+    else:
+        return array.dictionary_encode()
+
+
+def _factorize_on_column(
+    left: pyarrow.Array, right: pyarrow.Array
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Number `left` and `right` values so equal values get the same code.
+
+    Return `(left_codes, right_codes, n_codes)`. Null is a value, too: null
+    keys match null keys, as in `DataFrame.merge()`.
+
+    Dictionary columns are never decoded: we only compare their dictionaries.
+    Other columns are dictionary-encoded first.
+    """
+    if _is_number(left.type) and not left.type.equals(right.type):
+        common_type = _common_number_type(left.type, right.type)
+        left = left.cast(common_type)
+        right = right.cast(common_type)
+
+    left = _dictionary_encode(left)
+    right = _dictionary_encode(right)
+    # Map each side's dictionary to a shared dictionary. Dictionaries are
+    # small compared to the tables; hash them, not every row.
+    #
+    # An all-null column's dictionary has no buffers, and pyarrow 0.15's
+    # concat_arrays() garbles it. It has no values, so skip it.
+    dictionaries = [d for d in (left.dictionary, right.dictionary) if len(d)]
+    if dictionaries:
+        shared = pyarrow.concat_arrays(dictionaries).dictionary_encode()
+        dictionary_codes = arrow_values_to_numpy(shared.indices, 0)
+        n_values = len(shared.dictionary)
+    else:
+        dictionary_codes = np.array([], dtype=np.int64)
+        n_values = 0
+    # Append the null code to each side's mapping
+    left_map = np.append(dictionary_codes[: len(left.dictionary)], n_values)
+    right_map = np.append(dictionary_codes[len(left.dictionary) :], n_values)
+    return (
+        left_map[arrow_values_to_numpy(left.indices, -1)],
+        right_map[arrow_values_to_numpy(right.indices, -1)],
+        n_values + 1,
+    )
+
+
+def _factorize_keys(
+    left_arrays: List[pyarrow.Array],
+    right_arrays: List[pyarrow.Array],
+    in_order_of_appearance: bool,
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    """
+    Number `on` key tuples, so equal tuples get the same group.
+
+    Return `(left_groups, right_groups, n_groups)`.
+
+    If `in_order_of_appearance`, number groups in order of first appearance in
+    left, then right. This is the group order `DataFrame.merge()` produces
+    for inner and right joins. It costs an extra pass over all keys.
+    """
+    left_keys = np.zeros(len(left_arrays[0]), dtype=np.int64)
+    right_keys = np.zeros(len(right_arrays[0]), dtype=np.int64)
+    n_keys = 1
+    for left, right in zip(left_arrays, right_arrays):
+        left_codes, right_codes, n_codes = _factorize_on_column(left, right)
+        if n_keys * n_codes >= 2 ** 62:
+            # Renumber, so the combined key won't overflow
+            left_keys, right_keys, n_keys = _factorize_groups(left_keys, right_keys)
+        left_keys = left_keys * n_codes + left_codes
+        right_keys = right_keys * n_codes + right_codes
+        n_keys *= n_codes
+    if in_order_of_appearance or n_keys > len(left_keys) + len(right_keys):
+        return _factorize_groups(left_keys, right_keys)
+    else:
+        return left_keys, right_keys, n_keys
+
+
+def _factorize_groups(
+    left_keys: np.ndarray, right_keys: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, int]:
+    encoded = pyarrow.array(np.concatenate([left_keys, right_keys])).dictionary_encode()
+    groups = arrow_values_to_numpy(encoded.indices, 0)
+    return groups[: len(left_keys)], groups[len(left_keys) :], len(encoded.dictionary)
+
+
+def _stable_argsort(groups: np.ndarray, n_groups: int) -> np.ndarray:
+    if n_groups <= 2 ** 16:
+        # numpy radix-sorts 16-bit ints: much faster than sorting int64
+        return np.argsort(groups.astype(np.uint16), kind="stable")
+    elif n_groups <= 2 ** 32:
+        # Two-pass LSD radix sort: low 16 bits, then (stably) high 16 bits
+        order = np.argsort((groups & 0xFFFF).astype(np.uint16), kind="stable")
+        high = (groups[order] >> 16).astype(np.uint16)
+        return order[np.argsort(high, kind="stable")]
+    else:
+        return np.argsort(groups, kind="stable")
+
+
+def _outer_indexers(
+    groups: np.ndarray, other_groups: np.ndarray, n_groups: int, keep_unmatched: bool
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Pair each row of `groups` with the rows of `other_groups` it matches.
+
+    Return `(indexer, other_indexer)`. Each row is followed by its matches, in
+    the other table's order. If `keep_unmatched`, rows with no match appear
+    once, paired with -1; otherwise they are omitted.
+    """
+    other_counts = np.bincount(other_groups, minlength=n_groups)
+    if other_counts.max(initial=0) <= 1:
+        # Common case: a lookup table. No row is repeated.
+        other_rows = np.full(n_groups, -1, dtype=np.int64)
+        other_rows[other_groups] = np.arange(len(other_groups))
+        other_indexer = other_rows[groups]
+        if keep_unmatched:
+            return np.arange(len(groups)), other_indexer
+        else:
+            matched = other_indexer >= 0
+            return np.flatnonzero(matched), other_indexer[matched]
+
+    other_order = _stable_argsort(other_groups, n_groups)
+    other_starts = np.cumsum(other_counts) - other_counts
+    counts = other_counts[groups]
+    if keep_unmatched:
+        repeats = np.maximum(counts, 1)
+    else:
+        repeats = counts
+    indexer = np.repeat(np.arange(len(groups)), repeats)
+    # Position of each output row within its row's run of matches
+    run_starts = np.cumsum(repeats) - repeats
+    offsets = np.arange(len(indexer)) - np.repeat(run_starts, repeats)
+    positions = np.repeat(other_starts[groups], repeats) + offsets
+    matched = np.repeat(counts > 0, repeats)
+    # Unmatched rows' positions may be out of bounds: clip, then ignore them
+    other_order = np.append(other_order, -1)
+    other_indexer = np.where(
+        matched, other_order[np.minimum(positions, len(other_order) - 1)], -1
+    )
+    return indexer, other_indexer
+
+
+def _join_indexers(
+    left_groups: np.ndarray, right_groups: np.ndarray, n_groups: int, join_type: str
+) -> Tuple[Optional[np.ndarray], np.ndarray]:
+    """
+    Compute which left and right rows make up each output row.
+
+    Return `(left_indexer, right_indexer)`, where -1 means "no row". The row
+    order is that of `DataFrame.merge(..., sort=False)`. `left_indexer` is None
+    when it would select every left row, in order.
+    """
+    if join_type == "left":
+        left_indexer, right_indexer = _outer_indexers(
+            left_groups, right_groups, n_groups, True
+        )
+        if len(left_indexer) == len(left_groups):
+            left_indexer = None  # each left row matched at most once
+        return left_indexer, right_indexer
+    elif join_type == "inner":
+        # Group order; within a group, each left row, followed by its matches
+        left_order = _stable_argsort(left_groups, n_groups)
+        indexer, right_indexer = _outer_indexers(
+            left_groups[left_order], right_groups, n_groups, False
+        )
+        return left_order[indexer], right_indexer
+    else:
+        # Group order; within a group, each right row, followed by its matches
+        right_order = _stable_argsort(right_groups, n_groups)
+        indexer, left_indexer = _outer_indexers(
+            right_groups[right_order], left_groups, n_groups, True
+        )
+        return left_indexer, right_order[indexer]
+
+
+def _take(array: pyarrow.Array, indexer: np.ndarray) -> pyarrow.Array:
+    """
+    Select `indexer` rows of `array`; -1 means null.
+
+    Integers become floats if nulls appear, as in Pandas. Dictionaries lose
+    the values no row uses any more.
+    """
+    mask = indexer < 0
+    indices = pyarrow.array(indexer, mask=mask if mask.any() else None)
+    result = array.take(indices)
+    if pyarrow.types.is_integer(result.type) and result.null_count:
+        result = result.cast(pyarrow.float64())
+    if pyarrow.types.is_dictionary(result.type):
+        result = remove_unused_dictionary_values(result)
+    return result
+
+
+def render_arrow(table, params, tab_name, fetch_result, output_path):
+    input_columns = {c.name: c for c in table.metadata.columns}
     right_tab = params["right_tab"]
     if right_tab is None:
         # User hasn't chosen tabs yet
-        return table
+        return render_arrow_columns(
+            table, [(c.name, c) for c in table.metadata.columns], output_path
+        )
 
-    right_dataframe = right_tab.dataframe
+    right_table = right_tab.table
+    right_columns = {c.name: c for c in right_table.metadata.columns}
     on_columns = _parse_colnames(
         params["join_columns"]["on"],
         # Workbench doesn't test whether the 'on' columns are in
-        # right_dataframe, but the UI does so we can just ignore any invalid
+        # right_table, but the UI does so we can just ignore any invalid
         # columns and call it a day.
-        set(table.columns & right_dataframe.columns),
+        set(input_columns.keys() & right_columns.keys()),
     )
-    right_columns_set = set(
+    right_colnames_set = set(
         _parse_colnames(
             params["join_columns"]["right"],
-            set(right_dataframe.columns).difference(set(on_columns)),
+            set(right_columns.keys()).difference(set(on_columns)),
         )
     )
-    # order right_columns as they're ordered in right_dataframe
-    right_columns = [c for c in right_dataframe.columns if c in right_columns_set]
+    # order right_colnames as they're ordered in right_table
+    right_colnames = [c for c in right_columns if c in right_colnames_set]
 
     join_type = params["type"]
 
     # Ensure all "on" types match
     for colname in on_columns:
-        left_type = input_columns[colname].type
-        right_type = right_tab.columns[colname].type
+        left_type = input_columns[colname].type.name
+        right_type = right_columns[colname].type.name
         if left_type != right_type:
-            return (
+            return RenderResult.from_deprecated_error(
                 f'Column "{colname}" is *{left_type}* in this tab '
-                f"and *{right_type}* in {right_tab.name}. Please convert "
+                f"and *{right_type}* in {right_tab.tab.name}. Please convert "
                 "one or the other so they are both the same type."
             )
 
     # Ensure we don't overwrite a column (the user won't want that)
-    for colname in right_columns:
+    for colname in right_colnames:
         if colname in input_columns:
-            return (
-                f'You tried to add "{colname}" from {right_tab.name}, but '
+            return RenderResult.from_deprecated_error(
+                f'You tried to add "{colname}" from {right_tab.tab.name}, but '
                 "your table already has that column. Please rename the column "
                 "in one of the tabs, or unselect the column."
             )
 
     if not on_columns:
-        # Pandas ValueError: not enough values to unpack (expected 3, got 0)
-        #
         # Let's pretend we want this behavior, and just pass the input
         # (suggesting to the user that the params aren't all entered yet).
-        return table
-
-    for on_column in on_columns:
-        # if both 'left' and 'right' are categorical, coerce the categories to
-        # be identical, so DataFrame.merge can preserve the Categorical dtype.
-        # In cases where Categorical is the dtype we want, the join will be
-        # faster and the result will take less RAM and disk space.
-        #
-        # If we don't do this, the result will have 'object' dtype.
-        left_series = table[on_column]
-        right_series = right_dataframe[on_column]
-        if hasattr(left_series, "cat") and hasattr(right_series, "cat"):
-            # sorted for ease of unit-testing
-            categories = sorted(
-                list(
-                    frozenset.union(
-                        frozenset(left_series.cat.categories),
-                        frozenset(right_series.cat.categories),
-                    )
-                )
-            )
-            left_series.cat.set_categories(categories, inplace=True)
-            right_series.cat.set_categories(categories, inplace=True)
-
-    # Select only the columns we want
-    right_dataframe = right_dataframe[on_columns + right_columns]
+        return render_arrow_columns(
+            table, [(c.name, c) for c in table.metadata.columns], output_path
+        )
 
-    dataframe = table.merge(right_dataframe, on=on_columns, how=join_type)
+    left_groups, right_groups, n_groups = _factorize_keys(
+        [arrow_column_to_array(table.table.column(c)) for c in on_columns],
+        [arrow_column_to_array(right_table.table.column(c)) for c in on_columns],
+        # A left join's output is in left-row order, whatever the groups are
+        in_order_of_appearance=(join_type != "left"),
+    )
+    left_indexer, right_indexer = _join_indexers(
+        left_groups, right_groups, n_groups, join_type
+    )
 
-    colnames_to_recategorize = None
-    if join_type == "left":
-        colnames_to_recategorize = on_columns + right_columns
-    elif join_type == "right":
-        colnames_to_recategorize = list(input_columns.keys())
-    else:
-        colnames_to_recategorize = dataframe.columns
-    for colname in colnames_to_recategorize:
-        series = dataframe[colname]
-        if hasattr(series, "cat"):
-            series.cat.remove_unused_categories(inplace=True)
+    arrays = []
+    for colname in input_columns:
+        column = table.table.column(colname)
+        if join_type == "right" and colname in on_columns:
+            # Every output row has a right row, and its key equals the left's.
+            # Keep the left column's encoding.
+            array = _take(
+                arrow_column_to_array(right_table.table.column(colname)), right_indexer
+            )
+            if pyarrow.types.is_dictionary(column.type):
+                array = _dictionary_encode(array)
+            elif _is_number(column.type) and not column.type.equals(array.type):
+                array = array.cast(_common_number_type(column.type, array.type))
+            arrays.append(pyarrow.chunked_array([array]))
+        elif left_indexer is None:
+            arrays.append(column)  # left join: reuse input data as-is
+        else:
+            array = _take(arrow_column_to_array(column), left_indexer)
+            arrays.append(pyarrow.chunked_array([array]))
+    for colname in right_colnames:
+        array = _take(
+            arrow_column_to_array(right_table.table.column(colname)), right_indexer
+        )
+        arrays.append(pyarrow.chunked_array([array]))
 
-    return {
-        "dataframe": dataframe,
-        "column_formats": {c: right_tab.columns[c].format for c in right_columns},
-    }
+    return render_arrow_table(
+        arrays,
+        list(input_columns.values()) + [right_columns[c] for c in right_colnames],
+        len(right_indexer),
+        output_path,
+    )
 
 
 def _migrate_params_v0_to_v1(params):
@@ -1,7 +1,14 @@
 import json
 from typing import Any, Dict
 import numpy as np
-import pandas as pd
+import pyarrow
+from cjwkernel.pandas.moduleutils import (
+    arrow_column_to_array,
+    arrow_null_mask,
+    arrow_values_to_numpy,
+    render_arrow_columns,
+    render_arrow_table,
+)
 
 
 class RefineSpec:
@@ -15,64 +22,44 @@ class RefineSpec:
     def __init__(self, renames: Dict[str, str] = {}):
         self.renames = renames
 
-    def apply_renames(self, series: pd.Series) -> pd.Series:
-        """Build a series with changed categories."""
-        # 1. Build list of new_categories from old_categories and renames
-        old_categories = set(series.cat.categories)
-        # filter self.renames: ignore renames of categories that don't exist.
-        # (They can happen if the input changes after the user sets params.)
-        renames = {k: v for k, v in self.renames.items() if k in old_categories}
-        new_categories = (
-            set(series.cat.categories)
-            .difference(renames.keys())
-            .union(renames.values())
+    def apply_renames(self, array: pyarrow.Array) -> pyarrow.DictionaryArray:
+        """
+        Build a dictionary array with changed values.
+
+        We only touch the dictionary: cost is O(n_values), not O(n_rows),
+        unless renames merge values. Then we remap indices, with numpy.
+        """
+        if not pyarrow.types.is_dictionary(array.type):
+            array = array.dictionary_encode()
+
+        # 1. Rename each dictionary value. Renames of values that don't exist
+        # are ignored. (They can happen if the input changes after the user
+        # sets params.)
+        old_values = array.dictionary.to_pylist()
+        renamed = [self.renames.get(value, value) for value in old_values]
+
+        # 2. Build "code_map", a translation table from old index to new
+        # index. Renaming to an existing value (or renaming two values to the
+        # same new value) merges them: the first one in the dictionary wins.
+        new_codes = {}
+        code_map = np.array(
+            [new_codes.setdefault(value, len(new_codes)) for value in renamed],
+            dtype=np.int32,
+        )
+        dictionary = pyarrow.array(list(new_codes.keys()), type=pyarrow.utf8())
+        if len(new_codes) == len(old_values):
+            # No merges: every row keeps its index. Zero-copy.
+            return pyarrow.DictionaryArray.from_arrays(array.indices, dictionary)
+
+        # 3. Find new indices. Nulls map to 0 and stay null.
+        old_codes = arrow_values_to_numpy(array.indices, 0)
+        new_indices = code_map[old_codes]
+        return pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array(
+                new_indices.astype(np.int32), mask=arrow_null_mask(array.indices)
+            ),
+            dictionary,
         )
-        # Sort categories, simply to make unit tests pass. (They can't predict
-        # category order otherwise, and assert_frame_equal() treats different
-        # orders as different data frames.)
-        #
-        # This makes apply_renames O(n lg n) wrt the number of categories. It
-        # doesn't strictly need to be; but we assume this is more efficient
-        # than using hashes.
-        new_categories = pd.Index(sorted(new_categories))
-
-        # 2. Build "code_map", a translation table from old "code" to new
-        # "code". (A Categorical series is an array of integer codes and object
-        # categories. "code_map" is an array of int indexed by int old "code".)
-        def old_category_str_to_new_code(old_category: str) -> int:
-            nonlocal new_categories, renames
-            if old_category in renames:
-                new_category = renames[old_category]
-            else:
-                new_category = old_category
-            idx = new_categories.searchsorted(new_category)
-            assert new_categories[idx] == new_category
-            return idx
-
-        code_map = [old_category_str_to_new_code(c) for c in series.cat.categories]
-        # old_codes[x] == -1 means np.nan. code_map[-1] must give -1 so that
-        # new_codes[x] == -1, too.
-        code_map.append(-1)
-        code_map = np.array(code_map)  # optimization
-
-        # 3. Find "new_codes" -- given series.cat.categories, which index into
-        # series.cat.categories, find codes that would index into
-        # new_categories.
-        old_codes = series.cat.codes.values  # np.array
-        # "wrap" means when looking up -1, the result is the last element in
-        # code_map -- which is -1 because we set that above.
-        new_codes = code_map.take(old_codes, mode="wrap")
-
-        # 4. Cast to a Series.
-        return pd.Series(pd.Categorical.from_codes(new_codes, new_categories))
-
-    def apply(self, table, column):
-        # Always operate on categories
-        series = table[column].astype("category")
-        series = self.apply_renames(series)
-        table[column] = series
-
-        return table
 
 
 def migrate_params_v0_to_v1(column: str, refine: str) -> Dict[str, Any]:
@@ -247,15 +234,25 @@ def migrate_params(params: Dict[str, Any]) -> Dict[str, Any]:
     return params
 
 
-def render(table, params, **kwargs):
+def render_arrow(table, params, tab_name, fetch_result, output_path):
     # 'refine' holds the edits
     column: str = params["column"]
     if not column:
         # No user input yet
-        return table
+        return render_arrow_columns(
+            table, [(c.name, c) for c in table.metadata.columns], output_path
+        )
 
     refine = params["refine"]
     spec = RefineSpec(refine.get("renames", {}))
-    table = spec.apply(table, column)
-
-    return table
+    arrays = []
+    for metadata_column, chunked_array in zip(
+        table.metadata.columns, table.table.columns
+    ):
+        if metadata_column.name == column:
+            array = spec.apply_renames(arrow_column_to_array(chunked_array))
+            chunked_array = pyarrow.chunked_array([array])
+        arrays.append(chunked_array)
+    return render_arrow_table(
+        arrays, table.metadata.columns, table.metadata.n_rows, output_path
+    )
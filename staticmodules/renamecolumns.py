@@ -1,6 +1,8 @@
 import itertools
 import json
 from typing import Dict, List
+from cjwkernel.pandas.moduleutils import render_arrow_columns
+from cjwkernel.types import Column, RenderResult
 
 
 def _uniquify(colnames: List[str]):
@@ -89,32 +91,22 @@ def _parse_custom_list(custom_list: str, table_columns: List[str]):
     return _parse_renames(renames, table_columns)
 
 
-def _do_renames(table, input_columns, renames):
-    # Edit in-place
-    table.rename(columns=renames, inplace=True)
-    return {
-        "dataframe": table,
-        # Every new (or overwritten) column name gets a format
-        "column_formats": {
-            new: input_columns[old].format for old, new in renames.items()
-        },
-    }
-
-
-def render(table, params, *, input_columns):
-    columns = list(table.columns)
+def render_arrow(table, params, tab_name, fetch_result, output_path):
+    colnames = [c.name for c in table.metadata.columns]
     if params["custom_list"]:
         try:
-            renames = _parse_custom_list(params["list_string"], columns)
+            renames = _parse_custom_list(params["list_string"], colnames)
         except ValueError as err:
-            return str(err)
+            return RenderResult.from_deprecated_error(str(err))
     else:
-        renames = _parse_renames(params["renames"], columns)
-
-    if not renames:
-        return table  # no-op
-
-    return _do_renames(table, input_columns, renames)
+        renames = _parse_renames(params["renames"], colnames)
+
+    # Every renamed column keeps its type (and number format)
+    columns = [
+        (c.name, Column(renames.get(c.name, c.name), c.type))
+        for c in table.metadata.columns
+    ]
+    return render_arrow_columns(table, columns, output_path)
 
 
 def _migrate_params_v0_to_v1(params):
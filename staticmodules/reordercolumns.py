@@ -1,5 +1,6 @@
 import json
 from typing import Any, Dict
+from cjwkernel.pandas.moduleutils import render_arrow_columns
 
 
 def parse_json_param(value) -> Dict[str, Any]:
@@ -24,15 +25,12 @@ def parse_json_param(value) -> Dict[str, Any]:
         return value
 
 
-def render(table, params):
+def render_arrow(table, params, tab_name, fetch_result, output_path):
     # Entries should appear in chronological order as new
     # operations are appended to the end of the stack
     history_entries = parse_json_param(params["reorder-history"])
 
-    if not history_entries:
-        return table  # no reorders
-
-    columns = table.columns.tolist()
+    columns = list(table.metadata.columns)
 
     for entry in history_entries:
         from_idx = int(entry["from"])
@@ -46,7 +44,7 @@ def render(table, params):
         moved = columns.pop(from_idx)
         columns.insert(to_idx, moved)
 
-    return table[columns]
+    return render_arrow_columns(table, [(c.name, c) for c in columns], output_path)
 
 
 def _migrate_params_v0_to_v1(params):
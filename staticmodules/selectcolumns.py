@@ -1,27 +1,29 @@
 import re
-from typing import Tuple
+from typing import List, Tuple
 import pandas as pd
 from pandas.core.indexes.base import InvalidIndexError
+from cjwkernel.pandas.moduleutils import render_arrow_columns
+from cjwkernel.types import RenderResult
 
 
 commas = re.compile(r"\s*,\s*")
 numbers = re.compile(r"(?P<first>[1-9]\d*)(?:-(?P<last>[1-9]\d*))?")
 
 
-def select_columns_by_number(table, str_col_nums):
+def select_columns_by_number(colnames: List[str], str_col_nums: str) -> List[str]:
     """
     Return a list of column names, or raise ValueError.
     """
     index = parse_interval_index(str_col_nums)  # raises ValueError
 
-    table_col_nums = list(range(0, len(table.columns)))
+    table_col_nums = list(range(0, len(colnames)))
 
     try:
         mask = index.get_indexer(table_col_nums) != -1
     except InvalidIndexError:
         raise ValueError("There are overlapping numbers in input range")
 
-    return list(table.columns[mask])
+    return [colname for colname, selected in zip(colnames, mask) if selected]
 
 
 def parse_interval(s: str) -> Tuple[int, int]:
@@ -62,25 +64,30 @@ def parse_interval_index(column_numbers: str) -> pd.IntervalIndex:
     return pd.IntervalIndex.from_tuples(tuples, closed="both")
 
 
-def render(table, params, **kwargs):
+def render_arrow(table, params, tab_name, fetch_result, output_path):
+    input_columns = table.metadata.columns
     if params["select_range"]:
         try:
-            columns = select_columns_by_number(table, params["column_numbers"])
+            colnames = select_columns_by_number(
+                [c.name for c in input_columns], params["column_numbers"]
+            )
         except ValueError as err:
-            return str(err)
+            return RenderResult.from_deprecated_error(str(err))
     else:
-        columns = params["colnames"]
+        colnames = params["colnames"]
 
     # if no column has been selected, keep the columns
-    if not columns:
-        return table
-
-    if not params["keep"]:
-        # Invert "columns", maintaining the order from the input table.
-        drop_columns = set(columns)
-        columns = [c for c in table.columns if c not in drop_columns]
+    if not colnames:
+        keep_columns = input_columns
+    elif params["keep"]:
+        by_name = {c.name: c for c in input_columns}
+        keep_columns = [by_name[name] for name in colnames if name in by_name]
+    else:
+        # Invert "colnames", maintaining the order from the input table.
+        drop_colnames = set(colnames)
+        keep_columns = [c for c in input_columns if c.name not in drop_colnames]
 
-    return table[columns]
+    return render_arrow_columns(table, [(c.name, c) for c in keep_columns], output_path)
 
 
 def _migrate_params_v0_to_v1(params):
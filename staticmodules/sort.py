@@ -1,6 +1,16 @@
 from dataclasses import dataclass
-from typing import Any, Dict, List, Union
-import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+import numpy as np
+import pyarrow
+from cjwkernel.pandas.moduleutils import (
+    arrow_column_to_array,
+    arrow_null_mask,
+    arrow_values_to_numpy,
+    remove_unused_dictionary_values,
+    render_arrow_columns,
+    render_arrow_table,
+)
+from cjwkernel.types import RenderResult
 
 
 @dataclass
@@ -11,72 +21,280 @@ class SortColumn:
     is_ascending: bool
 
 
-def _do_render(
-    table, *, sort_columns: List[Dict[str, Union[str, bool]]], keep_top: str
-):
+@dataclass
+class SortKey:
+    """
+    Numbers that sort like a column's values.
+
+    Nulls sort last, whatever the direction.
+    """
+
+    values: np.ndarray
+    """int64 or float64; order of values at null positions is meaningless."""
+
+    is_null: Optional[np.ndarray] = None
+    """Bool mask, or None if there are no nulls."""
+
+    @classmethod
+    def from_array(cls, array: pyarrow.Array, is_ascending: bool) -> "SortKey":
+        if pyarrow.types.is_string(array.type) or pyarrow.types.is_dictionary(
+            array.type
+        ):
+            values = cls._text_ranks(array)
+        else:
+            values = arrow_values_to_numpy(array, 0)
+        if not is_ascending:
+            # ~x is -x - 1: it reverses int64 order without overflowing
+            values = -values if values.dtype == np.float64 else ~values
+        if array.null_count:
+            return cls(values, arrow_null_mask(array))
+        else:
+            return cls(values)
+
+    @staticmethod
+    def _text_ranks(array: pyarrow.Array) -> np.ndarray:
+        """
+        Rank each text value by its position in the sorted list of values.
+
+        Only the dictionary is sorted as strings: rows are ranked by their
+        dictionary codes, never by comparing strings.
+        """
+        if not pyarrow.types.is_dictionary(array.type):
+            array = array.dictionary_encode()
+        dictionary = array.dictionary.to_pylist()
+        ranks = np.empty(len(dictionary), dtype=np.int64)
+        ranks[sorted(range(len(dictionary)), key=dictionary.__getitem__)] = np.arange(
+            len(dictionary)
+        )
+        codes = arrow_values_to_numpy(array.indices, 0)
+        return ranks[codes] if len(ranks) else codes
+
+    def lexsort_keys(self) -> List[np.ndarray]:
+        """
+        Arrays to sort by, least significant first.
+        """
+        if self.is_null is None:
+            return [self.values]
+        else:
+            return [self.values, self.is_null.view(np.uint8)]
+
+    def select(self, rows: np.ndarray) -> "SortKey":
+        return SortKey(
+            self.values[rows], None if self.is_null is None else self.is_null[rows]
+        )
+
+
+def _stable_argsort(values: np.ndarray) -> np.ndarray:
+    if values.dtype != np.float64 and len(values):
+        low = values.min()
+        if int(values.max()) - int(low) < 2 ** 16:
+            # numpy radix-sorts 16-bit ints: much faster than sorting int64.
+            # Text ranks, null masks and small numbers all fit.
+            values = (values - low).astype(np.uint16)
+    return np.argsort(values, kind="stable")
+
+
+def _lexsort(keys: List[SortKey]) -> np.ndarray:
+    """
+    Return row order, sorting by `keys[0]`, then `keys[1]`, and so on.
+
+    The sort is stable. Like `np.lexsort()`, it sorts by the least
+    significant key first; unlike it, it radix-sorts small-range keys.
+    """
+    order = None
+    for key in reversed(keys):
+        for values in key.lexsort_keys():
+            if order is None:
+                order = _stable_argsort(values)
+            else:
+                order = order[_stable_argsort(values[order])]
+    return order
+
+
+def _keep_top_rows(key: SortKey, n: int) -> np.ndarray:
+    """
+    Return the first `n` rows of the stable sort by `key`, in order.
+
+    This is O(len(key.values)): it never sorts more than `n` candidate rows
+    (plus ties).
+    """
+    if n >= len(key.values):
+        return _lexsort([key])
+
+    if key.is_null is None:
+        valid = np.arange(len(key.values))
+        nulls = np.array([], dtype=valid.dtype)
+    else:
+        valid = np.flatnonzero(~key.is_null)
+        nulls = np.flatnonzero(key.is_null)
+
+    if len(valid) > n:
+        valid_values = key.values[valid]
+        nth = np.partition(valid_values, n - 1)[n - 1]
+        candidates = valid[valid_values <= nth]  # in input order
+        order = _stable_argsort(key.values[candidates])
+        return candidates[order[:n]]
+    else:
+        order = _stable_argsort(key.values[valid])
+        return np.concatenate([valid[order], nulls[: n - len(valid)]])
+
+
+def _factorize(values: np.ndarray) -> Tuple[np.ndarray, int]:
+    """
+    Map equal `values` to equal codes in `range(n_codes)`.
+
+    Return `(codes, n_codes)`. `n_codes` is at most `len(values)`.
+    """
+    if values.dtype != np.float64 and len(values):
+        low = values.min()
+        if int(values.max()) - int(low) < len(values):
+            # Small ints (such as text ranks) are codes already
+            return values - low, int(values.max()) - int(low) + 1
+    encoded = pyarrow.array(values).dictionary_encode()
+    return arrow_values_to_numpy(encoded.indices, 0), len(encoded.dictionary)
+
+
+def _group_ids(keys: List[SortKey]) -> Tuple[np.ndarray, int]:
+    """
+    Number the groups of `keys` values: return `(group_ids, n_groups)`.
+
+    Nulls are ignored: don't pass rows with null values.
+    """
+    ids = np.zeros(len(keys[0].values), dtype=np.int64)
+    n_ids = 1
+    for key in keys:
+        codes, n_codes = _factorize(key.values)
+        if n_ids * n_codes >= 2 ** 62:
+            ids, n_ids = _factorize(ids)  # so the product won't overflow
+        ids = ids * n_codes + codes
+        n_ids *= n_codes
+    if n_ids > len(ids):
+        ids, n_ids = _factorize(ids)
+    return ids, n_ids
+
+
+def _select_top_rows_per_group(keys: List[SortKey], n: int) -> Optional[np.ndarray]:
+    """
+    Find the rows `_keep_top_rows_per_group()` keeps, in input order.
+
+    The "group" is all keys but the last. Groups with at most `n` rows are
+    kept whole; from each larger group, `_keep_top_rows()` selects `n` rows
+    by the last key without sorting the group. Rows with a null group value
+    aren't part of any group: keep them all.
+
+    Return None if there are so many large groups that one sort of the whole
+    table would be faster than selecting within each group.
+    """
+    has_null_group = np.zeros(len(keys[0].values), dtype=bool)
+    for key in keys[:-1]:
+        if key.is_null is not None:
+            has_null_group |= key.is_null
+    grouped = np.flatnonzero(~has_null_group)
+    group_ids, n_groups = _group_ids([key.select(grouped) for key in keys[:-1]])
+    counts = np.bincount(group_ids, minlength=n_groups)
+
+    is_large = counts > n
+    n_large = np.count_nonzero(is_large)
+    # Each large group costs a few numpy calls; sorting costs per row.
+    if n_large * 100 > len(grouped):
+        return None
+
+    in_large_group = is_large[group_ids]
+    large_group_rows = grouped[in_large_group]
+    order = _stable_argsort(group_ids[in_large_group])
+    large_group_rows = large_group_rows[order]  # by group, then input order
+    ends = np.cumsum(counts[is_large])
+    selections = [np.flatnonzero(has_null_group), grouped[~in_large_group]]
+    for start, end in zip(ends - counts[is_large], ends):
+        rows = large_group_rows[start:end]
+        selections.append(rows[_keep_top_rows(keys[-1].select(rows), n)])
+    return np.sort(np.concatenate(selections))
+
+
+def _keep_top_rows_per_group(
+    keys: List[SortKey], sorted_rows: np.ndarray, n: int
+) -> np.ndarray:
+    """
+    Filter `sorted_rows`, keeping `n` rows per group.
+
+    The "group" is all keys but the last: in `sorted_rows`, each group's rows
+    are contiguous and sorted by the last key. Rows with a null group value
+    aren't part of any group: keep them all.
+    """
+    group_keys = [key.select(sorted_rows) for key in keys[:-1]]
+    is_new_group = np.zeros(len(sorted_rows), dtype=bool)
+    has_null_group = np.zeros(len(sorted_rows), dtype=bool)
+    for key in group_keys:
+        is_new_group[1:] |= key.values[1:] != key.values[:-1]
+        if key.is_null is not None:
+            is_new_group[1:] |= key.is_null[1:] != key.is_null[:-1]
+            has_null_group |= key.is_null
+    if len(sorted_rows):
+        is_new_group[0] = True
+    positions = np.arange(len(sorted_rows))
+    group_starts = np.maximum.accumulate(np.where(is_new_group, positions, 0))
+    rank_in_group = positions - group_starts
+    return sorted_rows[(rank_in_group < n) | has_null_group]
+
+
+def render_arrow(table, params, tab_name, fetch_result, output_path):
     # Filter out empty columns (don't raise an error)
-    sort_columns = [SortColumn(**sc) for sc in sort_columns if sc["colname"]]
+    sort_columns = [SortColumn(**sc) for sc in params["sort_columns"] if sc["colname"]]
 
+    keep_top = params["keep_top"]
     if keep_top:
         try:
             keep_top_int = int(keep_top)
             if keep_top_int <= 0:
                 raise ValueError
         except ValueError:
-            return 'Please enter a positive integer in "Keep top" ' "or leave it blank."
+            return RenderResult.from_deprecated_error(
+                'Please enter a positive integer in "Keep top" or leave it blank.'
+            )
     else:
         keep_top_int = None
 
     if not sort_columns:
-        return table
+        return render_arrow_columns(
+            table, [(c.name, c) for c in table.metadata.columns], output_path
+        )
 
     columns = [sc.colname for sc in sort_columns]
-    directions = [sc.is_ascending for sc in sort_columns]
 
     # check for duplicate columns
     if len(columns) != len(set(columns)):
         # TODO support this case? The intent is unambiguous.
-        return "Duplicate columns."
-
-    if keep_top_int and len(sort_columns) > 1:
-        # sort by _last_ column: that's the sorting we'll use within each group
-        table.sort_values(
-            by=sort_columns[-1].colname,
-            ascending=sort_columns[-1].is_ascending,
-            inplace=True,
-            na_position="last",
-        )
+        return RenderResult.from_deprecated_error("Duplicate columns.")
 
-        columns_to_group = columns[:-1]
-        rows_with_na_mask = table[columns_to_group].isnull().any(axis=1)
-        rows_with_na = table[rows_with_na_mask]
-        rows_without_na = table[~rows_with_na_mask]
-
-        keep_grouped_rows = rows_without_na.groupby(columns_to_group, sort=False).head(
-            keep_top_int
+    keys = [
+        SortKey.from_array(
+            arrow_column_to_array(table.table.column(sc.colname)), sc.is_ascending
         )
-        table = pd.concat([keep_grouped_rows, rows_with_na], ignore_index=True)
-
-    # sort values
-    table.sort_values(
-        by=columns, ascending=directions, inplace=True, na_position="last"
-    )
-
-    if keep_top_int and len(sort_columns) == 1:
-        # The whole result is one big group, and we want to keep the elements
-        # within it.
-        table = table.head(keep_top_int)
-
-    table.reset_index(drop=True, inplace=True)
-
-    if keep_top_int:
-        # We may have removed rows. Now, tidy up all Categorical columns.
-        for column in table.columns:
-            series = table[column]
-            if hasattr(series, "cat"):
-                series.cat.remove_unused_categories(inplace=True)
+        for sc in sort_columns
+    ]
+    if keep_top_int and len(keys) == 1:
+        # The whole table is one big group: select, then sort the selection
+        rows = _keep_top_rows(keys[0], keep_top_int)
+    elif keep_top_int:
+        selected = _select_top_rows_per_group(keys, keep_top_int)
+        if selected is not None:
+            # Sort only the rows we keep
+            rows = selected[_lexsort([key.select(selected) for key in keys])]
+        else:
+            # One sort by all columns also sorts each group by its last column
+            rows = _keep_top_rows_per_group(keys, _lexsort(keys), keep_top_int)
+    else:
+        rows = _lexsort(keys)
 
-    return table
+    indices = pyarrow.array(rows)
+    arrays = []
+    for column in table.table.columns:
+        array = arrow_column_to_array(column).take(indices)
+        if keep_top_int and pyarrow.types.is_dictionary(array.type):
+            # We may have removed rows. Tidy up the dictionary.
+            array = remove_unused_dictionary_values(array)
+        arrays.append(pyarrow.chunked_array([array]))
+    return render_arrow_table(arrays, table.metadata.columns, len(rows), output_path)
 
 
 def _migrate_params_v0_to_v1(params: Dict[str, Any]) -> Dict[str, Any]:
@@ -140,7 +358,3 @@ def migrate_params(params: Dict[str, Any]) -> Dict[str, Any]:
         params = _migrate_params_v1_to_v2(params)
 
     return params
-
-
-def render(table, params):
-    return _do_render(table, **params)
@@ -1,14 +1,39 @@
 import unittest
 import numpy as np
-import pandas as pd
-from pandas.testing import assert_frame_equal
-from staticmodules.converttexttonumber import (
-    render,
-    InputNumberType,
-    InputLocale,
-    Form,
-    migrate_params,
-)
+import pyarrow
+from cjwkernel.tests.util import arrow_table, assert_arrow_table_equals
+from cjwkernel.types import Column, ColumnType, I18nMessage, RenderError
+from cjwkernel.util import tempfile_context
+from staticmodules.converttexttonumber import render_arrow, migrate_params
+
+
+def P(
+    colnames=["A"],
+    extract=False,
+    input_number_type="any",
+    input_locale="us",
+    error_means_null=False,
+    output_format="{:,}",
+):
+    return {
+        "colnames": colnames,
+        "extract": extract,
+        "input_number_type": input_number_type,
+        "input_locale": input_locale,
+        "error_means_null": error_means_null,
+        "output_format": output_format,
+    }
+
+
+def render(table, params, columns=None):
+    with tempfile_context(suffix=".arrow") as output_path:
+        return render_arrow(
+            arrow_table(table, columns), params, "Tab 1", None, output_path
+        )
+
+
+def dictionary(values):
+    return pyarrow.array(values, type=pyarrow.utf8()).dictionary_encode()
 
 
 class TestMigrateParams(unittest.TestCase):
@@ -101,179 +126,272 @@ class TestMigrateParams(unittest.TestCase):
 
 
 class TestExtractNumbers(unittest.TestCase):
+    def assertResult(self, result, expected):
+        self.assertEqual(result.errors, [])
+        assert_arrow_table_equals(result.table, expected)
+
     def test_ignore_numbers(self):
-        table = pd.DataFrame({"A": [1, 2]})
-        result = Form(["A"]).convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [1, 2]}))
+        result = render({"A": [1, 2]}, P())
+        self.assertResult(result, {"A": [1, 2]})
 
     def test_match_unicode_minus(self):
-        table = pd.DataFrame({"A": ["-1", "\u22122"]})
-        result = Form(["A"]).convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [-1, -2]}))
+        result = render({"A": ["-1", "\u22122"]}, P())
+        self.assertResult(result, {"A": [-1, -2]})
 
     def test_extract_any_from_str(self):
-        table = pd.DataFrame({"A": ["1", "2.1", "note: 3.2", "-3.1"]})
-        form = Form(["A"], True, InputNumberType.ANY, error_means_null=True)
-        result = form.convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [1.0, 2.1, 3.2, -3.1]}))
+        result = render(
+            {"A": ["1", "2.1", "note: 3.2", "-3.1"]},
+            P(extract=True, input_number_type="any", error_means_null=True),
+        )
+        self.assertResult(result, {"A": [1.0, 2.1, 3.2, -3.1]})
 
     def test_extract_any_from_category(self):
-        table = pd.DataFrame({"A": ["1", "2.1", "note: 3.2"]}, dtype="category")
-        form = Form(["A"], True, InputNumberType.ANY)
-        result = form.convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [1.0, 2.1, 3.2]}))
+        result = render(
+            {"A": dictionary(["1", "2.1", "note: 3.2"])},
+            P(extract=True, input_number_type="any"),
+        )
+        self.assertResult(result, {"A": [1.0, 2.1, 3.2]})
 
     def test_extract_any_us(self):
-        table = pd.DataFrame({"A": ["1,234", "2,345.67", "3.456"]})
-        form = Form(["A"], True, InputNumberType.ANY, InputLocale.US)
-        result = form.convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [1234, 2345.67, 3.456]}))
+        result = render(
+            {"A": ["1,234", "2,345.67", "3.456"]},
+            P(extract=True, input_number_type="any", input_locale="us"),
+        )
+        self.assertResult(result, {"A": [1234, 2345.67, 3.456]})
 
     def test_extract_any_eu(self):
-        table = pd.DataFrame({"A": ["1,234", "2,345.67", "3.456"]})
-        form = Form(["A"], True, InputNumberType.ANY, InputLocale.EU)
-        result = form.convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [1.234, 2.345, 3456]}))
+        result = render(
+            {"A": ["1,234", "2,345.67", "3.456"]},
+            P(extract=True, input_number_type="any", input_locale="eu"),
+        )
+        self.assertResult(result, {"A": [1.234, 2.345, 3456]})
 
     def test_extract_any_many_commas(self):
-        result = Form(["A"], True, InputNumberType.ANY, InputLocale.US).convert_table(
-            pd.DataFrame({"A": ["1,234,567,890"]})
+        result = render(
+            {"A": ["1,234,567,890"]},
+            P(extract=True, input_number_type="any", input_locale="us"),
         )
-        assert_frame_equal(result, pd.DataFrame({"A": [1234567890]}))
+        self.assertResult(result, {"A": [1234567890]})
 
     def test_extract_any_us_thousands_must_be_in_groups_of_3(self):
-        form = Form(["A"], True, InputNumberType.ANY, InputLocale.US, True)
-        result = form.convert_table(
-            pd.DataFrame({"A": ["123,4", "2,345,1", "3,23.123"]})
+        result = render(
+            {"A": ["123,4", "2,345,1", "3,23.123"]},
+            P(
+                extract=True,
+                input_number_type="any",
+                input_locale="us",
+                error_means_null=True,
+            ),
         )
-        assert_frame_equal(result, pd.DataFrame({"A": [123, 2345, 3]}))
+        self.assertResult(result, {"A": [123, 2345, 3]})
 
     def test_extract_any_eu_thousands_must_be_in_groups_of_3(self):
-        form = Form(["A"], True, InputNumberType.ANY, InputLocale.EU, True)
-        result = form.convert_table(
-            pd.DataFrame({"A": ["123.4", "2.345.1", "3.23,123"]})
+        result = render(
+            {"A": ["123.4", "2.345.1", "3.23,123"]},
+            P(
+                extract=True,
+                input_number_type="any",
+                input_locale="eu",
+                error_means_null=True,
+            ),
         )
-        assert_frame_equal(result, pd.DataFrame({"A": [123, 2345, 3]}))
+        self.assertResult(result, {"A": [123, 2345, 3]})
 
     def test_match_eu_thousands_must_be_in_groups_of_3(self):
-        form = Form(
-            ["A"], False, InputNumberType.ANY, InputLocale.EU, error_means_null=True
+        result = render(
+            {"A": ["123.4", "2.345.1", "3.23,123"]},
+            P(
+                extract=False,
+                input_number_type="any",
+                input_locale="eu",
+                error_means_null=True,
+            ),
         )
-        result = form.convert_table(
-            pd.DataFrame({"A": ["123.4", "2.345.1", "3.23,123"]})
+        self.assertResult(
+            result, {"A": pyarrow.array([None, None, None], pyarrow.float64())}
         )
-        assert_frame_equal(result, pd.DataFrame({"A": [np.nan, np.nan, np.nan]}))
 
     def test_extract_integer_from_str(self):
-        table = pd.DataFrame({"A": ["1", "2.1", "note: 3.2", "-3"]})
-        form = Form(["A"], True, InputNumberType.INTEGER)
-        result = form.convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [1, 2, 3, -3]}))
+        result = render(
+            {"A": ["1", "2.1", "note: 3.2", "-3"]},
+            P(extract=True, input_number_type="int"),
+        )
+        self.assertResult(result, {"A": [1, 2, 3, -3]})
 
     def test_extract_integer_from_category(self):
-        table = pd.DataFrame({"A": ["1", "2.1", "note: 3.2"]}, dtype="category")
-        form = Form(["A"], True, InputNumberType.INTEGER)
-        result = form.convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [1, 2, 3]}))
+        result = render(
+            {"A": dictionary(["1", "2.1", "note: 3.2"])},
+            P(extract=True, input_number_type="int"),
+        )
+        self.assertResult(result, {"A": [1, 2, 3]})
 
     def test_extract_integer_no_separator(self):
-        table = pd.DataFrame({"A": ["10000", "20001"]})
-        result = Form(["A"], True, InputNumberType.INTEGER).convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [10000, 20001]}))
+        result = render(
+            {"A": ["10000", "20001"]}, P(extract=True, input_number_type="int")
+        )
+        self.assertResult(result, {"A": [10000, 20001]})
 
     def test_extract_integer_us(self):
-        table = pd.DataFrame({"A": ["1,234", "2,345.67", "3.456"]})
-        form = Form(["A"], True, InputNumberType.INTEGER, InputLocale.US)
-        result = form.convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [1234, 2345, 3]}))
+        result = render(
+            {"A": ["1,234", "2,345.67", "3.456"]},
+            P(extract=True, input_number_type="int", input_locale="us"),
+        )
+        self.assertResult(result, {"A": [1234, 2345, 3]})
 
     def test_extract_integer_eu(self):
-        table = pd.DataFrame({"A": ["1,234", "2,345.67", "3.456"]})
-        form = Form(["A"], True, InputNumberType.INTEGER, InputLocale.EU)
-        result = form.convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [1, 2, 3456]}))
+        result = render(
+            {"A": ["1,234", "2,345.67", "3.456"]},
+            P(extract=True, input_number_type="int", input_locale="eu"),
+        )
+        self.assertResult(result, {"A": [1, 2, 3456]})
 
     def test_extract_float_from_str(self):
-        table = pd.DataFrame({"A": ["1", "2.1", "note: 3.2"]})
-        form = Form(["A"], True, InputNumberType.FLOAT, error_means_null=True)
-        result = form.convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [np.nan, 2.1, 3.2]}))
+        result = render(
+            {"A": ["1", "2.1", "note: 3.2"]},
+            P(extract=True, input_number_type="float", error_means_null=True),
+        )
+        self.assertResult(result, {"A": [None, 2.1, 3.2]})
 
     def test_extract_float_from_category(self):
-        table = pd.DataFrame(
-            {"A": ["1", "2.1", "note: 3.2", "-3", "-3.0"]}, dtype="category"
+        result = render(
+            {"A": dictionary(["1", "2.1", "note: 3.2", "-3", "-3.0"])},
+            P(extract=True, input_number_type="float", error_means_null=True),
         )
-        form = Form(["A"], True, InputNumberType.FLOAT, error_means_null=True)
-        result = form.convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [np.nan, 2.1, 3.2, np.nan, -3]}))
+        self.assertResult(result, {"A": [None, 2.1, 3.2, None, -3.0]})
 
     def test_extract_float_us(self):
-        table = pd.DataFrame({"A": ["1,234", "2,345.67", "3.456"]})
-        form = Form(
-            ["A"], True, InputNumberType.FLOAT, InputLocale.US, error_means_null=True
+        result = render(
+            {"A": ["1,234", "2,345.67", "3.456"]},
+            P(
+                extract=True,
+                input_number_type="float",
+                input_locale="us",
+                error_means_null=True,
+            ),
         )
-        result = form.convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [np.nan, 2345.67, 3.456]}))
+        self.assertResult(result, {"A": [None, 2345.67, 3.456]})
 
     def test_extract_float_eu(self):
-        table = pd.DataFrame({"A": ["1,234", "2,345.67", "3.456"]})
-        form = Form(
-            ["A"], True, InputNumberType.FLOAT, InputLocale.EU, error_means_null=True
+        result = render(
+            {"A": ["1,234", "2,345.67", "3.456"]},
+            P(
+                extract=True,
+                input_number_type="float",
+                input_locale="eu",
+                error_means_null=True,
+            ),
         )
-        result = form.convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [1.234, 2.345, np.nan]}))
+        self.assertResult(result, {"A": [1.234, 2.345, None]})
 
     def test_replace_with_null(self):
-        table = pd.DataFrame({"A": ["", ".", np.nan, "1", "2.1"]})
-        form = Form(["A"], True, InputNumberType.INTEGER, InputLocale.US, True)
-        result = form.convert_table(table)
-        assert_frame_equal(result, pd.DataFrame({"A": [np.nan, np.nan, np.nan, 1, 2]}))
+        result = render(
+            {"A": ["", ".", None, "1", "2.1"]},
+            P(
+                extract=True,
+                input_number_type="int",
+                input_locale="us",
+                error_means_null=True,
+            ),
+        )
+        self.assertResult(result, {"A": [None, None, None, 1.0, 2.0]})
 
     def test_error_on_no_match(self):
-        table = pd.DataFrame({"A": ["", ".", np.nan, "1", "2.1"]})
-        form = Form(["A"], True, InputNumberType.INTEGER, InputLocale.US)
-        result = form.convert_table(table)
+        result = render(
+            {"A": ["", ".", None, "1", "2.1"]},
+            P(extract=True, input_number_type="int", input_locale="us"),
+        )
         self.assertEqual(
-            result,
-            (
-                "'' in row 1 of 'A' cannot be converted. Overall, there are 2 "
-                "errors in 1 column. Select 'Convert non-numbers to null' to set "
-                "these values to null."
-            ),
+            result.errors,
+            [
+                RenderError(
+                    I18nMessage.TODO_i18n(
+                        "'' in row 1 of 'A' cannot be converted. Overall, there "
+                        "are 2 errors in 1 column. Select 'Convert non-numbers "
+                        "to null' to set these values to null."
+                    )
+                )
+            ],
         )
 
-    def test_integration_no_op_when_no_columns(self):
-        table = pd.DataFrame({"A": ["1", "2"], "B": ["2", "3"], "C": ["3", "4"]})
+    def test_error_count_rows_of_category(self):
         result = render(
-            table,
             {
-                "colnames": [],
-                "extract": True,
-                "input_number_type": "integer",
-                "input_locale": "us",
-                "error_means_null": False,
-                "output_format": "{:,d}",
+                "A": dictionary(["1", "x", "2", "x", "y"]),
+                "B": ["y", "2", "z", "4", "5"],
             },
+            P(colnames=["A", "B"]),
         )
-        assert_frame_equal(
-            result, pd.DataFrame({"A": ["1", "2"], "B": ["2", "3"], "C": ["3", "4"]})
+        self.assertEqual(
+            result.errors,
+            [
+                RenderError(
+                    I18nMessage.TODO_i18n(
+                        "'x' in row 2 of 'A' cannot be converted. Overall, there "
+                        "are 5 errors in 2 columns. Select 'Convert non-numbers "
+                        "to null' to set these values to null."
+                    )
+                )
+            ],
         )
 
+    def test_integration_no_op_when_no_columns(self):
+        result = render(
+            {"A": ["1", "2"], "B": ["2", "3"], "C": ["3", "4"]},
+            P(
+                colnames=[],
+                extract=True,
+                input_number_type="int",
+                output_format="{:,d}",
+            ),
+        )
+        self.assertResult(result, {"A": ["1", "2"], "B": ["2", "3"], "C": ["3", "4"]})
+
     def test_integration(self):
-        table = pd.DataFrame({"A": ["1", "2"], "B": ["2", "3"], "C": ["3", "4"]})
         result = render(
-            table,
-            {
-                "colnames": ["A", "B"],
-                "extract": False,
-                "input_number_type": "any",
-                "input_locale": "us",
-                "error_means_null": False,
-                "output_format": "{:,d}",
-            },
+            {"A": ["1", "2"], "B": ["2", "3"], "C": ["3", "4"]},
+            P(colnames=["A", "B"], output_format="{:,d}"),
+        )
+        self.assertResult(
+            result,
+            arrow_table(
+                {"A": [1, 2], "B": [2, 3], "C": ["3", "4"]},
+                [
+                    Column("A", ColumnType.Number("{:,d}")),
+                    Column("B", ColumnType.Number("{:,d}")),
+                    Column("C", ColumnType.Text()),
+                ],
+            ),
+        )
+
+    def test_integration_format_number_column(self):
+        result = render({"A": [1, 2]}, P(output_format="{:.2f}"))
+        self.assertResult(
+            result,
+            arrow_table({"A": [1, 2]}, [Column("A", ColumnType.Number("{:.2f}"))]),
         )
-        assert_frame_equal(
-            result["dataframe"],
-            pd.DataFrame({"A": [1, 2], "B": [2, 3], "C": ["3", "4"]}),
+
+    def test_integration_invalid_format(self):
+        result = render({"A": ["1"]}, P(output_format="{:s}"))
+        self.assertEqual(
+            result.errors,
+            [
+                RenderError(
+                    I18nMessage.TODO_i18n(
+                        "Unknown format code 's' for object of type 'int'"
+                    )
+                )
+            ],
+        )
+
+    def test_category_many_rows(self):
+        # We parse each distinct value once, then look up every row's number
+        texts = ["%d,%03d.5" % (i, i) for i in range(1000)]
+        codes = np.random.RandomState(0).randint(0, 1000, 20000)
+        array = pyarrow.DictionaryArray.from_arrays(
+            pyarrow.array(codes, pyarrow.int32()), pyarrow.array(texts)
         )
-        self.assertEqual(result["column_formats"], {"A": "{:,d}", "B": "{:,d}"})
+        table = arrow_table({"A": array})
+        with tempfile_context(suffix=".arrow") as output_path:
+            result = render_arrow(table, P(), "Tab 1", None, output_path)
+        numbers = np.array([float(text.replace(",", "")) for text in texts])
+        self.assertEqual(result.table.table["A"].to_pylist(), numbers[codes].tolist())
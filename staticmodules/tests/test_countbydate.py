@@ -411,6 +411,52 @@ class CountByDateTests(unittest.TestCase):
             ),
         )
 
+    def test_include_missing_dates_with_text_min(self):
+        self._assertRendersTable(
+            pandas.DataFrame(
+                {
+                    "Date": [dt("2018-01-01"), dt("2018-01-03"), dt("2018-01-03")],
+                    "Amount": ["b", "c", "a"],
+                }
+            ),
+            P(
+                column="Date",
+                include_missing_dates=True,
+                groupby="day",
+                operation="min",
+                targetcolumn="Amount",
+            ),
+            pandas.DataFrame(
+                {
+                    "Date": [dt("2018-01-01"), dt("2018-01-02"), dt("2018-01-03")],
+                    "Amount": ["b", None, "a"],
+                }
+            ),
+        )
+
+    def test_include_missing_dates_with_datetime_min(self):
+        self._assertRendersTable(
+            pandas.DataFrame(
+                {
+                    "Date": [dt("2018-01-01"), dt("2018-01-03"), dt("2018-01-03")],
+                    "Amount": [dt("2019-01-02"), dt("2019-01-03"), dt("2019-01-01")],
+                }
+            ),
+            P(
+                column="Date",
+                include_missing_dates=True,
+                groupby="day",
+                operation="min",
+                targetcolumn="Amount",
+            ),
+            pandas.DataFrame(
+                {
+                    "Date": [dt("2018-01-01"), dt("2018-01-02"), dt("2018-01-03")],
+                    "Amount": [dt("2019-01-02"), pandas.NaT, dt("2019-01-01")],
+                }
+            ),
+        )
+
     def test_nix_missing_dates(self):
         # https://www.pivotaltracker.com/story/show/160632877
         self._assertRendersTable(
@@ -424,6 +470,68 @@ class CountByDateTests(unittest.TestCase):
             pandas.DataFrame({"Date": [dt("2018-01-02")], "Amount": 3.0}),
         )
 
+    def test_mean_of_int_is_float(self):
+        # Pandas gives int64 when every mean happens to be an integer. We don't.
+        self._assertRendersTable(
+            agg_int_table,
+            P(column="Date", groupby="day", operation="mean", targetcolumn="Amount"),
+            pandas.DataFrame(
+                {
+                    "Date": [dt("2018-01-01"), dt("2018-01-03"), dt("2018-01-05")],
+                    "Amount": [8.0, 3.0, 2.0],
+                }
+            ),
+        )
+
+    def test_count_before_1970(self):
+        # Periods are floored, not truncated toward 1970
+        self._assertRendersTable(
+            pandas.DataFrame(
+                {"Date": [dt("1969-12-31T23:59:59.5"), dt("1969-02-14T12:00")]}
+            ),
+            P(column="Date", groupby="month"),
+            pandas.DataFrame(
+                {"Date": [dt("1969-02-01"), dt("1969-12-01")], "count": [1, 1]}
+            ),
+        )
+
+    def test_count_by_quarter_before_1970(self):
+        self._assertRendersTable(
+            pandas.DataFrame({"Date": [dt("1969-12-31T23:59:59.5")]}),
+            P(column="Date", groupby="quarter"),
+            pandas.DataFrame({"Date": ["1969 Q4"], "count": [1]}),
+        )
+
+    def test_count_by_second_of_day_before_1970(self):
+        self._assertRendersTable(
+            pandas.DataFrame({"Date": [dt("1969-12-31T23:59:59.5")]}),
+            P(column="Date", groupby="second_of_day"),
+            pandas.DataFrame({"Date": ["23:59:59"], "count": [1]}),
+        )
+
+    def test_mean_by_second_many_rows(self):
+        n = 20000
+        random = np.random.RandomState(0)
+        # Span > 2**16 seconds, so we radix-sort in two passes
+        nanoseconds = 1300000000000000000 + random.randint(0, 10 ** 14, n)
+        amounts = random.rand(n)
+        table = pandas.DataFrame(
+            {"Date": nanoseconds.view("datetime64[ns]"), "Amount": amounts}
+        )
+        params = P(
+            column="Date", groupby="second", operation="mean", targetcolumn="Amount"
+        )
+        result = render(table, params)
+        expected = (
+            pandas.Series(amounts)
+            .groupby(nanoseconds // 1000000000 * 1000000000)
+            .mean()
+        )
+        self.assertEqual(
+            result["Date"].tolist(), pandas.to_datetime(expected.index.values).tolist()
+        )
+        np.testing.assert_allclose(result["Amount"].values, expected.values)
+
     @override_settings(MAX_ROWS_PER_TABLE=100)
     def test_include_too_many_missing_dates(self):
         # 0 - group by seconds
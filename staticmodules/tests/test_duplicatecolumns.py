@@ -1,11 +1,17 @@
-from collections import namedtuple
 import unittest
-import pandas as pd
-from pandas.testing import assert_frame_equal
-from staticmodules.duplicatecolumns import migrate_params, render
+from cjwkernel.tests.util import (
+    arrow_table,
+    arrow_table_context,
+    assert_arrow_table_equals,
+)
+from cjwkernel.types import Column, ColumnType
+from cjwkernel.util import tempfile_context
+from staticmodules.duplicatecolumns import migrate_params, render_arrow
 
 
-RenderColumn = namedtuple("RenderColumn", ("format",))
+def render(table, params):
+    with tempfile_context(suffix=".arrow") as output_path:
+        return render_arrow(table, params, "tab-x", None, output_path)
 
 
 class MigrateParamsTests(unittest.TestCase):
@@ -25,46 +31,69 @@ class MigrateParamsTests(unittest.TestCase):
 
 class DuplicateColumnsTests(unittest.TestCase):
     def test_duplicate_column(self):
-        table = pd.DataFrame({"A": [1, 2], "B": [2, 3], "C": [3, 4]})
-        input_columns = {
-            "A": RenderColumn("{:,}"),
-            "B": RenderColumn("{:,.2f}"),
-            "C": RenderColumn("{:,d}"),
-        }
-        result = render(table, {"colnames": ["A", "C"]}, input_columns=input_columns)
-        expected = pd.DataFrame(
-            {
-                "A": [1, 2],
-                "Copy of A": [1, 2],
-                "B": [2, 3],
-                "C": [3, 4],
-                "Copy of C": [3, 4],
-            }
-        )
-        assert_frame_equal(result["dataframe"], expected)
-        self.assertEqual(
-            result["column_formats"], {"Copy of A": "{:,}", "Copy of C": "{:,d}"}
+        with arrow_table_context(
+            {"A": [1, 2], "B": [2, 3], "C": [3, 4]},
+            columns=[
+                Column("A", ColumnType.Number("{:,}")),
+                Column("B", ColumnType.Number("{:,.2f}")),
+                Column("C", ColumnType.Number("{:,d}")),
+            ],
+        ) as table:
+            result = render(table, {"colnames": ["A", "C"]})
+        assert_arrow_table_equals(
+            result.table,
+            arrow_table(
+                {
+                    "A": [1, 2],
+                    "Copy of A": [1, 2],
+                    "B": [2, 3],
+                    "C": [3, 4],
+                    "Copy of C": [3, 4],
+                },
+                columns=[
+                    Column("A", ColumnType.Number("{:,}")),
+                    Column("Copy of A", ColumnType.Number("{:,}")),
+                    Column("B", ColumnType.Number("{:,.2f}")),
+                    Column("C", ColumnType.Number("{:,d}")),
+                    Column("Copy of C", ColumnType.Number("{:,d}")),
+                ],
+            ),
         )
 
     def test_duplicate_with_existing(self):
-        table = pd.DataFrame(
-            {"A": [1, 2], "Copy of A": [2, 3], "Copy of A 1": [3, 4], "C": [4, 5]}
+        with arrow_table_context(
+            {"A": [1, 2], "Copy of A": [2, 3], "Copy of A 1": [3, 4], "C": [4, 5]},
+            columns=[
+                Column("A", ColumnType.Number("{:,}")),
+                Column("Copy of A", ColumnType.Number("{:,.2f}")),
+                Column("Copy of A 1", ColumnType.Number("{:,.1%}")),
+                Column("C", ColumnType.Number("{:,d}")),
+            ],
+        ) as table:
+            result = render(table, {"colnames": ["A"]})
+        assert_arrow_table_equals(
+            result.table,
+            arrow_table(
+                {
+                    "A": [1, 2],
+                    "Copy of A 2": [1, 2],
+                    "Copy of A": [2, 3],
+                    "Copy of A 1": [3, 4],
+                    "C": [4, 5],
+                },
+                columns=[
+                    Column("A", ColumnType.Number("{:,}")),
+                    Column("Copy of A 2", ColumnType.Number("{:,}")),
+                    Column("Copy of A", ColumnType.Number("{:,.2f}")),
+                    Column("Copy of A 1", ColumnType.Number("{:,.1%}")),
+                    Column("C", ColumnType.Number("{:,d}")),
+                ],
+            ),
         )
-        input_columns = {
-            "A": RenderColumn("{:,}"),
-            "Copy of A": RenderColumn("{:,.2f}"),
-            "Copy of A 1": RenderColumn("{:,.1%}"),
-            "C": RenderColumn("{:,d}"),
-        }
-        result = render(table, {"colnames": ["A"]}, input_columns=input_columns)
-        expected = pd.DataFrame(
-            {
-                "A": [1, 2],
-                "Copy of A 2": [1, 2],
-                "Copy of A": [2, 3],
-                "Copy of A 1": [3, 4],
-                "C": [4, 5],
-            }
+
+    def test_duplicate_text_column(self):
+        with arrow_table_context({"A": ["x", None]}) as table:
+            result = render(table, {"colnames": ["A"]})
+        assert_arrow_table_equals(
+            result.table, {"A": ["x", None], "Copy of A": ["x", None]}
         )
-        assert_frame_equal(result["dataframe"], expected)
-        self.assertEqual(result["column_formats"], {"Copy of A 2": "{:,}"})
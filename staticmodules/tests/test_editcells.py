@@ -1,7 +1,9 @@
+import datetime
 import unittest
-import pandas as pd
-from pandas.testing import assert_frame_equal
-from cjwkernel.pandas.types import ProcessResult
+import pyarrow
+from cjwkernel.tests.util import arrow_table, assert_arrow_table_equals
+from cjwkernel.types import Column, ColumnType
+from cjwkernel.util import tempfile_context
 from staticmodules import editcells
 
 
@@ -9,14 +11,15 @@ def P(celledits=[]):
     return {"celledits": celledits}
 
 
-def test_render(in_table, patch_json, out_table=pd.DataFrame(), out_error=""):
-    result = editcells.render(in_table, P(celledits=patch_json))
-    result = ProcessResult.coerce(result)
+def render(table, patch_json):
+    with tempfile_context(suffix=".arrow") as output_path:
+        return editcells.render_arrow(
+            arrow_table(table), P(celledits=patch_json), "Tab 1", None, output_path
+        )
 
-    expected = ProcessResult.coerce((out_table, out_error))
 
-    assert result.errors == expected.errors
-    assert_frame_equal(result.dataframe, expected.dataframe)
+def dictionary(values):
+    return pyarrow.array(values, type=pyarrow.utf8()).dictionary_encode()
 
 
 class MigrateParamsTests(unittest.TestCase):
@@ -50,103 +53,124 @@ class MigrateParamsTests(unittest.TestCase):
 
 class EditCellsTests(unittest.TestCase):
     def test_edit_int_to_int(self):
-        test_render(
-            pd.DataFrame({"A": [1, 2]}, dtype="int64"),
-            [{"row": 1, "col": "A", "value": "3"}],
-            pd.DataFrame({"A": [1, 3]}, dtype="int64"),
-        )
+        result = render({"A": [1, 2]}, [{"row": 1, "col": "A", "value": "3"}])
+        assert_arrow_table_equals(result.table, {"A": [1, 3]})
 
     def test_edit_int_to_str(self):
-        test_render(
-            pd.DataFrame({"A": [1, 2]}, dtype="int64"),
-            [{"row": 1, "col": "A", "value": "foo"}],
-            pd.DataFrame({"A": ["1", "foo"]}),
-        )
+        result = render({"A": [1, 2]}, [{"row": 1, "col": "A", "value": "foo"}])
+        assert_arrow_table_equals(result.table, {"A": ["1", "foo"]})
 
     def test_edit_int_to_float(self):
-        test_render(
-            pd.DataFrame({"A": [1, 2]}, dtype="int64"),
-            [{"row": 1, "col": "A", "value": "2.1"}],
-            pd.DataFrame({"A": [1, 2.1]}, dtype="float64"),
-        )
+        result = render({"A": [1, 2]}, [{"row": 1, "col": "A", "value": "2.1"}])
+        assert_arrow_table_equals(result.table, {"A": [1.0, 2.1]})
 
     def test_edit_float_to_int(self):
         # It stays float64, even though all values are int
-        test_render(
-            pd.DataFrame({"A": [1, 2.1]}, dtype="float64"),
-            [{"row": 1, "col": "A", "value": "2"}],
-            pd.DataFrame({"A": [1, 2]}, dtype="float64"),
-        )
+        result = render({"A": [1, 2.1]}, [{"row": 1, "col": "A", "value": "2"}])
+        assert_arrow_table_equals(result.table, {"A": [1.0, 2.0]})
 
     def test_edit_float_to_str(self):
-        test_render(
-            pd.DataFrame({"A": [1.1, 2.1]}, dtype="float64"),
-            [{"row": 1, "col": "A", "value": "foo"}],
-            pd.DataFrame({"A": ["1.1", "foo"]}),
+        result = render({"A": [1.1, 2.1]}, [{"row": 1, "col": "A", "value": "foo"}])
+        assert_arrow_table_equals(result.table, {"A": ["1.1", "foo"]})
+
+    def test_edit_number_to_empty_is_null(self):
+        # pd.to_numeric() parses "" as NaN, so the column becomes float64
+        result = render({"A": [1, 2]}, [{"row": 1, "col": "A", "value": ""}])
+        assert_arrow_table_equals(result.table, {"A": [1.0, None]})
+
+    def test_edit_number_keeps_format(self):
+        table = arrow_table({"A": [1, 2]}, [Column("A", ColumnType.Number("{:.2f}"))])
+        with tempfile_context(suffix=".arrow") as output_path:
+            result = editcells.render_arrow(
+                table,
+                P([{"row": 1, "col": "A", "value": "3"}]),
+                "Tab 1",
+                None,
+                output_path,
+            )
+        self.assertEqual(result.table.metadata.columns, table.metadata.columns)
+
+    def test_edit_number_with_null_to_str(self):
+        result = render({"A": [1, None, 3]}, [{"row": 2, "col": "A", "value": "x"}])
+        assert_arrow_table_equals(result.table, {"A": ["1", None, "x"]})
+
+    def test_edit_datetime_to_str(self):
+        result = render(
+            {
+                "A": pyarrow.array(
+                    [datetime.datetime(2019, 1, 1), None], pyarrow.timestamp("ns")
+                )
+            },
+            [{"row": 1, "col": "A", "value": "x"}],
         )
+        assert_arrow_table_equals(result.table, {"A": ["2019-01-01", "x"]})
 
     def test_edit_str_to_int(self):
-        test_render(
-            pd.DataFrame({"A": ["foo", "bar"]}),
-            [{"row": 1, "col": "A", "value": "2"}],
-            # All stays str
-            pd.DataFrame({"A": ["foo", "2"]}),
+        # All stays str
+        result = render({"A": ["foo", "bar"]}, [{"row": 1, "col": "A", "value": "2"}])
+        assert_arrow_table_equals(result.table, {"A": ["foo", "2"]})
+
+    def test_edit_str_null(self):
+        result = render(
+            {"A": pyarrow.array([None, None], pyarrow.utf8())},
+            [{"row": 1, "col": "A", "value": "x"}],
         )
+        assert_arrow_table_equals(result.table, {"A": [None, "x"]})
 
     def test_edit_str_category_to_new_str_category(self):
-        test_render(
-            pd.DataFrame({"A": ["a", "b"]}, dtype="category"),
-            [{"row": 1, "col": "A", "value": "c"}],
-            pd.DataFrame({"A": ["a", "c"]}, dtype="category"),
+        result = render(
+            {"A": dictionary(["a", "b"])}, [{"row": 1, "col": "A", "value": "c"}]
+        )
+        assert_arrow_table_equals(result.table, {"A": dictionary(["a", "c"])})
+        # Workbench forbids unused dictionary values
+        self.assertEqual(
+            result.table.table["A"].chunk(0).dictionary.to_pylist(), ["a", "c"]
         )
 
     def test_edit_str_category_to_existing_str_category(self):
-        test_render(
-            pd.DataFrame({"A": ["a", "b", "a"]}, dtype="category"),
-            [{"row": 2, "col": "A", "value": "b"}],
-            pd.DataFrame({"A": ["a", "b", "b"]}, dtype="category"),
+        result = render(
+            {"A": dictionary(["a", "b", "a"])}, [{"row": 2, "col": "A", "value": "b"}]
         )
+        assert_arrow_table_equals(result.table, {"A": dictionary(["a", "b", "b"])})
+
+    def test_edit_str_category_null(self):
+        result = render(
+            {"A": dictionary([None, None])}, [{"row": 0, "col": "A", "value": "a"}]
+        )
+        assert_arrow_table_equals(result.table, {"A": dictionary(["a", None])})
 
     def test_two_edits_in_column(self):
-        test_render(
-            pd.DataFrame({"A": ["a", "b", "c"]}),
+        result = render(
+            {"A": ["a", "b", "c"]},
             [
                 {"row": 1, "col": "A", "value": "x"},
                 {"row": 2, "col": "A", "value": "y"},
             ],
-            pd.DataFrame({"A": ["a", "x", "y"]}),
         )
+        assert_arrow_table_equals(result.table, {"A": ["a", "x", "y"]})
 
     def test_two_edits_in_row(self):
-        test_render(
-            pd.DataFrame({"A": ["a", "b"], "B": ["c", "d"]}),
+        result = render(
+            {"A": ["a", "b"], "B": ["c", "d"]},
             [
                 {"row": 0, "col": "A", "value": "x"},
                 {"row": 0, "col": "B", "value": "y"},
             ],
-            pd.DataFrame({"A": ["x", "b"], "B": ["y", "d"]}),
         )
+        assert_arrow_table_equals(result.table, {"A": ["x", "b"], "B": ["y", "d"]})
 
     def test_empty_patch(self):
-        test_render(pd.DataFrame({"A": ["a"]}), {}, pd.DataFrame({"A": ["a"]}))  # no-op
+        result = render({"A": ["a"]}, [])
+        assert_arrow_table_equals(result.table, {"A": ["a"]})  # no-op
 
     def test_empty_table(self):
-        test_render(
-            pd.DataFrame(),
-            [{"row": 0, "col": "A", "value": "x"}],
-            pd.DataFrame(),  # no-op
-        )
+        result = render({}, [{"row": 0, "col": "A", "value": "x"}])
+        assert_arrow_table_equals(result.table, {})  # no-op
 
     def test_missing_col(self):
-        test_render(
-            pd.DataFrame({"A": ["a", "b"]}),
-            [{"row": 0, "col": "B", "value": "x"}],
-            pd.DataFrame({"A": ["a", "b"]}),  # no-op
-        )
+        result = render({"A": ["a", "b"]}, [{"row": 0, "col": "B", "value": "x"}])
+        assert_arrow_table_equals(result.table, {"A": ["a", "b"]})  # no-op
 
     def test_missing_row(self):
-        test_render(
-            pd.DataFrame({"A": ["a", "b"]}),
-            [{"row": 2, "col": "A", "value": "x"}],
-            pd.DataFrame({"A": ["a", "b"]}),  # no-op
-        )
+        result = render({"A": ["a", "b"]}, [{"row": 2, "col": "A", "value": "x"}])
+        assert_arrow_table_equals(result.table, {"A": ["a", "b"]})  # no-op
@@ -1,7 +1,18 @@
 import unittest
-import pandas as pd
-from pandas.testing import assert_frame_equal
-from staticmodules.formatnumbers import migrate_params, render
+from cjwkernel.tests.util import (
+    arrow_table,
+    arrow_table_context,
+    assert_arrow_table_equals,
+)
+from cjwkernel.types import Column, ColumnType
+from cjwkernel.util import tempfile_context
+from staticmodules.formatnumbers import migrate_params, render_arrow
+
+
+def render(table, params):
+    with arrow_table_context(table) as input_table:
+        with tempfile_context(suffix=".arrow") as output_path:
+            return render_arrow(input_table, params, "tab-x", None, output_path)
 
 
 class MigrateParamsTest(unittest.TestCase):
@@ -26,15 +37,25 @@ class MigrateParamsTest(unittest.TestCase):
 
 class FormatnumbersTest(unittest.TestCase):
     def test_render_empty_is_no_op(self):
-        result = render(pd.DataFrame({"A": [1]}), {"colnames": [], "format": "X{:d}"})
-        assert_frame_equal(result, pd.DataFrame({"A": [1]}))
+        result = render({"A": [1]}, {"colnames": [], "format": "X{:d}"})
+        assert_arrow_table_equals(result.table, {"A": [1]})
 
     def test_render_multiple_columns(self):
         result = render(
-            pd.DataFrame({"A": [1], "B": [2], "C": [3]}),
-            {"colnames": ["A", "B"], "format": "X{:d}"},
+            {"A": [1], "B": [2], "C": [3]}, {"colnames": ["A", "B"], "format": "X{:d}"}
         )
-        assert_frame_equal(
-            result["dataframe"], pd.DataFrame({"A": [1], "B": [2], "C": [3]})
+        assert_arrow_table_equals(
+            result.table,
+            arrow_table(
+                {"A": [1], "B": [2], "C": [3]},
+                columns=[
+                    Column("A", ColumnType.Number("X{:d}")),
+                    Column("B", ColumnType.Number("X{:d}")),
+                    Column("C", ColumnType.Number("{:,}")),
+                ],
+            ),
         )
-        self.assertEqual(result["column_formats"], {"A": "X{:d}", "B": "X{:d}"})
+
+    def test_render_ignore_non_number_column(self):
+        result = render({"A": ["x"]}, {"colnames": ["A"], "format": "X{:d}"})
+        assert_arrow_table_equals(result.table, {"A": ["x"]})
@@ -1,5 +1,6 @@
 import unittest
 from typing import Any, Dict
+from formulas import Parser
 import numpy as np
 import pandas as pd
 from pandas.testing import assert_frame_equal, assert_series_equal
@@ -272,6 +273,28 @@ class FormulaTests(unittest.TestCase):
             pd.DataFrame({"A": ["foo", "bar"], "R": ["fo", "ba"]}),
         )
 
+    def test_excel_all_rows_divide_by_zero(self):
+        self._test(
+            pd.DataFrame({"A": [1, 2], "B": [0, 4]}),
+            {"formula_excel": "=A1/B1", "all_rows": True},
+            pd.DataFrame({"A": [1, 2], "B": [0, 4], "R": ["#DIV/0!", "0.5"]}),
+        )
+
+    def test_excel_all_rows_concatenate_number(self):
+        self._test(
+            pd.DataFrame({"A": ["x", "y"], "B": [1, 2]}),
+            {"formula_excel": "=A1&B1", "all_rows": True},
+            pd.DataFrame({"A": ["x", "y"], "B": [1, 2], "R": ["x1", "y2"]}),
+        )
+
+    def test_excel_all_rows_unsupported_function_in_supported_formula(self):
+        # TRIM() is evaluated row by row; UPPER() and & column by column
+        self._test(
+            pd.DataFrame({"A": ["  a ", "b"]}),
+            {"formula_excel": '=UPPER(TRIM(A1))&"!"', "all_rows": True},
+            pd.DataFrame({"A": ["  a ", "b"], "R": ["A!", "B!"]}),
+        )
+
     # --- Formulas which write only to a single row ---
     def test_excel_divide_two_rows(self):
         self._test(
@@ -373,6 +396,85 @@ class FormulaTests(unittest.TestCase):
         )
 
 
+class ExcelAllRowsColumnwiseTest(unittest.TestCase):
+    def _eval_both_ways(self, table, excel_formula):
+        code = Parser().ast(excel_formula)[1].compile()
+        builder = formula._ExcelParser().ast(excel_formula)[1]
+
+        row_by_row = formula.eval_excel_all_rows(code, table)
+        columnwise = formula.eval_excel_all_rows_columnwise(
+            builder, builder.compile(), table
+        )
+        return row_by_row, columnwise
+
+    def test_same_result_as_row_by_row(self):
+        table = pd.DataFrame(
+            {
+                "A": [1.0, 2.5, np.nan, -3.0, 0.0, 2.5],
+                "B": [2, 0, 1, 4, 0, -1],
+                "C": ["foo", "Bar", "", " b ", "x", "yz"],
+                "D": [0.5, 1.5, 2.5, -2.5, 1e308, 3.0],
+            }
+        )
+        for excel_formula in [
+            "=A1",
+            "=A1*B1",
+            "=A1/B1",
+            "=A1+B1*2-D1",
+            "=D1*10",
+            "=A1^B1",
+            "=-A1",
+            "=A1%",
+            "=+A1",
+            "=A1>B1",
+            "=A1<>1",
+            '=C1>="b"',
+            "=C1&A1",
+            '=C1&"a""b"&B1',
+            '=IF(A1>1,"x",2)',
+            "=IF(A1>1,D1,B1)",
+            "=IF(A1,1,2)",
+            '=IF(A1>1,"x")',
+            "=SUM(A1:B1)",
+            "=SUM(A1,B1,3)",
+            "=ROUND(D1,0)",
+            "=ROUND(A1*1.15,1)",
+            "=ROUND(B1,-1)",
+            "=ABS(A1)",
+            "=UPPER(C1)",
+            "=LOWER(C1)",
+            "=LEN(C1)",
+            "=LEFT(C1,2)",
+            "=RIGHT(C1,2)",
+            "=RIGHT(C1,0)",
+            "=LEFT(C1)",
+            "=LEFT(A1,2)",
+            "=LEN(TRIM(C1))+1",
+            "=MAX(A1,B1)+SUM(A1:B1)",
+            "=IF(MOD(B1,2)=0,A1*2,0)",
+            "=1+2",
+        ]:
+            with self.subTest(excel_formula=excel_formula):
+                row_by_row, columnwise = self._eval_both_ways(table, excel_formula)
+                assert_series_equal(columnwise, row_by_row)
+
+    def test_unsupported_function_error(self):
+        builder = formula._ExcelParser().ast("=DATE(2019, 6, A1+1)")[1]
+        with self.assertRaisesRegex(ValueError, "DATE: Function not implemented!"):
+            formula.eval_excel_all_rows_columnwise(
+                builder, builder.compile(), pd.DataFrame({"A": [1, 2]})
+            )
+
+    def test_many_rows_same_result_as_row_by_row(self):
+        table = pd.DataFrame(
+            {"A": np.arange(2000, dtype=float), "B": np.arange(2000) % 7 + 1}
+        )
+        row_by_row, columnwise = self._eval_both_ways(
+            table, "=IF(A1>B1, ROUND(A1/B1, 2), A1*B1)"
+        )
+        assert_series_equal(columnwise, row_by_row)
+
+
 class SafeExecTest(unittest.TestCase):
     def exec_code(self, code):
         built_globals = build_globals_for_eval()
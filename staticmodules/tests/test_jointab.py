@@ -1,9 +1,10 @@
 import unittest
 import numpy as np
-import pandas as pd
-from pandas.testing import assert_frame_equal
-from cjwkernel.pandas.types import RenderColumn, TabOutput
-from staticmodules.jointab import migrate_params, render
+import pyarrow
+from cjwkernel.tests.util import arrow_table, assert_arrow_table_equals
+from cjwkernel.types import Column, ColumnType, I18nMessage, RenderError, Tab, TabOutput
+from cjwkernel.util import tempfile_context
+from staticmodules.jointab import migrate_params, render_arrow
 
 
 class MigrateTests(unittest.TestCase):
@@ -56,225 +57,231 @@ class MigrateTests(unittest.TestCase):
         )
 
 
+def P(right_tab, on, right, type="left"):
+    return {
+        "right_tab": right_tab,
+        "join_columns": {"on": on, "right": right},
+        "type": type,
+    }
+
+
+def render(left, params):
+    with tempfile_context(suffix=".arrow") as output_path:
+        return render_arrow(arrow_table(left), params, "Tab 1", None, output_path)
+
+
+def right_tab(table, columns=None):
+    return TabOutput(Tab("tab-2", "Tab 2"), arrow_table(table, columns))
+
+
+def dictionary(values):
+    return pyarrow.array(values).dictionary_encode()
+
+
 class JoinTabTests(unittest.TestCase):
     def test_left(self):
-        left = pd.DataFrame({"A": [1, 2, 3], "B": ["x", "y", "z"]})
-        right = pd.DataFrame({"A": [1, 2], "C": ["X", "Y"], "D": [0.1, 0.2]})
-        result = render(
-            left,
-            {
-                "right_tab": TabOutput(
-                    "slug",
-                    "name",
-                    {
-                        "A": RenderColumn("A", "number", "{:,.2f}"),
-                        "C": RenderColumn("C", "text", None),
-                        "D": RenderColumn("D", "number", "{:,}"),
-                    },
-                    right,
-                ),
-                "join_columns": {"on": ["A"], "right": ["C", "D"]},
-                "type": "left",
-            },
-            input_columns={
-                "A": RenderColumn("A", "number", "{:d}"),
-                "B": RenderColumn("B", "text", None),
-            },
+        left = arrow_table(
+            {"A": [1, 2, 3], "B": ["x", "y", "z"]},
+            [Column("A", ColumnType.Number("{:d}")), Column("B", ColumnType.Text())],
+        )
+        right = right_tab(
+            {"A": [1, 2], "C": ["X", "Y"], "D": [0.1, 0.2]},
+            [
+                Column("A", ColumnType.Number("{:,.2f}")),
+                Column("C", ColumnType.Text()),
+                Column("D", ColumnType.Number("{:,}")),
+            ],
         )
-        assert_frame_equal(
-            result["dataframe"],
-            pd.DataFrame(
+        with tempfile_context(suffix=".arrow") as output_path:
+            result = render_arrow(
+                left, P(right, ["A"], ["C", "D"]), "Tab 1", None, output_path
+            )
+        assert_arrow_table_equals(
+            result.table,
+            arrow_table(
                 {
                     "A": [1, 2, 3],
                     "B": ["x", "y", "z"],
-                    "C": ["X", "Y", np.nan],
-                    "D": [0.1, 0.2, np.nan],
-                }
+                    "C": ["X", "Y", None],
+                    "D": [0.1, 0.2, None],
+                },
+                [
+                    Column("A", ColumnType.Number("{:d}")),
+                    Column("B", ColumnType.Text()),
+                    Column("C", ColumnType.Text()),
+                    Column("D", ColumnType.Number("{:,}")),
+                ],
             ),
         )
-        self.assertEqual(result["column_formats"], {"C": None, "D": "{:,}"})
+
+    def test_no_right_tab(self):
+        result = render({"A": [1, 2]}, P(None, ["A"], []))
+        assert_arrow_table_equals(result.table, {"A": [1, 2]})
+
+    def test_no_on_columns(self):
+        right = right_tab({"A": [1], "B": ["x"]})
+        result = render({"A": [1, 2]}, P(right, [], ["B"]))
+        assert_arrow_table_equals(result.table, {"A": [1, 2]})
 
     def test_on_types_differ(self):
-        left = pd.DataFrame({"A": [1, 2, 3], "B": ["x", "y", "z"]})
-        right = pd.DataFrame({"A": ["1", "2"], "C": ["X", "Y"]})
-        result = render(
-            left,
-            {
-                "right_tab": TabOutput(
-                    "slug",
-                    "Tab 2",
-                    {
-                        "A": RenderColumn("A", "text", None),
-                        "C": RenderColumn("C", "text", None),
-                    },
-                    right,
-                ),
-                "join_columns": {"on": ["A"], "right": ["C"]},
-                "type": "left",
-            },
-            input_columns={
-                "A": RenderColumn("A", "number", "{}"),
-                "B": RenderColumn("B", "text", None),
-            },
+        right = right_tab({"A": ["1", "2"], "C": ["X", "Y"]})
+        result = render({"A": [1, 2, 3], "B": ["x", "y", "z"]}, P(right, ["A"], ["C"]))
+        self.assertEqual(
+            result.errors,
+            [
+                RenderError(
+                    I18nMessage.TODO_i18n(
+                        'Column "A" is *number* in this tab and *text* in Tab 2. '
+                        "Please convert one or the other so they are both the "
+                        "same type."
+                    )
+                )
+            ],
         )
 
+    def test_prevent_overwrite(self):
+        right = right_tab({"A": [1, 2], "B": ["X", "Y"]})
+        result = render({"A": [1, 2, 3], "B": ["x", "y", "z"]}, P(right, ["A"], ["B"]))
         self.assertEqual(
-            result,
-            (
-                'Column "A" is *number* in this tab and *text* in Tab 2. '
-                "Please convert one or the other so they are both the same type."
-            ),
+            result.errors,
+            [
+                RenderError(
+                    I18nMessage.TODO_i18n(
+                        'You tried to add "B" from Tab 2, but your table already '
+                        "has that column. Please rename the column in one of the "
+                        "tabs, or unselect the column."
+                    )
+                )
+            ],
         )
 
-    def test_prevent_overwrite(self):
-        left = pd.DataFrame({"A": [1, 2, 3], "B": ["x", "y", "z"]})
-        right = pd.DataFrame({"A": ["1", "2"], "B": ["X", "Y"]})
+    def test_left_join_repeat_rows_with_many_matches(self):
+        right = right_tab({"A": [2, 1, 2], "B": ["x", "y", "z"]})
+        result = render({"A": [1, 2, 3]}, P(right, ["A"], ["B"]))
+        assert_arrow_table_equals(
+            result.table, {"A": [1, 2, 2, 3], "B": ["y", "x", "z", None]}
+        )
+
+    def test_left_join_int_column_with_nulls_becomes_float(self):
+        right = right_tab({"A": [1], "B": [4]})
+        result = render({"A": [1, 2]}, P(right, ["A"], ["B"]))
+        assert_arrow_table_equals(result.table, {"A": [1, 2], "B": [4.0, None]})
+
+    def test_null_keys_match(self):
+        right = right_tab({"A": ["a", None], "B": [1, 2]})
+        result = render({"A": [None, "a"]}, P(right, ["A"], ["B"]))
+        assert_arrow_table_equals(result.table, {"A": [None, "a"], "B": [2, 1]})
+
+    def test_multiple_on_columns(self):
+        right = right_tab({"A": [1, 1, 2], "B": ["x", "y", "x"], "C": [3, 4, 5]})
         result = render(
-            left,
-            {
-                "right_tab": TabOutput(
-                    "slug",
-                    "Tab 2",
-                    {
-                        "A": RenderColumn("A", "number", "{}"),
-                        "B": RenderColumn("B", "text", None),
-                    },
-                    right,
-                ),
-                "join_columns": {"on": ["A"], "right": ["B"]},
-                "type": "left",
-            },
-            input_columns={
-                "A": RenderColumn("A", "number", "{}"),
-                "B": RenderColumn("B", "text", None),
-            },
+            {"A": [1, 2, 1], "B": ["y", "y", "x"]}, P(right, ["A", "B"], ["C"])
+        )
+        assert_arrow_table_equals(
+            result.table, {"A": [1, 2, 1], "B": ["y", "y", "x"], "C": [4.0, None, 3.0]}
         )
 
-        self.assertEqual(
-            result,
-            (
-                'You tried to add "B" from Tab 2, but your table already has that '
-                "column. Please rename the column in one of the tabs, or unselect "
-                "the column."
-            ),
+    def test_dictionary_key_matches_text_key(self):
+        right = right_tab({"A": ["b", "a"], "B": [1, 2]})
+        result = render({"A": dictionary(["a", "b", "c"])}, P(right, ["A"], ["B"]))
+        assert_arrow_table_equals(
+            result.table, {"A": dictionary(["a", "b", "c"]), "B": [2.0, 1.0, None]}
         )
 
+    def test_int_key_matches_float_key(self):
+        right = right_tab({"A": [1.0, 2.5], "B": ["x", "y"]})
+        result = render({"A": [1, 2]}, P(right, ["A"], ["B"]))
+        assert_arrow_table_equals(result.table, {"A": [1, 2], "B": ["x", None]})
+
     def test_left_join_delete_unused_categories_in_added_columns(self):
-        left = pd.DataFrame({"A": ["a", "b"]}, dtype="category")
-        right = pd.DataFrame(
-            {
-                "A": pd.Series(["a", "z"], dtype="category"),
-                "B": pd.Series(["x", "y"], dtype="category"),
-            }
-        )
-        result = render(
-            left,
-            {
-                "right_tab": TabOutput(
-                    "slug",
-                    "Tab 2",
-                    {
-                        "A": RenderColumn("A", "text", None),
-                        "B": RenderColumn("B", "text", None),
-                    },
-                    right,
-                ),
-                "join_columns": {"on": ["A"], "right": ["B"]},
-                "type": "left",
-            },
-            input_columns={"A": RenderColumn("A", "text", None)},
-        )
-        # 'z' category does not appear in result, so it should not be a
-        # category in the 'B' column.
-        assert_frame_equal(
-            result["dataframe"],
-            pd.DataFrame(
-                {
-                    "A": pd.Series(["a", "b"], dtype="category"),
-                    "B": pd.Series(["x", np.nan], dtype="category"),
-                }
-            ),
+        right = right_tab({"A": dictionary(["a", "z"]), "B": dictionary(["x", "y"])})
+        result = render({"A": dictionary(["a", "b"])}, P(right, ["A"], ["B"]))
+        # 'y' does not appear in result, so it should not be in the dictionary
+        assert_arrow_table_equals(
+            result.table, {"A": dictionary(["a", "b"]), "B": dictionary(["x", None])}
         )
+        self.assertEqual(result.table.table["B"].chunk(0).dictionary.to_pylist(), ["x"])
 
     def test_right_join_delete_unused_categories_in_input_columns(self):
-        left = pd.DataFrame(
-            {
-                "A": pd.Series(["a", "b"], dtype="category"),  # join column
-                "B": pd.Series(["c", "d"], dtype="category"),  # other column
-            }
+        left = {
+            "A": dictionary(["a", "b"]),  # join column
+            "B": dictionary(["c", "d"]),  # other column
+        }
+        right = right_tab({"A": dictionary(["a"]), "C": ["e"]})
+        result = render(left, P(right, ["A"], ["C"], "right"))
+        # 'b' and 'd' don't appear in result, so they should not be in the
+        # dictionaries.
+        assert_arrow_table_equals(
+            result.table, {"A": dictionary(["a"]), "B": dictionary(["c"]), "C": ["e"]}
+        )
+        self.assertEqual(result.table.table["B"].chunk(0).dictionary.to_pylist(), ["c"])
+
+    def test_right_join_order_and_keys(self):
+        right = right_tab({"A": [3, 2, 1, 2], "C": ["w", "x", "y", "z"]})
+        result = render({"A": [2, 1], "B": [5, 6]}, P(right, ["A"], ["C"], "right"))
+        # Keys in order of appearance in left, then right
+        assert_arrow_table_equals(
+            result.table,
+            {"A": [2, 2, 1, 3], "B": [5.0, 5.0, 6.0, None], "C": ["x", "z", "y", "w"]},
         )
-        right = pd.DataFrame(
-            {"A": pd.Series(["a"], dtype="category"), "C": ["e"]}  # join column
+
+    def test_inner_join_delete_unused_categories_in_all_columns(self):
+        left = {
+            "A": dictionary(["a", "b"]),  # join column
+            "B": dictionary(["c", "d"]),  # other column
+        }
+        right = right_tab({"A": dictionary(["a", "x"]), "C": dictionary(["e", "y"])})
+        result = render(left, P(right, ["A"], ["C"], "inner"))
+        # 'b', 'd', 'x' and 'y' don't appear in the result, so the
+        # dictionaries should not contain them.
+        assert_arrow_table_equals(
+            result.table,
+            {"A": dictionary(["a"]), "B": dictionary(["c"]), "C": dictionary(["e"])},
         )
+        for column in result.table.table.columns:
+            self.assertEqual(len(column.chunk(0).dictionary), 1)
+
+    def test_inner_join_order(self):
+        right = right_tab({"A": [3, 1, 2, 1], "C": ["w", "x", "y", "z"]})
         result = render(
-            left,
+            {"A": [1, 2, 1, 4], "B": [5, 6, 7, 8]}, P(right, ["A"], ["C"], "inner")
+        )
+        # Keys in order of appearance in left; left rows, then right rows
+        assert_arrow_table_equals(
+            result.table,
             {
-                "right_tab": TabOutput(
-                    "slug",
-                    "Tab 2",
-                    {
-                        "A": RenderColumn("A", "text", None),
-                        "C": RenderColumn("C", "text", None),
-                    },
-                    right,
-                ),
-                "join_columns": {"on": ["A"], "right": ["C"]},
-                "type": "right",
-            },
-            input_columns={
-                "A": RenderColumn("A", "text", None),
-                "B": RenderColumn("B", "text", None),
+                "A": [1, 1, 1, 1, 2],
+                "B": [5, 5, 7, 7, 6],
+                "C": ["x", "z", "x", "z", "y"],
             },
         )
-        # 'b' and 'd' categories don't appear in result, so it should not be
-        # categories in the result dataframe.
-        assert_frame_equal(
-            result["dataframe"],
-            pd.DataFrame(
-                {
-                    "A": pd.Series(["a"], dtype="category"),
-                    "B": pd.Series(["c"], dtype="category"),
-                    "C": ["e"],
-                }
-            ),
-        )
 
-    def test_inner_join_delete_unused_categories_in_all_columns(self):
-        left = pd.DataFrame(
+    def test_many_rows_left_join(self):
+        n = 20000
+        codes = np.random.RandomState(0).randint(0, 1000, n)
+        categories = np.array(["key%d" % i for i in range(1000)], dtype=object)
+        left = arrow_table(
             {
-                "A": pd.Series(["a", "b"], dtype="category"),  # join column
-                "B": pd.Series(["c", "d"], dtype="category"),  # other column
+                "A": pyarrow.DictionaryArray.from_arrays(
+                    pyarrow.array(codes.astype(np.int32)), pyarrow.array(categories)
+                ),
+                "B": np.arange(n),
             }
         )
-        right = pd.DataFrame(
+        right = right_tab(
             {
-                "A": pd.Series(["a", "x"], dtype="category"),  # join column
-                "C": pd.Series(["e", "y"], dtype="category"),  # other column
+                "A": pyarrow.array(categories).dictionary_encode(),
+                "C": categories[::-1].tolist(),
+                "D": np.arange(1000) * 0.5,
             }
         )
-        result = render(
-            left,
-            {
-                "right_tab": TabOutput(
-                    "slug",
-                    "Tab 2",
-                    {
-                        "A": RenderColumn("A", "text", None),
-                        "C": RenderColumn("C", "text", None),
-                    },
-                    right,
-                ),
-                "join_columns": {"on": ["A"], "right": ["C"]},
-                "type": "inner",
-            },
-            input_columns={
-                "A": RenderColumn("A", "text", None),
-                "B": RenderColumn("B", "text", None),
-            },
+        with tempfile_context(suffix=".arrow") as output_path:
+            result = render_arrow(
+                left, P(right, ["A"], ["C", "D"]), "Tab 1", None, output_path
+            )
+        self.assertEqual(
+            result.table.table.column("C").to_pylist(), categories[::-1][codes].tolist()
         )
-        # 'b', 'd', 'x' and 'y' categories don't appear in the result, so the
-        # dtypes should not contain them.
-        assert_frame_equal(
-            result["dataframe"],
-            pd.DataFrame({"A": ["a"], "B": ["c"], "C": ["e"]}, dtype="category"),
+        self.assertEqual(
+            result.table.table.column("D").to_pylist(), (codes * 0.5).tolist()
         )
@@ -1,10 +1,10 @@
 import json
 import unittest
 from typing import Any, Dict, List
-import numpy as np
-import pandas as pd
-from pandas.testing import assert_frame_equal
-from staticmodules.refine import render, migrate_params, RefineSpec
+import pyarrow
+from cjwkernel.tests.util import arrow_table, assert_arrow_table_equals
+from cjwkernel.util import tempfile_context
+from staticmodules.refine import render_arrow, migrate_params, RefineSpec
 
 
 def P(column: str, refine: Dict[str, Any]) -> Dict[str, Any]:
@@ -227,131 +227,92 @@ class MigrateParamsTest(unittest.TestCase):
     def test_parse_v3_only_rename(self):
         self._test_parse_v2("A", {"renames": {"a": "b"}}, RefineSpec({"a": "b"}))
 
-    def _test_refine_spec_apply(
-        self,
-        in_table: pd.DataFrame,
-        column: str,
-        spec: RefineSpec,
-        expected_out: pd.DataFrame = pd.DataFrame(),
-        expected_error: str = "",
-    ) -> None:
-        """Render and assert the output is as expected."""
-        result = spec.apply(in_table, column)
-
-        if not expected_out.empty and expected_error:
-            table, error = result
-            self.assertEqual(error, expected_error)
-            assert_frame_equal(table, expected_out)
-        elif expected_error:
-            self.assertEqual(result, expected_error)
-        else:
-            assert_frame_equal(result, expected_out)
 
+def render(table, params):
+    with tempfile_context(suffix=".arrow") as output_path:
+        return render_arrow(arrow_table(table), params, "Tab 1", None, output_path)
+
+
+def dictionary(values):
+    return pyarrow.array(values, type=pyarrow.utf8()).dictionary_encode()
+
+
+class RenderTests(unittest.TestCase):
     def test_refine_rename_to_new(self):
-        self._test_refine_spec_apply(
-            pd.DataFrame({"A": ["a", "b"]}),
-            "A",
-            RefineSpec({"b": "c"}),
-            pd.DataFrame({"A": ["a", "c"]}, dtype="category"),
-        )
+        result = render({"A": ["a", "b"]}, P("A", {"renames": {"b": "c"}}))
+        assert_arrow_table_equals(result.table, {"A": dictionary(["a", "c"])})
 
     def test_refine_rename_category_to_new(self):
-        self._test_refine_spec_apply(
-            pd.DataFrame({"A": ["a", "b"]}, dtype="category"),
-            "A",
-            RefineSpec({"b": "c"}),
-            pd.DataFrame({"A": ["a", "c"]}, dtype="category"),
-        )
+        result = render({"A": dictionary(["a", "b"])}, P("A", {"renames": {"b": "c"}}))
+        assert_arrow_table_equals(result.table, {"A": dictionary(["a", "c"])})
 
     def test_refine_spurious_rename(self):
-        self._test_refine_spec_apply(
-            pd.DataFrame({"A": ["a"]}, dtype="category"),
-            "A",
-            RefineSpec({"b": "c"}),
-            pd.DataFrame({"A": ["a"]}, dtype="category"),
-        )
+        result = render({"A": dictionary(["a"])}, P("A", {"renames": {"b": "c"}}))
+        assert_arrow_table_equals(result.table, {"A": dictionary(["a"])})
 
     def test_refine_rename_empty_category(self):
-        self._test_refine_spec_apply(
-            pd.DataFrame({"A": []}, dtype="category"),
-            "A",
-            RefineSpec({"b": "c"}),
-            pd.DataFrame({"A": []}, dtype="category"),
-        )
+        result = render({"A": dictionary([])}, P("A", {"renames": {"b": "c"}}))
+        assert_arrow_table_equals(result.table, {"A": dictionary([])})
 
     def test_refine_rename_nan_category(self):
-        # Get explicit, because pandas botches the comparison:
-        #
-        # >>> self._test_refine_spec_apply(
-        #     pd.DataFrame({'A': [np.nan]}, dtype='category'),
-        #     'A', RefineSpec({'b': 'c'}),
-        #     pd.DataFrame({'A': [np.nan]}, dtype='category')
-        # )
-        # Attribute "dtype" are different
-        # [left]:  CategoricalDtype(categories=[], ordered=False)
-        # [right]: CategoricalDtype(categories=[], ordered=False)
-        spec = RefineSpec({"b": "c"})
-        result = spec.apply(pd.DataFrame({"A": []}, dtype="category"), "A")
-        self.assertEqual(0, len(result))
-        self.assertEqual(0, len(result["A"].cat.categories))
+        result = render({"A": dictionary([None])}, P("A", {"renames": {"b": "c"}}))
+        assert_arrow_table_equals(result.table, {"A": dictionary([None])})
+        self.assertEqual(len(result.table.table["A"].chunk(0).dictionary), 0)
 
     def test_refine_rename_category_to_existing(self):
-        self._test_refine_spec_apply(
-            pd.DataFrame({"A": ["a", "b"]}, dtype="category"),
-            "A",
-            RefineSpec({"b": "a"}),
-            pd.DataFrame({"A": ["a", "a"]}, dtype="category"),
+        result = render(
+            {"A": dictionary(["a", "b", "b"])}, P("A", {"renames": {"b": "a"}})
+        )
+        assert_arrow_table_equals(result.table, {"A": dictionary(["a", "a", "a"])})
+        # Workbench forbids duplicate dictionary values
+        self.assertEqual(result.table.table["A"].chunk(0).dictionary.to_pylist(), ["a"])
+
+    def test_refine_rename_two_to_one_new(self):
+        result = render(
+            {"A": dictionary(["a", "b", "c"])},
+            P("A", {"renames": {"a": "x", "c": "x"}}),
+        )
+        assert_arrow_table_equals(result.table, {"A": dictionary(["x", "b", "x"])})
+        self.assertEqual(
+            result.table.table["A"].chunk(0).dictionary.to_pylist(), ["x", "b"]
         )
 
     def test_refine_ignore_nan(self):
-        self._test_refine_spec_apply(
-            pd.DataFrame({"A": ["a", "b", np.nan]}, dtype="category"),
-            "A",
-            RefineSpec({"b": "a"}),
-            pd.DataFrame({"A": ["a", "a", np.nan]}, dtype="category"),
+        result = render(
+            {"A": dictionary(["a", "b", None])}, P("A", {"renames": {"b": "a"}})
         )
+        assert_arrow_table_equals(result.table, {"A": dictionary(["a", "a", None])})
 
     def test_refine_rename_swap(self):
-        self._test_refine_spec_apply(
-            pd.DataFrame({"A": ["a", "b"]}, dtype="category"),
-            "A",
-            RefineSpec({"a": "b", "b": "a"}),
-            pd.DataFrame({"A": ["b", "a"]}, dtype="category"),
+        result = render(
+            {"A": dictionary(["a", "b"])}, P("A", {"renames": {"a": "b", "b": "a"}})
         )
+        assert_arrow_table_equals(result.table, {"A": dictionary(["b", "a"])})
 
-    def _test_render(
-        self,
-        in_table: pd.DataFrame,
-        column: str,
-        edits_json: Dict[str, Any],
-        expected_out: pd.DataFrame = pd.DataFrame(),
-        expected_error: str = "",
-    ) -> None:
-        """Test that the render method works (kinda an integration test)."""
-        params = P(column, edits_json)
-        result = render(in_table, params)
-
-        if not expected_out.empty and expected_error:
-            table, error = result
-            self.assertEqual(error, expected_error)
-            assert_frame_equal(table, expected_out)
-        elif expected_error:
-            self.assertEqual(result, expected_error)
-        else:
-            assert_frame_equal(result, expected_out)
+    def test_refine_other_columns_untouched(self):
+        result = render(
+            {"A": dictionary(["a", "b"]), "B": [1, 2]}, P("A", {"renames": {"a": "b"}})
+        )
+        assert_arrow_table_equals(
+            result.table, {"A": dictionary(["b", "b"]), "B": [1, 2]}
+        )
 
     def test_render_no_column_is_no_op(self):
-        self._test_render(
-            pd.DataFrame({"A": ["b"]}, dtype="category"),
-            {},
-            {"renames": {}},
-            pd.DataFrame({"A": ["b"]}, dtype="category"),
-        )
+        result = render({"A": dictionary(["b"])}, P("", {"renames": {}}))
+        assert_arrow_table_equals(result.table, {"A": dictionary(["b"])})
 
     def test_render_no_json_is_no_op(self):
-        self._test_render(
-            pd.DataFrame({"A": ["b"]}, dtype="category"),
-            "A",
-            {},
-            pd.DataFrame({"A": ["b"]}, dtype="category"),
+        result = render({"A": dictionary(["b"])}, P("A", {}))
+        assert_arrow_table_equals(result.table, {"A": dictionary(["b"])})
+
+    def test_rename_does_not_copy_indices(self):
+        table = arrow_table({"A": dictionary(["a", "b", "a"])})
+        with tempfile_context(suffix=".arrow") as output_path:
+            result = render_arrow(
+                table, P("A", {"renames": {"a": "c"}}), "Tab 1", None, output_path
+            )
+        self.assertEqual(result.table.table["A"].to_pylist(), ["c", "b", "c"])
+        self.assertEqual(
+            result.table.table["A"].chunk(0).indices.buffers()[1].address,
+            table.table["A"].chunk(0).indices.buffers()[1].address,
         )
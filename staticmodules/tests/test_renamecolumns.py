@@ -1,11 +1,14 @@
-from dataclasses import dataclass
-from typing import Optional
 import unittest
-import pandas as pd
-from pandas.testing import assert_frame_equal
+from cjwkernel.tests.util import (
+    arrow_table,
+    arrow_table_context,
+    assert_arrow_table_equals,
+)
+from cjwkernel.types import Column, ColumnType, I18nMessage, RenderError
+from cjwkernel.util import tempfile_context
 from staticmodules.renamecolumns import (
     migrate_params,
-    render,
+    render_arrow,
     _parse_renames,
     _parse_custom_list,
 )
@@ -15,12 +18,10 @@ def P(custom_list=False, renames={}, list_string=""):
     return {"custom_list": custom_list, "renames": renames, "list_string": list_string}
 
 
-@dataclass
-class Column:
-    format: Optional[str] = None
-
-
-a_table = pd.DataFrame({"A": [1, 2], "B": [2, 3], "C": [3, 4]})
+def render(table, params, columns=None):
+    with arrow_table_context(table, columns) as input_table:
+        with tempfile_context(suffix=".arrow") as output_path:
+            return render_arrow(input_table, params, "tab-x", None, output_path)
 
 
 class MigrateParamsTests(unittest.TestCase):
@@ -134,70 +135,83 @@ class RenderTests(unittest.TestCase):
         )
 
     def test_rename_empty_is_no_op(self):
-        table = pd.DataFrame({"A": ["x"]})
-        result = render(
-            table, P(custom_list=False, renames={}), input_columns={"A": Column()}
-        )
-        assert_frame_equal(result, pd.DataFrame({"A": ["x"]}))
+        result = render({"A": ["x"]}, P(custom_list=False, renames={}))
+        assert_arrow_table_equals(result.table, {"A": ["x"]})
 
     def test_rename_custom_list_empty_is_no_op(self):
-        table = pd.DataFrame({"A": ["x"]})
-        result = render(
-            table, P(custom_list=True, list_string=""), input_columns={"A": Column()}
-        )
-        assert_frame_equal(result, pd.DataFrame({"A": ["x"]}))
+        result = render({"A": ["x"]}, P(custom_list=True, list_string=""))
+        assert_arrow_table_equals(result.table, {"A": ["x"]})
 
     def test_rename_custom_list_too_many_columns_is_error(self):
-        table = pd.DataFrame({"A": ["x"]})
-        result = render(
-            table, P(custom_list=True, list_string="X,Y"), input_columns={"A": Column()}
-        )
+        result = render({"A": ["x"]}, P(custom_list=True, list_string="X,Y"))
         self.assertEqual(
-            result, "You supplied 2 column names, but the table has 1 columns."
+            result.errors,
+            [
+                RenderError(
+                    I18nMessage.TODO_i18n(
+                        "You supplied 2 column names, but the table has 1 columns."
+                    )
+                )
+            ],
         )
 
     def test_rename_formats(self):
-        table = pd.DataFrame({"A": ["x"], "B": [1]})
         result = render(
-            table,
+            {"A": ["x"], "B": [1]},
             P(custom_list=False, renames={"A": "X", "B": "Y"}),
-            input_columns={"A": Column(), "B": Column("{:,d}")},
+            [Column("A", ColumnType.Text()), Column("B", ColumnType.Number("{:,d}"))],
+        )
+        assert_arrow_table_equals(
+            result.table,
+            arrow_table(
+                {"X": ["x"], "Y": [1]},
+                [
+                    Column("X", ColumnType.Text()),
+                    Column("Y", ColumnType.Number("{:,d}")),
+                ],
+            ),
         )
-        assert_frame_equal(result["dataframe"], pd.DataFrame({"X": ["x"], "Y": [1]}))
-        self.assertEqual(result["column_formats"], {"Y": "{:,d}", "X": None})
 
     def test_rename_swap_columns(self):
-        table = pd.DataFrame({"A": ["x"], "B": [1]})
         result = render(
-            table,
+            {"A": ["x"], "B": [1]},
             P(custom_list=False, renames={"A": "B", "B": "A"}),
-            input_columns={"A": Column(), "B": Column("{:,d}")},
+            [Column("A", ColumnType.Text()), Column("B", ColumnType.Number("{:,d}"))],
+        )
+        assert_arrow_table_equals(
+            result.table,
+            arrow_table(
+                {"B": ["x"], "A": [1]},
+                [
+                    Column("B", ColumnType.Text()),
+                    Column("A", ColumnType.Number("{:,d}")),
+                ],
+            ),
         )
-        assert_frame_equal(result["dataframe"], pd.DataFrame({"B": ["x"], "A": [1]}))
-        self.assertEqual(result["column_formats"], {"A": "{:,d}", "B": None})
 
     def test_custom_list(self):
-        table = pd.DataFrame({"A": ["x"], "B": [1]})
         result = render(
-            table,
+            {"A": ["x"], "B": [1]},
             P(custom_list=True, list_string="X\nY"),
-            input_columns={"A": Column(), "B": Column("{:,d}")},
+            [Column("A", ColumnType.Text()), Column("B", ColumnType.Number("{:,d}"))],
+        )
+        assert_arrow_table_equals(
+            result.table,
+            arrow_table(
+                {"X": ["x"], "Y": [1]},
+                [
+                    Column("X", ColumnType.Text()),
+                    Column("Y", ColumnType.Number("{:,d}")),
+                ],
+            ),
         )
-        assert_frame_equal(result["dataframe"], pd.DataFrame({"X": ["x"], "Y": [1]}))
-        self.assertEqual(result["column_formats"], {"Y": "{:,d}", "X": None})
 
     def test_dict_disallow_rename_to_null(self):
-        table = pd.DataFrame({"A": [1]})
-        result = render(table, P(renames={"A": ""}), input_columns={"A": Column()})
-        assert_frame_equal(result, pd.DataFrame({"A": [1]}))
+        result = render({"A": [1]}, P(renames={"A": ""}))
+        assert_arrow_table_equals(result.table, {"A": [1]})
 
     def test_custom_list_disallow_rename_to_null(self):
-        table = pd.DataFrame({"A": [1], "B": [2], "C": [3]})
         result = render(
-            table,
-            P(custom_list=True, list_string="D\n\nF"),
-            input_columns={"A": Column(), "B": Column(), "C": Column()},
-        )
-        assert_frame_equal(
-            result["dataframe"], pd.DataFrame({"D": [1], "B": [2], "F": [3]})
+            {"A": [1], "B": [2], "C": [3]}, P(custom_list=True, list_string="D\n\nF")
         )
+        assert_arrow_table_equals(result.table, {"D": [1], "B": [2], "F": [3]})
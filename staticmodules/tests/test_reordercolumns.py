@@ -1,21 +1,23 @@
 import unittest
-import pandas as pd
-from pandas.testing import assert_frame_equal
+from cjwkernel.tests.util import arrow_table_context, assert_arrow_table_equals
+from cjwkernel.util import tempfile_context
 from staticmodules import reordercolumns
 
 
-a_table = pd.DataFrame(
-    {"name": [1, 2], "date": [2, 3], "count": [3, 4], "float": [4.0, 5.0]}
-)
+a_table = {"name": [1, 2], "date": [2, 3], "count": [3, 4], "float": [4.0, 5.0]}
 
 
 def fake_result(colnames):
-    return a_table[colnames]
+    return {colname: a_table[colname] for colname in colnames}
 
 
 def render(table, reorder_history):
     params = {"reorder-history": reorder_history}
-    return reordercolumns.render(table.copy(), params)
+    with arrow_table_context(table) as arrow_table:
+        with tempfile_context(suffix=".arrow") as output_path:
+            return reordercolumns.render_arrow(
+                arrow_table, params, "tab-x", None, output_path
+            )
 
 
 class MigrateParamsTest(unittest.TestCase):
@@ -71,7 +73,9 @@ class MigrateParamsTest(unittest.TestCase):
 class ReorderTest(unittest.TestCase):
     def test_reorder_empty(self):
         result = render(a_table, {})
-        assert_frame_equal(result, fake_result(["name", "date", "count", "float"]))
+        assert_arrow_table_equals(
+            result.table, fake_result(["name", "date", "count", "float"])
+        )
 
     def test_reorder(self):
         # In chronological order, starting with
@@ -94,7 +98,9 @@ class ReorderTest(unittest.TestCase):
             },  # gives ['count', 'float', 'date', 'name']
         ]
         result = render(a_table, reorder_ops)
-        assert_frame_equal(result, fake_result(["count", "float", "date", "name"]))
+        assert_arrow_table_equals(
+            result.table, fake_result(["count", "float", "date", "name"])
+        )
 
     def test_missing_column(self):
         # If an input column is removed (e.g. via select columns)
@@ -115,4 +121,6 @@ class ReorderTest(unittest.TestCase):
             },  # gives ['count', 'name', 'float', 'date']
         ]
         result = render(a_table, reorder_ops)
-        assert_frame_equal(result, fake_result(["count", "name", "float", "date"]))
+        assert_arrow_table_equals(
+            result.table, fake_result(["count", "name", "float", "date"])
+        )
@@ -1,8 +1,9 @@
 from typing import Any, Dict, List
 import unittest
-import pandas as pd
-from pandas.testing import assert_frame_equal
-from staticmodules.selectcolumns import migrate_params, render
+from cjwkernel.tests.util import arrow_table_context, assert_arrow_table_equals
+from cjwkernel.types import I18nMessage, RenderError
+from cjwkernel.util import tempfile_context
+from staticmodules.selectcolumns import migrate_params, render_arrow
 
 
 class MigrateParamsTest(unittest.TestCase):
@@ -58,55 +59,118 @@ def P(
     }
 
 
+def render(table, params):
+    with arrow_table_context(table) as arrow_table:
+        with tempfile_context(suffix=".arrow") as output_path:
+            return render_arrow(arrow_table, params, "tab-x", None, output_path)
+
+
 class RenderTest(unittest.TestCase):
     def test_render_single_column(self):
-        table = pd.DataFrame({"A": [1, 2], "B": [2, 3], "C": [3, 4]})
+        table = {"A": [1, 2], "B": [2, 3], "C": [3, 4]}
         result = render(table, P(["A"]))
-        assert_frame_equal(result, pd.DataFrame({"A": [1, 2]}))
+        assert_arrow_table_equals(result.table, {"A": [1, 2]})
+
+    def test_render_no_colnames_is_no_op(self):
+        table = {"A": [1, 2], "B": [2, 3]}
+        result = render(table, P([]))
+        assert_arrow_table_equals(result.table, table)
 
     def test_render_maintain_input_column_order(self):
-        table = pd.DataFrame({"A": [1, 2], "B": [2, 3], "C": [3, 4]})
+        table = {"A": [1, 2], "B": [2, 3], "C": [3, 4]}
         result = render(table, P(["B"], keep=False))
-        assert_frame_equal(result, pd.DataFrame({"A": [1, 2], "C": [3, 4]}))
+        assert_arrow_table_equals(result.table, {"A": [1, 2], "C": [3, 4]})
+
+    def test_render_keep_in_param_order(self):
+        table = {"A": [1, 2], "B": [2, 3], "C": [3, 4]}
+        result = render(table, P(["C", "A"]))
+        assert_arrow_table_equals(result.table, {"C": [3, 4], "A": [1, 2]})
 
     def test_render_drop_columns(self):
-        table = pd.DataFrame({"A": [1, 2], "B": [2, 3], "C": [3, 4]})
+        table = {"A": [1, 2], "B": [2, 3], "C": [3, 4]}
         result = render(table, P(["B", "C"], keep=False))
-        assert_frame_equal(result, pd.DataFrame({"A": [1, 2]}))
+        assert_arrow_table_equals(result.table, {"A": [1, 2]})
+
+    def test_render_drop_all_columns(self):
+        table = {"A": [1, 2]}
+        result = render(table, P(["A"], keep=False))
+        self.assertIsNone(result.table.table)
+        self.assertEqual(result.table.metadata.columns, [])
 
     def test_render_range_ignore_empty_range(self):
-        table = pd.DataFrame({"A": [1, 2], "B": [2, 3], "C": [3, 4]})
-        result = render(table.copy(), P(select_range=True, column_numbers=""))
+        table = {"A": [1, 2], "B": [2, 3], "C": [3, 4]}
+        result = render(table, P(select_range=True, column_numbers=""))
         self.assertEqual(
-            result, 'Column numbers must look like "1-2", "5" or "1-2, 5"; got ""'
+            result.errors,
+            [
+                RenderError(
+                    I18nMessage.TODO_i18n(
+                        'Column numbers must look like "1-2", "5" or "1-2, 5"; got ""'
+                    )
+                )
+            ],
         )
 
     def test_render_range_comma_separated(self):
-        table = pd.DataFrame({"A": [1, 2], "B": [2, 3], "C": [3, 4]})
+        table = {"A": [1, 2], "B": [2, 3], "C": [3, 4]}
         result = render(table, P(select_range=True, column_numbers="1,3"))
-        assert_frame_equal(result, pd.DataFrame({"A": [1, 2], "C": [3, 4]}))
+        assert_arrow_table_equals(result.table, {"A": [1, 2], "C": [3, 4]})
 
     def test_render_range_hyphen_separated(self):
-        table = pd.DataFrame({"A": [1, 2], "B": [2, 3], "C": [3, 4]})
+        table = {"A": [1, 2], "B": [2, 3], "C": [3, 4]}
         result = render(table, P(select_range=True, column_numbers="2-3", keep=False))
-        assert_frame_equal(result, pd.DataFrame({"A": [1, 2]}))
+        assert_arrow_table_equals(result.table, {"A": [1, 2]})
 
     def test_render_range_overlapping_ranges(self):
-        table = pd.DataFrame({"A": [1, 2], "B": [2, 3], "C": [3, 4]})
+        table = {"A": [1, 2], "B": [2, 3], "C": [3, 4]}
         result = render(table, P(select_range=True, column_numbers="2-3,2"))
-        self.assertEqual(result, "There are overlapping numbers in input range")
+        self.assertEqual(
+            result.errors,
+            [
+                RenderError(
+                    I18nMessage.TODO_i18n(
+                        "There are overlapping numbers in input range"
+                    )
+                )
+            ],
+        )
 
     def test_render_range_clamp_range(self):
-        table = pd.DataFrame({"A": [1, 2], "B": [2, 3], "C": [3, 4]})
+        table = {"A": [1, 2], "B": [2, 3], "C": [3, 4]}
         result = render(table, P(select_range=True, column_numbers="-1,2,6"))
         self.assertEqual(
-            result, 'Column numbers must look like "1-2", "5" or "1-2, 5"; got "-1"'
+            result.errors,
+            [
+                RenderError(
+                    I18nMessage.TODO_i18n(
+                        'Column numbers must look like "1-2", "5" or "1-2, 5"; got "-1"'
+                    )
+                )
+            ],
         )
 
     def test_render_range_non_numeric_ranges(self):
-        table = pd.DataFrame({"A": [1, 2], "B": [2, 3], "C": [3, 4]})
+        table = {"A": [1, 2], "B": [2, 3], "C": [3, 4]}
         result = render(table, P(select_range=True, column_numbers="2-3,giraffe"))
         self.assertEqual(
-            result,
-            ('Column numbers must look like "1-2", "5" or "1-2, 5"; ' 'got "giraffe"'),
+            result.errors,
+            [
+                RenderError(
+                    I18nMessage.TODO_i18n(
+                        'Column numbers must look like "1-2", "5" or "1-2, 5"; '
+                        'got "giraffe"'
+                    )
+                )
+            ],
         )
+
+    def test_render_reuse_input_arrays(self):
+        table = {"A": [1, 2], "B": [2.0, 3.0]}
+        with arrow_table_context(table) as arrow_table:
+            with tempfile_context(suffix=".arrow") as output_path:
+                result = render_arrow(arrow_table, P(["B"]), "tab-x", None, output_path)
+                # zero-copy: the output points to the input's data buffer
+                self.assertEqual(
+                    result.table.table.column(0).chunk(0).buffers()[1].address,
+                    arrow_table.table.column(1).chunk(0).buffers()[1].address,
+                )
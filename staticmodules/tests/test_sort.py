@@ -1,9 +1,11 @@
 import datetime
 import unittest
-import pandas as pd
-from pandas.testing import assert_frame_equal
 import numpy as np
-from staticmodules.sort import render, migrate_params
+import pyarrow
+from cjwkernel.tests.util import arrow_table, assert_arrow_table_equals
+from cjwkernel.types import I18nMessage, RenderError
+from cjwkernel.util import tempfile_context
+from staticmodules.sort import migrate_params, render_arrow
 
 
 def P(sort_columns=[], keep_top=""):
@@ -72,7 +74,19 @@ class MigrateParamsTests(unittest.TestCase):
         )
 
 
+def render(table, params):
+    with tempfile_context(suffix=".arrow") as output_path:
+        return render_arrow(arrow_table(table), params, "Tab 1", None, output_path)
+
+
+def dictionary(values):
+    return pyarrow.array(values).dictionary_encode()
+
+
 class SortTests(unittest.TestCase):
+    def assertResultError(self, result, message):
+        self.assertEqual(result.errors, [RenderError(I18nMessage.TODO_i18n(message))])
+
     def test_params_duplicate_columns(self):
         params = P(
             [
@@ -81,13 +95,13 @@ class SortTests(unittest.TestCase):
             ]
         )
 
-        result = render(pd.DataFrame(), params)
-        self.assertEqual(result, "Duplicate columns.")
+        result = render({"A": [1, 2]}, params)
+        self.assertResultError(result, "Duplicate columns.")
 
     def test_params_initial_value_is_no_op(self):
         params = P([{"colname": "", "is_ascending": False}])
-        result = render(pd.DataFrame(pd.DataFrame({"A": [1, 2]})), params)
-        assert_frame_equal(result, pd.DataFrame({"A": [1, 2]}))
+        result = render({"A": [1, 2]}, params)
+        assert_arrow_table_equals(result.table, {"A": [1, 2]})
 
     def test_params_nix_empty_columns(self):
         params = P(
@@ -98,83 +112,103 @@ class SortTests(unittest.TestCase):
             ]
         )
 
-        result = render(
-            pd.DataFrame({"A": [3, 2, 1], "B": [2, 3, 4], "C": [1, 2, 3]}), params
-        )
-        assert_frame_equal(
-            result, pd.DataFrame({"A": [3, 2, 1], "B": [2, 3, 4], "C": [1, 2, 3]})
+        result = render({"A": [3, 2, 1], "B": [2, 3, 4], "C": [1, 2, 3]}, params)
+        assert_arrow_table_equals(
+            result.table, {"A": [3, 2, 1], "B": [2, 3, 4], "C": [1, 2, 3]}
         )
 
     def test_params_keep_top_str_is_error(self):
         params = P([{"colname": "A", "is_ascending": False}], keep_top="apple")
 
-        result = render(pd.DataFrame({"A": [1, 2, 3]}), params)
-        expected = 'Please enter a positive integer in "Keep top" or leave it blank.'
-        self.assertEqual(result, expected)
+        result = render({"A": [1, 2, 3]}, params)
+        self.assertResultError(
+            result, 'Please enter a positive integer in "Keep top" or leave it blank.'
+        )
 
     def test_params_keep_top_negative_is_error(self):
         params = P([{"colname": "A", "is_ascending": False}], keep_top="-2")
 
-        result = render(pd.DataFrame({"A": [1, 2, 3]}), params)
-        expected = 'Please enter a positive integer in "Keep top" or leave it blank.'
-        self.assertEqual(result, expected)
+        result = render({"A": [1, 2, 3]}, params)
+        self.assertResultError(
+            result, 'Please enter a positive integer in "Keep top" or leave it blank.'
+        )
 
     def test_order_str_ascending(self):
-        table = pd.DataFrame({"A": ["a", "c", "b"], "B": [1, 2, 3]})
+        table = {"A": ["a", "c", "b"], "B": [1, 2, 3]}
         params = P([{"colname": "A", "is_ascending": True}])
         result = render(table, params)
-        expected = pd.DataFrame({"A": ["a", "b", "c"], "B": [1, 3, 2]})
-        assert_frame_equal(result, expected)
+        assert_arrow_table_equals(result.table, {"A": ["a", "b", "c"], "B": [1, 3, 2]})
 
     def test_order_cat_str_ascending(self):
-        table = pd.DataFrame({"A": ["a", "c", "b"], "B": [1, 2, 3]})
-        table["A"] = table["A"].astype("category")
+        table = {"A": dictionary(["a", "c", "b"]), "B": [1, 2, 3]}
         params = P([{"colname": "A", "is_ascending": True}])
         result = render(table, params)
-        expected = pd.DataFrame(
-            {"A": pd.Series(["a", "b", "c"], dtype="category"), "B": [1, 3, 2]}
+        assert_arrow_table_equals(
+            result.table, {"A": dictionary(["a", "b", "c"]), "B": [1, 3, 2]}
+        )
+
+    def test_order_cat_str_by_value_not_dictionary_order(self):
+        table = {"A": dictionary(["c", "a", "b", None, "a"])}
+        params = P([{"colname": "A", "is_ascending": False}])
+        result = render(table, params)
+        assert_arrow_table_equals(
+            result.table, {"A": dictionary(["c", "b", "a", "a", None])}
         )
-        assert_frame_equal(result, expected)
 
     def test_order_str_descending(self):
-        table = pd.DataFrame({"A": ["a", "c", "b"], "B": [1, 2, 3]})
+        table = {"A": ["a", "c", "b"], "B": [1, 2, 3]}
         params = P([{"colname": "A", "is_ascending": False}])
         result = render(table, params)
-        expected = pd.DataFrame({"A": ["c", "b", "a"], "B": [2, 3, 1]})
-        assert_frame_equal(result, expected)
+        assert_arrow_table_equals(result.table, {"A": ["c", "b", "a"], "B": [2, 3, 1]})
 
     def test_order_number_ascending(self):
         # NaN and NaT always appear last
-        table = pd.DataFrame({"A": [3.0, np.nan, 2.1], "B": ["a", "b", "c"]})
+        table = {"A": [3.0, None, 2.1], "B": ["a", "b", "c"]}
         params = P([{"colname": "A", "is_ascending": True}])
         result = render(table, params)
-        expected = pd.DataFrame({"A": [2.1, 3.0, np.nan], "B": ["c", "a", "b"]})
-        assert_frame_equal(result, expected)
+        assert_arrow_table_equals(
+            result.table, {"A": [2.1, 3.0, None], "B": ["c", "a", "b"]}
+        )
 
     def test_order_number_descending(self):
-        table = pd.DataFrame({"A": [3.0, np.nan, 2.1], "B": ["a", "b", "c"]})
+        table = {"A": [3.0, None, 2.1], "B": ["a", "b", "c"]}
         params = P([{"colname": "A", "is_ascending": False}])
         result = render(table, params)
-        expected = pd.DataFrame({"A": [3.0, 2.1, np.nan], "B": ["a", "c", "b"]})
-        assert_frame_equal(result, expected)
+        assert_arrow_table_equals(
+            result.table, {"A": [3.0, 2.1, None], "B": ["a", "c", "b"]}
+        )
+
+    def test_order_int_descending_is_stable(self):
+        table = {"A": [1, 2, 1, 2], "B": ["a", "b", "c", "d"]}
+        params = P([{"colname": "A", "is_ascending": False}])
+        result = render(table, params)
+        assert_arrow_table_equals(
+            result.table, {"A": [2, 2, 1, 1], "B": ["b", "d", "a", "c"]}
+        )
 
     def test_order_date(self):
         d1 = datetime.datetime(2018, 8, 15, 1, 23, 45)
         d2 = datetime.datetime(2018, 8, 15, 1, 34, 56)
-        table = pd.DataFrame({"A": [d2, d1], "B": ["a", "b"]})
+        table = {
+            "A": pyarrow.array([d2, None, d1], pyarrow.timestamp("ns")),
+            "B": ["a", "b", "c"],
+        }
         params = P([{"colname": "A", "is_ascending": True}])
         result = render(table, params)
-        expected = pd.DataFrame({"A": [d1, d2], "B": ["b", "a"]})
-        assert_frame_equal(result, expected)
-
-    def test_keep_top_2_columns(self):
-        table = pd.DataFrame(
+        assert_arrow_table_equals(
+            result.table,
             {
-                "A": ["a", "a", "b", "b", "c", "c"],
-                "B": ["a", "b", "a", "b", "a", "b"],
-                "C": [1, 2, 3, 4, 5, 6],
-            }
+                "A": pyarrow.array([d1, d2, None], pyarrow.timestamp("ns")),
+                "B": ["c", "a", "b"],
+            },
         )
+
+    def test_keep_top_2_columns(self):
+        table = {
+            "A": ["a", "a", "b", "b", "c", "c"],
+            "B": ["a", "b", "a", "b", "a", "b"],
+            "C": [1, 2, 3, 4, 5, 6],
+        }
         params = P(
             [
                 {"colname": "A", "is_ascending": True},
@@ -183,22 +217,19 @@ class SortTests(unittest.TestCase):
             keep_top="1",
         )
         result = render(table, params)
-        assert_frame_equal(
-            result,
-            pd.DataFrame({"A": ["a", "b", "c"], "B": ["b", "b", "b"], "C": [2, 4, 6]}),
+        assert_arrow_table_equals(
+            result.table, {"A": ["a", "b", "c"], "B": ["b", "b", "b"], "C": [2, 4, 6]}
         )
 
     def test_keep_top_N_columns(self):
         """First N-1 columns are "group"; last column is "sort-in-group"."""
-        table = pd.DataFrame(
-            {
-                # Groups are "acf", "adf", "bde" (read this code vertically)
-                "A": ["a", "b", "a", "a", "a", "b"],
-                "B": ["c", "d", "c", "c", "d", "d"],
-                "C": ["f", "e", "f", "f", "f", "e"],
-                "D": [1, 2, 3, 4, 5, 6],
-            }
-        )
+        table = {
+            # Groups are "acf", "adf", "bde" (read this code vertically)
+            "A": ["a", "b", "a", "a", "a", "b"],
+            "B": ["c", "d", "c", "c", "d", "d"],
+            "C": ["f", "e", "f", "f", "f", "e"],
+            "D": [1, 2, 3, 4, 5, 6],
+        }
         params = P(
             [
                 {"colname": "A", "is_ascending": True},
@@ -209,31 +240,26 @@ class SortTests(unittest.TestCase):
             keep_top="2",
         )
         result = render(table, params)
-        assert_frame_equal(
-            result,
-            pd.DataFrame(
-                {
-                    "A": ["a", "a", "a", "b", "b"],
-                    "B": ["c", "c", "d", "d", "d"],
-                    "C": ["f", "f", "f", "e", "e"],
-                    "D": [4, 3, 5, 6, 2],
-                }
-            ),
+        assert_arrow_table_equals(
+            result.table,
+            {
+                "A": ["a", "a", "a", "b", "b"],
+                "B": ["c", "c", "d", "d", "d"],
+                "C": ["f", "f", "f", "e", "e"],
+                "D": [4, 3, 5, 6, 2],
+            },
         )
 
     def test_keep_top_na_is_sorted_last(self):
-        nan = np.nan  # to make the table line up -- ASCII art FTW
-        table = pd.DataFrame(
-            {
-                # groups:
-                # nan -- not a real group
-                # 'a' -- 3 rows
-                # 'b' -- 1 group
-                "A": [nan, "a", "a", "a", "b"],
-                "B": ["c", "c", "d", nan, nan],
-                "C": [1, 2, 3, 4, 5],
-            }
-        )
+        table = {
+            # groups:
+            # None -- not a real group
+            # 'a' -- 3 rows
+            # 'b' -- 1 group
+            "A": [None, "a", "a", "a", "b"],
+            "B": ["c", "c", "d", None, None],
+            "C": [1, 2, 3, 4, 5],
+        }
         params = P(
             [
                 {"colname": "A", "is_ascending": True},
@@ -242,33 +268,55 @@ class SortTests(unittest.TestCase):
             keep_top="2",
         )
         result = render(table, params)
-        assert_frame_equal(
-            result,
-            pd.DataFrame(
-                {
-                    "A": ["a", "a", "b", nan],
-                    "B": ["d", "c", nan, "c"],
-                    "C": [3, 2, 5, 1],
-                }
-            ),
+        assert_arrow_table_equals(
+            result.table,
+            {"A": ["a", "a", "b", None], "B": ["d", "c", None, "c"], "C": [3, 2, 5, 1]},
+        )
+
+    def test_keep_top_selects_within_large_groups(self):
+        # 2 groups of 500 rows: select the top 3 of each without sorting all
+        table = {"A": ["x", "y"] * 500, "B": (np.arange(1000) * 7919 % 1000).tolist()}
+        params = P(
+            [
+                {"colname": "A", "is_ascending": False},
+                {"colname": "B", "is_ascending": True},
+            ],
+            keep_top="3",
+        )
+        result = render(table, params)
+        assert_arrow_table_equals(
+            result.table, {"A": ["y", "y", "y", "x", "x", "x"], "B": [1, 3, 5, 0, 2, 4]}
         )
 
     def test_keep_top_with_one_column(self):
-        table = pd.DataFrame({"A": [np.nan, "a", "a", "a", "b"], "B": [1, 2, 3, 4, 5]})
+        table = {"A": [None, "a", "a", "a", "b"], "B": [1, 2, 3, 4, 5]}
         params = P([{"colname": "A", "is_ascending": True}], keep_top="2")
         result = render(table, params)
-        assert_frame_equal(result, pd.DataFrame({"A": ["a", "a"], "B": [2, 3]}))
+        assert_arrow_table_equals(result.table, {"A": ["a", "a"], "B": [2, 3]})
+
+    def test_keep_top_with_one_column_includes_nulls(self):
+        table = {"A": [None, 3.0, None, 1.0], "B": [1, 2, 3, 4]}
+        params = P([{"colname": "A", "is_ascending": False}], keep_top="3")
+        result = render(table, params)
+        assert_arrow_table_equals(result.table, {"A": [3.0, 1.0, None], "B": [2, 4, 1]})
 
     def test_keep_top_removes_unused_categories(self):
-        table = pd.DataFrame(
-            {
-                "A": [1, 2, 3, 4, 5],
-                "B": pd.Series(["x", "y", "z", "a", "b"], dtype="category"),
-            }
-        )
+        table = {"A": [1, 2, 3, 4, 5], "B": dictionary(["x", "y", "z", "a", "b"])}
         params = P([{"colname": "A", "is_ascending": True}], keep_top="2")
         result = render(table, params)
-        assert_frame_equal(
-            result,
-            pd.DataFrame({"A": [1, 2], "B": pd.Series(["x", "y"], dtype="category")}),
+        assert_arrow_table_equals(
+            result.table, {"A": [1, 2], "B": dictionary(["x", "y"])}
+        )
+        self.assertEqual(
+            result.table.table["B"].chunk(0).dictionary.to_pylist(), ["x", "y"]
+        )
+
+    def test_keep_top_many_rows(self):
+        values = np.random.RandomState(0).rand(100000)
+        table = arrow_table({"A": values})
+        params = P([{"colname": "A", "is_ascending": False}], keep_top="10")
+        with tempfile_context(suffix=".arrow") as output_path:
+            result = render_arrow(table, params, "Tab 1", None, output_path)
+        self.assertEqual(
+            result.table.table["A"].to_pylist(), np.sort(values)[::-1][:10].tolist()
         )
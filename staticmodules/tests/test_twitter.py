@@ -4,9 +4,13 @@ from unittest.mock import patch
 from asgiref.sync import async_to_sync
 import dateutil
 import pandas as pd
+import pyarrow
 from pandas.testing import assert_frame_equal
+from cjwkernel import parquet
 from cjwkernel.tests.util import override_settings
 from cjwkernel.pandas.types import ProcessResult
+from cjwkernel.types import FetchResult
+from cjwkernel.util import tempfile_context
 from staticmodules import twitter
 from .util import MockParams
 
@@ -1157,3 +1161,99 @@ class TwitterTests(unittest.TestCase):
         lang = result["lang"][0]
         self.assertNotEqual(lang, "und")
         self.assertTrue(pd.isnull(lang))
+
+
+class AccumulateIntoStoredFileTests(unittest.TestCase):
+    def setUp(self):
+        super().setUp()
+        self._stored_context = tempfile_context(suffix=".parquet")
+        self.stored_path = self._stored_context.__enter__()
+        self._output_context = tempfile_context(suffix=".parquet")
+        self.output_path = self._output_context.__enter__()
+
+    def tearDown(self):
+        self._output_context.__exit__(None, None, None)
+        self._stored_context.__exit__(None, None, None)
+        super().tearDown()
+
+    def _store(self, table):
+        with tempfile_context(suffix=".arrow") as arrow_path:
+            parquet.write(
+                self.stored_path, twitter.tweets_to_arrow_table(table, arrow_path)
+            )
+
+    def _fetch(self, params):
+        return async_to_sync(twitter.fetch)(
+            params,
+            secrets={"twitter_credentials": DefaultSecret},
+            get_stored_dataframe=None,  # we must not call it
+            last_fetch_result=FetchResult(self.stored_path, []),
+            output_path=self.output_path,
+        )
+
+    def _read_output(self):
+        return parquet.read(self.output_path).to_pandas()
+
+    @patch("aiohttp.ClientSession")
+    def test_prepend_new_tweets(self, session):
+        self._store(mock_tweet_table)
+        session.return_value = mock_session = MockAiohttpSession([mock_statuses2, []])
+        result = self._fetch(P(username="foouser", accumulate=True))
+        self.assertEqual(result, self.output_path)
+        expected = pd.concat(
+            [mock_tweet_table2, mock_tweet_table], ignore_index=True, sort=False
+        )
+        assert_frame_equal(self._read_output(), expected)
+        # since_id comes from the stored file
+        self.assertIn("&since_id=795017539831103489", str(mock_session.requests[0].url))
+
+    @override_settings(TWITTER_MAX_ROWS_PER_TABLE=3)
+    @patch("aiohttp.ClientSession")
+    def test_prepend_truncate(self, session):
+        self._store(mock_tweet_table)
+        session.return_value = MockAiohttpSession([mock_statuses2, []])
+        self._fetch(P(username="foouser", accumulate=True))
+        expected = pd.concat(
+            [mock_tweet_table2, mock_tweet_table.iloc[[0]]],
+            ignore_index=True,
+            sort=False,
+        )
+        assert_frame_equal(self._read_output(), expected)
+
+    @patch("aiohttp.ClientSession")
+    def test_no_new_tweets_copies_stored_file(self, session):
+        self._store(mock_tweet_table)
+        session.return_value = MockAiohttpSession([[]])
+        self._fetch(P(username="foouser", accumulate=True))
+        # Identical bytes, so the fetcher won't store a new version
+        self.assertEqual(self.output_path.read_bytes(), self.stored_path.read_bytes())
+
+    @patch("aiohttp.ClientSession")
+    def test_old_format_falls_back_to_pandas(self, session):
+        # Missing a column we added in a later version
+        parquet.write(
+            self.stored_path,
+            pyarrow.table({"id": pyarrow.array([795017539831103489], pyarrow.int64())}),
+        )
+
+        async def get_stored_dataframe():
+            return mock_tweet_table[["id"]].copy()
+
+        session.return_value = MockAiohttpSession([mock_statuses2, []])
+        result = async_to_sync(twitter.fetch)(
+            P(username="foouser", accumulate=True),
+            secrets={"twitter_credentials": DefaultSecret},
+            get_stored_dataframe=get_stored_dataframe,
+            last_fetch_result=FetchResult(self.stored_path, []),
+            output_path=self.output_path,
+        )
+        self.assertIsInstance(result, pd.DataFrame)
+        self.assertEqual(
+            list(result["id"]),
+            [
+                795018956507582465,
+                794967685113188400,
+                795017539831103489,
+                795017147651162112,
+            ],
+        )
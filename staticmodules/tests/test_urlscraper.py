@@ -5,9 +5,10 @@ import unittest
 from unittest.mock import patch
 import aiohttp
 from asgiref.sync import async_to_sync
-from django.test import override_settings, SimpleTestCase
+from django.test import SimpleTestCase
 import pandas as pd
 from pandas.testing import assert_frame_equal
+from cjwkernel.tests.util import override_settings
 from cjwkernel.pandas.types import ProcessResult
 from staticmodules import urlscraper
 from .util import MockParams
@@ -67,14 +68,29 @@ paged_result_table = pd.DataFrame(
 url_table = simple_result_table.loc[0:, ["url"]].copy()
 
 
-# mock for aiohttp.ClientResponse. Note async text()
+class MockStreamReader:
+    def __init__(self, body: bytes):
+        self.body = body
+
+    async def iter_chunked(self, n):
+        for i in range(0, len(self.body), n):
+            yield self.body[i : i + n]
+
+
+# mock for aiohttp.ClientResponse. Note async content
 class MockResponse:
-    def __init__(self, status, text):
+    def __init__(self, status, text, charset="utf-8"):
         self.status = status
-        self._text = text
+        self.content = MockStreamReader(text.encode(charset or "utf-8"))
+        self.charset = charset
+        self.released = False
+
+    def release(self):
+        self.released = True
 
-    async def text(self):
-        return self._text
+
+async def async_noop(*args, **kwargs):
+    pass
 
 
 class MockCachedRenderResult:
@@ -149,6 +165,7 @@ class ScrapeUrlsTest(SimpleTestCase):
             urls = results["url"].tolist()
             session_mock = session.return_value
             session_mock.get.side_effect = session_get
+            session_mock.close.side_effect = async_noop
 
             # mock the output table format scraper expects
             out_table = pd.DataFrame(
@@ -222,6 +239,62 @@ class ScrapeUrlsTest(SimpleTestCase):
 
         self.scraper_result_test(results_table, response_times)
 
+    def test_fetch_duplicate_url_once(self):
+        results = pd.DataFrame(
+            {
+                "url": ["http://a.com/1", "http://a.com/1"],
+                "status": ["200", "200"],
+                "html": ["<p>1</p>", "<p>1</p>"],
+            }
+        )
+
+        async def session_get(url, *, timeout=None):
+            return MockResponse(200, "<p>1</p>")
+
+        with patch("aiohttp.ClientSession") as session:
+            session_mock = session.return_value
+            session_mock.get.side_effect = session_get
+            session_mock.close.side_effect = async_noop
+            out_table = pd.DataFrame(
+                {"url": results["url"], "status": ""}, columns=["url", "status", "html"]
+            )
+            async_to_sync(urlscraper.scrape_urls)(results["url"].tolist(), out_table)
+
+        assert_frame_equal(out_table, results)
+        self.assertEqual(len(session_mock.get.mock_calls), 1)
+
+    @override_settings(SCRAPER_NUM_CONNECTIONS=8, SCRAPER_NUM_CONNECTIONS_PER_HOST=2)
+    def test_limit_connections_per_host(self):
+        urls = [f"http://a.com/{i}" for i in range(6)] + ["http://b.com/1"]
+        n_in_flight = {"a.com": 0, "b.com": 0}
+        max_in_flight = {"a.com": 0, "b.com": 0}
+
+        async def session_get(url, *, timeout=None):
+            host = url.host
+            n_in_flight[host] += 1
+            max_in_flight[host] = max(max_in_flight[host], n_in_flight[host])
+            await asyncio.sleep(0.001)
+            n_in_flight[host] -= 1
+            return MockResponse(200, "")
+
+        with patch("aiohttp.ClientSession") as session:
+            session_mock = session.return_value
+            session_mock.get.side_effect = session_get
+            session_mock.close.side_effect = async_noop
+            out_table = pd.DataFrame(
+                {"url": urls, "status": ""}, columns=["url", "status", "html"]
+            )
+            async_to_sync(urlscraper.scrape_urls)(urls, out_table)
+
+        self.assertEqual(max_in_flight, {"a.com": 2, "b.com": 1})
+        self.assertEqual(list(out_table["status"]), ["200"] * 7)
+
+    @override_settings(SCRAPER_MAX_RESPONSE_BYTES=5)
+    def test_truncate_response(self):
+        response = MockResponse(200, "<p>hi</p>", charset=None)
+        text = async_to_sync(urlscraper.read_text)(response)
+        self.assertEqual(text, "<p>hi")
+
     def test_module_initial_nop(self):
         table = pd.DataFrame({"A": [1]})
         result = urlscraper.render(
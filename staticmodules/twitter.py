@@ -1,6 +1,8 @@
 from collections import namedtuple
 from enum import Enum
+from pathlib import Path
 import re
+import shutil
 from typing import Any, Dict, List, Optional, Tuple
 import aiohttp
 from aiohttp.client_exceptions import ClientError, ClientResponseError
@@ -8,8 +10,13 @@ import numpy as np
 from oauthlib import oauth1
 from oauthlib.common import urlencode
 import pandas as pd
+import pyarrow
+import pyarrow.parquet
 import yarl  # expose aiohttp's innards -- ick.
-from cjwkernel import settings
+from cjwkernel import parquet, settings
+from cjwkernel.pandas.types import ProcessResult
+from cjwkernel.types import FetchResult
+from cjwkernel.util import tempfile_context
 
 
 class QueryType(Enum):
@@ -305,6 +312,10 @@ async def get_new_tweets(credentials, querytype, query, old_tweets):
     else:
         last_id = None
 
+    return await get_tweets_since(credentials, querytype, query, last_id)
+
+
+async def get_tweets_since(credentials, querytype, query, last_id: Optional[int]):
     if querytype == QueryType.USER_TIMELINE:
         match = USERNAME_REGEX.match(query)
         if not match:
@@ -350,6 +361,110 @@ def merge_tweets(old_table, new_table):
         return new_table.append(old_table, ignore_index=True, sort=False)
 
 
+def read_stored_max_id(parquet_path: Path) -> Optional[int]:
+    """
+    Find the greatest tweet ID in a Parquet file we stored.
+
+    Read the file's "id" statistics if they're there, so we needn't decode any
+    data. Raise `pyarrow.ArrowIOError` or `ValueError` on unexpected input.
+    """
+    metadata = pyarrow.parquet.read_metadata(str(parquet_path))
+    column_index = metadata.schema.to_arrow_schema().get_field_index("id")
+    if column_index == -1:
+        raise ValueError("Stored tweets have no 'id' column")
+
+    ids = []
+    for i in range(metadata.num_row_groups):
+        statistics = metadata.row_group(i).column(column_index).statistics
+        if statistics is None or not statistics.has_min_max:
+            # Old file, without statistics. Read the column.
+            table = pyarrow.parquet.read_table(str(parquet_path), columns=["id"])
+            values = table.column(0).to_pandas()
+            return None if values.isna().all() else int(values.max())
+        ids.append(statistics.max)
+    return max(ids, default=None)
+
+
+def tweets_to_arrow_table(tweets: pd.DataFrame, arrow_path: Path) -> pyarrow.Table:
+    # Convert the same way `fetch_arrow()` would, so schemas match
+    return ProcessResult(tweets).to_arrow(arrow_path).table.table
+
+
+def is_stored_file_appendable(parquet_path: Path) -> bool:
+    """
+    Return True if `parquet_path` holds tweets in this version's format.
+
+    Raise `pyarrow.ArrowIOError` on invalid Parquet file.
+    """
+    metadata = pyarrow.parquet.read_metadata(str(parquet_path))
+    with tempfile_context(suffix=".arrow") as arrow_path:
+        schema = tweets_to_arrow_table(create_empty_table(), arrow_path).schema
+    return (
+        metadata.schema.to_arrow_schema()
+        .remove_metadata()
+        .equals(schema.remove_metadata())
+    )
+
+
+def prepend_tweets_to_stored_file(
+    tweets: pd.DataFrame, stored_path: Path, output_path: Path
+) -> None:
+    """
+    Write `tweets` followed by the tweets stored at `stored_path`.
+
+    The stored tweets never become a pandas DataFrame: `parquet` copies them
+    one row group at a time. Raise `pyarrow.ArrowIOError` or `ValueError` if
+    the stored file can't be copied (e.g., it has a different schema).
+    """
+    with tempfile_context(suffix=".arrow") as arrow_path:
+        parquet.write_prepended(
+            output_path,
+            tweets_to_arrow_table(tweets, arrow_path),
+            stored_path,
+            max_n_rows=settings.TWITTER_MAX_ROWS_PER_TABLE,
+        )
+
+
+async def accumulate_into_stored_file(
+    credentials, querytype, query, last_fetch_result: FetchResult, output_path: Path
+) -> Optional[Path]:
+    """
+    Fetch new tweets and write them, plus the stored ones, to `output_path`.
+
+    Return `None` if the stored file isn't one we can append to (it's from an
+    older version of this module, say): the caller should merge in pandas
+    instead.
+
+    If there are no new tweets, we don't rewrite anything: `output_path` is a
+    byte-for-byte copy of the stored file, so the fetcher won't store a new
+    version. Otherwise, we decode and re-encode the entire stored history (up
+    to `TWITTER_MAX_ROWS_PER_TABLE` rows), one row group at a time: the
+    fetcher stores each version as one self-contained file.
+    """
+    stored_path = last_fetch_result.path
+    if (
+        last_fetch_result.errors
+        or not stored_path.stat().st_size
+        or not parquet.file_has_parquet_magic_number(stored_path)
+    ):
+        return None
+
+    try:
+        if not is_stored_file_appendable(stored_path):
+            return None
+        last_id = read_stored_max_id(stored_path)
+    except (pyarrow.ArrowIOError, ValueError):
+        return None
+
+    tweets = await get_tweets_since(credentials, querytype, query, last_id)
+    if tweets.empty:
+        shutil.copyfile(stored_path, output_path)
+        return output_path
+
+    prepend_tweets_to_stored_file(tweets, stored_path, output_path)
+    return output_path
+
+
 # Render just returns previously retrieved tweets
 def render(table, params, *, fetch_result):
     if fetch_result is None:
@@ -375,7 +490,14 @@ def render(table, params, *, fetch_result):
     }
 
 
-async def fetch(params, *, secrets, get_stored_dataframe):
+async def fetch(
+    params,
+    *,
+    secrets,
+    get_stored_dataframe,
+    last_fetch_result: Optional[FetchResult] = None,
+    output_path: Optional[Path] = None,
+):
     querytype = QueryType(params["querytype"])
     query: str = params[querytype.query_param_name]
     credentials = (secrets.get("twitter_credentials") or {}).get("secret")
@@ -390,6 +512,19 @@ async def fetch(params, *, secrets, get_stored_dataframe):
         return "Please sign in to Twitter"
 
     try:
+        if (
+            params["accumulate"]
+            and last_fetch_result is not None
+            and output_path is not None
+        ):
+            path = await accumulate_into_stored_file(
+                credentials, querytype, query, last_fetch_result, output_path
+            )
+            if path is not None:
+                return path
+            # The stored file is in an older format. Merge in pandas; that
+            # rewrites it in the current format.
+
         if params["accumulate"]:
             old_tweets = await get_stored_tweets(get_stored_dataframe)
             tweets = await get_new_tweets(credentials, querytype, query, old_tweets)
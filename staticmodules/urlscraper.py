@@ -1,10 +1,13 @@
 import asyncio
 import datetime
+import io
 import re
+from typing import Dict, List, Tuple
 import pandas as pd
 import aiohttp
 import yarl  # aiohttp innards -- yuck!
 from cjwkernel import settings
+from cjwkernel.pandas.parse.text import detect_encoding
 
 
 MaxNUrls = 10
@@ -19,19 +22,52 @@ def utcnow():
     return datetime.datetime.utcnow()
 
 
-async def async_get_url(row, url):
+def create_session() -> aiohttp.ClientSession:
     """
-    Return a Future (row, status, text).
+    Build a session whose keep-alive connections and DNS cache all requests
+    share.
+    """
+    connector = aiohttp.TCPConnector(
+        limit=settings.SCRAPER_NUM_CONNECTIONS,
+        limit_per_host=settings.SCRAPER_NUM_CONNECTIONS_PER_HOST,
+        ttl_dns_cache=settings.SCRAPER_DNS_CACHE_SECONDS,
+    )
+    return aiohttp.ClientSession(connector=connector)
 
-    The Future will resolve within settings.SCRAPER_TIMEOUT seconds. `status`
-    may be '
 
-    The Future will resolve within settings.SCRAPER_TIMEOUT seconds. The
-    exception may be `asyncio.TimeoutError`, `ValueError` (invalid URL) or
-    `aiohttp.client_exceptions.ClientError`.
+async def read_text(response) -> str:
     """
-    session = aiohttp.ClientSession()
+    Read and decode at most settings.SCRAPER_MAX_RESPONSE_BYTES of `response`.
+
+    Use the response's charset if it has one; otherwise, guess.
+    """
+    max_n_bytes = settings.SCRAPER_MAX_RESPONSE_BYTES
+    chunks = []
+    n_bytes = 0
+    async for chunk in response.content.iter_chunked(64 * 1024):
+        chunks.append(chunk)
+        n_bytes += len(chunk)
+        if n_bytes >= max_n_bytes:
+            break
+    body = b"".join(chunks)[:max_n_bytes]
+
+    encoding = response.charset or detect_encoding(io.BytesIO(body)) or "utf-8"
+    try:
+        return body.decode(encoding, errors="replace")
+    except LookupError:
+        # Server sent a charset Python doesn't know
+        return body.decode("utf-8", errors="replace")
+
+
+async def async_get_url(session: aiohttp.ClientSession, url: str) -> Tuple[str, str]:
+    """
+    Return (status, text).
+
+    `status` is the HTTP status code (as a str) or an error message. This
+    never raises, except `asyncio.CancelledError`.
 
+    The request will finish within settings.SCRAPER_TIMEOUT seconds.
+    """
     try:
         # aiohttp internally performs URL canonization before sending
         # request. DISABLE THIS: it breaks oauth and user's expectations.
@@ -40,53 +76,70 @@ async def async_get_url(row, url):
         url = yarl.URL(url, encoded=True)  # prevent magic
 
         response = await session.get(url, timeout=settings.SCRAPER_TIMEOUT)
-        # We have the header. Now read the content.
-        # response.text() times out according to SCRAPER_TIMEOUT above. See
-        # https://docs.aiohttp.org/en/stable/client_quickstart.html#timeouts
-        text = await response.text()
-
-        return (row, str(response.status), text)
+        try:
+            # We have the header. Now read the content.
+            # Reading times out according to SCRAPER_TIMEOUT above. See
+            # https://docs.aiohttp.org/en/stable/client_quickstart.html#timeouts
+            text = await read_text(response)
+        finally:
+            # Return the connection to the pool (or close it, if we didn't
+            # read to the end)
+            response.release()
+
+        return (str(response.status), text)
     except asyncio.TimeoutError:
-        return (row, "Timed out", "")
+        return ("Timed out", "")
     except aiohttp.InvalidURL:
-        return (row, "Invalid URL", "")
+        return ("Invalid URL", "")
     except aiohttp.ClientError as err:
-        return (row, f"Can't connect: {err}", "")
+        return (f"Can't connect: {err}", "")
     except asyncio.CancelledError:
         raise
     except Exception as err:
-        return (row, f"Unknown error: {err}", "")
-
-
-# Asynchronously scrape many urls, and store the results in the table
-async def scrape_urls(urls, result_table):
-    next_queued_row = 0  # index into urls
-    fetching = set()  # {Future<response>}
-
-    max_fetchers = settings.SCRAPER_NUM_CONNECTIONS
+        return (f"Unknown error: {err}", "")
 
-    while next_queued_row < len(urls) or fetching:
-        # start tasks until we max out connections, or run out of urls
-        while next_queued_row < len(urls) and len(fetching) < max_fetchers:
-            row = next_queued_row
-            url = urls[row].strip()
-            fetching.add(async_get_url(row, url))
 
-            next_queued_row += 1
-
-        assert fetching
+async def scrape_urls(urls: List[str], result_table: pd.DataFrame) -> None:
+    """
+    Fetch `urls`; write each response to `result_table`'s "status" and "html".
 
-        # finish one or more tasks, then loop
-        done, pending = await asyncio.wait(
-            fetching, return_when=asyncio.FIRST_COMPLETED
-        )
+    At most settings.SCRAPER_NUM_CONNECTIONS requests are in flight at once,
+    and at most settings.SCRAPER_NUM_CONNECTIONS_PER_HOST per host. A request
+    only starts (and starts its timeout) once a connection is free for it.
 
-        for task in done:
-            row, status, text = await task
+    A URL that appears in several rows is fetched once.
+    """
+    rows_by_url: Dict[str, List[int]] = {}
+    for row, url in enumerate(urls):
+        rows_by_url.setdefault(url.strip(), []).append(row)
+
+    slots = asyncio.Semaphore(settings.SCRAPER_NUM_CONNECTIONS)
+    host_slots: Dict[str, asyncio.Semaphore] = {}
+
+    session = create_session()
+
+    async def scrape(url: str) -> None:
+        try:
+            host = yarl.URL(url, encoded=True).host
+        except ValueError:
+            host = None
+        if host not in host_slots:
+            host_slots[host] = asyncio.Semaphore(
+                settings.SCRAPER_NUM_CONNECTIONS_PER_HOST
+            )
+
+        # Wait for the host first, so we don't hold a global slot idle
+        async with host_slots[host], slots:
+            status, text = await async_get_url(session, url)
+
+        for row in rows_by_url[url]:
             result_table.loc[row, "status"] = status
             result_table.loc[row, "html"] = text
 
-        fetching = pending  # delete done tasks
+    try:
+        await asyncio.gather(*(scrape(url) for url in rows_by_url))
+    finally:
+        await session.close()
 
 
 def are_params_empty(params, input_table):